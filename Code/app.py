@@ -13,9 +13,9 @@ if current_dir not in sys.path:
 if parent_dir not in sys.path:
     sys.path.insert(0, parent_dir)
 
-from flask import Flask, redirect, url_for
-from flask_migrate import Migrate
+from flask import Flask, g, redirect, url_for
 from Code.extensions import db, mail
+from Code.db_routing import configure_replica, engine_options, init_db_routing
 
 import smtplib
 from flask_mail import Mail
@@ -29,9 +29,20 @@ class CustomMail(Mail):
         return connection
 
 
+def _running_flask_cli():
+    """Vrai si l'app est chargée par la commande `flask` (contexte click actif)."""
+    import click
+    return click.get_current_context(silent=True) is not None
+
+
 def create_app():
+    # Journalisation structurée (LOG_LEVEL, LOG_FORMAT) : voir Code/structured_logging.py
+    from Code.structured_logging import configure_logging, init_request_logging
+    configure_logging()
+
     static_folder = os.path.join(parent_dir, "static")
     app = Flask(__name__, static_folder=static_folder)
+    init_request_logging(app)
 
     app.config["DEBUG"] = True
     app.config["PROPAGATE_EXCEPTIONS"] = True
@@ -46,12 +57,7 @@ def create_app():
             db_url = db_url.replace("postgres://", "postgresql://", 1)
         app.config["SQLALCHEMY_DATABASE_URI"] = db_url
         # Pool de connexions limité pour Neon (free tier = max ~20 connexions)
-        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-            "pool_pre_ping": True,
-            "pool_recycle": 300,
-            "pool_size": 2,
-            "max_overflow": 3,
-        }
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(pool_size=2, max_overflow=3)
     else:
         instance_path = os.path.join(os.path.dirname(__file__), "instance")
         os.makedirs(instance_path, exist_ok=True)
@@ -61,16 +67,21 @@ def create_app():
 
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
     
-    # Configuration SQLite pour éviter "database is locked"
+    # Configuration SQLite pour éviter "database is locked" : WAL et pragmas
+    # appliqués à la connexion, écritures courtes sérialisées par processus
+    # (voir Code/sqlite_writer.py)
     if not db_url:  # Seulement pour SQLite
-        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-            "pool_pre_ping": True,
-            "pool_recycle": 300,
-            "connect_args": {
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(
+            pool_size=5,
+            max_overflow=10,
+            connect_args={
                 "timeout": 30,
                 "check_same_thread": False,
-            }
-        }
+            },
+        )
+
+    # Réplique de lecture optionnelle (DATABASE_REPLICA_URL) : voir Code/db_routing.py
+    configure_replica(app)
 
     # -----------------------------
     # 2) Mail
@@ -83,8 +94,13 @@ def create_app():
 
     mail.init_app(app)
     db.init_app(app)
+    init_db_routing(app, db)
 
-    migrate = Migrate(app, db)
+    # Flask-Migrate (et Alembic, ~250 ms d'import) n'est utile qu'à la CLI
+    # `flask db ...` et au bootstrap : les workers HTTP ne le chargent pas.
+    if _running_flask_cli():
+        from flask_migrate import Migrate
+        Migrate(app, db)
 
     # --------- filtres jinja ----------
     import re
@@ -222,118 +238,50 @@ def create_app():
     from Code.routes.cartography_editor import cartography_editor_bp
     app.register_blueprint(cartography_editor_bp)
 
+    from Code.routes.process_graph import process_graph_bp
+    app.register_blueprint(process_graph_bp)
+
+    # Profilage par endpoint (PROFILING=1) + API d'administration
+    from Code.routes.profiling import init_profiling, profiling_bp
+    app.register_blueprint(profiling_bp)
+    init_profiling(app)
+
+    # Métriques Prometheus (METRICS=0 pour désactiver) : GET /metrics
+    from Code.metrics import init_metrics
+    from Code.routes.metrics import metrics_bp
+    app.register_blueprint(metrics_bp)
+    init_metrics(app)
+
+    from Code.sqlite_writer import init_write_serializer
     with app.app_context():
-        from sqlalchemy import text as _text
-
-        def _safe_add_column(table, col, col_type):
-            try:
-                with db.engine.connect() as _conn:
-                    _conn.execute(_text(f"ALTER TABLE {table} ADD COLUMN {col} {col_type}"))
-                    _conn.commit()
-                    print(f"[DB] Colonne {table}.{col} ajoutée")
-            except Exception:
-                pass  # colonne déjà présente — normal
-
-        # 1. Créer les tables manquantes (idempotent, pas de verrou DDL)
-        try:
-            db.create_all()
-            print("[DB] Tables vérifiées/créées via create_all")
-        except Exception as e:
-            print(f"[DB] create_all warning: {e}")
-
-        # 2. Colonnes manquantes — ALTER TABLE instantané, ignore si déjà présente
-        _safe_add_column("tools", "file_path", "VARCHAR(512)")
-        _safe_add_column("constraints", "file_path", "VARCHAR(512)")
-        _safe_add_column("entities", "svg_content", "TEXT")
-        _safe_add_column("entities", "vsdx_filename", "VARCHAR(255)")
-        _safe_add_column("entities", "optiqcarto_data", "TEXT")
-        _safe_add_column("recent_events", "detail", "TEXT")
-        _safe_add_column("recent_events", "user_id", "INTEGER")
-
-        # 3. Tables supplémentaires
-        try:
-            from Code.models.models import FileBlob
-            FileBlob.__table__.create(db.engine, checkfirst=True)
-            print("[DB] Table file_blobs prête")
-        except Exception as e:
-            print(f"[DB] file_blobs check: {e}")
-
-        try:
-            from Code.models.models import RecentEvent
-            RecentEvent.__table__.create(db.engine, checkfirst=True)
-            print("[DB] Table recent_events prête")
-        except Exception as e:
-            print(f"[DB] recent_events check: {e}")
-
-        # 4. Marquer les migrations Alembic comme appliquées (sans les exécuter)
-        # db_upgrade() est intentionnellement absent : il attend un verrou PostgreSQL
-        # pendant 10+ minutes si la colonne existe déjà → worker timeout → crash infini.
-        try:
-            with db.engine.connect() as _conn:
-                _conn.execute(_text("DELETE FROM alembic_version"))
-                _conn.execute(_text(
-                    "INSERT INTO alembic_version (version_num) VALUES ('b2c3d4e5f6a7')"
-                ))
-                _conn.commit()
-                print("[DB] alembic_version → b2c3d4e5f6a7")
-        except Exception as e:
-            print(f"[DB] alembic_version: {e}")
-
-        # 5. Seed données de démonstration recent_events
-        try:
-            import json as _json_seed
-            from datetime import datetime as _datetime, timedelta
-            from Code.models.models import RecentEvent as _RE
-            if _RE.query.count() == 0:
-                _now = _datetime.utcnow()
-                _seeds = [
-                    _RE(event_type='activity_created',
-                        icon='fa-solid fa-diagram-project',
-                        label='Activité créée : Gestion des commandes',
-                        created_at=_now - timedelta(days=3, hours=2),
-                        detail=_json_seed.dumps({"name": "Gestion des commandes",
-                                                  "description": "Traitement et suivi des commandes clients"}, ensure_ascii=False)),
-                    _RE(event_type='activity_updated',
-                        icon='fa-solid fa-pen-to-square',
-                        label='Activité modifiée : Facturation',
-                        created_at=_now - timedelta(days=2, hours=5),
-                        detail=_json_seed.dumps({"changes": [
-                            {"field": "Nom", "before": "Factures clients", "after": "Facturation"},
-                            {"field": "Description", "before": "Émission des factures", "after": "Création, validation et envoi des factures clients"}
-                        ]}, ensure_ascii=False)),
-                    _RE(event_type='role_updated',
-                        icon='fa-solid fa-pen-to-square',
-                        label='Rôle modifié : Responsable Qualité',
-                        created_at=_now - timedelta(hours=18),
-                        detail=_json_seed.dumps({"changes": [
-                            {"field": "Mission", "before": "Contrôle qualité", "after": "Assurer la conformité des processus aux standards ISO"}
-                        ]}, ensure_ascii=False)),
-                    _RE(event_type='tool_created',
-                        icon='fa-solid fa-toolbox',
-                        label='Outil créé : CRM Salesforce',
-                        created_at=_now - timedelta(hours=6),
-                        detail=_json_seed.dumps({"name": "CRM Salesforce",
-                                                  "description": "Gestion de la relation client"}, ensure_ascii=False)),
-                    _RE(event_type='tool_linked',
-                        icon='fa-solid fa-link',
-                        label='Outil associé : ERP SAP',
-                        created_at=_now - timedelta(minutes=45),
-                        detail=_json_seed.dumps({"tool": "ERP SAP", "task": "Saisie des commandes"}, ensure_ascii=False)),
-                ]
-                for _s in _seeds:
-                    db.session.add(_s)
-                db.session.commit()
-                print("[DB] Données de démonstration recent_events insérées")
-        except Exception as e:
-            db.session.rollback()
-            print(f"[DB] Seed recent_events: {e}")
-        finally:
-            db.session.remove()
-
-        # 6. Réinitialiser le pool — toutes les connexions du startup sont fermées
-        # avant que le worker commence à traiter les requêtes HTTP
-        db.engine.dispose()
-        print("[DB] Pool connexions réinitialisé")
+        init_write_serializer(app)
+
+    # -----------------------------
+    # Schéma : contrôle de version uniquement (aucun DDL au démarrage).
+    # Le DDL est fait une seule fois par Code/bootstrap.py avant les workers.
+    # -----------------------------
+    from Code.bootstrap import check_schema, register_cli
+
+    app.config["SCHEMA_CHECK"] = os.getenv("SCHEMA_CHECK", "warn").lower()
+    register_cli(app)
+
+    from Code.retention import register_cli as register_retention_cli
+    register_retention_cli(app)
+
+    from Code.carto_history import register_cli as register_carto_history_cli
+    register_carto_history_cli(app)
+
+    from Code.index_advisor import register_cli as register_index_advisor_cli
+    register_index_advisor_cli(app)
+
+    from Code.routes.changelog import register_cli as register_changelog_cli
+    register_changelog_cli(app)
+
+    if app.config["SCHEMA_CHECK"] != "off":
+        with app.app_context():
+            check_schema(app)
+            # Aucune connexion ouverte au démarrage ne doit survivre au fork des workers
+            db.engine.dispose()
 
     # secret key
     app.secret_key = os.getenv("SECRET_KEY", "devoptiq-secret")
@@ -346,6 +294,27 @@ def create_app():
     def home():
         return redirect(url_for("auth.login"))
 
+    # Instrumentation du contexte de requête (utilisateur / entité active) :
+    # REQUEST_CONTEXT_HEADER=1 ajoute les compteurs de la requête en en-tête
+    app.config["REQUEST_CONTEXT_HEADER"] = os.getenv("REQUEST_CONTEXT_HEADER", "0") == "1"
+
+    @app.after_request
+    def request_context_header(response):
+        if app.config["REQUEST_CONTEXT_HEADER"]:
+            memo = g.get("_request_memo")
+            if memo is not None:
+                response.headers["X-Request-Context"] = ";".join(
+                    f"{k}={v}" for k, v in memo["stats"].items()
+                )
+        return response
+
+    # Le mémo vit sur g, qui peut survivre à la requête (contexte
+    # d'application déjà poussé, ex. tests) : on le vide à chaque fin de requête
+    @app.teardown_request
+    def clear_request_memo(exception=None):
+        g.pop("_request_memo", None)
+        g.pop("_db_route", None)
+
     # Fermer proprement les connexions après chaque requête
     @app.teardown_appcontext
     def shutdown_session(exception=None):
@@ -357,6 +326,11 @@ def create_app():
 app = create_app()
 
 if __name__ == "__main__":
+    # Dev local : met le schéma à niveau avant de servir (en production,
+    # startup.sh lance `python -m Code.bootstrap` avant gunicorn)
+    from Code.bootstrap import bootstrap_database
+    bootstrap_database(app)
+
     # IMPORTANT: use_reloader=False pour éviter "database is locked" avec SQLite
     # Le reloader crée 2 processus qui accèdent à la DB simultanément
     app.run(debug=True, host="0.0.0.0", port=int(os.getenv("PORT", 8080)), use_reloader=False)
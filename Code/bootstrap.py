@@ -0,0 +1,233 @@
+# Code/bootstrap.py
+"""
+Initialisation ponctuelle du schéma, séparée de la construction de l'app.
+
+- bootstrap_database() : DDL idempotent (create_all, colonnes manquantes,
+  marquage Alembic, migrations versionnées) + seed de démonstration.
+  Lancé UNE fois avant le démarrage des workers :
+      python -m Code.bootstrap            (startup.sh, dev local)
+      flask --app Code.app bootstrap-db
+- check_schema() : seul contrôle exécuté par create_app() — une lecture de
+  alembic_version, sans DDL ni verrou.
+
+Le mode de contrôle est piloté par la variable SCHEMA_CHECK :
+  strict → RuntimeError si la version ne correspond pas (production)
+  warn   → message d'avertissement (défaut, dev/tests)
+  off    → aucun accès base au démarrage
+"""
+import os
+import sys
+import time
+
+from sqlalchemy import inspect, text
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from Code.extensions import db
+
+# Révision Alembic attendue par le code (head de migrations/versions).
+SCHEMA_VERSION = "d0e1f2a3b4c5"
+
+# Révision de référence : schéma obtenu par create_all + colonnes ci-dessous.
+BASELINE_VERSION = "b2c3d4e5f6a7"
+
+MIGRATIONS_DIR = os.path.join(parent_dir, "migrations")
+
+# Colonnes ajoutées après coup aux bases déjà en production
+LEGACY_COLUMNS = [
+    ("tools", "file_path", "VARCHAR(512)"),
+    ("constraints", "file_path", "VARCHAR(512)"),
+    ("entities", "svg_content", "TEXT"),
+    ("entities", "vsdx_filename", "VARCHAR(255)"),
+    ("entities", "optiqcarto_data", "TEXT"),
+    ("recent_events", "detail", "TEXT"),
+    ("recent_events", "user_id", "INTEGER"),
+]
+
+
+class SchemaVersionError(RuntimeError):
+    """Le schéma de la base ne correspond pas à SCHEMA_VERSION."""
+
+
+# -------------------------------------------------------------------
+# Contrôle au démarrage (lecture seule)
+# -------------------------------------------------------------------
+def current_schema_version(engine=None):
+    """Retourne la révision enregistrée dans alembic_version (ou None)."""
+    engine = engine or db.engine
+    try:
+        with engine.connect() as conn:
+            row = conn.execute(text("SELECT version_num FROM alembic_version")).fetchone()
+        return row[0] if row else None
+    except Exception:
+        return None
+
+
+def check_schema(app):
+    """
+    Vérifie que la base est au niveau SCHEMA_VERSION.
+    Appelé par create_app() dans un app_context ; ne fait aucun DDL.
+    """
+    mode = app.config.get("SCHEMA_CHECK", "warn")
+    if mode == "off":
+        return True
+
+    found = current_schema_version()
+    if found == SCHEMA_VERSION:
+        return True
+
+    message = (
+        f"[DB] Schéma {found or 'absent'} ≠ {SCHEMA_VERSION} attendu — "
+        f"lancer : python -m Code.bootstrap"
+    )
+    if mode == "strict":
+        raise SchemaVersionError(message)
+    print(message)
+    return False
+
+
+# -------------------------------------------------------------------
+# Bootstrap ponctuel (DDL)
+# -------------------------------------------------------------------
+def _add_missing_columns(engine):
+    """ALTER TABLE ADD COLUMN uniquement pour les colonnes réellement absentes."""
+    inspector = inspect(engine)
+    tables = set(inspector.get_table_names())
+    for table, col, col_type in LEGACY_COLUMNS:
+        if table not in tables:
+            continue
+        existing = {c["name"] for c in inspector.get_columns(table)}
+        if col in existing:
+            continue
+        with engine.begin() as conn:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {col} {col_type}"))
+        print(f"[DB] Colonne {table}.{col} ajoutée")
+
+
+def _known_revisions():
+    from alembic.config import Config
+    from alembic.script import ScriptDirectory
+
+    config = Config()
+    config.set_main_option("script_location", MIGRATIONS_DIR)
+    return {rev.revision for rev in ScriptDirectory.from_config(config).walk_revisions()}
+
+
+def _upgrade_to_head(app):
+    """
+    Marque la base au niveau BASELINE_VERSION si elle n'a jamais été versionnée
+    (schéma créé par create_all), puis applique les migrations suivantes.
+    """
+    from flask_migrate import Migrate, stamp, upgrade
+
+    if "migrate" not in app.extensions:
+        Migrate(app, db)
+    found = current_schema_version()
+    if found not in _known_revisions():
+        stamp(directory=MIGRATIONS_DIR, revision=BASELINE_VERSION)
+        print(f"[DB] alembic_version → {BASELINE_VERSION}")
+    upgrade(directory=MIGRATIONS_DIR)
+    print(f"[DB] Migrations appliquées → {current_schema_version()}")
+
+
+def seed_recent_events():
+    """Insère quelques événements de démonstration si le journal est vide."""
+    import json as _json_seed
+    from datetime import datetime as _datetime, timedelta
+    from Code.models.models import RecentEvent as _RE
+
+    try:
+        if _RE.query.count() == 0:
+            _now = _datetime.utcnow()
+            _seeds = [
+                _RE(event_type='activity_created',
+                    icon='fa-solid fa-diagram-project',
+                    label='Activité créée : Gestion des commandes',
+                    created_at=_now - timedelta(days=3, hours=2),
+                    detail=_json_seed.dumps({"name": "Gestion des commandes",
+                                              "description": "Traitement et suivi des commandes clients"}, ensure_ascii=False)),
+                _RE(event_type='activity_updated',
+                    icon='fa-solid fa-pen-to-square',
+                    label='Activité modifiée : Facturation',
+                    created_at=_now - timedelta(days=2, hours=5),
+                    detail=_json_seed.dumps({"changes": [
+                        {"field": "Nom", "before": "Factures clients", "after": "Facturation"},
+                        {"field": "Description", "before": "Émission des factures", "after": "Création, validation et envoi des factures clients"}
+                    ]}, ensure_ascii=False)),
+                _RE(event_type='role_updated',
+                    icon='fa-solid fa-pen-to-square',
+                    label='Rôle modifié : Responsable Qualité',
+                    created_at=_now - timedelta(hours=18),
+                    detail=_json_seed.dumps({"changes": [
+                        {"field": "Mission", "before": "Contrôle qualité", "after": "Assurer la conformité des processus aux standards ISO"}
+                    ]}, ensure_ascii=False)),
+                _RE(event_type='tool_created',
+                    icon='fa-solid fa-toolbox',
+                    label='Outil créé : CRM Salesforce',
+                    created_at=_now - timedelta(hours=6),
+                    detail=_json_seed.dumps({"name": "CRM Salesforce",
+                                              "description": "Gestion de la relation client"}, ensure_ascii=False)),
+                _RE(event_type='tool_linked',
+                    icon='fa-solid fa-link',
+                    label='Outil associé : ERP SAP',
+                    created_at=_now - timedelta(minutes=45),
+                    detail=_json_seed.dumps({"tool": "ERP SAP", "task": "Saisie des commandes"}, ensure_ascii=False)),
+            ]
+            db.session.add_all(_seeds)
+            db.session.commit()
+            print("[DB] Données de démonstration recent_events insérées")
+    except Exception as e:
+        db.session.rollback()
+        print(f"[DB] Seed recent_events: {e}")
+    finally:
+        db.session.remove()
+
+
+def bootstrap_database(app, seed=True):
+    """
+    Met la base au niveau SCHEMA_VERSION. Idempotent : peut être relancé
+    sans effet sur une base déjà à jour.
+    """
+    t0 = time.perf_counter()
+    with app.app_context():
+        import Code.models.models  # noqa: F401 — enregistre toutes les tables
+
+        # 1. Tables manquantes
+        db.create_all()
+        print("[DB] Tables vérifiées/créées via create_all")
+
+        # 2. Colonnes manquantes (anciennes bases)
+        _add_missing_columns(db.engine)
+
+        # 3. Versionnement Alembic + migrations postérieures au baseline
+        _upgrade_to_head(app)
+
+        # 4. Données de démonstration
+        if seed:
+            seed_recent_events()
+
+        db.engine.dispose()
+    print(f"[DB] Bootstrap terminé en {(time.perf_counter() - t0) * 1000:.0f} ms")
+
+
+def register_cli(app):
+    """Ajoute la commande `flask bootstrap-db`."""
+    import click
+
+    @app.cli.command("bootstrap-db")
+    @click.option("--no-seed", is_flag=True, help="Ne pas insérer les données de démonstration.")
+    def bootstrap_db_command(no_seed):
+        """Crée/met à jour le schéma puis sort (à lancer avant les workers)."""
+        bootstrap_database(app, seed=not no_seed)
+
+
+if __name__ == "__main__":
+    # L'import de Code.app construit l'app : pas de contrôle de schéma ici,
+    # c'est justement ce script qui le met à niveau.
+    os.environ["SCHEMA_CHECK"] = "off"
+    from Code.app import app as _app
+
+    bootstrap_database(_app, seed="--no-seed" not in sys.argv[1:])
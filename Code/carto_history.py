@@ -0,0 +1,495 @@
+# Code/carto_history.py
+"""
+Historique versionné des cartographies OptiqCarto (Entity.optiqcarto_data).
+
+Chaque sauvegarde de l'éditeur (complète ou par patch) ajoute une ligne
+carto_revisions pour la révision Entity.optiqcarto_rev :
+  - full  : diagramme complet (JSON canonique) ;
+  - delta : opérations (format apply_carto_ops) appliquées à la révision
+            précédente.
+Un instantané complet est écrit toutes les CARTO_KEYFRAME révisions : une
+lecture « diagramme à la révision N » applique au plus CARTO_KEYFRAME - 1
+deltas.
+
+Les contenus sont stockés dans carto_blobs, adressés par leur sha256
+(dédoublonnage : un diagramme revenu à un état antérieur ou un fichier déjà
+importé ne coûte rien) et compressés zlib quand c'est rentable.
+
+Les anciens fichiers de Code/static/carto_history/ (copies horodatées
+.svg/.vsdx) peuvent être importés (kind = file) puis supprimés du disque.
+
+Format des opérations (collections adressées par id) :
+    {"op": "add",     "path": "/shapes/17", "value": {...}, "index": 0}   (index optionnel)
+    {"op": "replace", "path": "/shapes/17", "value": {...}}
+    {"op": "remove",  "path": "/connections/42"}
+    {"op": "replace", "path": "/shapes/17/label", "value": "..."}        (add/remove d'un champ)
+    {"op": "move",    "path": "/bands/3", "index": 0}
+    {"op": "replace", "path": "/bands", "value": [...]}                  (collection entière)
+    {"op": "replace", "path": "/nextId", "value": 130}                   (clé de premier niveau)
+
+Usage :
+    python -m Code.carto_history [--dry-run] [--json]
+    flask --app Code.app carto-history-compact [--dry-run] [--json] [--entity ID]
+    flask --app Code.app carto-history-import [--remove] [--dir PATH]
+"""
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+import zlib
+from datetime import datetime
+
+from sqlalchemy import case, func
+from sqlalchemy.exc import IntegrityError
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from Code.extensions import db
+from Code.models.models import CartoBlob, CartoRevision
+
+CARTO_KEYFRAME = 50          # un instantané complet toutes les N révisions
+COMPRESS_MIN_GAIN = 0.9      # zlib conservé seulement s'il fait gagner ≥ 10 %
+LEGACY_DIR = os.path.join(current_dir, "static", "carto_history")
+_LEGACY_NAME = re.compile(r"^(\d{8}_\d{6})_(.+)$")
+
+
+# -------------------------------------------------------------------
+# Opérations sur le diagramme
+# -------------------------------------------------------------------
+_COLLECTIONS = ('shapes', 'bands', 'connections', 'groups')
+
+
+class PatchError(ValueError):
+    """Opération de patch invalide (→ 400)."""
+
+
+def item_key(value):
+    return str(value)
+
+
+def _index_of(items, item_id):
+    for i, it in enumerate(items):
+        if item_key(it.get('id')) == item_id:
+            return i
+    return None
+
+
+def _objects(coll, items, source):
+    """Contrôle qu'une collection est une liste d'objets (sinon 400, pas 500)."""
+    if not isinstance(items, list) or not all(isinstance(it, dict) for it in items):
+        raise PatchError(f"/{coll} : {source} doit être une liste d'objets")
+    return items
+
+
+def apply_carto_ops(diagram, ops):
+    """
+    Applique les opérations à `diagram` (modifié sur place).
+    Retourne {collection: {ids touchés}} ; une collection remplacée en bloc
+    est marquée par l'id spécial '*'.
+    """
+    touched = {c: set() for c in _COLLECTIONS}
+    for op in ops:
+        if not isinstance(op, dict):
+            raise PatchError("opération invalide")
+        kind = op.get('op')
+        parts = [p for p in str(op.get('path', '')).split('/') if p]
+        if not parts:
+            raise PatchError("path requis")
+
+        if parts[0] not in _COLLECTIONS:
+            if len(parts) != 1 or kind not in ('add', 'replace', 'remove'):
+                raise PatchError(f"chemin non supporté : {op.get('path')}")
+            if kind == 'remove':
+                diagram.pop(parts[0], None)
+            else:
+                diagram[parts[0]] = op.get('value')
+            continue
+
+        coll = parts[0]
+        items = _objects(coll, diagram.setdefault(coll, []), "la collection enregistrée")
+        if len(parts) == 1:
+            if kind != 'replace' or not isinstance(op.get('value'), list):
+                raise PatchError(f"/{coll} : seul replace d'une liste est supporté")
+            _objects(coll, op['value'], "value")
+            old_ids = {item_key(it.get('id')) for it in items}
+            diagram[coll] = op['value']
+            touched[coll] |= old_ids | {item_key(it.get('id')) for it in op['value']}
+            touched[coll].add('*')
+            continue
+
+        item_id = parts[1]
+        pos = _index_of(items, item_id)
+        if len(parts) == 2:
+            if kind == 'add':
+                value = op.get('value')
+                if not isinstance(value, dict) or item_key(value.get('id')) != item_id:
+                    raise PatchError(f"{op.get('path')} : value.id doit correspondre au chemin")
+                if pos is not None:
+                    items[pos] = value
+                elif isinstance(op.get('index'), int):
+                    items.insert(op['index'], value)
+                else:
+                    items.append(value)
+            elif kind == 'replace':
+                if pos is None:
+                    raise PatchError(f"{op.get('path')} introuvable")
+                if not isinstance(op.get('value'), dict):
+                    raise PatchError(f"{op.get('path')} : value doit être un objet")
+                items[pos] = op['value']
+            elif kind == 'remove':
+                if pos is not None:
+                    items.pop(pos)
+            elif kind == 'move':
+                if pos is None or not isinstance(op.get('index'), int):
+                    raise PatchError(f"{op.get('path')} : move exige un élément existant et un index")
+                items.insert(op['index'], items.pop(pos))
+            else:
+                raise PatchError(f"op inconnue : {kind}")
+        elif len(parts) == 3 and kind in ('add', 'replace', 'remove'):
+            if pos is None:
+                raise PatchError(f"{op.get('path')} introuvable")
+            if parts[2] == 'id':
+                raise PatchError("l'id d'un élément ne peut pas être modifié")
+            if kind == 'remove':
+                items[pos].pop(parts[2], None)
+            else:
+                items[pos][parts[2]] = op.get('value')
+        else:
+            raise PatchError(f"chemin non supporté : {op.get('path')}")
+        touched[coll].add(item_id)
+    return touched
+
+
+def diff_carto_ops(old, new):
+    """
+    Opérations qui transforment `old` en `new` (miroir de _diffOps dans
+    static/optiqcarto/editor.js) : éléments remplacés en entier, collection
+    entière si l'ordre des éléments communs a changé.
+    """
+    ops = []
+    for key in list(dict.fromkeys(list(old) + list(new))):
+        if key in _COLLECTIONS:
+            continue
+        if key not in new:
+            ops.append({"op": "remove", "path": f"/{key}"})
+        elif old.get(key) != new[key] or key not in old:
+            ops.append({"op": "replace", "path": f"/{key}", "value": new[key]})
+    for coll in _COLLECTIONS:
+        before, after = old.get(coll) or [], new.get(coll) or []
+        before_map = {item_key(it.get('id')): it for it in before}
+        after_map = {item_key(it.get('id')): it for it in after}
+        common_before = [k for k in before_map if k in after_map]
+        common_after = [k for k in after_map if k in before_map]
+        if common_before != common_after:
+            ops.append({"op": "replace", "path": f"/{coll}", "value": after})
+            continue
+        for k in before_map:
+            if k not in after_map:
+                ops.append({"op": "remove", "path": f"/{coll}/{k}"})
+        for index, item in enumerate(after):
+            k = item_key(item.get('id'))
+            prev = before_map.get(k)
+            if prev is None:
+                ops.append({"op": "add", "path": f"/{coll}/{k}", "value": item, "index": index})
+            elif prev != item:
+                ops.append({"op": "replace", "path": f"/{coll}/{k}", "value": item})
+    return ops
+
+
+def _canonical(obj):
+    return json.dumps(obj, ensure_ascii=False, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+
+def _sha(raw):
+    return hashlib.sha256(raw).hexdigest()
+
+
+# -------------------------------------------------------------------
+# Stockage adressé par contenu
+# -------------------------------------------------------------------
+def store_blob(raw):
+    """Retourne l'id du blob de contenu `raw` (bytes), créé s'il n'existe pas."""
+    sha = _sha(raw)
+    blob_id = db.session.query(CartoBlob.id).filter(CartoBlob.sha256 == sha).scalar()
+    if blob_id:
+        return blob_id
+    packed = zlib.compress(raw, 6)
+    if len(packed) < len(raw) * COMPRESS_MIN_GAIN:
+        encoding, data = "zlib", packed
+    else:
+        encoding, data = "raw", raw
+    blob = CartoBlob(sha256=sha, encoding=encoding, size=len(raw), data=data)
+    try:
+        with db.session.begin_nested():
+            db.session.add(blob)
+    except IntegrityError:
+        # Même contenu inséré en parallèle par une autre sauvegarde
+        return db.session.query(CartoBlob.id).filter(CartoBlob.sha256 == sha).scalar()
+    return blob.id
+
+
+def _decode(encoding, data):
+    data = bytes(data)
+    return zlib.decompress(data) if encoding == "zlib" else data
+
+
+def load_blobs(blob_ids):
+    """{blob_id: bytes} en une requête."""
+    if not blob_ids:
+        return {}
+    return {
+        bid: _decode(encoding, data)
+        for bid, encoding, data in db.session.query(CartoBlob.id, CartoBlob.encoding, CartoBlob.data)
+        .filter(CartoBlob.id.in_(list(set(blob_ids))))
+    }
+
+
+# -------------------------------------------------------------------
+# Écriture / lecture des révisions
+# -------------------------------------------------------------------
+def _add_revision(entity_id, rev, kind, payload, content_sha, user_id):
+    db.session.add(CartoRevision(
+        entity_id=entity_id, rev=rev, kind=kind, blob_id=store_blob(payload),
+        content_sha=content_sha, user_id=user_id,
+    ))
+
+
+def record_revision(entity_id, rev, old, new, ops=None, user_id=None, keyframe=CARTO_KEYFRAME):
+    """
+    Historise la révision `rev` (diagramme `new`, issu de `old` à rev - 1).
+    À appeler dans la transaction qui écrit optiqcarto_data. Si l'entité
+    n'a pas encore d'historique, `old` est d'abord enregistré comme base.
+    """
+    last_full, last_rev = db.session.query(
+        func.max(case((CartoRevision.kind == "full", CartoRevision.rev))),
+        func.max(CartoRevision.rev),
+    ).filter(CartoRevision.entity_id == entity_id, CartoRevision.rev.isnot(None)).one()
+
+    if last_rev is None and old:
+        raw = _canonical(old)
+        _add_revision(entity_id, rev - 1, "full", raw, _sha(raw), user_id)
+        last_full = last_rev = rev - 1
+
+    raw = _canonical(new)
+    content_sha = _sha(raw)
+    if last_full is None or last_rev != rev - 1 or rev - last_full >= keyframe:
+        _add_revision(entity_id, rev, "full", raw, content_sha, user_id)
+    else:
+        delta = ops if ops is not None else diff_carto_ops(old or {}, new)
+        _add_revision(entity_id, rev, "delta", _canonical(delta), content_sha, user_id)
+
+
+def revision_list(entity_id):
+    """Révisions d'une entité (plus récente d'abord), sans charger les contenus."""
+    rows = db.session.query(
+        CartoRevision.rev, CartoRevision.kind, CartoRevision.created_at, CartoRevision.user_id,
+        CartoBlob.size, func.length(CartoBlob.data),
+    ).join(CartoBlob, CartoBlob.id == CartoRevision.blob_id).filter(
+        CartoRevision.entity_id == entity_id, CartoRevision.rev.isnot(None)
+    ).order_by(CartoRevision.rev.desc()).all()
+    return [{
+        "rev": rev, "kind": kind,
+        "created_at": created_at.isoformat() if created_at else None,
+        "user_id": user_id, "size": size, "stored_bytes": stored,
+    } for rev, kind, created_at, user_id, size, stored in rows]
+
+
+def diagram_at(entity_id, rev):
+    """
+    Diagramme tel qu'il était à la révision `rev` (None si inconnue) :
+    dernier instantané complet ≤ rev, puis les deltas suivants.
+    """
+    base_rev = db.session.query(func.max(CartoRevision.rev)).filter(
+        CartoRevision.entity_id == entity_id, CartoRevision.kind == "full", CartoRevision.rev <= rev
+    ).scalar()
+    if base_rev is None:
+        return None
+    rows = db.session.query(CartoRevision.rev, CartoRevision.kind, CartoRevision.blob_id).filter(
+        CartoRevision.entity_id == entity_id,
+        CartoRevision.rev >= base_rev, CartoRevision.rev <= rev,
+    ).order_by(CartoRevision.rev).all()
+    if not rows or rows[-1][0] != rev or len(rows) != rev - base_rev + 1:
+        return None   # trou dans la chaîne
+    blobs = load_blobs([blob_id for _, _, blob_id in rows])
+    diagram = json.loads(blobs[rows[0][2]])
+    for _, kind, blob_id in rows[1:]:
+        if kind == "full":
+            diagram = json.loads(blobs[blob_id])
+        else:
+            apply_carto_ops(diagram, json.loads(blobs[blob_id]))
+    return diagram
+
+
+# -------------------------------------------------------------------
+# Compaction
+# -------------------------------------------------------------------
+def _stored_bytes():
+    return int(db.session.query(func.coalesce(func.sum(func.length(CartoBlob.data)), 0)).scalar())
+
+
+def gc_blobs(dry_run=False):
+    """Supprime les blobs qui ne sont plus référencés par aucune révision."""
+    orphans = db.session.query(CartoBlob.id, func.length(CartoBlob.data)).outerjoin(
+        CartoRevision, CartoRevision.blob_id == CartoBlob.id
+    ).filter(CartoRevision.id.is_(None)).all()
+    if orphans and not dry_run:
+        db.session.query(CartoBlob).filter(CartoBlob.id.in_([bid for bid, _ in orphans])).delete(
+            synchronize_session=False
+        )
+        db.session.commit()
+    return {"blobs_deleted": len(orphans), "bytes_reclaimed": int(sum(n or 0 for _, n in orphans))}
+
+
+def compact_entity(entity_id, keyframe=CARTO_KEYFRAME, dry_run=False):
+    """
+    Réécrit la chaîne de révisions d'une entité : instantané complet toutes
+    les `keyframe` révisions, deltas minimaux (diff_carto_ops) entre elles.
+    Une révision à la fois en mémoire (précédente + courante).
+    """
+    out = {"rewritten": 0}
+    rows = db.session.query(CartoRevision).filter(
+        CartoRevision.entity_id == entity_id, CartoRevision.rev.isnot(None)
+    ).order_by(CartoRevision.rev).all()
+    prev, prev_rev, last_full = None, None, None
+    for row in rows:
+        payload = load_blobs([row.blob_id])[row.blob_id]
+        if row.kind == "full" or prev is None or row.rev != prev_rev + 1:
+            current = json.loads(payload) if row.kind == "full" else None
+            if current is None:
+                break   # delta orphelin : chaîne inexploitable au-delà
+        else:
+            current = json.loads(json.dumps(prev))
+            apply_carto_ops(current, json.loads(payload))
+
+        contiguous = prev is not None and row.rev == prev_rev + 1
+        if not contiguous or last_full is None or row.rev - last_full >= keyframe:
+            kind, raw = "full", _canonical(current)
+            last_full = row.rev
+        else:
+            kind, raw = "delta", _canonical(diff_carto_ops(prev, current))
+        if kind != row.kind or _sha(raw) != db.session.query(CartoBlob.sha256).filter(
+            CartoBlob.id == row.blob_id
+        ).scalar():
+            out["rewritten"] += 1
+            if not dry_run:
+                row.kind = kind
+                row.blob_id = store_blob(raw)
+        prev, prev_rev = current, row.rev
+    if not dry_run:
+        db.session.commit()
+    return out
+
+
+def compact_carto_history(entity_id=None, keyframe=CARTO_KEYFRAME, dry_run=False):
+    """Compacte toutes les entités (ou une seule) puis supprime les blobs orphelins."""
+    t0 = time.perf_counter()
+    before = _stored_bytes()
+    entity_ids = [entity_id] if entity_id else [
+        eid for (eid,) in db.session.query(CartoRevision.entity_id).filter(
+            CartoRevision.rev.isnot(None)
+        ).distinct()
+    ]
+    rewritten = 0
+    for eid in entity_ids:
+        rewritten += compact_entity(eid, keyframe=keyframe, dry_run=dry_run)["rewritten"]
+    gc = gc_blobs(dry_run=dry_run)
+    metrics = {
+        "dry_run": dry_run,
+        "entities": len(entity_ids),
+        "revisions_rewritten": rewritten,
+        "blobs_deleted": gc["blobs_deleted"],
+        "bytes_before": before,
+        "bytes_after": _stored_bytes() if not dry_run else before - gc["bytes_reclaimed"],
+        "duration_ms": round((time.perf_counter() - t0) * 1000, 1),
+    }
+    print(f"[CARTO_HISTORY] {metrics['entities']} entités, {rewritten} révisions réécrites, "
+          f"{gc['blobs_deleted']} blobs supprimés : {metrics['bytes_before']} → {metrics['bytes_after']} octets")
+    return metrics
+
+
+# -------------------------------------------------------------------
+# Import des anciens fichiers (Code/static/carto_history)
+# -------------------------------------------------------------------
+def import_legacy_files(directory=LEGACY_DIR, remove=False, entity_id=None):
+    """
+    Importe les copies horodatées (AAAAMMJJ_HHMMSS_nom.ext) en blobs
+    dédoublonnés. remove=True supprime les fichiers importés du disque.
+    """
+    out = {"files": 0, "imported": 0, "deduplicated": 0, "bytes_on_disk": 0, "removed": 0}
+    if not os.path.isdir(directory):
+        return out
+    known = {
+        (fname, sha) for fname, sha in db.session.query(CartoRevision.filename, CartoBlob.sha256)
+        .join(CartoBlob, CartoBlob.id == CartoRevision.blob_id).filter(CartoRevision.kind == "file")
+    }
+    read = {}                   # {nom: sha256} des fichiers lus, pour la suppression
+    for name in sorted(os.listdir(directory)):
+        match = _LEGACY_NAME.match(name)
+        path = os.path.join(directory, name)
+        if not match or not os.path.isfile(path):
+            continue
+        with open(path, "rb") as f:
+            raw = f.read()
+        out["files"] += 1
+        out["bytes_on_disk"] += len(raw)
+        sha = read[name] = _sha(raw)
+        if (name, sha) in known:
+            out["deduplicated"] += 1
+        else:
+            existed = db.session.query(CartoBlob.id).filter(CartoBlob.sha256 == sha).scalar() is not None
+            db.session.add(CartoRevision(
+                entity_id=entity_id, rev=None, kind="file", blob_id=store_blob(raw), content_sha=sha,
+                filename=name, created_at=datetime.strptime(match.group(1), "%Y%m%d_%H%M%S"),
+            ))
+            known.add((name, sha))
+            out["imported"] += 1
+            out["deduplicated"] += int(existed)
+    db.session.commit()
+    if remove:
+        for name, sha in read.items():
+            if (name, sha) in known:
+                os.remove(os.path.join(directory, name))
+                out["removed"] += 1
+    print(f"[CARTO_HISTORY] {out['imported']} fichiers importés ({out['bytes_on_disk']} octets sur disque), "
+          f"{out['removed']} supprimés")
+    return out
+
+
+def register_cli(app):
+    """Ajoute `flask carto-history-compact` et `flask carto-history-import`."""
+    import click
+
+    @app.cli.command("carto-history-compact")
+    @click.option("--dry-run", is_flag=True, help="Estimer sans rien modifier.")
+    @click.option("--json", "as_json", is_flag=True, help="Métriques en JSON.")
+    @click.option("--entity", "entity_id", type=int, default=None, help="Une seule entité.")
+    @click.option("--keyframe", type=int, default=CARTO_KEYFRAME, help="Révisions entre deux instantanés.")
+    def carto_history_compact_command(dry_run, as_json, entity_id, keyframe):
+        """Réécrit l'historique des cartographies en instantanés + deltas."""
+        with app.app_context():
+            metrics = compact_carto_history(entity_id, keyframe=keyframe, dry_run=dry_run)
+        if as_json:
+            click.echo(json.dumps(metrics, indent=2))
+
+    @app.cli.command("carto-history-import")
+    @click.option("--remove", is_flag=True, help="Supprimer les fichiers importés.")
+    @click.option("--dir", "directory", default=LEGACY_DIR, help="Répertoire des anciennes copies.")
+    def carto_history_import_command(remove, directory):
+        """Importe les anciennes copies .svg/.vsdx dans l'historique dédoublonné."""
+        with app.app_context():
+            click.echo(json.dumps(import_legacy_files(directory, remove=remove)))
+
+
+if __name__ == "__main__":
+    os.environ.setdefault("SCHEMA_CHECK", "warn")
+    from Code.app import app as _app
+
+    with _app.app_context():
+        _metrics = compact_carto_history(dry_run="--dry-run" in sys.argv[1:])
+    if "--json" in sys.argv[1:]:
+        print(json.dumps(_metrics, indent=2))
@@ -0,0 +1,274 @@
+# Code/db_routing.py
+"""
+Routage lecture/écriture des sessions SQLAlchemy et métriques des pools.
+
+Réplique optionnelle (DATABASE_REPLICA_URL) : les requêtes GET/HEAD des
+blueprints de consultation (DB_REPLICA_BLUEPRINTS, ou vues décorées par
+@use_replica) lisent sur la réplique. Tout le reste va au primaire :
+  - écritures (flush ORM, INSERT/UPDATE/DELETE via session.execute), et
+    toute lecture qui suit une écriture dans la même requête ;
+  - requêtes d'un utilisateur qui vient d'écrire (cookie de session
+    _db_write_at), pendant max(DB_REPLICA_STICKY_SECONDS, retard mesuré) ;
+  - réplique en retard de plus de DB_REPLICA_MAX_LAG_SECONDS, ou injoignable
+    (nouvel essai après REPLICA_RETRY_SECONDS).
+Le retard est mesuré au plus une fois toutes les LAG_CHECK_SECONDS par
+processus (PostgreSQL : pg_last_xact_replay_timestamp()).
+
+Pools : TimedQueuePool mesure l'attente d'une connexion libre ; les
+compteurs (connexions prises, débordement, attente) sont exposés par
+pool_metrics() et GET /admin/profiling/api/pools.
+
+Ce module n'importe pas Code.extensions (qui en importe RoutingSession).
+"""
+import os
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, g, has_request_context, request, session as flask_session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.sql.elements import TextClause
+
+LAG_CHECK_SECONDS = 5
+REPLICA_RETRY_SECONDS = 30
+DEFAULT_READ_BLUEPRINTS = ("export", "roles_view", "time_view", "process_graph", "projection_metier")
+WRITE_AT_KEY = "_db_write_at"
+
+ROUTING_STATS = {"replica": 0, "primary": 0, "sticky": 0, "lagging": 0, "unhealthy": 0, "writes": 0}
+_replica_state = {"checked": 0.0, "lag": 0.0, "healthy": True}
+_state_lock = threading.Lock()
+
+
+# ============================================================
+# Pools instrumentés
+# ============================================================
+class TimedQueuePool(QueuePool):
+    """QueuePool qui mesure le temps d'attente d'une connexion."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_stats = {"checkouts": 0, "wait_ms": 0.0, "max_wait_ms": 0.0, "timeouts": 0}
+
+    def _do_get(self):
+        t0 = time.perf_counter()
+        try:
+            return super()._do_get()
+        except Exception:
+            self.wait_stats["timeouts"] += 1
+            raise
+        finally:
+            waited = (time.perf_counter() - t0) * 1000
+            stats = self.wait_stats
+            stats["checkouts"] += 1
+            stats["wait_ms"] += waited
+            if waited > stats["max_wait_ms"]:
+                stats["max_wait_ms"] = waited
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.wait_stats = self.wait_stats
+        return pool
+
+
+def pool_metrics(engines):
+    """Métriques par moteur : {nom: {...}} (nom None = primaire)."""
+    out = {}
+    for name, engine in engines.items():
+        pool = engine.pool
+        entry = {"pool": type(pool).__name__, "url": engine.url.render_as_string(hide_password=True)}
+        if isinstance(pool, QueuePool):
+            entry.update({
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(),
+                "overflow": max(0, pool.overflow()),
+                "max_overflow": pool._max_overflow,
+            })
+        stats = getattr(pool, "wait_stats", None)
+        if stats:
+            entry.update({
+                "checkouts": stats["checkouts"],
+                "wait_ms_mean": round(stats["wait_ms"] / stats["checkouts"], 3) if stats["checkouts"] else 0.0,
+                "wait_ms_max": round(stats["max_wait_ms"], 3),
+                "timeouts": stats["timeouts"],
+            })
+        out[name or "primary"] = entry
+    return out
+
+
+# ============================================================
+# Réplique : retard et santé
+# ============================================================
+def _measure_lag(engine):
+    with engine.connect() as conn:
+        if engine.dialect.name == "postgresql":
+            lag = conn.execute(text(
+                "SELECT CASE WHEN pg_is_in_recovery() "
+                "THEN EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) ELSE 0 END"
+            )).scalar()
+            return float(lag or 0.0)
+        conn.execute(text("SELECT 1"))
+        return 0.0
+
+
+def replica_lag(engine, now=None):
+    """(sain, retard en secondes), mesuré au plus toutes les LAG_CHECK_SECONDS."""
+    now = now or time.monotonic()
+    state = _replica_state
+    interval = LAG_CHECK_SECONDS if state["healthy"] else REPLICA_RETRY_SECONDS
+    if now - state["checked"] >= interval:
+        with _state_lock:
+            if now - state["checked"] >= interval:
+                try:
+                    state["lag"], state["healthy"] = _measure_lag(engine), True
+                except Exception as exc:
+                    if state["healthy"]:
+                        print(f"[DB] Réplique injoignable, lectures sur le primaire : {exc.__class__.__name__}")
+                    state["healthy"] = False
+                state["checked"] = now
+    return state["healthy"], state["lag"]
+
+
+def reset_routing():
+    for key in ROUTING_STATS:
+        ROUTING_STATS[key] = 0
+    _replica_state.update(checked=0.0, lag=0.0, healthy=True)
+
+
+# ============================================================
+# Décision par requête
+# ============================================================
+def use_replica(view):
+    """Décorateur : vue en lecture seule, éligible à la réplique (GET/HEAD)."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        return view(*args, **kwargs)
+    wrapper._db_read_only = True
+    return wrapper
+
+
+def _routing():
+    return current_app.extensions.get("db_routing")
+
+
+def _eligible(routing):
+    if request.method not in ("GET", "HEAD"):
+        return False
+    if request.blueprint in routing["blueprints"]:
+        return True
+    view = current_app.view_functions.get(request.endpoint)
+    return bool(getattr(view, "_db_read_only", False))
+
+
+def _route_for_request():
+    """'replica' ou 'primary' pour la requête courante (décidé une fois)."""
+    route = g.get("_db_route")
+    if route is not None:
+        return route
+    routing = _routing()
+    route = "primary"
+    if routing and routing.get("replica") is not None and _eligible(routing):
+        healthy, lag = replica_lag(routing["replica"])
+        written = flask_session.get(WRITE_AT_KEY)
+        if not healthy:
+            ROUTING_STATS["unhealthy"] += 1
+        elif lag > routing["max_lag"]:
+            ROUTING_STATS["lagging"] += 1
+        elif written and time.time() - written < max(routing["sticky"], lag):
+            ROUTING_STATS["sticky"] += 1
+        else:
+            route = "replica"
+    ROUTING_STATS[route] += 1
+    g._db_route = route
+    return route
+
+
+def _is_write(clause):
+    if clause is None:
+        return False
+    if getattr(clause, "is_dml", False):
+        return True
+    if isinstance(clause, TextClause):
+        return not clause.text.lstrip().upper().startswith(("SELECT", "WITH", "PRAGMA", "EXPLAIN"))
+    return False
+
+
+class RoutingSession(Session):
+    """Session Flask-SQLAlchemy qui lit sur la réplique quand la requête le permet."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_request_context() and not self._flushing and not self.info.get("wrote"):
+            if _is_write(clause):
+                self.info["wrote"] = True
+            elif _route_for_request() == "replica":
+                return _routing()["replica"]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def _mark_write(session, flush_context):
+    session.info["wrote"] = True
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _remember_write(session):
+    if not session.info.pop("wrote", False) or not has_request_context():
+        return
+    ROUTING_STATS["writes"] += 1
+    g._db_route = "primary"          # relire ses propres écritures
+    routing = _routing()
+    if routing and routing.get("replica") is not None:
+        flask_session[WRITE_AT_KEY] = time.time()
+
+
+@event.listens_for(RoutingSession, "after_rollback")
+def _forget_write(session):
+    session.info.pop("wrote", None)
+
+
+# ============================================================
+# Installation
+# ============================================================
+def engine_options(pool_size, max_overflow, **extra):
+    """Options de moteur communes (pool mesuré)."""
+    return {
+        "poolclass": TimedQueuePool,
+        "pool_pre_ping": True,
+        "pool_recycle": 300,
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        **extra,
+    }
+
+
+def configure_replica(app):
+    """À appeler avant db.init_app : déclare la réplique comme bind « replica »."""
+    url = os.getenv("DATABASE_REPLICA_URL")
+    if not url:
+        return
+    if url.startswith("postgres://"):
+        url = url.replace("postgres://", "postgresql://", 1)
+    binds = dict(app.config.get("SQLALCHEMY_BINDS") or {})
+    binds["replica"] = {
+        "url": url,
+        **engine_options(int(os.getenv("DB_REPLICA_POOL_SIZE", 2)), int(os.getenv("DB_REPLICA_MAX_OVERFLOW", 3))),
+    }
+    app.config["SQLALCHEMY_BINDS"] = binds
+
+
+def init_db_routing(app, db):
+    """Après db.init_app : active le routage si une réplique est configurée."""
+    blueprints = os.getenv("DB_REPLICA_BLUEPRINTS")
+    with app.app_context():
+        replica = db.engines.get("replica")
+    app.extensions["db_routing"] = {
+        "replica": replica,
+        "blueprints": set(b.strip() for b in blueprints.split(",") if b.strip())
+        if blueprints is not None else set(DEFAULT_READ_BLUEPRINTS),
+        "sticky": float(os.getenv("DB_REPLICA_STICKY_SECONDS", 2)),
+        "max_lag": float(os.getenv("DB_REPLICA_MAX_LAG_SECONDS", 5)),
+    }
+    if replica is not None:
+        print(f"[DB] Réplique de lecture active pour {sorted(app.extensions['db_routing']['blueprints'])}")
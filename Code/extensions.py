@@ -4,7 +4,9 @@ from sqlalchemy import event
 from sqlalchemy.engine import Engine
 import sqlite3
 
-db = SQLAlchemy()
+from Code.db_routing import RoutingSession
+
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 
 
 import smtplib
@@ -26,15 +28,14 @@ mail = CustomMail()
 
 @event.listens_for(Engine, "connect")
 def set_sqlite_pragmas(dbapi_connection, connection_record):
-    # S'applique uniquement pour SQLite
+    # S'applique uniquement pour SQLite (profil : voir Code/sqlite_writer.py)
     if isinstance(dbapi_connection, sqlite3.Connection):
+        from Code.sqlite_writer import sqlite_pragmas
+
         cursor = dbapi_connection.cursor()
-        try:
-            cursor.execute("PRAGMA journal_mode=WAL;")
-        except Exception:
-            pass
-        try:
-            cursor.execute("PRAGMA busy_timeout = 5000;")  # 5s
-        except Exception:
-            pass
-        cursor.close()
\ No newline at end of file
+        for pragma in sqlite_pragmas():
+            try:
+                cursor.execute(pragma)
+            except Exception:
+                pass
+        cursor.close()
@@ -0,0 +1,163 @@
+# Code/import_profiler.py
+"""
+Profil du temps d'import de l'application (démarrage à froid d'un worker).
+
+Lance `python -X importtime` dans un processus neuf, puis agrège :
+  - par module importé directement par la cible (temps cumulé),
+  - par paquet racine (somme des temps propres : flask, sqlalchemy, openai...),
+  - par blueprint (modules qui déclarent ses vues).
+
+Usage :
+    python -m Code.import_profiler              # rapport texte
+    python -m Code.import_profiler --top 30
+    python -m Code.import_profiler --json
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Bibliothèques lourdes importées dans les fonctions qui s'en servent, jamais
+# en tête de module : chaque worker démarre sans les charger et seul le
+# premier appel de l'endpoint paie leur import (openai, openpyxl, requests…).
+HEAVY_MODULES = ("openai", "openpyxl", "vsdx", "docx", "requests", "alembic", "flask_migrate")
+
+_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s+)(\S+)")
+
+_CHILD = r"""
+import json, sys
+sys.path.insert(0, {root!r})
+import {target} as _target
+app = getattr(_target, "app", None)
+blueprints = {{}}
+if app is not None:
+    for endpoint, func in app.view_functions.items():
+        bp = endpoint.split(".", 1)[0] if "." in endpoint else "(app)"
+        blueprints.setdefault(bp, set()).add(getattr(func, "__module__", "?"))
+print(json.dumps({{
+    "blueprints": {{k: sorted(v) for k, v in blueprints.items()}},
+    "loaded": [m for m in {heavy!r} if m in sys.modules],
+}}))
+"""
+
+
+def _parse(stderr):
+    """Retourne la liste (module, self_us, cumulative_us, profondeur)."""
+    records = []
+    for line in stderr.splitlines():
+        m = _LINE.match(line)
+        if m:
+            self_us, cum_us, indent, name = m.groups()
+            records.append((name, int(self_us), int(cum_us), (len(indent) - 1) // 2))
+    return records
+
+
+def _run_child(target):
+    env = dict(os.environ, SCHEMA_CHECK="off")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c",
+         _CHILD.format(root=ROOT, target=target, heavy=HEAVY_MODULES)],
+        capture_output=True, text=True, env=env, cwd=ROOT, check=True,
+    )
+    return _parse(proc.stderr), json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def profile_imports(target="Code.app", runs=1):
+    """
+    Importe `target` dans un processus neuf et retourne un dict :
+    total_ms, modules, packages, blueprints, heavy_loaded.
+    Avec runs > 1, garde l'exécution la plus rapide (moins sensible à la charge machine).
+    """
+    best = None
+    for _ in range(max(1, runs)):
+        records, child = _run_child(target)
+        total = next((cum for name, _s, cum, depth in records if name == target and depth == 0), 0)
+        if best is None or total < best[0]:
+            best = (total, records, child)
+    _total, records, child = best
+
+    cumulative = {}
+    packages = defaultdict(int)
+    for name, self_us, cum_us, _depth in records:
+        cumulative.setdefault(name, cum_us)
+        packages[name.split(".", 1)[0]] += self_us
+
+    target_us = cumulative.get(target, 0)
+    # Modules importés directement par la cible : la sortie -X importtime
+    # liste les enfants (profondeur 1) juste avant leur parent (profondeur 0).
+    direct = []
+    for name, _self_us, cum_us, depth in records:
+        if depth == 0:
+            if name == target:
+                break
+            direct = []
+        elif depth == 1:
+            direct.append((name, cum_us))
+
+    # Seuls les modules du projet (hors cible) sont imputés aux blueprints
+    package = target.split(".", 1)[0] + "."
+    blueprints = {}
+    for bp, modules in child["blueprints"].items():
+        modules = [m for m in modules if m.startswith(package) and m != target]
+        if not modules:
+            continue
+        blueprints[bp] = {
+            "modules": modules,
+            "ms": round(sum(cumulative.get(m, 0) for m in modules) / 1000, 1),
+        }
+
+    return {
+        "target": target,
+        "total_ms": round(target_us / 1000, 1),
+        "modules": sorted(((n, round(c / 1000, 1)) for n, c in direct), key=lambda x: -x[1]),
+        "packages": sorted(((n, round(c / 1000, 1)) for n, c in packages.items()), key=lambda x: -x[1]),
+        "blueprints": dict(sorted(blueprints.items(), key=lambda x: -x[1]["ms"])),
+        "heavy_loaded": child["loaded"],
+    }
+
+
+def format_report(profile, top=15):
+    lines = [f"Import de {profile['target']} : {profile['total_ms']:.1f} ms", ""]
+
+    lines.append(f"Modules (cumulé, top {top})")
+    for name, ms in profile["modules"][:top]:
+        lines.append(f"  {ms:8.1f} ms  {name}")
+
+    lines.append("")
+    lines.append(f"Paquets (temps propre, top {top})")
+    for name, ms in profile["packages"][:top]:
+        lines.append(f"  {ms:8.1f} ms  {name}")
+
+    lines.append("")
+    lines.append(f"Blueprints (top {top})")
+    for name, info in list(profile["blueprints"].items())[:top]:
+        lines.append(f"  {info['ms']:8.1f} ms  {name}  ({', '.join(info['modules'])})")
+
+    lines.append("")
+    heavy = ", ".join(profile["heavy_loaded"]) or "aucune"
+    lines.append(f"Bibliothèques lourdes chargées au démarrage : {heavy}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Profil du temps d'import de l'application.")
+    parser.add_argument("--target", default="Code.app")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--runs", type=int, default=1, help="Nombre d'exécutions (garde la plus rapide)")
+    parser.add_argument("--json", action="store_true", help="Sortie JSON brute")
+    args = parser.parse_args(argv)
+
+    profile = profile_imports(args.target, runs=args.runs)
+    if args.json:
+        print(json.dumps(profile, indent=2, ensure_ascii=False))
+    else:
+        print(format_report(profile, args.top))
+
+
+if __name__ == "__main__":
+    main()
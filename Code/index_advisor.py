@@ -0,0 +1,225 @@
+# Code/index_advisor.py
+"""
+Index advisor : rejoue des requêtes SELECT capturées avec EXPLAIN et signale
+les parcours séquentiels (full scan) de tables volumineuses.
+
+- Source des requêtes : échantillons du profilage (Code/routes/profiling.py,
+  un exemplaire par empreinte), exportés par GET /admin/profiling/api/samples
+  ou lus directement en processus par GET /admin/profiling/api/index-advice.
+  Les valeurs liées (e-mails, jetons…) ne quittent pas le processus :
+  l'export les remplace par des NULL, le plan rejoué hors ligne est donc
+  indicatif (sous PostgreSQL, « col = NULL » peut masquer un Seq Scan).
+- SQLite : EXPLAIN QUERY PLAN ; « SCAN <table> » sans index = full scan.
+- PostgreSQL : EXPLAIN (FORMAT JSON) ; nœuds « Seq Scan ».
+- Volume : COUNT(*) par table (SQLite) ou pg_class.reltuples (PostgreSQL) ;
+  seules les tables d'au moins MIN_ROWS lignes sont signalées.
+
+Pour chaque table signalée, les colonnes filtrées dans la requête
+(table.colonne = / IN / < / >) sans index en tête sont proposées.
+
+Usage :
+    flask --app Code.app index-advisor samples.json [--min-rows 1000] [--json]
+    python -m Code.index_advisor samples.json [--json]
+"""
+import json
+import os
+import re
+import sys
+
+from sqlalchemy import inspect, text
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from Code.extensions import db
+
+MIN_ROWS = 1000
+
+_SQLITE_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)(?: AS (\w+))?(.*)$")
+_FILTER = r"\b{table}\.(\w+)\s*(?:=|IN\b|<|>|BETWEEN\b|IS\b)"
+
+
+def _redact_params(parameters):
+    """Même forme (dict ou liste), valeurs remplacées par None."""
+    if isinstance(parameters, dict):
+        return dict.fromkeys(parameters)
+    return [None] * len(parameters or ())
+
+
+def jsonable_sample(sample):
+    """Échantillon sérialisable, paramètres liés masqués (jamais exportés)."""
+    sample = {**sample, "parameters": _redact_params(sample.get("parameters"))}
+    return json.loads(json.dumps(sample, default=str))
+
+
+def _replay_params(parameters):
+    if isinstance(parameters, dict):
+        return parameters
+    return tuple(parameters or ())
+
+
+# ============================================================
+# Plans
+# ============================================================
+def _sqlite_scans(conn, statement, parameters, tables):
+    rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, _replay_params(parameters)).fetchall()
+    scans = []
+    for row in rows:
+        match = _SQLITE_SCAN.match(row[-1])
+        if not match or "USING" in match.group(3):
+            continue   # SEARCH … USING INDEX, ou SCAN … USING (COVERING) INDEX
+        name = match.group(1)
+        # SQLite récent affiche l'alias (tasks_1) : on retrouve la table
+        table = name if name in tables else re.sub(r"_\d+$", "", name)
+        if table in tables:
+            scans.append({"table": table, "alias": name, "detail": row[-1]})
+    return scans
+
+
+def _pg_scans(conn, statement, parameters, tables):
+    plan = conn.exec_driver_sql("EXPLAIN (FORMAT JSON) " + statement, _replay_params(parameters)).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    scans, stack = [], [plan[0]["Plan"]]
+    while stack:
+        node = stack.pop()
+        stack.extend(node.get("Plans", []))
+        if node.get("Node Type") == "Seq Scan" and node.get("Relation Name") in tables:
+            scans.append({
+                "table": node["Relation Name"],
+                "alias": node.get("Alias"),
+                "detail": f"Seq Scan (rows={node.get('Plan Rows')}, filter={node.get('Filter')})",
+            })
+    return scans
+
+
+def _table_rows(conn, dialect, table):
+    if dialect == "postgresql":
+        return int(conn.execute(
+            text("SELECT GREATEST(reltuples, 0)::bigint FROM pg_class WHERE relname = :t"), {"t": table}
+        ).scalar() or 0)
+    return int(conn.execute(text(f'SELECT COUNT(*) FROM "{table}"')).scalar() or 0)
+
+
+def _indexed_leading_columns(inspector, table):
+    """Colonnes en tête d'un index (ou de la clé primaire / d'une contrainte d'unicité)."""
+    leading = set(inspector.get_pk_constraint(table).get("constrained_columns") or [])
+    for ix in inspector.get_indexes(table):
+        if ix.get("column_names"):
+            leading.add(ix["column_names"][0])
+    for uq in inspector.get_unique_constraints(table):
+        if uq.get("column_names"):
+            leading.add(uq["column_names"][0])
+    return leading
+
+
+# ============================================================
+# Rapport
+# ============================================================
+def advise(samples, min_rows=MIN_ROWS, engine=None):
+    """
+    samples : itérable de {"statement", "parameters"[, "endpoint", "count"]}.
+    Retourne {"dialect", "analyzed", "errors", "findings": [...]} ; un
+    constat par (table, requête), les plus fréquents d'abord.
+    """
+    engine = engine or db.engine
+    dialect = engine.dialect.name
+    if dialect not in ("sqlite", "postgresql"):
+        return {"dialect": dialect, "analyzed": 0, "errors": 0, "findings": [],
+                "error": "EXPLAIN non supporté pour ce dialecte"}
+
+    inspector = inspect(engine)
+    tables = set(inspector.get_table_names())
+    scanner = _pg_scans if dialect == "postgresql" else _sqlite_scans
+    sizes, leading, findings = {}, {}, []
+    analyzed = errors = 0
+
+    with engine.connect() as conn:
+        for sample in samples:
+            statement = sample.get("statement") or ""
+            if not statement.lstrip().upper().startswith(("SELECT", "WITH")):
+                continue
+            try:
+                scans = scanner(conn, statement, sample.get("parameters"), tables)
+            except Exception as exc:
+                errors += 1
+                conn.rollback()
+                print(f"[INDEX_ADVISOR] EXPLAIN impossible : {exc.__class__.__name__}: {str(exc)[:120]}")
+                continue
+            analyzed += 1
+            for scan in scans:
+                table = scan["table"]
+                if table not in sizes:
+                    sizes[table] = _table_rows(conn, dialect, table)
+                    leading[table] = _indexed_leading_columns(inspector, table)
+                if sizes[table] < min_rows:
+                    continue
+                filtered = []
+                for alias in {table, scan.get("alias") or table}:
+                    filtered += re.findall(_FILTER.format(table=re.escape(alias)), statement)
+                missing = [c for c in dict.fromkeys(filtered) if c not in leading[table]]
+                findings.append({
+                    "table": table,
+                    "rows": sizes[table],
+                    "endpoint": sample.get("endpoint"),
+                    "count": sample.get("count", 1),
+                    "plan": scan["detail"],
+                    "statement": statement[:500],
+                    "suggested_indexes": [
+                        f"CREATE INDEX ix_{table}_{col} ON {table} ({col})" for col in missing
+                    ],
+                })
+
+    findings.sort(key=lambda f: (-f["count"], -f["rows"]))
+    return {"dialect": dialect, "analyzed": analyzed, "errors": errors, "findings": findings}
+
+
+def print_report(report):
+    print(f"[INDEX_ADVISOR] {report['analyzed']} requêtes analysées ({report['dialect']}), "
+          f"{len(report['findings'])} parcours séquentiels sur grandes tables")
+    for f in report["findings"]:
+        print(f"  - {f['table']} ({f['rows']} lignes) ×{f['count']} [{f['endpoint'] or '?'}] : {f['plan']}")
+        for suggestion in f["suggested_indexes"]:
+            print(f"      → {suggestion}")
+
+
+def load_samples(path):
+    """Fichier JSON exporté par /admin/profiling/api/samples ({"samples": [...]}) ou liste brute."""
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return data.get("samples", []) if isinstance(data, dict) else data
+
+
+def register_cli(app):
+    """Ajoute `flask index-advisor`."""
+    import click
+
+    @app.cli.command("index-advisor")
+    @click.argument("samples_file", type=click.Path(exists=True, dir_okay=False))
+    @click.option("--min-rows", type=int, default=MIN_ROWS, help="Taille minimale des tables signalées.")
+    @click.option("--json", "as_json", is_flag=True, help="Rapport en JSON.")
+    def index_advisor_command(samples_file, min_rows, as_json):
+        """Rejoue les requêtes capturées avec EXPLAIN et signale les full scans."""
+        with app.app_context():
+            report = advise(load_samples(samples_file), min_rows=min_rows)
+        if as_json:
+            click.echo(json.dumps(report, indent=2, ensure_ascii=False))
+        else:
+            print_report(report)
+
+
+if __name__ == "__main__":
+    os.environ.setdefault("SCHEMA_CHECK", "warn")
+    from Code.app import app as _app
+
+    _args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    if not _args:
+        sys.exit("usage : python -m Code.index_advisor samples.json [--json]")
+    with _app.app_context():
+        _report = advise(load_samples(_args[0]))
+    if "--json" in sys.argv[1:]:
+        print(json.dumps(_report, indent=2, ensure_ascii=False))
+    else:
+        print_report(_report)
@@ -0,0 +1,166 @@
+# Code/io_executor.py
+"""
+Appels d'E/S bloquants (API externes, LLM, SMTP) hors du thread de requête.
+
+Un pool de threads par processus (IO_EXECUTOR_WORKERS, 16 par défaut),
+créé à la première soumission, donc après le fork des workers gunicorn.
+Sous gevent (monkey-patching), ces threads sont des greenlets.
+
+    run_io(fn, *args, timeout=…)       attend le résultat au plus `timeout` s
+                                       (IOTimeout au-delà) ;
+    map_io(fn, items, timeout=…)       appels en parallèle, résultats dans
+                                       l'ordre ; `default` pour ceux qui
+                                       n'ont pas fini à temps ;
+    run_background(fn, *args)          sans attendre (envoi d'e-mail…),
+                                       erreurs journalisées.
+
+Le contexte d'application est recréé dans le thread (config, db.session
+propre, retirée à la fin) et les contextvars copiées (identifiant de
+requête des logs) ; le contexte de requête (session, g) ne l'est pas :
+passer les valeurs utiles en arguments.
+
+Un appel qui dépasse son délai n'est pas interrompu : le thread reste
+occupé jusqu'à son retour. Les appels gardent donc leur propre timeout
+réseau (requests timeout=, client OpenAI timeout=) ; le délai d'ici borne
+l'attente de la requête, et la taille du pool le nombre d'appels lents
+simultanés.
+
+Statistiques : io_stats(), exposées par GET /admin/profiling/api/pools.
+"""
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from flask import current_app, has_app_context
+
+IO_DEFAULT_TIMEOUT_S = float(os.getenv("IO_TIMEOUT_S", 30))
+
+_STATS_KEYS = ("submitted", "completed", "errors", "timeouts", "background")
+_stats = dict.fromkeys(_STATS_KEYS, 0)
+_stats_lock = threading.Lock()
+_executor_state = {"executor": None, "pid": None}
+_executor_lock = threading.Lock()
+
+
+class IOTimeout(TimeoutError):
+    """L'appel d'E/S n'a pas répondu dans le délai."""
+
+
+def _bump(key, n=1):
+    with _stats_lock:
+        _stats[key] += n
+
+
+def io_stats(reset=False):
+    with _stats_lock:
+        stats = dict(_stats)
+        if reset:
+            for key in _STATS_KEYS:
+                _stats[key] = 0
+    stats["workers"] = int(os.getenv("IO_EXECUTOR_WORKERS", 16))
+    return stats
+
+
+def _executor():
+    state = _executor_state
+    if state["executor"] is None or state["pid"] != os.getpid():
+        with _executor_lock:
+            if state["executor"] is None or state["pid"] != os.getpid():
+                # Après un fork, les threads du parent n'existent plus
+                state["executor"] = ThreadPoolExecutor(
+                    max_workers=int(os.getenv("IO_EXECUTOR_WORKERS", 16)), thread_name_prefix="io")
+                state["pid"] = os.getpid()
+    return state["executor"]
+
+
+def _in_app_context(app, fn):
+    def call(*args, **kwargs):
+        if app is None:
+            return fn(*args, **kwargs)
+        with app.app_context():
+            return fn(*args, **kwargs)
+    return call
+
+
+def submit_io(fn, *args, **kwargs):
+    """Soumet fn(*args, **kwargs) au pool ; retourne un Future."""
+    app = current_app._get_current_object() if has_app_context() else None
+    _bump("submitted")
+    ctx = contextvars.copy_context()
+    future = _executor().submit(ctx.run, _in_app_context(app, fn), *args, **kwargs)
+
+    def _done(f):
+        if f.cancelled():
+            return
+        _bump("errors" if f.exception() is not None else "completed")
+
+    future.add_done_callback(_done)
+    return future
+
+
+def run_io(fn, *args, timeout=None, **kwargs):
+    """Exécute fn dans le pool et attend au plus `timeout` s (IOTimeout au-delà)."""
+    timeout = IO_DEFAULT_TIMEOUT_S if timeout is None else timeout
+    future = submit_io(fn, *args, **kwargs)
+    done, _ = wait([future], timeout=timeout)
+    if not done:
+        future.cancel()
+        _bump("timeouts")
+        raise IOTimeout(f"{getattr(fn, '__qualname__', fn)} : pas de réponse après {timeout:g} s")
+    return future.result()
+
+
+def map_io(fn, items, timeout=None, default=None, max_parallel=None):
+    """
+    fn(item) pour chaque item, en parallèle (au plus `max_parallel` appels
+    en cours : quotas des API externes). Résultats dans l'ordre des items ;
+    `default` pour un appel en erreur ou non terminé au bout de `timeout` s
+    (délai global).
+    """
+    items = list(items)
+    if not items:
+        return []
+    timeout = IO_DEFAULT_TIMEOUT_S if timeout is None else timeout
+    deadline = time.monotonic() + timeout
+    limit = max_parallel or len(items)
+    futures, pending = [], set()
+    while len(futures) < len(items) or pending:
+        while len(futures) < len(items) and len(pending) < limit:
+            future = submit_io(fn, items[len(futures)])
+            futures.append(future)
+            pending.add(future)
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        _, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+
+    results = []
+    for i in range(len(items)):
+        future = futures[i] if i < len(futures) else None
+        if future is None or not future.done():
+            if future is not None:
+                future.cancel()
+            _bump("timeouts")
+            results.append(default)
+        elif future.cancelled() or future.exception() is not None:
+            results.append(default)
+        else:
+            results.append(future.result())
+    return results
+
+
+def run_background(fn, *args, **kwargs):
+    """Exécute fn sans attendre son résultat ; les erreurs sont journalisées."""
+    name = getattr(fn, "__qualname__", repr(fn))
+
+    def _job(*a, **kw):
+        try:
+            return fn(*a, **kw)
+        except Exception as exc:
+            print(f"[IO] Tâche de fond {name} en échec : {exc.__class__.__name__}: {exc}")
+            raise
+
+    _bump("background")
+    return submit_io(_job, *args, **kwargs)
@@ -0,0 +1,387 @@
+# Code/metrics.py
+"""
+Métriques au format texte Prometheus, calculées dans le processus (aucun
+service externe, aucune dépendance).
+
+Instruments (étiquettes déclarées une fois, un verrou par instrument) :
+    Counter.inc(n, **étiquettes)     Gauge.set(v, **étiquettes)
+    Histogram.observe(v, **étiquettes) / with Histogram.time(**étiquettes)
+
+Séries :
+    optiq_http_request_duration_seconds{blueprint,endpoint,method,status}
+    optiq_db_queries_total{endpoint}, optiq_db_query_seconds_total{endpoint}
+    optiq_db_query_duration_seconds
+    optiq_db_pool_*{engine}, optiq_db_routing_total{decision}   (à la collecte)
+    optiq_io_executor_tasks_total{state}                        (à la collecte)
+    optiq_upstream_request_duration_seconds{service,operation}  (OpenAI, ROME)
+    optiq_upstream_requests_total{service,operation,outcome}
+    optiq_vsdx_parse_seconds{parser}
+    optiq_import_rows_total{kind}, optiq_import_duration_seconds{kind},
+    optiq_import_last_rows_per_second{kind}
+        (débit moyen : rate(optiq_import_rows_total[5m]))
+
+Les compteurs sont propres à chaque worker gunicorn (optiq_process_info
+porte le pid) : rate() absorbe les redémarrages ; pour des totaux exacts,
+interroger chaque worker ou lancer un seul worker par instance.
+
+Activation : METRICS=0 débranche les hooks requête/SQL et l'endpoint
+(/metrics, Code/routes/metrics.py) ; les appels externes et imports restent
+comptés (coût négligeable). METRICS_TOKEN : jeton Bearer exigé par /metrics
+(sans jeton, /metrics n'est servi qu'en boucle locale).
+"""
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, got_request_exception, has_request_context, request, request_finished, request_started
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+UPSTREAM_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_metrics = []
+_collectors = []
+_START_TIME = time.time()
+
+
+# ============================================================
+# Instruments
+# ============================================================
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+        _metrics.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels))
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    def samples(self):
+        """[(suffixe, {étiquette: valeur}, valeur)] pour l'exposition."""
+        with self._lock:
+            items = list(self._values.items())
+        return [("", dict(zip(self.labels, key)), value) for key, value in items]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=HTTP_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+    def value(self, **labels):
+        """{"count", "sum", "buckets"} (cumulés) ou None."""
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            if state is None:
+                return None
+            counts, total, count = list(state[0]), state[1], state[2]
+        return {"count": count, "sum": total, "buckets": _cumulative(self.buckets, counts)}
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(s[0]), s[1], s[2]) for key, s in self._values.items()]
+        out = []
+        for key, counts, total, count in items:
+            labels = dict(zip(self.labels, key))
+            for bound, n in _cumulative(self.buckets, counts):
+                out.append(("_bucket", {**labels, "le": bound}, n))
+            out.append(("_sum", labels, total))
+            out.append(("_count", labels, count))
+        return out
+
+
+def _cumulative(buckets, counts):
+    out, running = [], 0
+    for bound, n in zip(buckets + (float("inf"),), counts):
+        running += n
+        out.append((_format_value(bound), running))
+    return out
+
+
+def register_collector(fn):
+    """fn() -> [(nom, type, aide, [({étiquette: valeur}, valeur)])], appelée à chaque collecte."""
+    _collectors.append(fn)
+    return fn
+
+
+def reset():
+    for metric in _metrics:
+        metric.reset()
+
+
+# ============================================================
+# Exposition (format texte 0.0.4)
+# ============================================================
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _family(lines, name, kind, help_text, samples):
+    lines.append(f"# HELP {name} {_escape(help_text)}")
+    lines.append(f"# TYPE {name} {kind}")
+    for suffix, labels, value in samples:
+        lines.append(f"{name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+
+
+def render():
+    """Toutes les séries au format texte Prometheus."""
+    lines = []
+    for metric in _metrics:
+        _family(lines, metric.name, metric.kind, metric.help, metric.samples())
+    for collector in _collectors:
+        try:
+            families = collector()
+        except Exception as exc:
+            print(f"[METRICS] Collecteur {collector.__name__} en échec : {exc}")
+            continue
+        for name, kind, help_text, rows in families:
+            _family(lines, name, kind, help_text, [("", labels, value) for labels, value in rows])
+    return "\n".join(lines) + "\n"
+
+
+# ============================================================
+# Séries de l'application
+# ============================================================
+HTTP_LATENCY = Histogram(
+    "optiq_http_request_duration_seconds", "Durée des requêtes HTTP",
+    ("blueprint", "endpoint", "method", "status"), HTTP_BUCKETS)
+DB_QUERIES = Counter("optiq_db_queries_total", "Requêtes SQL exécutées", ("endpoint",))
+DB_QUERY_SECONDS = Counter("optiq_db_query_seconds_total", "Temps cumulé des requêtes SQL", ("endpoint",))
+DB_QUERY_DURATION = Histogram("optiq_db_query_duration_seconds", "Durée d'une requête SQL", (), SQL_BUCKETS)
+UPSTREAM_LATENCY = Histogram(
+    "optiq_upstream_request_duration_seconds", "Durée des appels aux API externes",
+    ("service", "operation"), UPSTREAM_BUCKETS)
+UPSTREAM_REQUESTS = Counter(
+    "optiq_upstream_requests_total", "Appels aux API externes par issue (ok, http_4xx, http_5xx, timeout, error)",
+    ("service", "operation", "outcome"))
+VSDX_PARSE = Histogram("optiq_vsdx_parse_seconds", "Durée d'analyse d'un fichier VSDX", ("parser",), HTTP_BUCKETS)
+IMPORT_ROWS = Counter("optiq_import_rows_total", "Lignes d'import traitées", ("kind",))
+IMPORT_DURATION = Histogram("optiq_import_duration_seconds", "Durée d'un import", ("kind",), HTTP_BUCKETS)
+IMPORT_LAST_RATE = Gauge("optiq_import_last_rows_per_second", "Débit du dernier import (lignes/s)", ("kind",))
+
+
+def observe_upstream(service, operation, fn, *args, **kwargs):
+    """
+    Appelle fn(*args, **kwargs) en mesurant durée et issue. Un résultat
+    portant status_code ≥ 400 (réponse requests) compte comme http_4xx/5xx.
+    """
+    t0 = time.perf_counter()
+    outcome = "ok"
+    try:
+        result = fn(*args, **kwargs)
+        status = getattr(result, "status_code", None)
+        if isinstance(status, int) and status >= 400:
+            outcome = f"http_{status // 100}xx"
+        return result
+    except Exception as exc:
+        timeout = isinstance(exc, TimeoutError) or "Timeout" in type(exc).__name__
+        outcome = "timeout" if timeout else "error"
+        raise
+    finally:
+        UPSTREAM_LATENCY.observe(time.perf_counter() - t0, service=service, operation=operation)
+        UPSTREAM_REQUESTS.inc(service=service, operation=operation, outcome=outcome)
+
+
+def record_import(kind, rows, seconds):
+    """Import terminé : `rows` lignes traitées en `seconds` s."""
+    IMPORT_ROWS.inc(rows, kind=kind)
+    IMPORT_DURATION.observe(seconds, kind=kind)
+    if seconds > 0:
+        IMPORT_LAST_RATE.set(rows / seconds, kind=kind)
+
+
+# ============================================================
+# Hooks requête / SQL
+# ============================================================
+def _on_request_started(sender, **extra):
+    if request.blueprint != "metrics":
+        g._metrics_t0 = time.perf_counter()
+
+
+def _observe_request(status):
+    t0 = g.pop("_metrics_t0", None)
+    if t0 is None:
+        return
+    HTTP_LATENCY.observe(
+        time.perf_counter() - t0,
+        blueprint=request.blueprint or "",
+        endpoint=request.endpoint or "<aucun>",
+        method=request.method,
+        status=status,
+    )
+
+
+def _on_request_finished(sender, response, **extra):
+    _observe_request(response.status_code)
+
+
+def _on_request_exception(sender, exception, **extra):
+    # PROPAGATE_EXCEPTIONS : request_finished n'est pas émis
+    _observe_request(500)
+
+
+def _sql_endpoint():
+    if has_request_context():
+        return request.endpoint or "<aucun>"
+    return "<hors requête>"
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("_metrics_t0", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stack = conn.info.get("_metrics_t0")
+    if not stack:
+        return
+    elapsed = time.perf_counter() - stack.pop()
+    endpoint = _sql_endpoint()
+    DB_QUERIES.inc(endpoint=endpoint)
+    DB_QUERY_SECONDS.inc(elapsed, endpoint=endpoint)
+    DB_QUERY_DURATION.observe(elapsed)
+
+
+def _handle_error(context):
+    conn = context.connection
+    if conn is not None and conn.info.get("_metrics_t0"):
+        conn.info["_metrics_t0"].pop()
+
+
+# ============================================================
+# Collecteurs (état lu au moment de la collecte)
+# ============================================================
+def _collect_process():
+    return [
+        ("optiq_process_info", "gauge", "Worker exposant ces séries", [({"pid": os.getpid()}, 1)]),
+        ("optiq_process_start_time_seconds", "gauge", "Démarrage du processus (epoch)", [({}, _START_TIME)]),
+    ]
+
+
+def _collect_pools():
+    from Code.db_routing import ROUTING_STATS, pool_metrics
+    from Code.extensions import db
+
+    gauges = {
+        "size": ("optiq_db_pool_size", "Taille du pool de connexions"),
+        "checked_out": ("optiq_db_pool_checked_out", "Connexions en cours d'utilisation"),
+        "overflow": ("optiq_db_pool_overflow", "Connexions au-delà de la taille du pool"),
+    }
+    counters = {
+        "checkouts": ("optiq_db_pool_checkouts_total", "Emprunts de connexion"),
+        "timeouts": ("optiq_db_pool_timeouts_total", "Attentes de connexion expirées"),
+    }
+    rows = {key: [] for key in (*gauges, *counters)}
+    for engine, entry in pool_metrics(db.engines).items():
+        for key in rows:
+            if key in entry:
+                rows[key].append(({"engine": engine}, entry[key]))
+    families = [(name, "gauge", help_text, rows[key]) for key, (name, help_text) in gauges.items()]
+    families += [(name, "counter", help_text, rows[key]) for key, (name, help_text) in counters.items()]
+    families.append(("optiq_db_routing_total", "counter", "Décisions de routage lecture/écriture",
+                     [({"decision": k}, v) for k, v in ROUTING_STATS.items()]))
+    return families
+
+
+def _collect_io():
+    from Code.io_executor import io_stats
+
+    stats = io_stats()
+    workers = stats.pop("workers")
+    return [
+        ("optiq_io_executor_tasks_total", "counter", "Tâches du pool d'E/S",
+         [({"state": k}, v) for k, v in stats.items()]),
+        ("optiq_io_executor_workers", "gauge", "Threads du pool d'E/S", [({}, workers)]),
+    ]
+
+
+# ============================================================
+# Installation
+# ============================================================
+def init_metrics(app):
+    """Branche les signaux Flask et les événements SQLAlchemy (une fois par processus)."""
+    app.config.setdefault("METRICS", os.getenv("METRICS", "1") != "0")
+    app.config.setdefault("METRICS_TOKEN", os.getenv("METRICS_TOKEN") or None)
+    if not app.config["METRICS"]:
+        return
+    request_started.connect(_on_request_started, app)
+    request_finished.connect(_on_request_finished, app)
+    got_request_exception.connect(_on_request_exception, app)
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(Engine, "handle_error", _handle_error)
+    for collector in (_collect_process, _collect_pools, _collect_io):
+        if collector not in _collectors:
+            register_collector(collector)
@@ -1,9 +1,77 @@
 # Code/models/models.py
+import time
 from datetime import datetime
-from flask import session
+from flask import g, has_request_context, request, session
 from sqlalchemy import or_
 from Code.extensions import db
 
+# -------------------------------------------------------------------
+# Contexte de requête : utilisateur et entité active résolus une fois
+# -------------------------------------------------------------------
+# La propriété (entité active, utilisateur) vérifiée en base est gardée
+# ACTIVE_ENTITY_TTL secondes dans la session (cookie signé) : pendant ce
+# délai, get_active_id() ne fait aucune requête pour les lectures (GET,
+# HEAD, OPTIONS). Les écritures revérifient toujours en base : un
+# utilisateur qui perd une entité (owner_id modifié) ne peut plus y écrire.
+# Au sein d'une requête, les résultats sont mémoïsés sur flask.g.
+ACTIVE_ENTITY_TTL = 300
+_SAFE_METHODS = frozenset(('GET', 'HEAD', 'OPTIONS'))
+_OWNER_CACHE_KEY = '_active_entity_owner'
+
+# Compteurs (processus) : mémo de requête, cache de session, requêtes en base
+REQUEST_CONTEXT_STATS = {'memo_hits': 0, 'session_hits': 0, 'lookups': 0}
+
+
+def request_memo():
+    """Dictionnaire de mémoïsation propre à la requête (flask.g), None hors requête."""
+    if not has_request_context():
+        return None
+    memo = g.get('_request_memo')
+    if memo is None:
+        memo = g._request_memo = {'stats': dict.fromkeys(REQUEST_CONTEXT_STATS, 0)}
+    return memo
+
+
+def _count(name):
+    REQUEST_CONTEXT_STATS[name] += 1
+    memo = request_memo()
+    if memo is not None:
+        memo['stats'][name] += 1
+
+
+def request_context_stats(reset=False):
+    """Compteurs cumulés du processus (et remise à zéro optionnelle)."""
+    stats = dict(REQUEST_CONTEXT_STATS)
+    if reset:
+        for k in REQUEST_CONTEXT_STATS:
+            REQUEST_CONTEXT_STATS[k] = 0
+    return stats
+
+
+def _owner_cached(entity_id, user_id):
+    if request.method not in _SAFE_METHODS:
+        return False
+    cached = session.get(_OWNER_CACHE_KEY)
+    return (
+        isinstance(cached, list) and len(cached) == 3
+        and cached[0] == entity_id and cached[1] == user_id
+        and time.time() - cached[2] < ACTIVE_ENTITY_TTL
+    )
+
+
+def _remember_owner(entity_id, user_id):
+    session['active_entity_id'] = entity_id
+    session[_OWNER_CACHE_KEY] = [entity_id, user_id, int(time.time())]
+
+
+def forget_active_entity():
+    """Invalide le mémo de requête et le cache de propriété en session."""
+    session.pop(_OWNER_CACHE_KEY, None)
+    memo = request_memo()
+    if memo is not None:
+        for key in [k for k in memo if k != 'stats']:
+            del memo[key]
+
 # -------------------------------------------------------------------
 # Tables d'association (déclarées UNE seule fois + extend_existing)
 # -------------------------------------------------------------------
@@ -59,6 +127,8 @@ class Entity(db.Model):
     vsdx_filename = db.Column(db.String(255), nullable=True)
     # Cartographie OptiqCarto sérialisée en JSON (survit aux redémarrages cloud)
     optiqcarto_data = db.Column(db.Text, nullable=True)
+    # Révision de optiqcarto_data (concurrence optimiste des patchs de l'éditeur)
+    optiqcarto_rev = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     # DEPRECATED: is_active n'est plus utilisé, l'entité active est dans la session
     is_active = db.Column(db.Boolean, default=False, nullable=False)
@@ -73,49 +143,101 @@ class Entity(db.Model):
     roles = db.relationship('Role', backref='entity', lazy=True, cascade="all, delete-orphan")
     tools = db.relationship('Tool', backref='entity', lazy=True, cascade="all, delete-orphan")
     links = db.relationship('Link', backref='entity', lazy=True, cascade="all, delete-orphan")
+    carto_revisions = db.relationship('CartoRevision', lazy=True, cascade="all, delete-orphan")
     
     def __repr__(self):
         return f'<Entity {self.id}: {self.name}>'
     
     @classmethod
-    def get_active(cls, user_id=None):
+    def _resolve_active_id(cls, user_id, newest_first=False):
+        """
+        Vérifie en base l'entité active de la session, sinon la première de
+        l'utilisateur (la plus récente si newest_first).
+        """
+        _count('lookups')
+        active_entity_id = session.get('active_entity_id')
+        if active_entity_id:
+            # Vérifier que l'entité appartient à cet utilisateur
+            found = db.session.query(cls.id).filter(
+                cls.id == active_entity_id,
+                cls.owner_id == user_id
+            ).scalar()
+            if found:
+                _remember_owner(found, user_id)
+                return found
+
+        # Fallback: retourner la première (ou la dernière) entité de l'utilisateur
+        order = cls.id.desc() if newest_first else cls.id
+        first_id = db.session.query(cls.id).filter_by(owner_id=user_id).order_by(order).limit(1).scalar()
+        if first_id:
+            _remember_owner(first_id, user_id)
+        return first_id
+
+    @classmethod
+    def get_active_id(cls, user_id=None, newest_first=False):
+        """
+        Retourne l'ID de l'entité active (ou None).
+        Mémoïsé pour la requête ; sans requête SQL pour une lecture tant que
+        la propriété mise en cache en session est récente. Sans entité active valide :
+        la plus ancienne de l'utilisateur, ou la plus récente si newest_first.
+        """
+        if user_id is None:
+            user_id = session.get('user_id')
+
+        if not user_id:
+            return None  # Pas connecté = pas d'entité
+
+        memo = request_memo()
+        key = ('active_entity_id', user_id, session.get('active_entity_id'), newest_first)
+        if memo is not None and key in memo:
+            _count('memo_hits')
+            return memo[key]
+
+        active_entity_id = session.get('active_entity_id')
+        if active_entity_id and _owner_cached(active_entity_id, user_id):
+            _count('session_hits')
+            result = active_entity_id
+        else:
+            result = cls._resolve_active_id(user_id, newest_first)
+
+        if memo is not None:
+            # Clé recalculée : la résolution a pu changer l'entité de la session
+            memo[('active_entity_id', user_id, session.get('active_entity_id'), newest_first)] = result
+            memo[key] = result
+        return result
+
+    @classmethod
+    def get_active(cls, user_id=None, newest_first=False):
         """
         Retourne l'entité active pour l'utilisateur courant.
         L'ID de l'entité active est stocké dans session['active_entity_id'].
         STRICT: Ne retourne que les entités appartenant à l'utilisateur.
+        newest_first : repli sur l'entité la plus récente (voir get_active_id).
         """
         if user_id is None:
             user_id = session.get('user_id')
-        
+
         if not user_id:
             return None  # Pas connecté = pas d'entité
-        
-        active_entity_id = session.get('active_entity_id')
-        
-        if active_entity_id:
-            # Vérifier que l'entité appartient à cet utilisateur
-            entity = cls.query.filter(
-                cls.id == active_entity_id,
-                cls.owner_id == user_id
-            ).first()
-            
-            if entity:
-                return entity
-        
-        # Fallback: retourner la première entité de l'utilisateur
-        first_entity = cls.query.filter_by(owner_id=user_id).first()
-        
-        if first_entity:
-            session['active_entity_id'] = first_entity.id
-            return first_entity
-        
-        return None
-    
-    @classmethod
-    def get_active_id(cls, user_id=None):
-        """Retourne l'ID de l'entité active (ou None)."""
-        entity = cls.get_active(user_id)
-        return entity.id if entity else None
+
+        memo = request_memo()
+        key = ('active_entity', user_id, session.get('active_entity_id'), newest_first)
+        if memo is not None and key in memo:
+            _count('memo_hits')
+            return memo[key]
+
+        entity_id = cls.get_active_id(user_id, newest_first)
+        entity = db.session.get(cls, entity_id) if entity_id else None
+        if entity_id and (entity is None or entity.owner_id != user_id):
+            # Cache de session périmé (entité supprimée ou cédée)
+            forget_active_entity()
+            entity_id = cls._resolve_active_id(user_id, newest_first)
+            entity = db.session.get(cls, entity_id) if entity_id else None
+
+        if memo is not None:
+            memo[('active_entity', user_id, session.get('active_entity_id'), newest_first)] = entity
+            memo[key] = entity
+        return entity
     
     @classmethod
     def set_active(cls, entity_id, user_id=None):
@@ -134,7 +256,8 @@ class Entity(db.Model):
         entity = cls.query.filter_by(id=entity_id, owner_id=user_id).first()
         
         if entity:
-            session['active_entity_id'] = entity.id
+            forget_active_entity()
+            _remember_owner(entity.id, user_id)
             return entity
         
         return None
@@ -155,6 +278,18 @@ class Entity(db.Model):
         return cls.query.filter(cls.id < 0)  # Query vide
         return cls.query.order_by(cls.name)
 
+    @classmethod
+    def owned_id(cls, entity_id, user_id=None):
+        """
+        Retourne entity_id s'il appartient à l'utilisateur (None sinon).
+        STRICT: pour les entity_id passés en paramètre de requête.
+        """
+        if user_id is None:
+            user_id = session.get('user_id')
+        if not user_id or not entity_id:
+            return None
+        return db.session.query(cls.id).filter_by(id=entity_id, owner_id=user_id).scalar()
+
 
 # -------------------------------------------------------------------
 # Modèles principaux
@@ -231,6 +366,10 @@ class Data(db.Model):
         return cls.query.filter(cls.id < 0)
 
 
+# Recherche par nom des imports : lower(name) = ..., insensible à la casse
+db.Index('ix_data_entity_name', Data.entity_id, db.func.lower(Data.name))
+
+
 class Task(db.Model):
     __tablename__ = 'tasks'
 
@@ -238,7 +377,7 @@ class Task(db.Model):
     name = db.Column(db.String(255), nullable=False)
     description = db.Column(db.Text, nullable=True)
     order = db.Column(db.Integer, nullable=True)
-    activity_id = db.Column(db.Integer, db.ForeignKey('activities.id'), nullable=False)
+    activity_id = db.Column(db.Integer, db.ForeignKey('activities.id'), nullable=False, index=True)
 
     # Durée/délai par tâche
     duration_minutes = db.Column(db.Float, default=0)
@@ -278,7 +417,7 @@ class Competency(db.Model):
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     description = db.Column(db.Text, nullable=False)
-    activity_id = db.Column(db.Integer, db.ForeignKey('activities.id'), nullable=False)
+    activity_id = db.Column(db.Integer, db.ForeignKey('activities.id'), nullable=False, index=True)
 
 
 class Softskill(db.Model):
@@ -288,7 +427,7 @@ class Softskill(db.Model):
     habilete = db.Column(db.String(255), nullable=False)
     niveau = db.Column(db.String(10), nullable=False)
     justification = db.Column(db.Text, nullable=True)
-    activity_id = db.Column(db.Integer, db.ForeignKey('activities.id'), nullable=False)
+    activity_id = db.Column(db.Integer, db.ForeignKey('activities.id'), nullable=False, index=True)
 
 
 class Role(db.Model):
@@ -316,10 +455,10 @@ class Link(db.Model):
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     entity_id = db.Column(db.Integer, db.ForeignKey('entities.id'), nullable=True, index=True)
-    source_activity_id = db.Column(db.Integer, db.ForeignKey('activities.id'), nullable=True)
-    source_data_id = db.Column(db.Integer, db.ForeignKey('data.id'), nullable=True)
-    target_activity_id = db.Column(db.Integer, db.ForeignKey('activities.id'), nullable=True)
-    target_data_id = db.Column(db.Integer, db.ForeignKey('data.id'), nullable=True)
+    source_activity_id = db.Column(db.Integer, db.ForeignKey('activities.id'), nullable=True, index=True)
+    source_data_id = db.Column(db.Integer, db.ForeignKey('data.id'), nullable=True, index=True)
+    target_activity_id = db.Column(db.Integer, db.ForeignKey('activities.id'), nullable=True, index=True)
+    target_data_id = db.Column(db.Integer, db.ForeignKey('data.id'), nullable=True, index=True)
     type = db.Column(db.String(50), nullable=False)
     description = db.Column(db.Text, nullable=True)
 
@@ -364,12 +503,35 @@ class PerformancePersonnalisee(db.Model):
     deleted = db.Column(db.Boolean, default=False)
 
 
+# Historique des performances personnalisées (accès SQL brut, voir
+# routes/performance_personnalisee.py). 'contenu' : compat ancien schéma.
+performance_personnalisee_historique = db.Table(
+    'performance_personnalisee_historique',
+    db.Column('id', db.Integer, primary_key=True, autoincrement=True),
+    db.Column('performance_id', db.Integer),
+    db.Column('user_id', db.Integer),
+    db.Column('activity_id', db.Integer),
+    db.Column('content', db.Text),
+    db.Column('contenu', db.Text),
+    db.Column('validation_status', db.Text),
+    db.Column('validation_date', db.Text),
+    db.Column('event', db.Text),
+    db.Column('changed_at', db.Text, server_default=db.text('CURRENT_TIMESTAMP')),
+    # Compaction (Code/retention.py) : content NULL + delta vers la ligne plus récente
+    db.Column('content_delta', db.Text),
+    db.Column('delta_base_id', db.Integer),
+    db.Index('ix_perf_hist_performance_id', 'performance_id', 'id'),
+    db.Index('ix_perf_hist_user_activity', 'user_id', 'activity_id'),
+    extend_existing=True
+)
+
+
 class Constraint(db.Model):
     __tablename__ = 'constraints'
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     description = db.Column(db.Text, nullable=False)
-    activity_id = db.Column(db.Integer, db.ForeignKey('activities.id'), nullable=False)
+    activity_id = db.Column(db.Integer, db.ForeignKey('activities.id'), nullable=False, index=True)
     file_path = db.Column(db.String(512), nullable=True)
 
 
@@ -378,7 +540,7 @@ class Savoir(db.Model):
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     description = db.Column(db.Text, nullable=False)
-    activity_id = db.Column(db.Integer, db.ForeignKey('activities.id'), nullable=False)
+    activity_id = db.Column(db.Integer, db.ForeignKey('activities.id'), nullable=False, index=True)
 
 
 class SavoirFaire(db.Model):
@@ -386,7 +548,7 @@ class SavoirFaire(db.Model):
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     description = db.Column(db.Text, nullable=False)
-    activity_id = db.Column(db.Integer, db.ForeignKey('activities.id'), nullable=False)
+    activity_id = db.Column(db.Integer, db.ForeignKey('activities.id'), nullable=False, index=True)
 
 
 class Aptitude(db.Model):
@@ -394,7 +556,7 @@ class Aptitude(db.Model):
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     description = db.Column(db.Text, nullable=False)
-    activity_id = db.Column(db.Integer, db.ForeignKey('activities.id'), nullable=False)
+    activity_id = db.Column(db.Integer, db.ForeignKey('activities.id'), nullable=False, index=True)
 
 
 class User(db.Model):
@@ -408,11 +570,28 @@ class User(db.Model):
     email = db.Column(db.String(200), nullable=False, unique=True)
     password = db.Column(db.String(200), nullable=False)
     status = db.Column(db.String(20), nullable=False, default='user')
-    manager_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    manager_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True, index=True)
 
     subordinates = db.relationship('User', backref=db.backref('manager', remote_side=[id]))
     evaluations = db.relationship('CompetencyEvaluation', back_populates='user', cascade='all, delete-orphan')
 
+    @classmethod
+    def current(cls):
+        """Utilisateur connecté (ou None), chargé une seule fois par requête."""
+        user_id = session.get('user_id')
+        if not user_id:
+            return None
+        memo = request_memo()
+        key = ('user', user_id)
+        if memo is not None and key in memo:
+            _count('memo_hits')
+            return memo[key]
+        _count('lookups')
+        user = db.session.get(cls, user_id)
+        if memo is not None:
+            memo[key] = user
+        return user
+
     @classmethod
     def for_active_entity(cls):
         active_entity_id = Entity.get_active_id()
@@ -438,7 +617,7 @@ class CompetencyEvaluation(db.Model):
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    activity_id = db.Column(db.Integer, db.ForeignKey('activities.id'), nullable=False)
+    activity_id = db.Column(db.Integer, db.ForeignKey('activities.id'), nullable=False, index=True)
 
     item_id = db.Column(db.Integer, nullable=True)
     item_type = db.Column(db.String(50), nullable=True)
@@ -453,6 +632,11 @@ class CompetencyEvaluation(db.Model):
     )
 
 
+# Facteurs d'annualisation de TimeAnalysis : préfixe de la récurrence → occurrences/an
+# (partagés avec l'agrégation SQL de routes/time_view.py)
+ANNUAL_FACTORS = (("jour", 220), ("hebdo", 42), ("mens", 10.5), ("ann", 1))
+
+
 class TimeAnalysis(db.Model):
     __tablename__ = 'time_analysis'
 
@@ -464,7 +648,7 @@ class TimeAnalysis(db.Model):
 
     type = db.Column(db.String(20), nullable=False)
 
-    activity_id = db.Column(db.Integer, db.ForeignKey('activities.id'), nullable=True)
+    activity_id = db.Column(db.Integer, db.ForeignKey('activities.id'), nullable=True, index=True)
     task_id = db.Column(db.Integer, db.ForeignKey('tasks.id'), nullable=True)
     role_id = db.Column(db.Integer, db.ForeignKey('roles.id'), nullable=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
@@ -481,12 +665,11 @@ class TimeAnalysis(db.Model):
 
     @property
     def recurrence_factor(self):
-        return {
-            "journalier": 220,
-            "hebdo": 42,
-            "mensuel": 10.5,
-            "annuel": 1
-        }.get(self.recurrence, 0)
+        rec = (self.recurrence or "").lower()
+        for prefix, factor in ANNUAL_FACTORS:
+            if rec.startswith(prefix):
+                return factor
+        return 0
 
     @property
     def annual_time(self):
@@ -534,7 +717,7 @@ class TimeProjectLine(db.Model):
     __tablename__ = 'time_project_line'
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     project_id = db.Column(db.Integer, db.ForeignKey('time_project.id', ondelete="CASCADE"), nullable=False)
-    activity_id = db.Column(db.Integer, db.ForeignKey('activities.id'), nullable=False)
+    activity_id = db.Column(db.Integer, db.ForeignKey('activities.id'), nullable=False, index=True)
     duration_minutes = db.Column(db.Float, nullable=False, default=0)
     delay_minutes = db.Column(db.Float, nullable=False, default=0)
     nb_people = db.Column(db.Integer, nullable=False, default=1)
@@ -553,7 +736,7 @@ class TimeRoleLine(db.Model):
     __tablename__ = 'time_role_line'
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     role_analysis_id = db.Column(db.Integer, db.ForeignKey('time_role_analysis.id', ondelete="CASCADE"), nullable=False)
-    activity_id = db.Column(db.Integer, db.ForeignKey('activities.id'), nullable=False)
+    activity_id = db.Column(db.Integer, db.ForeignKey('activities.id'), nullable=False, index=True)
     recurrence = db.Column(db.String(32), nullable=False)
     frequency = db.Column(db.Integer, nullable=False, default=1)
     duration_minutes = db.Column(db.Float, nullable=False, default=0)
@@ -561,10 +744,37 @@ class TimeRoleLine(db.Model):
     nb_people = db.Column(db.Integer, nullable=False, default=1)
 
 
+# Plans de formation et commentaires de prérequis (accès SQL brut, voir
+# routes/competences_plan.py)
+training_plan = db.Table(
+    'training_plan',
+    db.Column('id', db.Integer, primary_key=True, autoincrement=True),
+    db.Column('user_id', db.Integer, nullable=False),
+    db.Column('role_id', db.Integer, nullable=False),
+    db.Column('activity_id', db.Integer, nullable=False),
+    db.Column('plan_type', db.String(100)),
+    db.Column('plan_json', db.Text),
+    db.Column('created_at', db.DateTime, server_default=db.func.current_timestamp()),
+    extend_existing=True
+)
+
+prerequis_comment = db.Table(
+    'prerequis_comment',
+    db.Column('id', db.Integer, primary_key=True, autoincrement=True),
+    db.Column('user_id', db.Integer, nullable=False),
+    db.Column('activity_id', db.Integer, nullable=False),
+    db.Column('item_type', db.String(100)),
+    db.Column('item_id', db.Integer),
+    db.Column('comment', db.Text),
+    db.Column('updated_at', db.Text),
+    extend_existing=True
+)
+
+
 class TimeWeakness(db.Model):
     __tablename__ = 'time_weakness'
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    activity_id = db.Column(db.Integer, db.ForeignKey('activities.id'), nullable=False)
+    activity_id = db.Column(db.Integer, db.ForeignKey('activities.id'), nullable=False, index=True)
     task_id = db.Column(db.Integer, db.ForeignKey('tasks.id'))
     duration_std_minutes = db.Column(db.Float, nullable=False, default=0)
     delay_std_minutes = db.Column(db.Float, nullable=False, default=0)
@@ -605,6 +815,53 @@ class TaskLinkAssignment(db.Model):
     )
 
 
+class CartoBlob(db.Model):
+    """Contenu adressé par son empreinte (sha256 du contenu brut), compressé si utile."""
+    __tablename__ = 'carto_blobs'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    sha256 = db.Column(db.String(64), nullable=False, unique=True)
+    encoding = db.Column(db.String(10), nullable=False, default='zlib')   # zlib | raw
+    size = db.Column(db.Integer, nullable=False)                          # taille brute
+    data = db.Column(db.LargeBinary, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class CartoRevision(db.Model):
+    """
+    Historique versionné des cartographies (voir Code/carto_history.py) :
+    kind = full (diagramme complet), delta (opérations depuis rev - 1) ou
+    file (fichier SVG/VSDX importé, sans numéro de révision).
+    """
+    __tablename__ = 'carto_revisions'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    entity_id = db.Column(db.Integer, db.ForeignKey('entities.id'), nullable=True)
+    rev = db.Column(db.Integer, nullable=True)
+    kind = db.Column(db.String(10), nullable=False)
+    blob_id = db.Column(db.Integer, db.ForeignKey('carto_blobs.id'), nullable=False, index=True)
+    content_sha = db.Column(db.String(64), nullable=True)   # empreinte du diagramme reconstruit
+    filename = db.Column(db.String(255), nullable=True)
+    user_id = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('entity_id', 'rev', name='uq_carto_revision'),
+    )
+
+
+class CacheGeneration(db.Model):
+    """
+    Compteur de génération partagé par les workers, un par cache et par
+    entité : incrémenté dans la transaction qui modifie les données d'un
+    cache (voir workload_rollup).
+    """
+    __tablename__ = 'cache_generations'
+
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+
 class RecentEvent(db.Model):
     """Journal d'activité récente : créations/modifications/suppressions des 4 entités principales."""
     __tablename__ = 'recent_events'
@@ -618,43 +875,197 @@ class RecentEvent(db.Model):
     detail = db.Column(db.Text, nullable=True)   # JSON — avant/après ou données de création
     user_id = db.Column(db.Integer, nullable=True)  # utilisateur à l'origine de l'action
 
+    # Fil paginé par clé (created_at, id) : global et par entité
+    __table_args__ = (
+        db.Index('ix_recent_events_created_id', 'created_at', 'id'),
+        db.Index('ix_recent_events_entity_created_id', 'entity_id', 'created_at', 'id'),
+    )
+
 
 # -------------------------------------------------------------------
 # SQLAlchemy event listeners — journal d'activité automatique
+#
+# Les hooks ne font plus d'INSERT par ligne : les événements sont mis en
+# tampon dans session.info pendant les flushs, puis écrits en un seul
+# INSERT multi-lignes au moment du commit (before_commit). Un rollback
+# vide le tampon.
+#
+# Pour les opérations en masse (imports), audit_bulk() suspend les
+# événements ligne à ligne et, par défaut, les remplace par un unique
+# événement de synthèse (« Import : 2000 tâches créées »).
 # -------------------------------------------------------------------
 import json as _json
+from collections import Counter as _Counter
+from contextlib import contextmanager
 from sqlalchemy import event, inspect as _sa_inspect
 from sqlalchemy import text as _sql_text
+from sqlalchemy.orm import Session as _OrmSession, object_session as _object_session
+
+_AUDIT_KEY = "audit"
+
+_AUDIT_NOUNS = {
+    'activity': ('activité', True),
+    'task': ('tâche', True),
+    'role': ('rôle', False),
+    'tool': ('outil', False),
+}
+_AUDIT_VERBS = {'created': 'créé', 'updated': 'modifié', 'deleted': 'supprimé', 'linked': 'associé'}
+
+
+def _audit_state(session):
+    state = session.info.get(_AUDIT_KEY)
+    if state is None:
+        state = session.info[_AUDIT_KEY] = {"events": [], "mode": None, "counts": None, "entities": None}
+    return state
+
+
+def _audit_mode(target):
+    session = _object_session(target)
+    if session is None:
+        return None
+    state = session.info.get(_AUDIT_KEY)
+    return state["mode"] if state else None
 
 
-def _log_recent(connection, event_type, icon, label, entity_id=None, detail=None):
-    """Insère un événement récent via la connexion active (dans la même transaction)."""
+def _current_user_id():
+    # Utilisateur de la session Flask (disponible dans le contexte de requête)
     try:
-        # Récupérer l'utilisateur depuis la session Flask (disponible dans le contexte de requête)
-        user_id = None
-        try:
-            from flask import session as _fs
-            user_id = _fs.get('user_id')
-        except Exception:
-            pass
-
-        detail_str = _json.dumps(detail, ensure_ascii=False) if detail else None
-        connection.execute(
-            _sql_text(
-                "INSERT INTO recent_events "
-                "(event_type, icon, label, entity_id, created_at, detail, user_id) "
-                "VALUES (:et, :icon, :label, :eid, :ts, :detail, :uid)"
-            ),
-            {"et": event_type, "icon": icon, "label": label,
-             "eid": entity_id, "ts": datetime.utcnow(),
-             "detail": detail_str, "uid": user_id}
-        )
+        from flask import session as _fs
+        return _fs.get('user_id')
+    except Exception:
+        return None
+
+
+def _log_recent(target, event_type, icon, label, entity_id=None, detail=None, activity_id=None):
+    """
+    Ajoute un événement au tampon de la session de `target`.
+    activity_id : pour les tâches, l'entité est résolue en lot au commit.
+    """
+    session = _object_session(target)
+    if session is None:
+        return
+    state = _audit_state(session)
+    if state["mode"] == "suspend":
+        return
+    if state["mode"] == "coalesce":
+        state["counts"][event_type] += 1
+        if entity_id is not None:
+            state["entities"].add(entity_id)
+        return
+    state["events"].append({
+        "event_type": event_type, "icon": icon, "label": label,
+        "entity_id": entity_id, "created_at": datetime.utcnow(),
+        "detail": _json.dumps(detail, ensure_ascii=False) if detail else None,
+        "user_id": _current_user_id(),
+        "_activity_id": activity_id,
+    })
+
+
+def _task_entity_hint(target):
+    """Entité d'une tâche si son activité est déjà chargée, sinon None (résolue au commit)."""
+    activity = target.__dict__.get('activity')
+    return activity.entity_id if activity is not None else None
+
+
+def _resolve_task_entities(connection, rows):
+    pending = {r["_activity_id"] for r in rows if r["entity_id"] is None and r["_activity_id"]}
+    if not pending:
+        return
+    acts = Activities.__table__
+    found = dict(connection.execute(
+        db.select(acts.c.id, acts.c.entity_id).where(acts.c.id.in_(pending))
+    ).all())
+    for r in rows:
+        if r["entity_id"] is None and r["_activity_id"]:
+            r["entity_id"] = found.get(r["_activity_id"])
+
+
+def _write_recent_events(connection, rows):
+    """Un seul INSERT multi-lignes (executemany) pour tout le tampon."""
+    try:
+        _resolve_task_entities(connection, rows)
+        for r in rows:
+            r.pop("_activity_id", None)
+        connection.execute(RecentEvent.__table__.insert(), rows)
     except Exception:
         pass  # Table absente ou colonne manquante — ignoré silencieusement
 
 
+def _bulk_summary_label(label, counts):
+    parts = []
+    for event_type, n in counts.most_common():
+        noun, verb = (event_type.split('_', 1) + [''])[:2]
+        word, feminine = _AUDIT_NOUNS.get(noun, (noun, False))
+        plural = 's' if n > 1 else ''
+        participle = _AUDIT_VERBS.get(verb, verb) + ('e' if feminine else '') + plural
+        parts.append(f"{n} {word}{plural} {participle}")
+    return f"{label} : {', '.join(parts)}" if parts else label
+
+
+@contextmanager
+def audit_bulk(label="Import", icon="fa-solid fa-file-import", coalesce=True, entity_id=None, session=None):
+    """
+    Opération en masse : pas d'événement (ni de capture avant/après) par ligne.
+      coalesce=True  → un événement 'bulk_import' récapitulatif à la sortie
+      coalesce=False → aucun événement
+    Usage :
+        with audit_bulk("Import de tâches", entity_id=eid):
+            ... db.session.add(...) ...
+        db.session.commit()
+    """
+    session = session or db.session()
+    state = _audit_state(session)
+    previous = (state["mode"], state["counts"], state["entities"])
+    state["mode"] = "coalesce" if coalesce else "suspend"
+    state["counts"], state["entities"] = _Counter(), set()
+    try:
+        yield state
+        # Les objets encore en attente doivent passer par les hooks en mode masse
+        session.flush()
+        counts, entities = state["counts"], state["entities"]
+    finally:
+        state["mode"], state["counts"], state["entities"] = previous
+
+    if coalesce and counts:
+        if entity_id is None and len(entities) == 1:
+            entity_id = next(iter(entities))
+        state["events"].append({
+            "event_type": "bulk_import", "icon": icon,
+            "label": _bulk_summary_label(label, counts)[:255],
+            "entity_id": entity_id, "created_at": datetime.utcnow(),
+            "detail": _json.dumps({"counts": dict(counts)}, ensure_ascii=False),
+            "user_id": _current_user_id(),
+            "_activity_id": None,
+        })
+
+
+@event.listens_for(_OrmSession, 'before_commit')
+def _audit_before_commit(session):
+    state = session.info.get(_AUDIT_KEY)
+    if state is None and not (session.new or session.dirty or session.deleted):
+        return
+    # Le flush final du commit a lieu après before_commit : on le déclenche
+    # ici pour que ses hooks alimentent le tampon avant l'écriture.
+    session.flush()
+    state = session.info.get(_AUDIT_KEY)
+    if state and state["events"]:
+        rows, state["events"] = state["events"], []
+        _write_recent_events(session.connection(), rows)
+
+
+@event.listens_for(_OrmSession, 'after_transaction_end')
+def _audit_transaction_end(session, transaction):
+    # Commit (déjà écrit) ou rollback : le tampon de la transaction racine est vidé
+    if transaction.parent is None:
+        state = session.info.get(_AUDIT_KEY)
+        if state:
+            state["events"] = []
+
+
 def _capture_changes(target, fields):
     """Retourne la liste des champs modifiés avec avant/après via l'historique SQLAlchemy."""
+    if _audit_mode(target):
+        return []  # opération en masse : pas de détail par ligne
     try:
         state = _sa_inspect(target)
         changes = []
@@ -674,7 +1085,7 @@ def _capture_changes(target, fields):
 @event.listens_for(Activities, 'after_insert')
 def _on_activity_insert(mapper, connection, target):
     detail = {"name": target.name, "description": target.description or ""}
-    _log_recent(connection, 'activity_created', 'fa-solid fa-diagram-project',
+    _log_recent(target, 'activity_created', 'fa-solid fa-diagram-project',
                 f'Activité créée : {target.name}', target.entity_id, detail=detail)
 
 
@@ -687,7 +1098,7 @@ def _before_activity_update(mapper, connection, target):
 def _on_activity_update(mapper, connection, target):
     changes = getattr(target, '_prev_changes', None) or []
     detail = {"changes": changes} if changes else None
-    _log_recent(connection, 'activity_updated', 'fa-solid fa-pen-to-square',
+    _log_recent(target, 'activity_updated', 'fa-solid fa-pen-to-square',
                 f'Activité modifiée : {target.name}', target.entity_id, detail=detail)
 
 
@@ -695,8 +1106,9 @@ def _on_activity_update(mapper, connection, target):
 @event.listens_for(Task, 'after_insert')
 def _on_task_insert(mapper, connection, target):
     detail = {"name": target.name, "description": target.description or ""}
-    _log_recent(connection, 'task_created', 'fa-solid fa-list-check',
-                f'Tâche créée : {target.name}', detail=detail)
+    _log_recent(target, 'task_created', 'fa-solid fa-list-check',
+                f'Tâche créée : {target.name}', _task_entity_hint(target),
+                detail=detail, activity_id=target.activity_id)
 
 
 @event.listens_for(Task, 'before_update')
@@ -708,15 +1120,16 @@ def _before_task_update(mapper, connection, target):
 def _on_task_update(mapper, connection, target):
     changes = getattr(target, '_prev_changes', None) or []
     detail = {"changes": changes} if changes else None
-    _log_recent(connection, 'task_updated', 'fa-solid fa-pen-to-square',
-                f'Tâche modifiée : {target.name}', detail=detail)
+    _log_recent(target, 'task_updated', 'fa-solid fa-pen-to-square',
+                f'Tâche modifiée : {target.name}', _task_entity_hint(target),
+                detail=detail, activity_id=target.activity_id)
 
 
 # ── Roles ─────────────────────────────────────────────────────────
 @event.listens_for(Role, 'after_insert')
 def _on_role_insert(mapper, connection, target):
     detail = {"name": target.name, "mission": target.onboarding_plan or ""}
-    _log_recent(connection, 'role_created', 'fa-solid fa-user-tie',
+    _log_recent(target, 'role_created', 'fa-solid fa-user-tie',
                 f'Rôle créé : {target.name}', target.entity_id, detail=detail)
 
 
@@ -729,7 +1142,7 @@ def _before_role_update(mapper, connection, target):
 def _on_role_update(mapper, connection, target):
     changes = getattr(target, '_prev_changes', None) or []
     detail = {"changes": changes} if changes else None
-    _log_recent(connection, 'role_updated', 'fa-solid fa-pen-to-square',
+    _log_recent(target, 'role_updated', 'fa-solid fa-pen-to-square',
                 f'Rôle modifié : {target.name}', target.entity_id, detail=detail)
 
 
@@ -737,7 +1150,7 @@ def _on_role_update(mapper, connection, target):
 @event.listens_for(Tool, 'after_insert')
 def _on_tool_insert(mapper, connection, target):
     detail = {"name": target.name, "description": target.description or ""}
-    _log_recent(connection, 'tool_created', 'fa-solid fa-toolbox',
+    _log_recent(target, 'tool_created', 'fa-solid fa-toolbox',
                 f'Outil créé : {target.name}', target.entity_id, detail=detail)
 
 
@@ -750,7 +1163,7 @@ def _before_tool_update(mapper, connection, target):
 def _on_tool_update(mapper, connection, target):
     changes = getattr(target, '_prev_changes', None) or []
     detail = {"changes": changes} if changes else None
-    _log_recent(connection, 'tool_updated', 'fa-solid fa-pen-to-square',
+    _log_recent(target, 'tool_updated', 'fa-solid fa-pen-to-square',
                 f'Outil modifié : {target.name}', target.entity_id, detail=detail)
 
 
@@ -758,26 +1171,33 @@ def _on_tool_update(mapper, connection, target):
 @event.listens_for(Activities, 'after_delete')
 def _on_activity_delete(mapper, connection, target):
     detail = {"name": target.name, "description": target.description or ""}
-    _log_recent(connection, 'activity_deleted', 'fa-solid fa-trash',
+    _log_recent(target, 'activity_deleted', 'fa-solid fa-trash',
                 f'Activité supprimée : {target.name}', target.entity_id, detail=detail)
 
 
 @event.listens_for(Task, 'after_delete')
 def _on_task_delete(mapper, connection, target):
     detail = {"name": target.name}
-    _log_recent(connection, 'task_deleted', 'fa-solid fa-trash',
-                f'Tâche supprimée : {target.name}', detail=detail)
+    _log_recent(target, 'task_deleted', 'fa-solid fa-trash',
+                f'Tâche supprimée : {target.name}', _task_entity_hint(target),
+                detail=detail, activity_id=target.activity_id)
 
 
 @event.listens_for(Role, 'after_delete')
 def _on_role_delete(mapper, connection, target):
     detail = {"name": target.name}
-    _log_recent(connection, 'role_deleted', 'fa-solid fa-trash',
+    _log_recent(target, 'role_deleted', 'fa-solid fa-trash',
                 f'Rôle supprimé : {target.name}', target.entity_id, detail=detail)
 
 
 @event.listens_for(Tool, 'after_delete')
 def _on_tool_delete(mapper, connection, target):
     detail = {"name": target.name, "description": target.description or ""}
-    _log_recent(connection, 'tool_deleted', 'fa-solid fa-trash',
-                f'Outil supprimé : {target.name}', target.entity_id, detail=detail)
\ No newline at end of file
+    _log_recent(target, 'tool_deleted', 'fa-solid fa-trash',
+                f'Outil supprimé : {target.name}', target.entity_id, detail=detail)
+
+@event.listens_for(Entity, 'after_delete')
+def _on_entity_delete(mapper, connection, target):
+    # L'entité active mise en cache ne doit pas survivre à sa suppression
+    if has_request_context() and session.get('active_entity_id') == target.id:
+        forget_active_entity()
@@ -0,0 +1,525 @@
+# Code/retention.py
+"""
+Rétention et compaction des tables d'historique.
+
+- recent_events : purge par âge et par nombre d'événements par entité.
+  Sur PostgreSQL, si la table est partitionnée par mois (voir
+  partition_recent_events), les partitions expirées sont détachées et
+  supprimées en bloc ; sinon (SQLite, ou PG non partitionné) suppression
+  par lots courts pour ne pas verrouiller la base.
+- performance_personnalisee_historique : purge par nombre d'instantanés par
+  performance (et par âge si configuré), puis encodage en deltas des
+  instantanés consécutifs. La ligne la plus récente reste complète, chaque
+  ligne plus ancienne ne stocke que le delta vers la ligne suivante (plus
+  récente) ; une ligne complète est conservée tous les HISTORY_KEYFRAME
+  instantanés pour borner la reconstruction.
+
+Politique (variables d'environnement ou app.config) :
+    RETENTION_EVENTS_MAX_AGE_DAYS       365
+    RETENTION_EVENTS_MAX_PER_ENTITY     10000
+    RETENTION_HISTORY_MAX_AGE_DAYS      0      (0 = pas de limite d'âge)
+    RETENTION_HISTORY_MAX_PER_PERF      500
+    RETENTION_BATCH_SIZE                1000
+
+Usage :
+    python -m Code.retention [--dry-run] [--json]
+    flask --app Code.app retention [--dry-run] [--json]
+    flask --app Code.app retention-partition      (PostgreSQL, ponctuel)
+"""
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import bindparam, text
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from Code.extensions import db
+
+DEFAULT_POLICY = {
+    "RETENTION_EVENTS_MAX_AGE_DAYS": 365,
+    "RETENTION_EVENTS_MAX_PER_ENTITY": 10000,
+    "RETENTION_HISTORY_MAX_AGE_DAYS": 0,
+    "RETENTION_HISTORY_MAX_PER_PERF": 500,
+    "RETENTION_BATCH_SIZE": 1000,
+}
+
+HISTORY_TABLE = "performance_personnalisee_historique"
+HISTORY_KEYFRAME = 20          # une ligne complète tous les N instantanés
+DELTA_MAX_RATIO = 0.8          # delta conservé seulement s'il fait gagner ≥ 20 %
+PARTITION_MONTHS_AHEAD = 2
+
+_EVENT_BYTES = ("LENGTH(COALESCE(label, '')) + LENGTH(COALESCE(detail, '')) "
+                "+ LENGTH(COALESCE(event_type, '')) + LENGTH(COALESCE(icon, ''))")
+
+
+def load_policy(app=None):
+    """Politique effective : app.config > variables d'environnement > défauts."""
+    policy = {}
+    for key, default in DEFAULT_POLICY.items():
+        value = app.config.get(key) if app is not None else None
+        if value is None:
+            value = os.getenv(key, default)
+        policy[key] = int(value)
+    return policy
+
+
+# -------------------------------------------------------------------
+# Codec delta (texte → texte)
+# -------------------------------------------------------------------
+def make_delta(base, target):
+    """
+    Opérations qui transforment `base` en `target`, encodées en JSON :
+      [n]      → copier n caractères de base
+      [-n]     → sauter n caractères de base
+      "texte"  → insérer
+    """
+    from difflib import SequenceMatcher
+
+    ops = []
+    matcher = SequenceMatcher(None, base, target, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            ops.append(i2 - i1)
+        else:
+            if i2 > i1:
+                ops.append(-(i2 - i1))
+            if j2 > j1:
+                ops.append(target[j1:j2])
+    return json.dumps(ops, ensure_ascii=False, separators=(",", ":"))
+
+
+def apply_delta(base, delta):
+    out = []
+    pos = 0
+    for op in json.loads(delta):
+        if isinstance(op, str):
+            out.append(op)
+        elif op >= 0:
+            out.append(base[pos:pos + op])
+            pos += op
+        else:
+            pos -= op
+    return "".join(out)
+
+
+def expand_history(rows):
+    """
+    Reconstruit `content` pour des lignes d'historique (dicts avec id,
+    performance_id, content, content_delta, delta_base_id). L'ordre des
+    lignes retournées est conservé ; les champs internes sont retirés.
+    """
+    by_perf = {}
+    for row in rows:
+        by_perf.setdefault(row["performance_id"], []).append(row)
+
+    for perf_rows in by_perf.values():
+        newer = {}  # id → contenu reconstruit
+        for row in sorted(perf_rows, key=lambda r: r["id"], reverse=True):
+            if row.get("content") is None and row.get("content_delta"):
+                base = newer.get(row.get("delta_base_id"))
+                row["content"] = apply_delta(base, row["content_delta"]) if base is not None else None
+            newer[row["id"]] = row.get("content")
+
+    for row in rows:
+        row.pop("content_delta", None)
+        row.pop("delta_base_id", None)
+        row.pop("id", None)
+    return rows
+
+
+# -------------------------------------------------------------------
+# Suppression par lots
+# -------------------------------------------------------------------
+def _delete_in_batches(table, where, params, batch_size, dry_run, bytes_expr="0"):
+    """
+    Sélectionne jusqu'à batch_size ids (et leur taille), les supprime,
+    commit, recommence : transactions courtes, pas de verrou long.
+    Retourne (lignes, octets) ; en dry_run, simple comptage.
+    """
+    if dry_run:
+        stats = db.session.execute(
+            text(f"SELECT COUNT(*), COALESCE(SUM({bytes_expr}), 0) FROM {table} WHERE {where}"), params
+        ).one()
+        return int(stats[0]), int(stats[1])
+
+    select_sql = text(
+        f"SELECT id, {bytes_expr} FROM {table} WHERE {where} ORDER BY id LIMIT :_batch"
+    )
+    delete_sql = text(f"DELETE FROM {table} WHERE id IN :ids").bindparams(bindparam("ids", expanding=True))
+    rows = size = 0
+    while True:
+        batch = db.session.execute(select_sql, dict(params, _batch=batch_size)).fetchall()
+        if not batch:
+            break
+        rows += len(batch)
+        size += sum(int(b[1] or 0) for b in batch)
+        db.session.execute(delete_sql, {"ids": [b[0] for b in batch]})
+        db.session.commit()
+        if len(batch) < batch_size:
+            break
+    return rows, size
+
+
+# -------------------------------------------------------------------
+# recent_events
+# -------------------------------------------------------------------
+def _is_postgres():
+    return db.engine.dialect.name == "postgresql"
+
+
+def _is_partitioned(table):
+    if not _is_postgres():
+        return False
+    kind = db.session.execute(
+        text("SELECT relkind FROM pg_class WHERE relname = :t AND relkind = 'p'"), {"t": table}
+    ).scalar()
+    return kind == "p"
+
+
+def _month_start(d):
+    return datetime(d.year, d.month, 1)
+
+
+def _next_month(d):
+    return datetime(d.year + (d.month == 12), d.month % 12 + 1, 1)
+
+
+def _partition_name(table, month):
+    return f"{table}_p{month:%Y%m}"
+
+
+def _default_partition(table):
+    return db.session.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :t AND pg_get_expr(c.relpartbound, c.oid) = 'DEFAULT'"
+    ), {"t": table}).scalar()
+
+
+def _create_month_partition(name, month, default):
+    """
+    CREATE TABLE … PARTITION OF échoue si la partition par défaut contient
+    déjà des lignes du mois : elle est alors détachée, ses lignes du mois
+    sont déplacées dans la nouvelle partition, puis elle est rattachée.
+    """
+    bounds = {"lo": month, "hi": _next_month(month)}
+    create = (
+        f"CREATE TABLE {name} PARTITION OF recent_events "
+        f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{_next_month(month):%Y-%m-%d}')"
+    )
+    in_month = "created_at >= :lo AND created_at < :hi"
+    stranded = default and db.session.execute(
+        text(f"SELECT COUNT(*) FROM {default} WHERE {in_month}"), bounds
+    ).scalar()
+    if not stranded:
+        db.session.execute(text(create))
+        return 0
+    db.session.execute(text(f"ALTER TABLE recent_events DETACH PARTITION {default}"))
+    db.session.execute(text(create))
+    db.session.execute(text(f"INSERT INTO recent_events SELECT * FROM {default} WHERE {in_month}"), bounds)
+    db.session.execute(text(f"DELETE FROM {default} WHERE {in_month}"), bounds)
+    db.session.execute(text(f"ALTER TABLE recent_events ATTACH PARTITION {default} DEFAULT"))
+    return stranded
+
+
+def ensure_event_partitions(months_ahead=PARTITION_MONTHS_AHEAD, start=None):
+    """
+    Crée les partitions mensuelles manquantes (PostgreSQL partitionné
+    uniquement), en y déplaçant les lignes déjà tombées dans la partition
+    par défaut. Chaque mois est traité dans un savepoint : un échec est
+    signalé et n'empêche pas les autres mois.
+    """
+    created = []
+    existing = set(db.session.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = 'recent_events'"
+    )).scalars())
+    default = _default_partition("recent_events")
+    month = _month_start(start or datetime.utcnow())
+    for _ in range(months_ahead + 1):
+        name = _partition_name("recent_events", month)
+        if name not in existing:
+            try:
+                with db.session.begin_nested():
+                    moved = _create_month_partition(name, month, default)
+            except Exception as exc:
+                print(f"[RETENTION] Partition {name} non créée : {exc.__class__.__name__}: {str(exc)[:200]}")
+            else:
+                if moved:
+                    print(f"[RETENTION] {moved} lignes déplacées de {default} vers {name}")
+                created.append(name)
+        month = _next_month(month)
+    db.session.commit()
+    return created
+
+
+def _drop_expired_partitions(cutoff, dry_run):
+    """Supprime les partitions mensuelles entièrement antérieures à cutoff."""
+    names = db.session.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = 'recent_events'"
+    )).scalars().all()
+    dropped, rows, size = [], 0, 0
+    for name in sorted(names):
+        suffix = name.rsplit("_p", 1)[-1]
+        if not suffix.isdigit() or len(suffix) != 6:
+            continue  # partition par défaut ou nom inconnu
+        month = datetime(int(suffix[:4]), int(suffix[4:]), 1)
+        if _next_month(month) > cutoff:
+            continue
+        stats = db.session.execute(text(f"SELECT COUNT(*), COALESCE(SUM({_EVENT_BYTES}), 0) FROM {name}")).one()
+        rows += int(stats[0])
+        size += int(stats[1])
+        dropped.append(name)
+        if not dry_run:
+            db.session.execute(text(f"ALTER TABLE recent_events DETACH PARTITION {name}"))
+            db.session.execute(text(f"DROP TABLE {name}"))
+            db.session.commit()
+    return dropped, rows, size
+
+
+def prune_recent_events(policy, dry_run=False, now=None):
+    now = now or datetime.utcnow()
+    batch = policy["RETENTION_BATCH_SIZE"]
+    out = {"deleted_rows": 0, "bytes_reclaimed": 0, "partitions_dropped": [], "strategy": "batch_delete"}
+
+    max_age = policy["RETENTION_EVENTS_MAX_AGE_DAYS"]
+    if max_age > 0:
+        cutoff = now - timedelta(days=max_age)
+        if _is_partitioned("recent_events"):
+            out["strategy"] = "partition_drop"
+            dropped, rows, size = _drop_expired_partitions(cutoff, dry_run)
+            out["partitions_dropped"] = dropped
+            out["deleted_rows"] += rows
+            out["bytes_reclaimed"] += size
+            if not dry_run:
+                ensure_event_partitions()
+        # Reliquat (ou toute la purge hors partitionnement) : suppression par lots
+        rows, size = _delete_in_batches(
+            "recent_events", "created_at < :cutoff", {"cutoff": cutoff}, batch, dry_run, _EVENT_BYTES
+        )
+        out["deleted_rows"] += rows
+        out["bytes_reclaimed"] += size
+
+    max_per_entity = policy["RETENTION_EVENTS_MAX_PER_ENTITY"]
+    if max_per_entity > 0:
+        over = db.session.execute(text(
+            "SELECT entity_id FROM recent_events WHERE entity_id IS NOT NULL "
+            "GROUP BY entity_id HAVING COUNT(*) > :n"
+        ), {"n": max_per_entity}).scalars().all()
+        for entity_id in over:
+            # Première ligne hors quota (index entity_id, created_at, id)
+            boundary = db.session.execute(text(
+                "SELECT created_at, id FROM recent_events WHERE entity_id = :e "
+                "ORDER BY created_at DESC, id DESC LIMIT 1 OFFSET :n"
+            ), {"e": entity_id, "n": max_per_entity}).one()
+            rows, size = _delete_in_batches(
+                "recent_events",
+                "entity_id = :e AND (created_at < :ts OR (created_at = :ts AND id <= :id))",
+                {"e": entity_id, "ts": boundary[0], "id": boundary[1]},
+                batch, dry_run, _EVENT_BYTES,
+            )
+            out["deleted_rows"] += rows
+            out["bytes_reclaimed"] += size
+    return out
+
+
+def partition_recent_events():
+    """
+    Conversion ponctuelle (PostgreSQL) de recent_events en table partitionnée
+    par mois sur created_at. À lancer hors trafic : copie toutes les lignes.
+    """
+    if not _is_postgres():
+        raise RuntimeError("Partitionnement disponible uniquement sur PostgreSQL")
+    if _is_partitioned("recent_events"):
+        return {"converted": False, "reason": "déjà partitionnée"}
+
+    oldest = db.session.execute(text("SELECT MIN(created_at) FROM recent_events")).scalar() or datetime.utcnow()
+    statements = [
+        "ALTER TABLE recent_events RENAME TO recent_events_legacy",
+        "CREATE TABLE recent_events (LIKE recent_events_legacy INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)",
+        # La clé de partition doit faire partie de la clé primaire
+        "ALTER TABLE recent_events ADD PRIMARY KEY (id, created_at)",
+        "CREATE TABLE recent_events_pdefault PARTITION OF recent_events DEFAULT",
+        "CREATE INDEX ix_recent_events_created_id_p ON recent_events (created_at, id)",
+        "CREATE INDEX ix_recent_events_entity_created_id_p ON recent_events (entity_id, created_at, id)",
+    ]
+    for sql in statements:
+        db.session.execute(text(sql))
+
+    months = 0
+    month = _month_start(oldest)
+    while month <= _month_start(datetime.utcnow()):
+        months += 1
+        month = _next_month(month)
+    ensure_event_partitions(months_ahead=months + PARTITION_MONTHS_AHEAD, start=oldest)
+
+    copied = db.session.execute(text("INSERT INTO recent_events SELECT * FROM recent_events_legacy")).rowcount
+    # La séquence de l'id appartient à l'ancienne table : on la rattache avant suppression
+    db.session.execute(text(
+        "ALTER SEQUENCE IF EXISTS recent_events_id_seq OWNED BY recent_events.id"
+    ))
+    db.session.execute(text("DROP TABLE recent_events_legacy"))
+    db.session.commit()
+    return {"converted": True, "rows": copied}
+
+
+# -------------------------------------------------------------------
+# Historique des performances personnalisées
+# -------------------------------------------------------------------
+def prune_history(policy, dry_run=False, now=None):
+    now = now or datetime.utcnow()
+    batch = policy["RETENTION_BATCH_SIZE"]
+    out = {"deleted_rows": 0, "bytes_reclaimed": 0}
+    bytes_expr = "LENGTH(COALESCE(content, '')) + LENGTH(COALESCE(contenu, '')) + LENGTH(COALESCE(content_delta, ''))"
+
+    max_age = policy["RETENTION_HISTORY_MAX_AGE_DAYS"]
+    if max_age > 0:
+        # changed_at est un texte ISO (CURRENT_TIMESTAMP) : comparaison lexicographique
+        cutoff = (now - timedelta(days=max_age)).strftime("%Y-%m-%d %H:%M:%S")
+        rows, size = _delete_in_batches(HISTORY_TABLE, "changed_at < :cutoff", {"cutoff": cutoff},
+                                        batch, dry_run, bytes_expr)
+        out["deleted_rows"] += rows
+        out["bytes_reclaimed"] += size
+
+    max_per_perf = policy["RETENTION_HISTORY_MAX_PER_PERF"]
+    if max_per_perf > 0:
+        over = db.session.execute(text(
+            f"SELECT performance_id FROM {HISTORY_TABLE} "
+            "GROUP BY performance_id HAVING COUNT(*) > :n"
+        ), {"n": max_per_perf}).scalars().all()
+        for perf_id in over:
+            # Les deltas pointent vers des lignes plus récentes : supprimer les
+            # plus anciennes ne casse aucune chaîne.
+            boundary = db.session.execute(text(
+                f"SELECT id FROM {HISTORY_TABLE} WHERE performance_id = :p "
+                "ORDER BY id DESC LIMIT 1 OFFSET :n"
+            ), {"p": perf_id, "n": max_per_perf}).scalar()
+            rows, size = _delete_in_batches(HISTORY_TABLE, "performance_id = :p AND id <= :id",
+                                            {"p": perf_id, "id": boundary}, batch, dry_run, bytes_expr)
+            out["deleted_rows"] += rows
+            out["bytes_reclaimed"] += size
+    return out
+
+
+def compact_history(policy, dry_run=False, keyframe=HISTORY_KEYFRAME):
+    """
+    Remplace les instantanés complets (hors plus récent et lignes clés) par
+    un delta vers l'instantané suivant. Une performance à la fois : la
+    mémoire reste bornée par RETENTION_HISTORY_MAX_PER_PERF lignes.
+    """
+    out = {"compacted_rows": 0, "bytes_before": 0, "bytes_after": 0}
+    update = text(
+        f"UPDATE {HISTORY_TABLE} SET content = NULL, contenu = NULL, "
+        "content_delta = :delta, delta_base_id = :base WHERE id = :id"
+    )
+    select_rows = text(
+        f"SELECT id, COALESCE(content, contenu), content_delta, delta_base_id "
+        f"FROM {HISTORY_TABLE} WHERE performance_id = :p ORDER BY id DESC"
+    )
+    pending = []
+
+    def _flush():
+        if pending and not dry_run:
+            db.session.execute(update, pending)
+            db.session.commit()
+        pending.clear()
+
+    perf_ids = db.session.execute(text(
+        f"SELECT DISTINCT performance_id FROM {HISTORY_TABLE} WHERE performance_id IS NOT NULL"
+    )).scalars().all()
+
+    for perf_id in perf_ids:
+        newer_id, newer_text, depth = None, None, 0
+        for row_id, content, delta, base_id in db.session.execute(select_rows, {"p": perf_id}).fetchall():
+            if content is None and delta is not None:
+                # Déjà compactée : on reconstruit pour servir de base à la suivante
+                content = apply_delta(newer_text, delta) if (newer_text is not None and base_id == newer_id) else None
+                depth += 1
+            elif newer_text is not None and content is not None and depth + 1 < keyframe:
+                encoded = make_delta(newer_text, content)
+                if len(encoded) < len(content) * DELTA_MAX_RATIO:
+                    pending.append({"delta": encoded, "base": newer_id, "id": row_id})
+                    out["compacted_rows"] += 1
+                    out["bytes_before"] += len(content)
+                    out["bytes_after"] += len(encoded)
+                    depth += 1
+                else:
+                    depth = 0
+            else:
+                depth = 0  # ligne complète : nouvelle ligne clé
+            newer_id, newer_text = row_id, content
+        if len(pending) >= policy["RETENTION_BATCH_SIZE"]:
+            _flush()
+    _flush()
+    out["bytes_reclaimed"] = out["bytes_before"] - out["bytes_after"]
+    return out
+
+
+# -------------------------------------------------------------------
+# Job complet
+# -------------------------------------------------------------------
+def run_retention(app, dry_run=False):
+    """Purge + compaction ; retourne les métriques (lignes et octets récupérés)."""
+    policy = load_policy(app)
+    t0 = time.perf_counter()
+    with app.app_context():
+        events = prune_recent_events(policy, dry_run=dry_run)
+        history = prune_history(policy, dry_run=dry_run)
+        compaction = compact_history(policy, dry_run=dry_run)
+        history["compacted_rows"] = compaction["compacted_rows"]
+        history["compaction_bytes_before"] = compaction["bytes_before"]
+        history["compaction_bytes_after"] = compaction["bytes_after"]
+        history["bytes_reclaimed"] += compaction["bytes_reclaimed"]
+        db.session.remove()
+    metrics = {
+        "dry_run": dry_run,
+        "policy": policy,
+        "recent_events": events,
+        "history": history,
+        "duration_ms": round((time.perf_counter() - t0) * 1000, 1),
+    }
+    print(f"[RETENTION] recent_events : {events['deleted_rows']} lignes, {events['bytes_reclaimed']} octets "
+          f"({events['strategy']}) ; historique : {history['deleted_rows']} lignes supprimées, "
+          f"{history['compacted_rows']} compactées en {metrics['duration_ms']} ms")
+    return metrics
+
+
+def register_cli(app):
+    """Ajoute les commandes `flask retention` et `flask retention-partition`."""
+    import click
+
+    @app.cli.command("retention")
+    @click.option("--dry-run", is_flag=True, help="Estimer sans rien supprimer.")
+    @click.option("--json", "as_json", is_flag=True, help="Métriques en JSON.")
+    def retention_command(dry_run, as_json):
+        """Purge et compacte recent_events et l'historique des performances."""
+        metrics = run_retention(app, dry_run=dry_run)
+        if as_json:
+            click.echo(json.dumps(metrics, indent=2, default=str))
+
+    @app.cli.command("retention-partition")
+    def retention_partition_command():
+        """Convertit recent_events en table partitionnée par mois (PostgreSQL)."""
+        with app.app_context():
+            click.echo(json.dumps(partition_recent_events()))
+
+
+if __name__ == "__main__":
+    os.environ.setdefault("SCHEMA_CHECK", "warn")
+    from Code.app import app as _app
+
+    _metrics = run_retention(_app, dry_run="--dry-run" in sys.argv[1:])
+    if "--json" in sys.argv[1:]:
+        print(json.dumps(_metrics, indent=2, default=str))
@@ -1,7 +1,6 @@
 from .activities_bp import activities_bp
 from flask import jsonify
-import os, io, contextlib, traceback
-from Code.scripts.extract_visio import process_visio_file, print_summary
+import os, traceback
 from Code.models.models import Entity
 
 @activities_bp.route('/update-cartography', methods=['GET'])
@@ -44,14 +43,11 @@ def update_cartography():
 
         print(f"📍 Traitement de la cartographie: {vsdx_path}")
 
-        # Traiter le fichier Visio
-        process_visio_file(vsdx_path)
-
-        # Générer le résumé
-        summary_output = io.StringIO()
-        with contextlib.redirect_stdout(summary_output):
-            print_summary()
-        summary_text = summary_output.getvalue()
+        # Traiter le fichier Visio (vsdx importé ici : coûteux au démarrage).
+        # Import sérialisé et résumé construit sans rediriger sys.stdout,
+        # partagé par tous les threads du worker.
+        from Code.scripts.extract_visio import import_visio
+        summary_text = import_visio(vsdx_path)
 
         return jsonify({
             "message": f"Cartographie mise à jour pour l'entité: {active_entity.name}",
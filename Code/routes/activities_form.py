@@ -1,7 +1,8 @@
 from flask import request, jsonify
 from .activities_bp import activities_bp
 from Code.extensions import db
-from Code.models.models import Task
+from Code.routes.tasks import reorder_activity_tasks
+from Code.sqlite_writer import run_write
 import traceback
 
 from .activities_performance import add_performance, update_performance, delete_performance
@@ -32,11 +33,8 @@ def reorder_tasks(activity_id):
     if not new_order:
         return jsonify({"error": "order list is required"}), 400
     try:
-        for idx, t_id in enumerate(new_order):
-            task = Task.query.filter_by(id=t_id, activity_id=activity_id).first()
-            if task:
-                task.order = idx
-        db.session.commit()
+        # Écriture courte et autonome : passe par la file d'écriture SQLite
+        run_write(lambda conn: reorder_activity_tasks(activity_id, new_order, conn=conn))
         return jsonify({"message": "Order updated"}), 200
     except Exception as e:
         db.session.rollback()
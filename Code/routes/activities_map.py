@@ -19,7 +19,8 @@ from flask import (
 )
 
 from Code.extensions import db
-from Code.models.models import Activities, Entity, Link, Data
+from Code.structured_logging import get_logger
+from Code.models.models import Activities, Entity, Link, Data, request_memo
 
 from Code.routes.vsdx_conection_parser import (
     parse_vsdx_connections,
@@ -36,6 +37,8 @@ activities_map_bp = Blueprint(
     url_prefix="/activities"
 )
 
+log = get_logger("carto")
+
 # ============================================================
 # CHEMINS - Calculés une seule fois au chargement
 # ============================================================
@@ -46,7 +49,7 @@ OLD_SVG_PATH = os.path.join(STATIC_DIR, "img", "carto_activities.svg")
 
 # IMPORTANT: Créer le dossier entities au chargement du module
 os.makedirs(ENTITIES_DIR, exist_ok=True)
-print(f"[CARTO] ENTITIES_DIR créé/vérifié: {ENTITIES_DIR}")
+log.debug("ENTITIES_DIR créé/vérifié", path=ENTITIES_DIR)
 
 
 # ============================================================
@@ -71,7 +74,7 @@ def ensure_entity_dir(entity_id):
     """Crée le dossier d'une entité s'il n'existe pas."""
     entity_dir = get_entity_dir(entity_id)
     os.makedirs(entity_dir, exist_ok=True)
-    print(f"[CARTO] Dossier entité créé/vérifié: {entity_dir}")
+    log.debug("Dossier entité créé/vérifié", path=entity_dir)
     return entity_dir
 
 
@@ -81,7 +84,7 @@ def check_svg_exists(entity_id):
 
     # 1. Fichier présent sur disque
     if os.path.exists(svg_path):
-        print(f"[CARTO] SVG trouvé sur disque pour entité {entity_id}: {svg_path}")
+        log.debug("SVG trouvé sur disque", entity_id=entity_id, path=svg_path)
         return True, svg_path
 
     # 2. Scan du dossier entité pour tout fichier .svg (fallback nom différent)
@@ -90,7 +93,7 @@ def check_svg_exists(entity_id):
         svgs = sorted(f for f in os.listdir(entity_dir) if f.endswith('.svg'))
         if svgs:
             found_path = os.path.join(entity_dir, svgs[0])
-            print(f"[CARTO] SVG trouvé (scan) pour entité {entity_id}: {found_path}")
+            log.debug("SVG trouvé (scan)", entity_id=entity_id, path=found_path)
             return True, found_path
 
     # 3. Fallback DB : contenu SVG stocké en base (filesystem éphémère sur cloud)
@@ -100,12 +103,12 @@ def check_svg_exists(entity_id):
             ensure_entity_dir(entity_id)
             with open(svg_path, 'w', encoding='utf-8') as f:
                 f.write(entity.svg_content)
-            print(f"[CARTO] SVG restauré depuis DB pour entité {entity_id}")
+            log.info("SVG restauré depuis la base", entity_id=entity_id)
             return True, svg_path
         except Exception as e:
-            print(f"[CARTO] Erreur restauration SVG depuis DB: {e}")
+            log.warning("Erreur de restauration du SVG depuis la base : %s", e, entity_id=entity_id)
 
-    print(f"[CARTO] Aucun SVG trouvé pour entité {entity_id}")
+    log.debug("Aucun SVG trouvé", entity_id=entity_id)
     return False, None
 
 
@@ -127,13 +130,25 @@ def get_active_entity():
     Récupère l'entité active.
     Priorité : session → is_active en DB → première entité de l'utilisateur.
     Synchronise toujours la session avec ce qui est trouvé.
+    Résolue une seule fois par requête (mémo sur flask.g).
     """
     user_id = session.get('user_id')
     entity_id = session.get('active_entity_id')
 
+    memo = request_memo()
+    key = ('map_entity', user_id, entity_id)
+    if memo is not None and key in memo:
+        return memo[key]
+    entity = _resolve_active_entity(user_id, entity_id)
+    if memo is not None:
+        memo[key] = entity
+    return entity
+
+
+def _resolve_active_entity(user_id, entity_id):
     # 1. Session valide → récupérer sans filtre strict owner_id
     if entity_id:
-        entity = Entity.query.get(entity_id)
+        entity = db.session.get(Entity, entity_id)
         if entity:
             # Vérification souple : valide si owner_id est None ou correspond à user
             if not user_id or entity.owner_id is None or entity.owner_id == user_id:
@@ -210,8 +225,8 @@ def activities_map_page():
         if vsdx_exists:
             current_vsdx = active_entity.vsdx_filename or "connections.vsdx"
         
-        # Log pour debug
-        print(f"[CARTO] Entité {active_entity.id}: SVG={svg_exists} ({svg_path}), VSDX={vsdx_exists}")
+        log.debug("Fichiers de cartographie", entity_id=active_entity.id, svg=svg_exists,
+                  svg_path=svg_path, vsdx=vsdx_exists)
         
         activities = Activities.query.filter_by(
             entity_id=active_entity.id
@@ -289,13 +304,13 @@ def serve_svg():
         # Dernier recours : servir directement depuis DB sans passer par le disque
         if active_entity.svg_content:
             from flask import Response
-            print(f"[CARTO] Serving SVG depuis DB (direct) pour entité {active_entity.id}")
+            log.debug("SVG servi depuis la base", entity_id=active_entity.id)
             return Response(active_entity.svg_content, mimetype='image/svg+xml',
                             headers={"Cache-Control": "no-store"})
-        print(f"[CARTO] SVG non trouvé pour l'entité {active_entity.id}")
+        log.info("SVG non trouvé", entity_id=active_entity.id)
         return jsonify({"error": "SVG non trouvé pour cette entité"}), 404
 
-    print(f"[CARTO] Serving SVG pour entité {active_entity.id}: {svg_path}")
+    log.debug("SVG servi", entity_id=active_entity.id, path=svg_path)
     return send_file(svg_path, mimetype='image/svg+xml', max_age=0)
 
 
@@ -398,7 +413,7 @@ def create_entity():
     
     # Créer le dossier immédiatement
     entity_dir = ensure_entity_dir(entity.id)
-    print(f"[CARTO] Nouvelle entité créée: {entity.id} -> {entity_dir}")
+    log.info("Nouvelle entité créée", entity_id=entity.id, path=entity_dir)
     
     return jsonify({
         "status": "ok",
@@ -437,7 +452,7 @@ def activate_entity(entity_id):
 
     # Mettre aussi à jour la session (double garantie)
     session['active_entity_id'] = entity.id
-    print(f"[CARTO] Entité activée: {entity.id} ({entity.name})")
+    log.info("Entité activée", entity_id=entity.id, name=entity.name)
 
     return jsonify({
         "status": "ok",
@@ -463,7 +478,7 @@ def delete_entity(entity_id):
     entity_dir = get_entity_dir(entity_id)
     if os.path.exists(entity_dir):
         shutil.rmtree(entity_dir)
-        print(f"[CARTO] Dossier supprimé: {entity_dir}")
+        log.info("Dossier supprimé", path=entity_dir)
     
     try:
         db.session.delete(entity)
@@ -552,10 +567,10 @@ def extract_activities_from_svg(svg_path):
                 seen_names.add(text_content.lower())
                 activities.append({"shape_id": mid, "name": text_content})
         
-        print(f"[CARTO] Activités extraites du SVG: {len(activities)}")
+        log.debug("Activités extraites du SVG", count=len(activities))
         
     except Exception as e:
-        print(f"[CARTO] Erreur extraction SVG: {e}")
+        log.warning("Erreur d'extraction du SVG : %s", e, path=svg_path)
     
     return activities
 
@@ -598,7 +613,7 @@ def sync_activities_with_svg(entity_id, svg_path):
         if existing_by_name:
             existing_by_name.shape_id = shape_id
             stats["unchanged"] += 1
-            print(f"[CARTO] Activité existante reliée au SVG : '{name}' (shape_id={shape_id})")
+            log.debug("Activité existante reliée au SVG", name=name, shape_id=shape_id)
         else:
             new_act = Activities(
                 entity_id=entity_id,
@@ -633,7 +648,7 @@ def sync_activities_with_svg(entity_id, svg_path):
         stats["deleted"] += 1
     
     db.session.commit()
-    print(f"[CARTO] Sync: +{stats['added']} ~{stats['renamed']} -{stats['deleted']}")
+    log.info("Synchronisation SVG", entity_id=entity_id, **stats)
     
     return stats
 
@@ -680,8 +695,8 @@ def upload_cartography():
     
     try:
         entity_dir = ensure_entity_dir(entity_id)
-        print(f"[CARTO] Upload pour entité {entity_id} dans {entity_dir}")
-        print(f"[CARTO] Mode: {mode}, keep_svg: {keep_svg}, keep_vsdx: {keep_vsdx}")
+        log.debug("Upload de cartographie", entity_id=entity_id, path=entity_dir, mode=mode,
+                  keep_svg=keep_svg, keep_vsdx=keep_vsdx)
         
         # Chemins des fichiers
         svg_path = get_entity_svg_path(entity_id)
@@ -694,7 +709,7 @@ def upload_cartography():
                 return jsonify({"error": "Format SVG requis"}), 400
 
             svg_file.save(svg_path)
-            print(f"[CARTO] SVG sauvegardé: {svg_path} ({os.path.exists(svg_path)})")
+            log.debug("SVG sauvegardé", path=svg_path)
 
             # IMPORTANT: Sauvegarder le nom original ET le contenu en base
             # Le contenu en DB permet de restaurer le fichier si le filesystem éphémère est vidé
@@ -702,9 +717,9 @@ def upload_cartography():
             try:
                 with open(svg_path, 'r', encoding='utf-8') as f:
                     entity.svg_content = f.read()
-                print(f"[CARTO] Contenu SVG sauvegardé en DB pour entité {entity_id}")
+                log.debug("Contenu SVG sauvegardé en base", entity_id=entity_id)
             except Exception as e:
-                print(f"[CARTO] Avertissement: impossible de lire SVG pour stockage DB: {e}")
+                log.warning("Impossible de lire le SVG pour stockage en base : %s", e, entity_id=entity_id)
             db.session.commit()
             
             sync_stats = sync_activities_with_svg(entity_id, svg_path)
@@ -715,11 +730,11 @@ def upload_cartography():
         elif keep_svg:
             # Garder le SVG existant - vérifier qu'il existe
             if os.path.exists(svg_path):
-                print(f"[CARTO] SVG conservé: {svg_path}")
+                log.debug("SVG conservé", path=svg_path)
                 stats["svg_kept"] = True
                 stats["activities"] = Activities.query.filter_by(entity_id=entity_id).count()
             else:
-                print(f"[CARTO] ATTENTION: keep_svg=true mais fichier inexistant: {svg_path}")
+                log.warning("keep_svg=true mais fichier inexistant", path=svg_path)
                 
         elif mode == "new":
             # Mode création sans SVG et sans keep_svg -> erreur
@@ -736,7 +751,7 @@ def upload_cartography():
                 return jsonify({"error": "Format VSDX requis"}), 400
             
             vsdx_file.save(vsdx_path)
-            print(f"[CARTO] VSDX sauvegardé: {vsdx_path} ({os.path.exists(vsdx_path)})")
+            log.debug("VSDX sauvegardé", path=vsdx_path)
 
             # IMPORTANT: Sauvegarder le nom original en base
             entity.vsdx_filename = vsdx_file.filename
@@ -804,15 +819,15 @@ def upload_cartography():
                 stats["invalid_connections"] = len(invalid)
                 stats["missing_activities"] = missing
                 
-                print(f"[CARTO] Connexions importées: {imported}, invalides: {len(invalid)}")
+                log.info("Connexions importées", entity_id=entity_id, imported=imported, invalid=len(invalid))
         
         elif keep_vsdx:
             # Garder le VSDX existant - vérifier qu'il existe
             if os.path.exists(vsdx_path):
-                print(f"[CARTO] VSDX conservé: {vsdx_path}")
+                log.debug("VSDX conservé", path=vsdx_path)
                 stats["vsdx_kept"] = True
             else:
-                print(f"[CARTO] ATTENTION: keep_vsdx=true mais fichier inexistant: {vsdx_path}")
+                log.warning("keep_vsdx=true mais fichier inexistant", path=vsdx_path)
         
         # Comptage final des connexions
         if not stats["connections"]:
@@ -826,9 +841,7 @@ def upload_cartography():
         
     except Exception as e:
         db.session.rollback()
-        print(f"[CARTO] Erreur upload: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("Erreur d'upload : %s", e, entity_id=entity_id)
         return jsonify({"error": str(e)}), 500
 
 
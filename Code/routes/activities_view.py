@@ -15,12 +15,6 @@ from Code.models.models import Activities, Task, Link, Data, Performance, Role,
 
 @activities_bp.route('/view', methods=['GET'])
 def view_activities():
-    # Crée la table task_link_assignments si elle n'existe pas
-    try:
-        from Code.routes.task_link_assignments import ensure_table as _ensure_tla
-        _ensure_tla()
-    except Exception:
-        pass
     """
     Affiche la liste des activités de l'ENTITÉ ACTIVE.
     
@@ -112,7 +106,6 @@ def view_activities():
             }
 
         # Charger les task-link assignments pour cette activité
-        # (ensure_table appelé une seule fois via le blueprint au premier hit)
         task_conn_map = {}
         try:
             rows = db.session.execute(text("""
@@ -18,7 +18,9 @@ from flask import (
     session,
     url_for,
 )
+from sqlalchemy.exc import IntegrityError
 
+from Code.carto_history import PatchError, apply_carto_ops, diagram_at, item_key, record_revision, revision_list
 from Code.extensions import db
 from Code.models.models import Activities, Entity, Link, Role, activity_roles
 
@@ -36,15 +38,8 @@ def _require_auth():
 
 
 def _get_active_entity():
-    user_id = session.get("user_id")
-    entity_id = session.get("active_entity_id")
-    if not user_id:
-        return None
-    if entity_id:
-        e = Entity.query.filter_by(id=entity_id, owner_id=user_id).first()
-        if e:
-            return e
-    return Entity.query.filter_by(owner_id=user_id).order_by(Entity.id.desc()).first()
+    # Sans entité active valide, l'éditeur ouvre la plus récente de l'utilisateur
+    return Entity.get_active(newest_first=True)
 
 
 def _has_carto(entity) -> bool:
@@ -267,10 +262,277 @@ def _do_sync(entity, diagram):
     db.session.commit()
 
 
+# ─────────────────────────────────────────────
+# SAUVEGARDE PAR PATCH (delta + révision)
+# ─────────────────────────────────────────────
+#
+# Corps : {"base_rev": 12, "ops": [...]} ; format des opérations : voir
+# Code/carto_history.py (apply_carto_ops). Seuls les éléments touchés sont
+# répercutés en base (activités, rôles, activity_roles, liens) ; le résultat
+# est celui qu'aurait produit _do_sync. Chaque révision est historisée.
+
+
+def _by_id(items):
+    return {item_key(it.get('id')): it for it in items or []}
+
+
+def _is_activity(shape):
+    return bool(shape) and shape.get('type') in _ACTIVITY_TYPES
+
+
+def _band_id_of(shape, bands):
+    band = _get_band_for_y(bands, shape.get('y', 0) + shape.get('h', 0) / 2)
+    return item_key(band['id']) if band else None
+
+
+def _link_key(conn, act_ids):
+    """(source, cible, libellé) du lien activité → activité, ou None."""
+    if not conn:
+        return None
+    src = act_ids.get(item_key(conn.get('fromId', '')))
+    tgt = act_ids.get(item_key(conn.get('toId', '')))
+    if not src or not tgt:
+        return None
+    return (src, tgt, (conn.get('label') or '').strip() or None)
+
+
+def _sync_patch_to_db(entity, old, new, touched):
+    """Répercute en base uniquement les éléments touchés par le patch."""
+    old_shapes, new_shapes = _by_id(old.get('shapes')), _by_id(new.get('shapes'))
+    old_bands_list, new_bands_list = old.get('bands') or [], new.get('bands') or []
+    old_bands, new_bands = _by_id(old_bands_list), _by_id(new_bands_list)
+    old_conns, new_conns = _by_id(old.get('connections')), _by_id(new.get('connections'))
+
+    shape_ids = touched['shapes'] - {'*'}
+    conn_ids = touched['connections'] - {'*'}
+    band_ids = touched['bands'] - {'*'}
+
+    # ── Activités ─────────────────────────────────────────────────────────────
+    act_rows = {a.shape_id: a for a in Activities.query.filter(
+        Activities.entity_id == entity.id, Activities.shape_id.in_(list(shape_ids))
+    )} if shape_ids else {}
+    removed_acts = []
+    for sid in shape_ids:
+        was, now = old_shapes.get(sid), new_shapes.get(sid)
+        if _is_activity(was) != _is_activity(now):
+            # Une forme qui devient (ou cesse d'être) une activité change ses liens
+            conn_ids |= {
+                cid for cid, c in list(old_conns.items()) + list(new_conns.items())
+                if sid in (item_key(c.get('fromId', '')), item_key(c.get('toId', '')))
+            }
+        act = act_rows.get(sid)
+        if _is_activity(now):
+            label = (now.get('label') or '').strip() or f"Activité {sid}"
+            is_result = now.get('type') == 'special'
+            if act is None:
+                act = Activities(entity_id=entity.id, shape_id=sid, name=label, is_result=is_result)
+                db.session.add(act)
+                act_rows[sid] = act
+            else:
+                if act.name != label:
+                    act.name = label
+                if act.is_result != is_result:
+                    act.is_result = is_result
+        elif act is not None:
+            removed_acts.append(act)
+            del act_rows[sid]
+
+    if removed_acts:
+        gone = [a.id for a in removed_acts]
+        Link.query.filter(
+            Link.entity_id == entity.id,
+            db.or_(Link.source_activity_id.in_(gone), Link.target_activity_id.in_(gone)),
+        ).delete(synchronize_session=False)
+        for act in removed_acts:
+            db.session.delete(act)
+    db.session.flush()
+
+    # ── Rôles (bandes) ────────────────────────────────────────────────────────
+    new_names = {(b.get('label') or '').strip() for b in new_bands_list}
+    renamed = set()
+    for bid in band_ids:
+        old_label = ((old_bands.get(bid) or {}).get('label') or '').strip()
+        new_label = ((new_bands.get(bid) or {}).get('label') or '').strip()
+        if old_label != new_label:
+            renamed.add(bid)
+    wanted = {((new_bands.get(bid) or {}).get('label') or '').strip() for bid in band_ids} - {''}
+    dropped = {((old_bands.get(bid) or {}).get('label') or '').strip() for bid in band_ids} - new_names
+    roles = {r.name: r for r in Role.query.filter(
+        Role.entity_id == entity.id, Role.name.in_(list(wanted | dropped))
+    )} if wanted | dropped else {}
+    for name in dropped:
+        if name in roles:
+            db.session.delete(roles.pop(name))
+    for name in wanted:
+        if name not in roles:
+            roles[name] = Role(entity_id=entity.id, name=name)
+            db.session.add(roles[name])
+    db.session.flush()
+
+    # ── Activité → rôle (garant) : formes dont la bande a pu changer ──────────
+    geometry_changed = (
+        [(item_key(b.get('id')), b.get('height', 180)) for b in old_bands_list]
+        != [(item_key(b.get('id')), b.get('height', 180)) for b in new_bands_list]
+    )
+    dirty = {sid for sid in shape_ids if _is_activity(new_shapes.get(sid))}
+    if geometry_changed or renamed:
+        for sid, shape in new_shapes.items():
+            if not _is_activity(shape) or sid in dirty:
+                continue
+            before = _band_id_of(old_shapes.get(sid) or shape, old_bands_list)
+            after = _band_id_of(shape, new_bands_list)
+            if before != after or after in renamed:
+                dirty.add(sid)
+    if dirty:
+        missing = [sid for sid in dirty if sid not in act_rows]
+        if missing:
+            act_rows.update({a.shape_id: a for a in Activities.query.filter(
+                Activities.entity_id == entity.id, Activities.shape_id.in_(missing)
+            )})
+        names_needed = set()
+        assignments = []
+        for sid in dirty:
+            act = act_rows.get(sid)
+            if act is None:
+                continue
+            band_id = _band_id_of(new_shapes[sid], new_bands_list)
+            name = ((new_bands.get(band_id) or {}).get('label') or '').strip() if band_id else ''
+            assignments.append((act.id, name))
+            if name and name not in roles:
+                names_needed.add(name)
+        if names_needed:
+            roles.update({r.name: r for r in Role.query.filter(
+                Role.entity_id == entity.id, Role.name.in_(list(names_needed))
+            )})
+        db.session.execute(activity_roles.delete().where(
+            activity_roles.c.activity_id.in_([aid for aid, _ in assignments])
+        ))
+        rows = [{"activity_id": aid, "role_id": roles[name].id, "status": 'garant'}
+                for aid, name in assignments if name in roles]
+        if rows:
+            db.session.execute(activity_roles.insert(), rows)
+
+    # ── Liens (connexions activité → activité) ────────────────────────────────
+    if conn_ids:
+        endpoint_sids = set()
+        for cid in conn_ids:
+            for c in (old_conns.get(cid), new_conns.get(cid)):
+                if c:
+                    endpoint_sids.add(item_key(c.get('fromId', '')))
+                    endpoint_sids.add(item_key(c.get('toId', '')))
+        known = {sid: a.id for sid, a in act_rows.items()}
+        lookup = [sid for sid in endpoint_sids if sid not in known]
+        if lookup:
+            known.update(dict(db.session.query(Activities.shape_id, Activities.id).filter(
+                Activities.entity_id == entity.id, Activities.shape_id.in_(lookup)
+            )))
+        old_acts = {sid: aid for sid, aid in known.items() if _is_activity(old_shapes.get(sid))}
+        new_acts = {sid: aid for sid, aid in known.items() if _is_activity(new_shapes.get(sid))}
+        gone = {a.id for a in removed_acts}
+        for cid in conn_ids:
+            before = _link_key(old_conns.get(cid), old_acts)
+            after = _link_key(new_conns.get(cid), new_acts)
+            if before == after:
+                continue
+            if before and not (gone & {before[0], before[1]}):
+                link_id = db.session.query(Link.id).filter(
+                    Link.entity_id == entity.id,
+                    Link.source_activity_id == before[0],
+                    Link.target_activity_id == before[1],
+                    Link.description.is_(None) if before[2] is None else Link.description == before[2],
+                ).limit(1).scalar()
+                if link_id:
+                    Link.query.filter(Link.id == link_id).delete(synchronize_session=False)
+            if after:
+                db.session.add(Link(entity_id=entity.id, source_activity_id=after[0],
+                                    target_activity_id=after[1], type='flux', description=after[2]))
+
+
+def apply_carto_patch(entity, base_rev, ops):
+    """
+    Applique un patch avec contrôle de révision. Retourne la nouvelle
+    révision, ou None si base_rev n'est plus la révision courante.
+    """
+    old = json.loads(entity.optiqcarto_data) if entity.optiqcarto_data else {}
+    new = json.loads(entity.optiqcarto_data) if entity.optiqcarto_data else {}
+    touched = apply_carto_ops(new, ops)
+
+    # Écriture conditionnelle : verrouille la ligne et détecte les conflits
+    result = db.session.execute(
+        db.update(Entity)
+        .where(Entity.id == entity.id, Entity.optiqcarto_rev == base_rev)
+        .values(optiqcarto_data=json.dumps(new, ensure_ascii=False), optiqcarto_rev=base_rev + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        db.session.rollback()
+        return None
+    try:
+        _sync_patch_to_db(entity, old, new, touched)
+        record_revision(entity.id, base_rev + 1, old, new, ops=ops, user_id=session.get('user_id'))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    db.session.expire(entity, ['optiqcarto_data', 'optiqcarto_rev'])
+    return base_rev + 1
+
+
 # ─────────────────────────────────────────────
 # API SAVE / LOAD / LIST / DELETE
 # ─────────────────────────────────────────────
 
+def _save_full(entity, diagram):
+    """
+    Sauvegarde complète (nouvelle révision historisée) puis resynchronisation.
+    La révision est incrémentée en SQL : l'UPDATE verrouille la ligne, deux
+    sauvegardes concurrentes obtiennent des révisions distinctes et l'ancien
+    diagramme est relu sous ce verrou.
+    """
+    try:
+        db.session.execute(
+            db.update(Entity)
+            .where(Entity.id == entity.id)
+            .values(optiqcarto_rev=db.func.coalesce(Entity.optiqcarto_rev, 0) + 1)
+            .execution_options(synchronize_session=False)
+        )
+        old_data, rev = db.session.query(Entity.optiqcarto_data, Entity.optiqcarto_rev) \
+            .filter(Entity.id == entity.id).one()
+        db.session.execute(
+            db.update(Entity)
+            .where(Entity.id == entity.id)
+            .values(optiqcarto_data=json.dumps(diagram, ensure_ascii=False))
+            .execution_options(synchronize_session=False)
+        )
+        old = json.loads(old_data) if old_data else None
+        record_revision(entity.id, rev, old, diagram, user_id=session.get("user_id"))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    db.session.expire(entity, ['optiqcarto_data', 'optiqcarto_rev'])
+
+    # Re-extract activities / roles / links from the saved diagram
+    sync_error = None
+    try:
+        _sync_carto_to_db(entity, diagram)
+    except Exception as exc:
+        import traceback
+        sync_error = str(exc)
+        traceback.print_exc()
+
+    resp = {"ok": True, "name": entity.name or f"entity_{entity.id}", "rev": rev}
+    if sync_error:
+        resp["sync_warning"] = sync_error
+    return resp
+
+
+def _revision_conflict(entity):
+    """409 avec la révision courante : une autre sauvegarde a pris ce numéro (uq_carto_revision)."""
+    current = db.session.query(Entity.optiqcarto_rev).filter(Entity.id == entity.id).scalar()
+    return jsonify({"error": "Conflit de révision", "rev": current}), 409
+
+
 @cartography_editor_bp.route("/api/save", methods=["POST"])
 def api_save():
     if not _require_auth():
@@ -282,23 +544,45 @@ def api_save():
 
     data    = request.get_json(force=True)
     diagram = data.get("diagram", data)  # accepte {diagram: ...} ou le state direct
+    try:
+        return jsonify(_save_full(entity, diagram))
+    except IntegrityError:
+        return _revision_conflict(entity)
 
-    entity.optiqcarto_data = json.dumps(diagram, ensure_ascii=False)
-    db.session.commit()
 
-    # Re-extract activities / roles / links from the saved diagram
-    sync_error = None
+@cartography_editor_bp.route("/api/patch", methods=["POST"])
+def api_patch():
+    """
+    Sauvegarde incrémentale : {"base_rev": n, "ops": [...]}.
+    409 si la cartographie a changé depuis base_rev (le client recharge).
+    """
+    if not _require_auth():
+        return jsonify({"error": "Non autorisé"}), 403
+
+    entity = _get_active_entity()
+    if not entity:
+        return jsonify({"error": "Aucune entité active"}), 400
+
+    data = request.get_json(silent=True) or {}
+    base_rev = data.get("base_rev")
+    ops = data.get("ops")
+    if not isinstance(base_rev, int) or not isinstance(ops, list):
+        return jsonify({"error": "base_rev (entier) et ops (liste) requis"}), 400
+
     try:
-        _sync_carto_to_db(entity, diagram)
+        rev = apply_carto_patch(entity, base_rev, ops)
+    except PatchError as exc:
+        return jsonify({"error": str(exc)}), 400
+    except IntegrityError:
+        return _revision_conflict(entity)
     except Exception as exc:
         import traceback
-        sync_error = str(exc)
         traceback.print_exc()
+        return jsonify({"error": str(exc)}), 500
 
-    resp = {"ok": True, "name": entity.name or f"entity_{entity.id}"}
-    if sync_error:
-        resp["sync_warning"] = sync_error
-    return jsonify(resp)
+    if rev is None:
+        return _revision_conflict(entity)
+    return jsonify({"ok": True, "rev": rev, "applied": len(ops)})
 
 
 @cartography_editor_bp.route("/api/save-diff", methods=["POST"])
@@ -331,7 +615,9 @@ def api_load(name):
     if not entity.optiqcarto_data:
         return jsonify({"error": "Introuvable"}), 404
 
-    return jsonify(json.loads(entity.optiqcarto_data))
+    resp = jsonify(json.loads(entity.optiqcarto_data))
+    resp.headers["X-Carto-Rev"] = str(entity.optiqcarto_rev or 0)
+    return resp
 
 
 @cartography_editor_bp.route("/api/list")
@@ -363,6 +649,60 @@ def api_delete(name):
     return jsonify({"ok": True})
 
 
+# ─────────────────────────────────────────────
+# HISTORIQUE (Code/carto_history.py)
+# ─────────────────────────────────────────────
+
+@cartography_editor_bp.route("/api/history")
+def api_history():
+    if not _require_auth():
+        return jsonify({"error": "Non autorisé"}), 403
+
+    entity = _get_active_entity()
+    if not entity:
+        return jsonify({"error": "Aucune entité active"}), 400
+
+    return jsonify({"rev": entity.optiqcarto_rev or 0, "revisions": revision_list(entity.id)})
+
+
+@cartography_editor_bp.route("/api/history/<int:rev>")
+def api_history_rev(rev):
+    if not _require_auth():
+        return jsonify({"error": "Non autorisé"}), 403
+
+    entity = _get_active_entity()
+    if not entity:
+        return jsonify({"error": "Aucune entité active"}), 400
+
+    diagram = diagram_at(entity.id, rev)
+    if diagram is None:
+        return jsonify({"error": "Révision introuvable"}), 404
+    resp = jsonify(diagram)
+    resp.headers["X-Carto-Rev"] = str(rev)
+    return resp
+
+
+@cartography_editor_bp.route("/api/history/<int:rev>/restore", methods=["POST"])
+def api_history_restore(rev):
+    """Restaure la révision `rev` : crée une nouvelle révision identique."""
+    if not _require_auth():
+        return jsonify({"error": "Non autorisé"}), 403
+
+    entity = _get_active_entity()
+    if not entity:
+        return jsonify({"error": "Aucune entité active"}), 400
+
+    diagram = diagram_at(entity.id, rev)
+    if diagram is None:
+        return jsonify({"error": "Révision introuvable"}), 404
+    try:
+        resp = _save_full(entity, diagram)
+    except IntegrityError:
+        return _revision_conflict(entity)
+    resp["restored_from"] = rev
+    return jsonify(resp)
+
+
 # ─────────────────────────────────────────────
 # SERVIR LE VSDX EXISTANT (pour auto-import migration)
 # ─────────────────────────────────────────────
@@ -1,15 +1,32 @@
 # Code/routes/changelog.py
+import base64
 import subprocess
 import os
 import json
+import threading
 import time
 from datetime import datetime
 
-from flask import Blueprint, jsonify
+from flask import Blueprint, Response, jsonify, request
 
 changelog_bp = Blueprint('changelog', __name__)
 
-_changelog_cache = {}
+# Changelog généré : calculé une fois par commit (à la première requête,
+# ou à la main via `flask changelog-build`), persisté sur disque et servi
+# depuis la mémoire. Aucun appel git en sous-processus sur le chemin de
+# requête : le commit vient de GIT_COMMIT ou des fichiers de .git. Commit
+# inconnu : ni génération ni cache HTTP, changelog de repli.
+CHANGELOG_LOCK_STALE_SECONDS = 300
+CHANGELOG_MAX_AGE = 365 * 24 * 3600
+UNKNOWN_COMMIT = 'unknown'
+
+_changelog_lock = threading.Lock()
+_changelog_generating = False   # génération en cours dans ce processus (hors verrou)
+# Entrées jamais modifiées en place : un nouveau dict complet est substitué
+# d'une seule affectation, les lecteurs gardent une référence locale
+_changelog_memory = {}      # {'key': ..., 'body': bytes, 'etag': str}
+_curated_memory = {}        # {'key': ..., 'data': dict|None, 'body': bytes, 'etag': str}
+
 
 def _repo_root():
     return os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -17,16 +34,42 @@ def _repo_root():
 def _curated_file():
     return os.path.join(_repo_root(), 'static', 'changelog_user.json')
 
+def _cache_file():
+    return os.environ.get('CHANGELOG_CACHE_PATH') or os.path.join(
+        _repo_root(), 'Code', 'instance', 'changelog_cache.json'
+    )
+
+def _read_git_ref(git_dir, ref):
+    path = os.path.join(git_dir, *ref.split('/'))
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read().strip()
+    packed = os.path.join(git_dir, 'packed-refs')
+    if os.path.exists(packed):
+        with open(packed, 'r', encoding='utf-8') as f:
+            for line in f:
+                parts = line.strip().split(' ', 1)
+                if len(parts) == 2 and parts[1] == ref:
+                    return parts[0]
+    return None
+
 def _get_latest_commit_hash():
+    """
+    Commit déployé, sans sous-processus : GIT_COMMIT (fourni au build de
+    l'image, où .git est exclu) puis lecture directe de .git/HEAD.
+    """
+    env = os.environ.get('GIT_COMMIT', '').strip()
+    if env and env != UNKNOWN_COMMIT:
+        return env
     try:
-        r = subprocess.run(
-            ['git', 'rev-parse', 'HEAD'],
-            capture_output=True, text=True, timeout=5,
-            cwd=_repo_root()
-        )
-        return r.stdout.strip() if r.returncode == 0 else 'unknown'
-    except Exception:
-        return 'unknown'
+        git_dir = os.path.join(_repo_root(), '.git')
+        with open(os.path.join(git_dir, 'HEAD'), 'r', encoding='utf-8') as f:
+            head = f.read().strip()
+        if head.startswith('ref:'):
+            head = _read_git_ref(git_dir, head[4:].strip())
+        return head or UNKNOWN_COMMIT
+    except OSError:
+        return UNKNOWN_COMMIT
 
 def _get_recent_commits(n=30):
     try:
@@ -42,18 +85,33 @@ def _get_recent_commits(n=30):
         return []
 
 def _read_curated():
-    """Lit changelog_user.json s'il existe. Retourne None sinon."""
+    """
+    Lit changelog_user.json s'il existe (relu seulement s'il change).
+    Retourne l'entrée mémoire {'data', 'body', 'etag'}, ou None sans fichier.
+    """
+    global _curated_memory
     path = _curated_file()
-    if not os.path.exists(path):
+    try:
+        st = os.stat(path)
+    except OSError:
         return None
+    key = (st.st_mtime_ns, st.st_size)
+    entry = _curated_memory
+    if entry.get('key') == key:
+        return entry
+    data = None
     try:
         with open(path, 'r', encoding='utf-8') as f:
             items = json.load(f)
         if isinstance(items, list) and items:
-            return {"items": items}
+            data = {"items": items}
     except Exception:
         pass
-    return None
+    etag = f"curated-{key[0]:x}-{key[1]:x}"
+    body = json.dumps({'ok': True, 'version': etag, **data}, ensure_ascii=False).encode('utf-8') if data else None
+    entry = {'key': key, 'data': data, 'body': body, 'etag': etag}
+    _curated_memory = entry
+    return entry
 
 def _fallback_changelog():
     return {"items": [
@@ -143,6 +201,7 @@ _EVENT_LABELS = {
     'tool_updated':     'Modification',
     'tool_deleted':     'Suppression',
     'tool_linked':      'Association',
+    'bulk_import':      'Import',
 }
 
 _EVENT_COLORS = {
@@ -168,68 +227,263 @@ def _format_date(dt):
     return f"{dt.day} {months[dt.month - 1]} à {dt.strftime('%H:%M')}"
 
 
+FEED_DEFAULT_LIMIT = 20
+FEED_MAX_LIMIT = 100
+
+
+def _events_with_users():
+    """RecentEvent + nom de l'utilisateur en une seule requête (jointure externe)."""
+    from Code.extensions import db
+    from Code.models.models import RecentEvent, User
+
+    return db.session.query(RecentEvent, User.first_name, User.last_name).outerjoin(
+        User, User.id == RecentEvent.user_id
+    )
+
+
+def _serialize_events(rows):
+    items = []
+    for ev, first_name, last_name in rows:
+        detail = None
+        if ev.detail:
+            try:
+                detail = json.loads(ev.detail)
+            except Exception:
+                pass
+        items.append({
+            "id":          ev.id,
+            "icon":        ev.icon,
+            "label":       ev.label,
+            "type":        ev.event_type,
+            "event_label": _EVENT_LABELS.get(ev.event_type, 'Événement'),
+            "color":       _event_color(ev.event_type),
+            "time":        _format_relative_time(ev.created_at),
+            "date":        _format_date(ev.created_at),
+            "user":        f"{first_name} {last_name}" if first_name is not None else None,
+            "detail":      detail,
+        })
+    return items
+
+
+def _encode_cursor(ev):
+    raw = f"{ev.created_at.isoformat()}|{ev.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor):
+    """Retourne (created_at, id) ou None si le curseur est invalide."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        ts, ev_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(ts), int(ev_id)
+    except Exception:
+        return None
+
+
 @changelog_bp.route('/api/recent-activity', methods=['GET'])
 def get_recent_activity():
     """Retourne les 20 derniers événements depuis recent_events."""
     try:
-        import json as _j
-        from Code.models.models import RecentEvent, User
-
-        events = (RecentEvent.query
-                  .order_by(RecentEvent.created_at.desc())
-                  .limit(20)
-                  .all())
-
-        # Cache user names
-        user_cache = {}
-        for ev in events:
-            if ev.user_id and ev.user_id not in user_cache:
-                u = User.query.get(ev.user_id)
-                user_cache[ev.user_id] = (f"{u.first_name} {u.last_name}" if u else None)
-
-        items = []
-        for ev in events:
-            detail = None
-            if ev.detail:
-                try:
-                    detail = _j.loads(ev.detail)
-                except Exception:
-                    pass
-            items.append({
-                "icon":        ev.icon,
-                "label":       ev.label,
-                "type":        ev.event_type,
-                "event_label": _EVENT_LABELS.get(ev.event_type, 'Événement'),
-                "color":       _event_color(ev.event_type),
-                "time":        _format_relative_time(ev.created_at),
-                "date":        _format_date(ev.created_at),
-                "user":        user_cache.get(ev.user_id),
-                "detail":      detail,
-            })
+        from Code.models.models import RecentEvent
 
+        rows = (_events_with_users()
+                .order_by(RecentEvent.created_at.desc(), RecentEvent.id.desc())
+                .limit(20)
+                .all())
+        items = _serialize_events(rows)
         return jsonify({"ok": True, "items": items, "empty": len(items) == 0})
 
     except Exception as e:
         return jsonify({"ok": False, "items": [], "error": str(e)})
 
 
-@changelog_bp.route('/api/changelog', methods=['GET'])
-def get_changelog():
-    global _changelog_cache
+@changelog_bp.route('/api/recent-activity/feed', methods=['GET'])
+def get_recent_activity_feed():
+    """
+    Fil d'événements de l'entité active, paginé par clé (created_at, id).
+    GET /api/recent-activity/feed?limit=20&cursor=<next_cursor>
+    ETag = dernier événement de l'entité : un client qui rafraîchit sans
+    nouveauté reçoit un 304 après une seule lecture d'index.
+    """
+    from sqlalchemy import and_, or_
+    from Code.extensions import db
+    from Code.models.models import Entity, RecentEvent
+
+    entity_id = Entity.get_active_id()
+    if not entity_id:
+        return jsonify({"ok": False, "items": [], "error": "Aucune entité active"}), 400
+
+    limit = max(1, min(request.args.get('limit', FEED_DEFAULT_LIMIT, type=int), FEED_MAX_LIMIT))
+    cursor = request.args.get('cursor') or ''
+    after = None
+    if cursor:
+        after = _decode_cursor(cursor)
+        if after is None:
+            return jsonify({"ok": False, "items": [], "error": "Curseur invalide"}), 400
+
+    newest = (db.session.query(RecentEvent.id)
+              .filter(RecentEvent.entity_id == entity_id)
+              .order_by(RecentEvent.created_at.desc(), RecentEvent.id.desc())
+              .limit(1)
+              .scalar())
+    etag = f"feed-{entity_id}-{newest or 0}-{limit}-{cursor}"
+    if request.if_none_match.contains_weak(etag):
+        resp = Response(status=304)
+        resp.set_etag(etag, weak=True)
+        return resp
+
+    q = _events_with_users().filter(RecentEvent.entity_id == entity_id)
+    if after:
+        ts, ev_id = after
+        q = q.filter(or_(RecentEvent.created_at < ts,
+                         and_(RecentEvent.created_at == ts, RecentEvent.id < ev_id)))
+    rows = (q.order_by(RecentEvent.created_at.desc(), RecentEvent.id.desc())
+             .limit(limit + 1)
+             .all())
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    resp = jsonify({
+        "ok": True,
+        "items": _serialize_events(rows),
+        "next_cursor": _encode_cursor(rows[-1][0]) if has_more else None,
+        "empty": not rows,
+    })
+    resp.set_etag(etag, weak=True)
+    resp.headers['Cache-Control'] = 'private, no-cache'
+    return resp
+
+
+def _load_cache_file(commit_hash):
+    try:
+        with open(_cache_file(), 'r', encoding='utf-8') as f:
+            stored = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if stored.get('commit') == commit_hash and isinstance(stored.get('data'), dict):
+        return stored['data']
+    return None
 
-    # 1. Lire le fichier curated en priorité absolue
-    curated = _read_curated()
-    if curated:
-        return jsonify({'ok': True, **curated})
+def _write_cache_file(commit_hash, data):
+    path = _cache_file()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({'commit': commit_hash, 'generated_at': datetime.utcnow().isoformat(), 'data': data},
+                  f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+def _acquire_file_lock():
+    """Verrou inter-workers (O_EXCL). Un verrou abandonné est repris après expiration."""
+    lock = _cache_file() + '.lock'
+    os.makedirs(os.path.dirname(lock), exist_ok=True)
+    for _ in range(2):
+        try:
+            os.close(os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return lock
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock) < CHANGELOG_LOCK_STALE_SECONDS:
+                    return None
+                os.remove(lock)
+            except OSError:
+                return None
+    return None
 
-    # 2. Sinon : génération via OpenAI + cache
+def _remember(key, data):
+    global _changelog_memory
+    body = json.dumps({'ok': True, 'version': key, **data}, ensure_ascii=False).encode('utf-8')
+    _changelog_memory = {'key': key, 'body': body, 'etag': f"changelog-{key[:12]}"}
+    return _changelog_memory
+
+def build_changelog_cache(force=False):
+    """
+    Génère (git log + OpenAI) et persiste le changelog du commit courant.
+    Un seul worker génère : les autres trouvent le fichier, ou reçoivent
+    None pendant la génération et servent le changelog de repli. Le verrou
+    du processus ne couvre que la lecture du cache et la prise du verrou
+    fichier, jamais l'appel OpenAI. Commit inconnu : None (la même clé
+    servirait tous les déploiements).
+    """
+    global _changelog_generating
     commit_hash = _get_latest_commit_hash()
-    cached = _changelog_cache.get(commit_hash)
-    if cached and time.time() - cached['ts'] < 3600:
-        return jsonify({'ok': True, **cached['data']})
+    if commit_hash == UNKNOWN_COMMIT:
+        return None
+    if not force:
+        entry = _changelog_memory
+        if entry.get('key') == commit_hash:
+            return entry
+    with _changelog_lock:
+        if not force:
+            data = _load_cache_file(commit_hash)
+            if data is not None:
+                return _remember(commit_hash, data)
+        if _changelog_generating:
+            return None
+        lock = _acquire_file_lock()
+        if lock is None:
+            return None
+        _changelog_generating = True
+    try:
+        # Un autre worker a pu terminer entre la lecture et le verrou
+        data = None if force else _load_cache_file(commit_hash)
+        if data is None:
+            commits = _get_recent_commits(30)
+            data = (_generate_with_openai(commits) if commits else None) or _fallback_changelog()
+            _write_cache_file(commit_hash, data)
+            print(f"[CHANGELOG] Généré pour {commit_hash[:12]} ({len(data.get('items', []))} éléments)")
+        return _remember(commit_hash, data)
+    finally:
+        try:
+            os.remove(lock)
+        except OSError:
+            pass
+        _changelog_generating = False
+
+
+def _cached_response(body, etag, version):
+    if request.if_none_match.contains_weak(etag):
+        resp = Response(status=304)
+    else:
+        resp = Response(body, mimetype='application/json')
+    resp.set_etag(etag)
+    # URL versionnée (?v=<version>) : contenu immuable ; sinon revalidation par ETag
+    if version and request.args.get('v') == version:
+        resp.headers['Cache-Control'] = f'public, max-age={CHANGELOG_MAX_AGE}, immutable'
+    else:
+        resp.headers['Cache-Control'] = 'public, no-cache'
+    return resp
 
-    commits = _get_recent_commits(30)
-    data = (_generate_with_openai(commits) if commits else None) or _fallback_changelog()
 
-    _changelog_cache = {commit_hash: {'ts': time.time(), 'data': data}}
-    return jsonify({'ok': True, **data})
+@changelog_bp.route('/api/changelog', methods=['GET'])
+def get_changelog():
+    # 1. Lire le fichier curated en priorité absolue
+    curated = _read_curated()
+    if curated and curated['data']:
+        return _cached_response(curated['body'], curated['etag'], curated['etag'])
+
+    # 2. Sinon : changelog généré pour le commit courant (mémoire → fichier → génération)
+    entry = build_changelog_cache()
+    if entry is None:
+        # Génération en cours ou commit inconnu : repli, sans ETag ni cache
+        resp = jsonify({'ok': True, **_fallback_changelog()})
+        resp.headers['Cache-Control'] = 'no-store'
+        return resp
+    return _cached_response(entry['body'], entry['etag'], entry['key'])
+
+
+def register_cli(app):
+    """Ajoute la commande `flask changelog-build` (pré-génération manuelle)."""
+    import click
+
+    @app.cli.command("changelog-build")
+    @click.option("--force", is_flag=True, help="Régénérer même si le cache du commit existe.")
+    def changelog_build_command(force):
+        """Génère et persiste le changelog du commit déployé."""
+        entry = build_changelog_cache(force=force)
+        if entry:
+            click.echo(entry['key'])
+        elif _get_latest_commit_hash() == UNKNOWN_COMMIT:
+            click.echo("commit inconnu (GIT_COMMIT absent) : rien à générer")
+        else:
+            click.echo("génération déjà en cours")
@@ -5,9 +5,9 @@ import os
 import json
 from flask import Blueprint, request, jsonify
 from sqlalchemy import or_
-from openai import OpenAI
 
 from Code.extensions import db
+from Code.routes.propose_common import chat_completion
 from Code.models.models import (
     Activities, Task, Link, Data, Tool, Entity, Performance,
     Constraint, Savoir, SavoirFaire, Aptitude,
@@ -479,9 +479,11 @@ def chat():
     ]
 
     try:
+        from openai import OpenAI
         client = OpenAI()
         model = os.getenv('OPENAI_CHATBOT_MODEL', 'gpt-4o-mini')
-        resp = client.chat.completions.create(
+        resp = chat_completion(
+            client,
             model=model,
             messages=messages,
             response_format={'type': 'json_object'},
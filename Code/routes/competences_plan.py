@@ -5,6 +5,7 @@ from datetime import datetime
 from flask import Blueprint, request, jsonify
 from sqlalchemy import text
 from Code.extensions import db
+from Code.routes.propose_common import chat_completion
 
 competences_plan_bp = Blueprint(
     "competences_plan", __name__, url_prefix="/competences_plan"
@@ -32,98 +33,6 @@ Règles :
 
 # ==================== Helpers ====================
 
-def _ensure_tables_exist():
-    """
-    S'assure que les tables nécessaires existent.
-    Crée les tables si elles n'existent pas.
-    """
-    try:
-        # Vérifier si la table training_plan existe
-        result = db.session.execute(text("""
-            SELECT EXISTS (
-                SELECT FROM information_schema.tables 
-                WHERE table_name = 'training_plan'
-            )
-        """)).scalar()
-        
-        if not result:
-            # Créer la table training_plan pour PostgreSQL
-            db.session.execute(text("""
-                CREATE TABLE IF NOT EXISTS training_plan (
-                    id SERIAL PRIMARY KEY,
-                    user_id INTEGER NOT NULL,
-                    role_id INTEGER NOT NULL,
-                    activity_id INTEGER NOT NULL,
-                    plan_type VARCHAR(100),
-                    plan_json TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """))
-            db.session.commit()
-            
-    except Exception as e:
-        db.session.rollback()
-        # Essayer la syntaxe SQLite si PostgreSQL échoue
-        try:
-            db.session.execute(text("""
-                CREATE TABLE IF NOT EXISTS training_plan (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    role_id INTEGER NOT NULL,
-                    activity_id INTEGER NOT NULL,
-                    plan_type TEXT,
-                    plan_json TEXT,
-                    created_at TEXT DEFAULT (datetime('now'))
-                )
-            """))
-            db.session.commit()
-        except Exception as e2:
-            db.session.rollback()
-            print(f"Erreur création table training_plan: {e2}")
-    
-    try:
-        # Vérifier si la table prerequis_comment existe
-        result = db.session.execute(text("""
-            SELECT EXISTS (
-                SELECT FROM information_schema.tables 
-                WHERE table_name = 'prerequis_comment'
-            )
-        """)).scalar()
-        
-        if not result:
-            db.session.execute(text("""
-                CREATE TABLE IF NOT EXISTS prerequis_comment (
-                    id SERIAL PRIMARY KEY,
-                    user_id INTEGER NOT NULL,
-                    activity_id INTEGER NOT NULL,
-                    item_type VARCHAR(100),
-                    item_id INTEGER,
-                    comment TEXT,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """))
-            db.session.commit()
-            
-    except Exception as e:
-        db.session.rollback()
-        try:
-            db.session.execute(text("""
-                CREATE TABLE IF NOT EXISTS prerequis_comment (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    activity_id INTEGER NOT NULL,
-                    item_type TEXT,
-                    item_id INTEGER,
-                    comment TEXT,
-                    updated_at TEXT DEFAULT (datetime('now'))
-                )
-            """))
-            db.session.commit()
-        except Exception as e2:
-            db.session.rollback()
-            print(f"Erreur création table prerequis_comment: {e2}")
-
-
 def _dummy_plan():
     """Plan de secours pour dev/test sans clé API ou en cas d'erreur SDK."""
     return {
@@ -179,7 +88,8 @@ def _call_llm_or_dummy(prompt: str):
         client = OpenAI(api_key=api_key)
 
         model = os.environ.get("OPENAI_MODEL", "gpt-4o-mini")
-        resp = client.chat.completions.create(
+        resp = chat_completion(
+            client,
             model=model,
             temperature=0.2,
             messages=[{"role": "user", "content": prompt}],
@@ -214,8 +124,6 @@ def save_prerequis():
     { user_id, activity_id, comments: [{item_type, item_id, comment}] }
     Stratégie 'upsert simple' : on efface l'existant de (user, activity) puis on réinsère.
     """
-    _ensure_tables_exist()
-    
     data = request.get_json(force=True)
     user_id = int(data["user_id"])
     activity_id = int(data["activity_id"])
@@ -250,8 +158,6 @@ def get_prerequis(user_id: int, activity_id: int):
     Renvoie la liste des commentaires existants pour (user, activity):
     [{item_type, item_id, comment}]
     """
-    _ensure_tables_exist()
-    
     rows = db.session.execute(
         text("""
             SELECT item_type, item_id, comment
@@ -273,8 +179,6 @@ def generate_plan():
     }
     Sauvegarde le plan (réel ou dummy) et renvoie {ok:True, plan}
     """
-    _ensure_tables_exist()
-    
     try:
         data = request.get_json(force=True)
         user_id = int(data["user_id"])
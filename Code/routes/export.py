@@ -1,21 +1,22 @@
 # Code/routes/export.py
 """
 Export des données d'une entité vers Excel ou HTML.
+Les lignes sont lues par générateurs (iter_activity_names / iter_items) et
+écrites au fil de l'eau : classeur write_only pour Excel, template Jinja
+diffusé (stream_template) pour HTML.
 Upload-file  : sauvegarde le fichier en base de données (LargeBinary) — persistant sur cloud.
 Serve-file   : sert le fichier depuis la DB (ou chemin local en dev).
 """
 import os
-import io
 import mimetypes
+import tempfile
 from datetime import datetime
 
-from flask import Blueprint, request, jsonify, send_file, Response
+from flask import Blueprint, request, jsonify, send_file, Response, stream_template
 from werkzeug.utils import secure_filename
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-from openpyxl.utils import get_column_letter
 
 from sqlalchemy import text as _sql_text
+from sqlalchemy import func
 
 from Code.extensions import db
 from Code.models.models import (
@@ -32,7 +33,7 @@ def _get_role_mission(role_id):
     ).fetchone()
     return row[0] if row and row[0] else ""
 
-export_bp = Blueprint("export", __name__)
+export_bp = Blueprint("export", __name__, template_folder="templates")
 
 
 # ──────────────────────────────────────────────
@@ -109,13 +110,42 @@ def serve_local_file():
 
 
 # ──────────────────────────────────────────────
-# Collecte des données (simplifié)
+# Collecte des données
+#   _collect_entity_data ne charge que l'en-tête (entité, rôle, compteurs) ;
+#   les lignes sont produites à la demande par les générateurs iter_*,
+#   partagés par tous les formats d'export (Excel, HTML, ...).
 # ──────────────────────────────────────────────
+EXPORT_YIELD_PER = 500
+
+# Clé de section → modèle SQLAlchemy des éléments rattachés aux activités
+EXPORT_SECTIONS = {
+    "savoirs": Savoir,
+    "savoir_faires": SavoirFaire,
+    "aptitudes": Aptitude,
+    "competencies": Competency,
+}
+
+
+def _scoped_activities(entity_id, role_id=None):
+    """Query des activités exportées (Garant du rôle si role_id, sinon toute l'entité)."""
+    q = Activities.query.filter(Activities.entity_id == entity_id)
+    if role_id:
+        q = (
+            q.join(activity_roles, activity_roles.c.activity_id == Activities.id)
+            .filter(
+                activity_roles.c.role_id == role_id,
+                activity_roles.c.status == 'Garant',
+            )
+        )
+    return q
+
+
 def _collect_entity_data(entity_id, role_id=None):
     """
-    Collecte les données pour l'export :
+    Collecte l'en-tête de l'export :
     - role_id fourni → activités Garant du rôle + savoirs/SF/aptitudes/compétences de ces activités
     - pas de role_id  → toutes les activités de l'entité + idem
+    Les volumes sont calculés par COUNT ; le contenu est lu par iter_activity_names / iter_items.
     """
     entity = Entity.query.get(entity_id)
     if not entity:
@@ -125,47 +155,54 @@ def _collect_entity_data(entity_id, role_id=None):
     if role_id:
         role = Role.query.get(role_id)
 
-    # Activités
-    if role_id:
-        activities = (
-            Activities.query
-            .join(activity_roles, activity_roles.c.activity_id == Activities.id)
-            .filter(
-                activity_roles.c.role_id == role_id,
-                activity_roles.c.status == 'Garant',
-                Activities.entity_id == entity_id,
-            )
-            .order_by(Activities.name)
-            .all()
+    activities = _scoped_activities(entity_id, role_id)
+    counts = {"activities": activities.with_entities(func.count(Activities.id)).scalar() or 0}
+    for key, model in EXPORT_SECTIONS.items():
+        counts[key] = (
+            activities.join(model, model.activity_id == Activities.id)
+            .with_entities(func.count(model.id))
+            .scalar() or 0
         )
-    else:
-        activities = (
-            Activities.query
-            .filter_by(entity_id=entity_id)
-            .order_by(Activities.name)
-            .all()
-        )
-
-    # Agréger savoirs / SF / aptitudes / compétences de toutes ces activités
-    all_savoirs, all_sf, all_aptitudes, all_competencies = [], [], [], []
-    for act in activities:
-        all_savoirs.extend(act.savoirs)
-        all_sf.extend(act.savoir_faires)
-        all_aptitudes.extend(act.aptitudes)
-        all_competencies.extend(act.competencies)
 
     return {
         "entity": entity,
         "role": role,
+        "entity_id": entity_id,
+        "role_id": role_id,
         "mission_generale": _get_role_mission(role_id) if role_id else "",
-        "activities": activities,
-        "savoirs": all_savoirs,
-        "savoir_faires": all_sf,
-        "aptitudes": all_aptitudes,
-        "competencies": all_competencies,
+        "counts": counts,
     }
 
 
+def iter_activity_names(data):
+    """Génère les noms des activités exportées, triés, par lots de EXPORT_YIELD_PER."""
+    q = (
+        _scoped_activities(data["entity_id"], data["role_id"])
+        .with_entities(Activities.name)
+        .order_by(Activities.name, Activities.id)
+        .yield_per(EXPORT_YIELD_PER)
+    )
+    for (name,) in q:
+        yield name
+
+
+def iter_items(data, section):
+    """
+    Génère les tuples (nom de l'activité, description) d'une section
+    (clé de EXPORT_SECTIONS) en une seule requête jointe, sans instancier d'objets ORM.
+    """
+    model = EXPORT_SECTIONS[section]
+    q = (
+        _scoped_activities(data["entity_id"], data["role_id"])
+        .join(model, model.activity_id == Activities.id)
+        .with_entities(Activities.name, model.description)
+        .order_by(Activities.name, Activities.id, model.id)
+        .yield_per(EXPORT_YIELD_PER)
+    )
+    for activity_name, description in q:
+        yield activity_name, description
+
+
 # ──────────────────────────────────────────────
 # Export Excel
 # ──────────────────────────────────────────────
@@ -177,334 +214,191 @@ VIOLET_MID = "DDD6FE"
 WHITE      = "FFFFFF"
 GRAY_LT    = "F5F3FF"
 
-def _hdr_fill(hex_color): return PatternFill("solid", fgColor=hex_color)
+# Au-delà de ce seuil, le fichier temporaire bascule de la RAM vers le disque
+EXCEL_SPOOL_MAX_MEMORY = 8 * 1024 * 1024
+
+
+# openpyxl est importé dans les fonctions : coûteux au démarrage, utile au seul export
+def _hdr_fill(hex_color):
+    from openpyxl.styles import PatternFill
+    return PatternFill("solid", fgColor=hex_color)
+
+
 def _border():
+    from openpyxl.styles import Border, Side
     s = Side(border_style="thin", color="C4B5FD")
     return Border(left=s, right=s, top=s, bottom=s)
 
+
+def _register_styles(wb):
+    """
+    Déclare une fois pour toutes les styles nommés du classeur.
+    Chaque cellule référence ensuite un style par son nom au lieu de porter
+    ses propres objets Font/Fill/Border (indispensable en mode write_only).
+    """
+    from openpyxl.styles import Font, Alignment, NamedStyle
+
+    def add(name, **attrs):
+        st = NamedStyle(name=name)
+        for k, v in attrs.items():
+            setattr(st, k, v)
+        wb.add_named_style(st)
+
+    for color in (PURPLE, PURPLE_MID, INDIGO):
+        add(f"hdr_{color}",
+            font=Font(bold=True, color=WHITE, size=11),
+            fill=_hdr_fill(color),
+            alignment=Alignment(horizontal="center", vertical="center"),
+            border=_border())
+    for name, color in (("row_even", VIOLET_LT), ("row_odd", WHITE)):
+        add(name,
+            fill=_hdr_fill(color),
+            border=_border(),
+            alignment=Alignment(wrap_text=True, vertical="top"))
+    add("kv_key", font=Font(bold=True, color=PURPLE), fill=_hdr_fill(GRAY_LT), border=_border())
+    add("kv_value", border=_border(), alignment=Alignment(wrap_text=True))
+    add("title",
+        font=Font(bold=True, color=WHITE, size=11),
+        fill=_hdr_fill(PURPLE),
+        alignment=Alignment(vertical="center", wrap_text=True))
+
+
 def _make_excel(data, role_label=None):
-    wb = Workbook()
+    """
+    Construit le classeur en mode write_only : les lignes sont écrites au fil
+    de l'eau (pas de grille de cellules en mémoire) puis le classeur est
+    sérialisé dans un SpooledTemporaryFile, renvoyé positionné au début.
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.utils import get_column_letter
+
+    wb = Workbook(write_only=True)
+    _register_styles(wb)
     entity = data["entity"]
     role   = data.get("role")
 
     # ── Helpers ──────────────────────────────────────────────
-    def _sheet_header(ws, headers, widths, fill_color):
-        for i, (h, w) in enumerate(zip(headers, widths), 1):
-            c = ws.cell(row=1, column=i, value=h)
-            c.font = Font(bold=True, color=WHITE, size=11)
-            c.fill = _hdr_fill(fill_color)
-            c.alignment = Alignment(horizontal="center", vertical="center")
-            c.border = _border()
+    def _cell(ws, value, style):
+        c = WriteOnlyCell(ws, value=value)
+        c.style = style
+        return c
+
+    def _sheet(title, headers, widths, fill_color, rows):
+        ws = wb.create_sheet(title)
+        for i, w in enumerate(widths, 1):
             ws.column_dimensions[get_column_letter(i)].width = w
         ws.row_dimensions[1].height = 22
         ws.freeze_panes = "A2"
-
-    def _add_rows(ws, rows, start=2):
-        for ri, vals in enumerate(rows, start):
-            fill = _hdr_fill(VIOLET_LT) if ri % 2 == 0 else _hdr_fill(WHITE)
-            for ci, v in enumerate(vals, 1):
-                c = ws.cell(row=ri, column=ci, value=v)
-                c.fill = fill
-                c.border = _border()
-                c.alignment = Alignment(wrap_text=True, vertical="top")
-
-    def write_kv(ws, row, key, value, col=PURPLE):
-        k = ws.cell(row=row, column=1, value=key)
-        k.font = Font(bold=True, color=col)
-        k.fill = _hdr_fill(GRAY_LT)
-        k.border = _border()
-        v = ws.cell(row=row, column=2, value=str(value or ""))
-        v.border = _border()
-        v.alignment = Alignment(wrap_text=True)
-        ws.row_dimensions[row].height = 18
-        return row + 1
-
-    def write_title(ws, row, title):
-        c = ws.cell(row=row, column=1, value=title)
-        c.font = Font(bold=True, color=WHITE, size=11)
-        c.fill = _hdr_fill(PURPLE)
-        c.alignment = Alignment(vertical="center", wrap_text=True)
-        ws.merge_cells(start_row=row, start_column=1, end_row=row, end_column=2)
-        ws.row_dimensions[row].height = 22
-        return row + 1
+        ws.append([_cell(ws, h, f"hdr_{fill_color}") for h in headers])
+        for ri, vals in enumerate(rows, 2):
+            style = "row_even" if ri % 2 == 0 else "row_odd"
+            ws.append([_cell(ws, v, style) for v in vals])
+        return ws
 
     # ── Feuille 1 : Résumé ──────────────────────────────────
-    ws = wb.active
-    ws.title = "Résumé"
+    ws = wb.create_sheet("Résumé")
     ws.column_dimensions["A"].width = 26
     ws.column_dimensions["B"].width = 55
+    summary = []
+
+    def write_kv(key, value):
+        summary.append(("kv", key, value))
+
+    def write_title(title):
+        summary.append(("title", title, None))
 
-    r = 1
-    r = write_title(ws, r, "Informations générales")
-    r = write_kv(ws, r, "Entité", entity.name)
-    r = write_kv(ws, r, "Date d'export", datetime.now().strftime("%d/%m/%Y %H:%M"))
+    write_title("Informations générales")
+    write_kv("Entité", entity.name)
+    write_kv("Date d'export", datetime.now().strftime("%d/%m/%Y %H:%M"))
 
+    summary.append(None)
     if role:
-        r += 1
-        r = write_title(ws, r, "Rôle exporté")
-        r = write_kv(ws, r, "Nom du rôle", role.name)
-        r = write_kv(ws, r, "Mission", data.get("mission_generale") or "—")
+        write_title("Rôle exporté")
+        write_kv("Nom du rôle", role.name)
+        write_kv("Mission", data.get("mission_generale") or "—")
     else:
-        r += 1
-        r = write_title(ws, r, "Périmètre")
-        r = write_kv(ws, r, "Filtre", "Toutes les activités de l'entité")
-
-    r += 1
-    r = write_title(ws, r, "Statistiques")
-    r = write_kv(ws, r, "Activités", len(data["activities"]))
-    r = write_kv(ws, r, "Savoirs", len(data["savoirs"]))
-    r = write_kv(ws, r, "Savoir-faires", len(data["savoir_faires"]))
-    r = write_kv(ws, r, "HSC / Aptitudes", len(data["aptitudes"]))
-    r = write_kv(ws, r, "Compétences", len(data["competencies"]))
+        write_title("Périmètre")
+        write_kv("Filtre", "Toutes les activités de l'entité")
+
+    summary.append(None)
+    write_title("Statistiques")
+    counts = data["counts"]
+    write_kv("Activités", counts["activities"])
+    write_kv("Savoirs", counts["savoirs"])
+    write_kv("Savoir-faires", counts["savoir_faires"])
+    write_kv("HSC / Aptitudes", counts["aptitudes"])
+    write_kv("Compétences", counts["competencies"])
+
+    for r, line in enumerate(summary, 1):
+        if line is None:
+            ws.append([])
+            continue
+        kind, key, value = line
+        if kind == "title":
+            ws.row_dimensions[r].height = 22
+            ws.merged_cells.add(f"A{r}:B{r}")
+            ws.append([_cell(ws, key, "title")])
+        else:
+            ws.row_dimensions[r].height = 18
+            ws.append([_cell(ws, key, "kv_key"), _cell(ws, str(value or ""), "kv_value")])
 
     # ── Feuille 2 : Activités (noms uniquement) ──────────────
-    ws2 = wb.create_sheet("Activités")
-    _sheet_header(ws2, ["#", "Nom de l'activité"], [6, 70], PURPLE)
-    _add_rows(ws2, [(i, act.name) for i, act in enumerate(data["activities"], 1)])
+    _sheet("Activités", ["#", "Nom de l'activité"], [6, 70], PURPLE,
+           enumerate(iter_activity_names(data), 1))
 
     # ── Feuille 3 : Savoirs ──────────────────────────────────
-    ws3 = wb.create_sheet("Savoirs")
-    _sheet_header(ws3, ["Activité", "Savoir"], [35, 70], INDIGO)
-    _add_rows(ws3, [(s.activity.name if s.activity else "—", s.description) for s in data["savoirs"]])
+    _sheet("Savoirs", ["Activité", "Savoir"], [35, 70], INDIGO,
+           iter_items(data, "savoirs"))
 
     # ── Feuille 4 : Savoir-faires ────────────────────────────
-    ws4 = wb.create_sheet("Savoir-faires")
-    _sheet_header(ws4, ["Activité", "Savoir-faire"], [35, 70], PURPLE_MID)
-    _add_rows(ws4, [(sf.activity.name if sf.activity else "—", sf.description) for sf in data["savoir_faires"]])
+    _sheet("Savoir-faires", ["Activité", "Savoir-faire"], [35, 70], PURPLE_MID,
+           iter_items(data, "savoir_faires"))
 
     # ── Feuille 5 : HSC / Aptitudes ─────────────────────────
-    ws5 = wb.create_sheet("HSC - Aptitudes")
-    _sheet_header(ws5, ["Activité", "Aptitude / HSC"], [35, 70], PURPLE)
-    _add_rows(ws5, [(a.activity.name if a.activity else "—", a.description) for a in data["aptitudes"]])
+    _sheet("HSC - Aptitudes", ["Activité", "Aptitude / HSC"], [35, 70], PURPLE,
+           iter_items(data, "aptitudes"))
 
     # ── Feuille 6 : Compétences ──────────────────────────────
-    ws6 = wb.create_sheet("Compétences")
-    _sheet_header(ws6, ["Activité", "Compétence"], [35, 70], INDIGO)
-    _add_rows(ws6, [(c.activity.name if c.activity else "—", c.description) for c in data["competencies"]])
+    _sheet("Compétences", ["Activité", "Compétence"], [35, 70], INDIGO,
+           iter_items(data, "competencies"))
 
-    buf = io.BytesIO()
+    buf = tempfile.SpooledTemporaryFile(max_size=EXCEL_SPOOL_MAX_MEMORY)
     wb.save(buf)
     buf.seek(0)
     return buf
 
 
 # ──────────────────────────────────────────────
-# Export HTML
+# Export HTML — rendu progressif du template export_entity.html
 # ──────────────────────────────────────────────
 def _make_html(data, role_label=None):
-    entity = data["entity"]
-    role   = data.get("role")
-    now    = datetime.now().strftime("%d/%m/%Y à %H:%M")
-
-    def esc(s):
-        if not s:
-            return "—"
-        return str(s).replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
-
-    def _list_section(title, items, color):
-        if not items:
-            return f'<p class="no-items">Aucun élément.</p>'
-        rows = "".join(
-            f'<tr><td class="act-ref">{esc(getattr(item, "activity", None) and item.activity.name or "—")}</td>'
-            f'<td>{esc(item.description)}</td></tr>'
-            for item in items
-        )
-        return (
-            f'<div class="table-wrap">'
-            f'<table><thead style="background:{color};">'
-            f'<tr><th>Activité</th><th>Description</th></tr>'
-            f'</thead><tbody>{rows}</tbody></table></div>'
-        )
-
-    # ── Section rôle (si export par rôle) ───────────────────
-    role_section = ""
-    if role:
-        mission_text = data.get("mission_generale") or ""
-        mission = esc(mission_text) if mission_text else "<em>Non renseignée</em>"
-        role_section = f"""
-        <div class="role-card">
-          <div class="role-header">
-            <div class="role-icon">👤</div>
-            <div>
-              <div class="role-name">{esc(role.name)}</div>
-              <div class="role-label">Rôle exporté</div>
-            </div>
-          </div>
-          <div class="role-mission">
-            <span class="field-label">Mission</span>
-            <p>{mission}</p>
-          </div>
-        </div>"""
-
-    # ── Liste des activités ──────────────────────────────────
-    accents = ["#6d28d9", "#4338ca", "#7c3aed", "#5b21b6"]
-    acts_items = "".join(
-        f'<li style="border-left-color:{accents[i % 4]};">'
-        f'<span class="act-num">{i+1:02d}</span>'
-        f'<span class="act-name">{esc(act.name)}</span>'
-        f'</li>'
-        for i, act in enumerate(data["activities"])
-    ) or '<li class="no-items">Aucune activité.</li>'
-
-    # ── Sections savoirs / SF / aptitudes / compétences ─────
-    savoirs_html = _list_section("Savoirs", data["savoirs"], "linear-gradient(to right,#4c1d95,#4338ca)")
-    sf_html      = _list_section("Savoir-faires", data["savoir_faires"], "linear-gradient(to right,#5b21b6,#7c3aed)")
-    apt_html     = _list_section("HSC / Aptitudes", data["aptitudes"], "linear-gradient(to right,#4c1d95,#4338ca)")
-    comp_html    = _list_section("Compétences", data["competencies"], "linear-gradient(to right,#5b21b6,#7c3aed)")
-
-    nb_acts = len(data["activities"])
-    scope_label = f"Rôle : {esc(role.name)}" if role else "Toutes les activités"
-
-    html = f"""<!DOCTYPE html>
-<html lang="fr">
-<head>
-<meta charset="UTF-8">
-<meta name="viewport" content="width=device-width, initial-scale=1.0">
-<title>Export — {esc(entity.name)}</title>
-<style>
-  :root {{
-    --purple: #5b21b6; --indigo: #4338ca; --violet: #7c3aed;
-    --violet-lt: #ede9fe; --violet-mid: #ddd6fe;
-    --white: #ffffff; --gray: #f5f3ff; --text: #1e1040; --muted: #6b7280;
-  }}
-  * {{ box-sizing: border-box; margin: 0; padding: 0; }}
-  body {{ font-family: 'Segoe UI', system-ui, sans-serif; background: #f0ebff; color: var(--text); }}
-
-  /* ── Hero ── */
-  .hero {{
-    background: linear-gradient(155deg, #12053d 0%, #2e0f6b 35%, #4c1d95 65%, #4338ca 100%);
-    padding: 48px 40px 40px; position: relative; overflow: hidden;
-  }}
-  .hero::before {{
-    content:''; position:absolute; top:-60px; right:-60px; width:260px; height:260px;
-    background:radial-gradient(circle, rgba(216,180,254,.4) 0%, transparent 70%); border-radius:50%;
-  }}
-  .hero-brand {{ display:flex; align-items:center; gap:10px; margin-bottom:20px; }}
-  .hero-logo {{ width:38px;height:38px;background:rgba(255,255,255,.15);border:1.5px solid rgba(255,255,255,.3);
-    border-radius:10px;display:flex;align-items:center;justify-content:center;font-size:18px;color:#e9d5ff;font-weight:900; }}
-  .hero-name {{ font-size:14px;font-weight:800;color:rgba(255,255,255,.8);letter-spacing:2px;text-transform:uppercase; }}
-  .hero-title {{ font-size:30px;font-weight:800;color:#fff;line-height:1.2;margin-bottom:8px; }}
-  .hero-sub {{ font-size:14px;color:rgba(221,214,254,.75); }}
-  .hero-meta {{ display:flex;flex-wrap:wrap;gap:10px;margin-top:18px; }}
-  .meta-pill {{ background:rgba(255,255,255,.1);border:1px solid rgba(196,181,253,.35);border-radius:20px;
-    padding:5px 14px;font-size:12px;color:#e9d5ff;font-weight:600; }}
-  .scope-pill {{ background:rgba(74,222,128,.15);border:1px solid rgba(74,222,128,.4);border-radius:20px;
-    padding:5px 14px;font-size:12px;color:#86efac;font-weight:600; }}
-
-  /* ── Contenu ── */
-  .container {{ max-width:900px;margin:0 auto;padding:36px 24px; }}
-
-  .section-title {{
-    font-size:18px;font-weight:800;color:var(--purple);margin:32px 0 14px;
-    display:flex;align-items:center;gap:10px;
-  }}
-  .section-title::after {{ content:'';flex:1;height:2px;background:linear-gradient(to right,var(--violet-mid),transparent); }}
-
-  /* ── Carte rôle ── */
-  .role-card {{
-    background:#fff;border-radius:16px;border:1px solid var(--violet-mid);
-    border-left:4px solid var(--purple);
-    box-shadow:0 4px 16px rgba(109,40,217,.08);margin-bottom:28px;overflow:hidden;
-  }}
-  .role-header {{
-    display:flex;align-items:center;gap:14px;
-    padding:16px 24px;
-    background:linear-gradient(to right,var(--gray),#fff);
-  }}
-  .role-icon {{ font-size:26px; }}
-  .role-name {{ font-size:20px;font-weight:800;color:var(--text); }}
-  .role-label {{ font-size:11px;font-weight:600;text-transform:uppercase;letter-spacing:.8px;color:var(--muted);margin-top:2px; }}
-  .role-mission {{ padding:14px 24px 18px; }}
-  .field-label {{ font-size:11px;font-weight:700;text-transform:uppercase;letter-spacing:.8px;color:var(--muted);display:block;margin-bottom:6px; }}
-  .role-mission p {{ font-size:13.5px;color:var(--text);line-height:1.65; }}
-
-  /* ── Liste activités ── */
-  .act-list {{
-    list-style:none;display:flex;flex-direction:column;gap:6px;
-    background:#fff;border-radius:14px;border:1px solid var(--violet-mid);
-    padding:14px;box-shadow:0 2px 10px rgba(109,40,217,.06);
-  }}
-  .act-list li {{
-    display:flex;align-items:center;gap:12px;
-    padding:9px 12px;border-radius:10px;
-    border-left:3px solid var(--purple);
-    background:var(--gray);
-    transition:transform .15s;
-  }}
-  .act-list li:hover {{ transform:translateX(2px); }}
-  .act-num {{
-    width:28px;height:28px;border-radius:8px;background:var(--purple);
-    color:#fff;font-size:11px;font-weight:800;
-    display:flex;align-items:center;justify-content:center;flex-shrink:0;
-  }}
-  .act-name {{ font-size:13.5px;font-weight:600;color:var(--text); }}
-
-  /* ── Tables compétences ── */
-  .table-wrap {{ overflow-x:auto;border-radius:12px;border:1px solid var(--violet-mid);
-    box-shadow:0 2px 10px rgba(109,40,217,.06); }}
-  table {{ width:100%;border-collapse:collapse;font-size:13px; }}
-  thead th {{ color:#fff;padding:10px 14px;text-align:left;font-weight:700;font-size:12px; }}
-  tbody tr:nth-child(even) {{ background:var(--gray); }}
-  tbody tr:nth-child(odd) {{ background:#fff; }}
-  tbody td {{ padding:9px 14px;border-top:1px solid var(--violet-lt);vertical-align:top;line-height:1.55; }}
-  .act-ref {{ color:var(--muted);font-size:12px;width:30%;font-style:italic; }}
-  .no-items {{ color:var(--muted);font-style:italic;padding:12px 0; }}
-
-  /* ── Footer ── */
-  .footer {{ text-align:center;padding:32px;color:var(--muted);font-size:12px; }}
-  .footer strong {{ color:var(--purple); }}
-
-  @media print {{
-    body {{ background:#fff; }}
-    .hero {{ -webkit-print-color-adjust:exact;print-color-adjust:exact; }}
-  }}
-</style>
-</head>
-<body>
-
-<div class="hero">
-  <div class="hero-brand">
-    <div class="hero-logo">◉</div>
-    <span class="hero-name">OPTIQ</span>
-  </div>
-  <h1 class="hero-title">{esc(entity.name)}</h1>
-  <p class="hero-sub">Export des données métier</p>
-  <div class="hero-meta">
-    <span class="meta-pill">📋 {nb_acts} activité{"s" if nb_acts != 1 else ""}</span>
-    <span class="meta-pill">🗓 Exporté le {now}</span>
-    <span class="scope-pill">🎯 {scope_label}</span>
-  </div>
-</div>
-
-<div class="container">
-
-  {role_section}
-
-  <h2 class="section-title">Activités</h2>
-  <ul class="act-list">{acts_items}</ul>
-
-  <h2 class="section-title">Savoirs</h2>
-  {savoirs_html}
-
-  <h2 class="section-title">Savoir-faires</h2>
-  {sf_html}
-
-  <h2 class="section-title">HSC / Aptitudes</h2>
-  {apt_html}
-
-  <h2 class="section-title">Compétences</h2>
-  {comp_html}
-
-</div>
-
-<div class="footer">
-  Généré par <strong>OPTIQ</strong> · {now}
-</div>
-
-</body>
-</html>"""
-
-    return html
+    """
+    Retourne un générateur de fragments HTML : le template est rendu au fil
+    de la lecture des générateurs iter_*, le téléchargement démarre donc
+    immédiatement et la mémoire reste constante quelle que soit la taille.
+    """
+    sections = [
+        ("Savoirs", "savoirs", "linear-gradient(to right,#4c1d95,#4338ca)"),
+        ("Savoir-faires", "savoir_faires", "linear-gradient(to right,#5b21b6,#7c3aed)"),
+        ("HSC / Aptitudes", "aptitudes", "linear-gradient(to right,#4c1d95,#4338ca)"),
+        ("Compétences", "competencies", "linear-gradient(to right,#5b21b6,#7c3aed)"),
+    ]
+    return stream_template(
+        "export_entity.html",
+        entity=data["entity"],
+        role=data.get("role"),
+        mission=data.get("mission_generale") or "",
+        counts=data["counts"],
+        now=datetime.now().strftime("%d/%m/%Y à %H:%M"),
+        accents=["#6d28d9", "#4338ca", "#7c3aed", "#5b21b6"],
+        activity_names=iter_activity_names(data),
+        sections=[
+            {"title": title, "count": data["counts"][key], "color": color,
+             "rows": iter_items(data, key)}
+            for title, key, color in sections
+        ],
+    )
 
 
 # ──────────────────────────────────────────────
@@ -530,16 +424,17 @@ def export_entity():
     role_suffix = f"_{role_label.replace(' ', '_')}" if role_label else ""
 
     if fmt == "html":
-        html_content = _make_html(data, role_label)
+        html_stream = _make_html(data, role_label)
         filename = f"export_{entity_name}{role_suffix}_{date_str}.html"
         return Response(
-            html_content,
+            html_stream,
             mimetype="text/html",
             headers={"Content-Disposition": f'attachment; filename="{filename}"'}
         )
     else:
         buf = _make_excel(data, role_label)
         filename = f"export_{entity_name}{role_suffix}_{date_str}.xlsx"
+        # send_file diffuse le fichier temporaire par blocs et le ferme en fin de réponse
         return send_file(
             buf, mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
             as_attachment=True, download_name=filename
@@ -8,25 +8,13 @@ gestion_rh_bp = Blueprint('gestion_rh', __name__, url_prefix='/gestion_rh')
 
 
 def get_active_entity_id():
-    """Récupère l'ID de l'entité active depuis la session."""
-    return session.get('active_entity_id')
-
-
-def ensure_manager_id_column():
-    """Ajoute la colonne manager_id à user_roles si elle n'existe pas."""
-    try:
-        db.session.execute(text(
-            "ALTER TABLE user_roles ADD COLUMN manager_id INTEGER REFERENCES users(id)"
-        ))
-        db.session.commit()
-    except Exception:
-        db.session.rollback()
+    """Récupère l'ID de l'entité active (propriété vérifiée, mémoïsée par requête)."""
+    return Entity.get_active_id()
 
 
 @gestion_rh_bp.route('/')
 def gestion_rh_home():
     try:
-        ensure_manager_id_column()
         active_entity_id = get_active_entity_id()
 
         # Récupérer les paramètres entreprise
@@ -5,16 +5,18 @@
 import io
 import os
 import json
+import time
 from difflib import SequenceMatcher
 
-import openpyxl
 from flask import Blueprint, request, jsonify, session
 from sqlalchemy import func
 
 from Code.extensions import db
+from Code.metrics import record_import
+from Code.routes.propose_common import chat_completion
 from Code.models.models import (
     Activities, Task, Tool, Role, Competency,
-    Entity, activity_roles, task_roles,
+    Entity, activity_roles, task_roles, audit_bulk,
 )
 
 import_full_bp = Blueprint('import_full', __name__, url_prefix='/api/import-full')
@@ -29,6 +31,7 @@ def _parse_excel_bytes(data: bytes) -> list:
     Lit le fichier Excel et retourne une liste de groupes par activité.
     Gère les merged cells en propagant les valeurs manquantes.
     """
+    import openpyxl
     wb = openpyxl.load_workbook(io.BytesIO(data), data_only=True)
 
     # Chercher la feuille principale
@@ -304,7 +307,8 @@ def _try_openai_enrich(unmatched_groups: list, db_activities: list) -> dict | No
         }
         client = OpenAI()
         model = os.getenv('OPENAI_CHATBOT_MODEL', 'gpt-4o-mini')
-        resp = client.chat.completions.create(
+        resp = chat_completion(
+            client,
             model=model,
             messages=[
                 {'role': 'system', 'content': ENRICH_PROMPT},
@@ -464,91 +468,96 @@ def inject_full():
         'competencies_created': 0,
         'activities_updated': 0,
     }
+    t0 = time.perf_counter()
 
     try:
-        for group in groups:
-            activity_id = group.get('activity_id')
-            if not activity_id:
-                continue
-
-            activity = Activities.query.get(activity_id)
-            if not activity or activity.entity_id != entity_id:
-                continue
-
-            guarantor_name = (group.get('guarantor') or '').strip()
-
-            # ── Garant ───────────────────────────────────────────────────
-            if guarantor_name:
-                role = _get_or_create_role(guarantor_name, entity_id, stats)
-                _link_role_to_activity(role, activity, 'garant')
-
-            # ── Tâches ───────────────────────────────────────────────────
-            max_order = (
-                db.session.query(func.max(Task.order))
-                .filter_by(activity_id=activity_id)
-                .scalar() or 0
-            )
-
-            for i, task_in in enumerate(group.get('tasks', [])):
-                task_name = (task_in.get('name') or '').strip()
-                if not task_name:
+        # Un seul événement récapitulatif au lieu d'un par tâche / outil / rôle
+        with audit_bulk("Import complet", entity_id=entity_id):
+            for group in groups:
+                activity_id = group.get('activity_id')
+                if not activity_id:
                     continue
 
-                # Éviter les doublons : vérifier si la tâche existe déjà pour cette activité
-                existing_task = Task.query.filter(
-                    Task.activity_id == activity_id,
-                    func.lower(Task.name) == task_name.lower()
-                ).first()
-                if existing_task:
+                activity = Activities.query.get(activity_id)
+                if not activity or activity.entity_id != entity_id:
                     continue
 
-                task = Task(
-                    name=task_name,
-                    description=task_in.get('commentary', '') or '',
-                    order=max_order + i + 1,
-                    activity_id=activity_id,
+                guarantor_name = (group.get('guarantor') or '').strip()
+
+                # ── Garant ───────────────────────────────────────────────────
+                if guarantor_name:
+                    role = _get_or_create_role(guarantor_name, entity_id, stats)
+                    _link_role_to_activity(role, activity, 'garant')
+
+                # ── Tâches ───────────────────────────────────────────────────
+                max_order = (
+                    db.session.query(func.max(Task.order))
+                    .filter_by(activity_id=activity_id)
+                    .scalar() or 0
                 )
-                db.session.add(task)
-                db.session.flush()
-                stats['tasks_created'] += 1
-
-                # Outils
-                for tool_name in (task_in.get('tools') or []):
-                    tool_name = tool_name.strip()
-                    if not tool_name:
-                        continue
-                    tool = _get_or_create_tool(tool_name, entity_id, stats)
-                    if tool not in task.tools:
-                        task.tools.append(tool)
-
-                # Doer
-                doer_name = (task_in.get('doer') or '').strip()
-                if doer_name:
-                    doer_role = _get_or_create_role(doer_name, entity_id, stats)
-                    _link_role_to_task(doer_role, task, 'executant')
-
-                # Approbateur
-                approver_name = (task_in.get('approver') or '').strip()
-                if approver_name:
-                    approver_role = _get_or_create_role(approver_name, entity_id, stats)
-                    _link_role_to_task(approver_role, task, 'approbateur')
-
-                # Compétences
-                for skill in (task_in.get('skills') or []):
-                    skill = skill.strip()
-                    if not skill:
+
+                for i, task_in in enumerate(group.get('tasks', [])):
+                    task_name = (task_in.get('name') or '').strip()
+                    if not task_name:
                         continue
-                    exists = Competency.query.filter_by(
-                        activity_id=activity_id,
-                        description=skill,
+
+                    # Éviter les doublons : vérifier si la tâche existe déjà pour cette activité
+                    existing_task = Task.query.filter(
+                        Task.activity_id == activity_id,
+                        func.lower(Task.name) == task_name.lower()
                     ).first()
-                    if not exists:
-                        db.session.add(Competency(activity_id=activity_id, description=skill))
-                        stats['competencies_created'] += 1
+                    if existing_task:
+                        continue
 
-            stats['activities_updated'] += 1
+                    task = Task(
+                        name=task_name,
+                        description=task_in.get('commentary', '') or '',
+                        order=max_order + i + 1,
+                        activity_id=activity_id,
+                    )
+                    db.session.add(task)
+                    db.session.flush()
+                    stats['tasks_created'] += 1
+
+                    # Outils
+                    for tool_name in (task_in.get('tools') or []):
+                        tool_name = tool_name.strip()
+                        if not tool_name:
+                            continue
+                        tool = _get_or_create_tool(tool_name, entity_id, stats)
+                        if tool not in task.tools:
+                            task.tools.append(tool)
+
+                    # Doer
+                    doer_name = (task_in.get('doer') or '').strip()
+                    if doer_name:
+                        doer_role = _get_or_create_role(doer_name, entity_id, stats)
+                        _link_role_to_task(doer_role, task, 'executant')
+
+                    # Approbateur
+                    approver_name = (task_in.get('approver') or '').strip()
+                    if approver_name:
+                        approver_role = _get_or_create_role(approver_name, entity_id, stats)
+                        _link_role_to_task(approver_role, task, 'approbateur')
+
+                    # Compétences
+                    for skill in (task_in.get('skills') or []):
+                        skill = skill.strip()
+                        if not skill:
+                            continue
+                        exists = Competency.query.filter_by(
+                            activity_id=activity_id,
+                            description=skill,
+                        ).first()
+                        if not exists:
+                            db.session.add(Competency(activity_id=activity_id, description=skill))
+                            stats['competencies_created'] += 1
+
+                stats['activities_updated'] += 1
 
         db.session.commit()
+        rows = sum(len(g.get('tasks') or []) for g in groups)
+        record_import('full', rows, time.perf_counter() - t0)
         return jsonify({'status': 'ok', 'stats': stats}), 201
 
     except Exception as e:
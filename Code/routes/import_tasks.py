@@ -4,12 +4,14 @@
 import csv
 import io
 import json
+import time
 from collections import defaultdict
 
 from flask import Blueprint, request, jsonify
 
 from Code.extensions import db
-from Code.models.models import Activities, Task, Tool, Data, Link
+from Code.metrics import record_import
+from Code.models.models import Activities, Task, Tool, Data, Link, audit_bulk
 
 import_tasks_bp = Blueprint('import_tasks', __name__, url_prefix='/api/import-tasks')
 
@@ -211,108 +213,112 @@ def inject_import():
 
     entity_id = first_act.entity_id
     created   = []
+    t0        = time.perf_counter()
 
     try:
-        tasks_by_activity = defaultdict(list)
-        for r in valid:
-            tasks_by_activity[r['activity_id']].append(r)
-
-        for activity_id, act_rows in tasks_by_activity.items():
-            max_order = (
-                db.session.query(db.func.max(Task.order))
-                .filter_by(activity_id=activity_id)
-                .scalar() or 0
-            )
-
-            for i, row in enumerate(act_rows):
-                # ── Créer la tâche ────────────────────────────────────
-                task = Task(
-                    name=row['nom_tache'],
-                    description=row.get('description', ''),
-                    order=max_order + i + 1,
-                    activity_id=activity_id,
+        # Un seul événement « Import : N tâches créées » au lieu d'un par ligne
+        with audit_bulk("Import de tâches", entity_id=entity_id):
+            tasks_by_activity = defaultdict(list)
+            for r in valid:
+                tasks_by_activity[r['activity_id']].append(r)
+
+            for activity_id, act_rows in tasks_by_activity.items():
+                max_order = (
+                    db.session.query(db.func.max(Task.order))
+                    .filter_by(activity_id=activity_id)
+                    .scalar() or 0
                 )
-                db.session.add(task)
-                db.session.flush()
-
-                # ── Outils ───────────────────────────────────────────
-                for tool_name in (row.get('outils') or []):
-                    tool = Tool.query.filter(
-                        Tool.entity_id == entity_id,
-                        db.func.lower(Tool.name) == tool_name.lower(),
-                    ).first()
-                    if not tool:
-                        tool = Tool(name=tool_name, entity_id=entity_id)
-                        db.session.add(tool)
-                        db.session.flush()
-                    if tool not in task.tools:
-                        task.tools.append(tool)
-
-                # ── Connexion entrante ────────────────────────────────
-                if row.get('entree'):
-                    e = row['entree']
-                    data_obj = Data.query.filter(
-                        Data.entity_id == entity_id,
-                        db.func.lower(Data.name) == e['nom'].lower(),
-                    ).first()
-                    if not data_obj:
-                        data_obj = Data(
-                            entity_id=entity_id,
-                            name=e['nom'],
-                            type=e['type'],
-                        )
-                        db.session.add(data_obj)
-                        db.session.flush()
-                    if not Link.query.filter_by(
-                        entity_id=entity_id,
-                        target_activity_id=activity_id,
-                        source_data_id=data_obj.id,
-                    ).first():
-                        db.session.add(Link(
+
+                for i, row in enumerate(act_rows):
+                    # ── Créer la tâche ────────────────────────────────────
+                    task = Task(
+                        name=row['nom_tache'],
+                        description=row.get('description', ''),
+                        order=max_order + i + 1,
+                        activity_id=activity_id,
+                    )
+                    db.session.add(task)
+                    db.session.flush()
+
+                    # ── Outils ───────────────────────────────────────────
+                    for tool_name in (row.get('outils') or []):
+                        tool = Tool.query.filter(
+                            Tool.entity_id == entity_id,
+                            db.func.lower(Tool.name) == tool_name.lower(),
+                        ).first()
+                        if not tool:
+                            tool = Tool(name=tool_name, entity_id=entity_id)
+                            db.session.add(tool)
+                            db.session.flush()
+                        if tool not in task.tools:
+                            task.tools.append(tool)
+
+                    # ── Connexion entrante ────────────────────────────────
+                    if row.get('entree'):
+                        e = row['entree']
+                        data_obj = Data.query.filter(
+                            Data.entity_id == entity_id,
+                            db.func.lower(Data.name) == e['nom'].lower(),
+                        ).first()
+                        if not data_obj:
+                            data_obj = Data(
+                                entity_id=entity_id,
+                                name=e['nom'],
+                                type=e['type'],
+                            )
+                            db.session.add(data_obj)
+                            db.session.flush()
+                        if not Link.query.filter_by(
                             entity_id=entity_id,
-                            source_data_id=data_obj.id,
                             target_activity_id=activity_id,
-                            type=e['type'],
-                            description=e['nom'],
-                        ))
-                        db.session.flush()
-
-                # ── Connexion sortante ────────────────────────────────
-                if row.get('sortie'):
-                    s = row['sortie']
-                    data_obj = Data.query.filter(
-                        Data.entity_id == entity_id,
-                        db.func.lower(Data.name) == s['nom'].lower(),
-                    ).first()
-                    if not data_obj:
-                        data_obj = Data(
-                            entity_id=entity_id,
-                            name=s['nom'],
-                            type=s['type'],
-                        )
-                        db.session.add(data_obj)
-                        db.session.flush()
-                    if not Link.query.filter_by(
-                        entity_id=entity_id,
-                        source_activity_id=activity_id,
-                        source_data_id=data_obj.id,
-                    ).first():
-                        db.session.add(Link(
+                            source_data_id=data_obj.id,
+                        ).first():
+                            db.session.add(Link(
+                                entity_id=entity_id,
+                                source_data_id=data_obj.id,
+                                target_activity_id=activity_id,
+                                type=e['type'],
+                                description=e['nom'],
+                            ))
+                            db.session.flush()
+
+                    # ── Connexion sortante ────────────────────────────────
+                    if row.get('sortie'):
+                        s = row['sortie']
+                        data_obj = Data.query.filter(
+                            Data.entity_id == entity_id,
+                            db.func.lower(Data.name) == s['nom'].lower(),
+                        ).first()
+                        if not data_obj:
+                            data_obj = Data(
+                                entity_id=entity_id,
+                                name=s['nom'],
+                                type=s['type'],
+                            )
+                            db.session.add(data_obj)
+                            db.session.flush()
+                        if not Link.query.filter_by(
                             entity_id=entity_id,
                             source_activity_id=activity_id,
                             source_data_id=data_obj.id,
-                            target_activity_id=s.get('activity_id_cible'),
-                            type=s['type'],
-                            description=s['nom'],
-                        ))
-                        db.session.flush()
-
-                created.append({
-                    'activite': row['activite'],
-                    'tache':    row['nom_tache'],
-                })
+                        ).first():
+                            db.session.add(Link(
+                                entity_id=entity_id,
+                                source_activity_id=activity_id,
+                                source_data_id=data_obj.id,
+                                target_activity_id=s.get('activity_id_cible'),
+                                type=s['type'],
+                                description=s['nom'],
+                            ))
+                            db.session.flush()
+
+                    created.append({
+                        'activite': row['activite'],
+                        'tache':    row['nom_tache'],
+                    })
 
         db.session.commit()
+        record_import('tasks', len(valid), time.perf_counter() - t0)
         return jsonify({'created': created, 'count': len(created)}), 201
 
     except Exception as e:
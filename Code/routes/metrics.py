@@ -0,0 +1,39 @@
+# Code/routes/metrics.py
+"""
+Endpoint de collecte Prometheus (séries : voir Code/metrics.py).
+
+    GET /metrics      format texte 0.0.4 ; 404 si METRICS=0.
+
+Accès : avec METRICS_TOKEN, « Authorization: Bearer <METRICS_TOKEN> » exigé
+de tout client ; sans jeton, seuls les clients locaux (REMOTE_ADDR de
+boucle locale, X-Forwarded-For ignoré) sont servis, les autres reçoivent 403.
+"""
+import hmac
+import ipaddress
+
+from flask import Blueprint, Response, current_app, request
+
+from Code.metrics import CONTENT_TYPE, render
+
+metrics_bp = Blueprint("metrics", __name__)
+
+
+def _is_loopback(addr):
+    try:
+        return ipaddress.ip_address(addr or "").is_loopback
+    except ValueError:
+        return False
+
+
+@metrics_bp.route("/metrics", methods=["GET"])
+def metrics():
+    if not current_app.config.get("METRICS"):
+        return Response("metrics disabled\n", status=404, content_type="text/plain")
+    token = current_app.config.get("METRICS_TOKEN")
+    if token:
+        if not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+            return Response("unauthorized\n", status=401, content_type="text/plain")
+    elif not _is_loopback(request.remote_addr):
+        return Response("forbidden: set METRICS_TOKEN for remote scraping\n", status=403,
+                        content_type="text/plain")
+    return Response(render(), content_type=CONTENT_TYPE)
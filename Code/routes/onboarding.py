@@ -1,6 +1,5 @@
 from flask import Blueprint, request, jsonify
 import os
-import openai
 from Code.extensions import db
 from Code.models.models import Role
 
@@ -41,6 +40,7 @@ Assurez-vous que le plan se centre uniquement sur les HSC mentionnées dans la l
 Répondez sous forme de texte structuré avec des titres clairs pour chaque partie.
 """
 
+    import openai
     openai.api_key = os.getenv("OPENAI_API_KEY")
     if not openai.api_key:
         return jsonify({"error": "Clé OpenAI manquante (OPENAI_API_KEY)."}), 500
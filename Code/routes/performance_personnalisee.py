@@ -4,6 +4,7 @@ from datetime import datetime
 from sqlalchemy import text, or_
 from Code.extensions import db
 from Code.models.models import PerformancePersonnalisee
+from Code.retention import expand_history
 
 performance_perso_bp = Blueprint("performance_perso", __name__, url_prefix="/performance_perso")
 
@@ -30,37 +31,17 @@ def to_dict(p: PerformancePersonnalisee):
         "deleted": bool(getattr(p, "deleted", False)),
     }
 
-# ---------- Schéma historique (DDL idempotente) ----------
-def ensure_history_schema():
-    """
-    Crée la table d'historique si elle n'existe pas.
-    """
-    db.session.execute(text("""
-        CREATE TABLE IF NOT EXISTS performance_personnalisee_historique (
-          id INTEGER PRIMARY KEY AUTOINCREMENT,
-          performance_id INTEGER,
-          user_id INTEGER,
-          activity_id INTEGER,
-          content TEXT,
-          -- compat ancien schéma
-          contenu TEXT,
-          validation_status TEXT,
-          validation_date TEXT,
-          event TEXT,
-          changed_at TEXT DEFAULT (datetime('now'))
-        )
-    """))
-
 def insert_history_snapshot_session(perf: PerformancePersonnalisee, *, content: str, status: str, vdate: str, event: str):
     """
     Insert d'historique dans la même transaction.
+    La table est créée par migration ; changed_at prend sa valeur par défaut (CURRENT_TIMESTAMP).
     """
     db.session.execute(
         text("""
             INSERT INTO performance_personnalisee_historique
-              (performance_id, user_id, activity_id, content, validation_status, validation_date, event, changed_at)
+              (performance_id, user_id, activity_id, content, validation_status, validation_date, event)
             VALUES
-              (:performance_id, :user_id, :activity_id, :content, :validation_status, :validation_date, :event, datetime('now'))
+              (:performance_id, :user_id, :activity_id, :content, :validation_status, :validation_date, :event)
         """),
         {
             "performance_id": perf.id,
@@ -113,8 +94,6 @@ def create_perf():
     if not content:
         return jsonify({"ok": False, "error": "content requis"}), 400
 
-    ensure_history_schema()
-
     p = PerformancePersonnalisee(
         user_id=user_id,
         activity_id=activity_id,
@@ -136,8 +115,6 @@ def create_perf():
 @performance_perso_bp.route("/update/<int:perf_id>", methods=["PUT"])
 def update_perf(perf_id):
     try:
-        ensure_history_schema()
-
         p = PerformancePersonnalisee.query.get_or_404(perf_id)
         data = request.get_json(force=True) or {}
 
@@ -188,7 +165,6 @@ def update_perf(perf_id):
 
 @performance_perso_bp.route("/delete/<int:perf_id>", methods=["DELETE"])
 def delete_perf(perf_id):
-    ensure_history_schema()
     p = PerformancePersonnalisee.query.get_or_404(perf_id)
 
     insert_history_snapshot_session(
@@ -208,13 +184,15 @@ def delete_perf(perf_id):
 @performance_perso_bp.route("/history", methods=["GET"])
 def history_perf():
     """Historique de toutes les perfs d'un couple (user_id, activity_id)."""
-    ensure_history_schema()
     user_id = request.args.get("user_id", type=int)
     activity_id = request.args.get("activity_id", type=int)
 
     res = db.session.execute(text("""
-        SELECT performance_id,
+        SELECT id,
+               performance_id,
                COALESCE(content, contenu) AS content,
+               content_delta,
+               delta_base_id,
                validation_status,
                validation_date,
                event,
@@ -224,17 +202,19 @@ def history_perf():
         ORDER BY changed_at DESC, id DESC
     """), {"uid": user_id, "aid": activity_id})
 
-    rows = [dict(row) for row in res.mappings()]
+    # Les instantanés compactés (deltas) sont reconstruits à la lecture
+    rows = expand_history([dict(row) for row in res.mappings()])
     return jsonify({"history": rows})
 
 @performance_perso_bp.route("/history/<int:perf_id>", methods=["GET"])
 def history_by_perf(perf_id: int):
     """Historique détaillé pour UNE performance."""
-    ensure_history_schema()
-
     res = db.session.execute(text("""
-        SELECT performance_id,
+        SELECT id,
+               performance_id,
                COALESCE(content, contenu) AS content,
+               content_delta,
+               delta_base_id,
                validation_status,
                validation_date,
                event,
@@ -244,12 +224,12 @@ def history_by_perf(perf_id: int):
         ORDER BY changed_at DESC, id DESC
     """), {"pid": perf_id})
 
-    rows = [dict(row) for row in res.mappings()]
+    # Les instantanés compactés (deltas) sont reconstruits à la lecture
+    rows = expand_history([dict(row) for row in res.mappings()])
     return jsonify({"performance_id": perf_id, "history": rows})
 
 @performance_perso_bp.route("/history/<int:perf_id>", methods=["DELETE"])
 def delete_history_by_perf(perf_id: int):
-    ensure_history_schema()
     db.session.execute(
         text("DELETE FROM performance_personnalisee_historique WHERE performance_id = :pid"),
         {"pid": perf_id}
@@ -0,0 +1,373 @@
+# Code/routes/process_graph.py
+"""
+Analyse du graphe de processus d'une entité : ordre topologique, chemin
+critique, marge (slack) par activité et détection des boucles.
+
+Nœuds : activités (poids = durée + délai, en minutes) et données (poids nul,
+simples points de passage entre activités). Arcs : table links.
+
+Le graphe est chargé en trois requêtes (activités, durées des tâches, liens)
+puis stocké en listes d'adjacence compactes (CSR : offsets + targets) pour
+que l'analyse reste linéaire en nœuds + arcs.
+
+Les boucles (composantes fortement connexes de plus d'un nœud, ou nœud
+bouclant sur lui-même) sont condensées en un super-nœud dont le poids est la
+somme des poids de ses membres : une itération de la boucle est comptée.
+"""
+import time
+from array import array
+
+from flask import Blueprint, request, jsonify
+from sqlalchemy import func
+
+from Code.extensions import db
+from Code.models.models import Activities, Data, Entity, Link, Task
+
+process_graph_bp = Blueprint("process_graph", __name__, url_prefix="/process-graph")
+
+ACTIVITY = "activity"
+DATA = "data"
+_EPS = 1e-9
+
+
+# ============================================================
+# Structure
+# ============================================================
+class ProcessGraph:
+    """Graphe orienté en tableaux : nœud i ↔ (kinds[i], ids[i])."""
+
+    __slots__ = ("kinds", "ids", "names", "durations", "delays", "offsets", "targets", "self_loops")
+
+    def __init__(self, kinds, ids, names, durations, delays, edges):
+        n = len(ids)
+        self.kinds = kinds
+        self.ids = ids
+        self.names = names
+        self.durations = durations
+        self.delays = delays
+        self.self_loops = set()
+
+        # CSR : les successeurs de i sont targets[offsets[i]:offsets[i + 1]]
+        degree = [0] * (n + 1)
+        kept = []
+        for u, v in edges:
+            if u == v:
+                self.self_loops.add(u)
+                continue
+            degree[u + 1] += 1
+            kept.append((u, v))
+        for i in range(n):
+            degree[i + 1] += degree[i]
+        offsets = array("l", degree)
+        fill = list(degree[:n])
+        targets = array("l", bytes(len(kept) * array("l").itemsize))
+        for u, v in kept:
+            targets[fill[u]] = v
+            fill[u] += 1
+        self.offsets = offsets
+        self.targets = targets
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def edge_count(self):
+        return len(self.targets)
+
+    def weight(self, i):
+        return self.durations[i] + self.delays[i]
+
+
+def build_graph(activities, data, links):
+    """
+    activities : itérable de (id, name, duration_minutes, delay_minutes)
+    data       : itérable de (id, name)
+    links      : itérable de (source_activity_id, source_data_id,
+                              target_activity_id, target_data_id)
+
+    Un lien activité → activité portant aussi une donnée (import VSDX) reste
+    un arc direct ; activité → donnée → activité passe par le nœud donnée.
+    Les liens vers des nœuds hors entité sont ignorés.
+    """
+    kinds, ids, names, durations, delays = [], [], [], [], []
+    act_index, data_index = {}, {}
+
+    for aid, name, duration, delay in activities:
+        act_index[aid] = len(ids)
+        kinds.append(ACTIVITY)
+        ids.append(aid)
+        names.append(name)
+        durations.append(float(duration or 0))
+        delays.append(float(delay or 0))
+
+    for did, name in data:
+        data_index[did] = len(ids)
+        kinds.append(DATA)
+        ids.append(did)
+        names.append(name)
+        durations.append(0.0)
+        delays.append(0.0)
+
+    edges = []
+    for src_act, src_data, tgt_act, tgt_data in links:
+        if src_act is not None:
+            u = act_index.get(src_act)
+        else:
+            u = data_index.get(src_data)
+        if tgt_act is not None:
+            v = act_index.get(tgt_act)
+        else:
+            v = data_index.get(tgt_data)
+        if u is not None and v is not None:
+            edges.append((u, v))
+
+    return ProcessGraph(kinds, ids, names, durations, delays, edges)
+
+
+def load_entity_graph(entity_id):
+    """Charge le graphe d'une entité en trois requêtes, sans objets ORM."""
+    task_totals = dict(
+        db.session.query(Task.activity_id, func.sum(Task.duration_minutes))
+        .join(Activities, Activities.id == Task.activity_id)
+        .filter(Activities.entity_id == entity_id)
+        .group_by(Task.activity_id)
+        .all()
+    )
+    # Sans durée saisie sur l'activité, on retombe sur la somme de ses tâches
+    activities = [
+        (aid, name, duration or task_totals.get(aid) or 0, delay)
+        for aid, name, duration, delay in db.session.query(
+            Activities.id, Activities.name, Activities.duration_minutes, Activities.delay_minutes
+        ).filter(Activities.entity_id == entity_id).order_by(Activities.id)
+    ]
+    data = db.session.query(Data.id, Data.name).filter(Data.entity_id == entity_id).order_by(Data.id).all()
+    links = db.session.query(
+        Link.source_activity_id, Link.source_data_id, Link.target_activity_id, Link.target_data_id
+    ).filter(Link.entity_id == entity_id).all()
+    return build_graph(activities, data, links)
+
+
+# ============================================================
+# Algorithmes
+# ============================================================
+def strongly_connected_components(graph):
+    """
+    Tarjan itératif. Retourne (comp, count) où comp[i] est le numéro de
+    composante du nœud i, numéroté dans l'ordre topologique du graphe condensé
+    (tout arc u → v entre composantes vérifie comp[u] < comp[v]).
+    """
+    n = len(graph)
+    offsets, targets = graph.offsets, graph.targets
+    index = [-1] * n
+    low = [0] * n
+    on_stack = [False] * n
+    comp = [-1] * n
+    stack = []
+    counter = 0
+    found = 0
+
+    for root in range(n):
+        if index[root] != -1:
+            continue
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = True
+        work = [[root, offsets[root]]]
+        while work:
+            frame = work[-1]
+            v, i = frame
+            if i < offsets[v + 1]:
+                frame[1] = i + 1
+                w = targets[i]
+                if index[w] == -1:
+                    index[w] = low[w] = counter
+                    counter += 1
+                    stack.append(w)
+                    on_stack[w] = True
+                    work.append([w, offsets[w]])
+                elif on_stack[w] and index[w] < low[v]:
+                    low[v] = index[w]
+                continue
+            work.pop()
+            if work:
+                u = work[-1][0]
+                if low[v] < low[u]:
+                    low[u] = low[v]
+            if low[v] == index[v]:
+                while True:
+                    w = stack.pop()
+                    on_stack[w] = False
+                    comp[w] = found
+                    if w == v:
+                        break
+                found += 1
+
+    # Tarjan émet les composantes puits d'abord : on inverse la numérotation
+    last = found - 1
+    return [last - c for c in comp], found
+
+
+def analyze(graph):
+    """
+    Calcule sur le graphe condensé :
+      - earliest/latest start/finish (minutes depuis le début du processus),
+      - slack = latest_start - earliest_start,
+      - lead time (durée du chemin le plus long) et chemin critique.
+    """
+    n = len(graph)
+    comp, count = strongly_connected_components(graph)
+    offsets, targets = graph.offsets, graph.targets
+
+    members = [[] for _ in range(count)]
+    weight = [0.0] * count
+    for i in range(n):
+        c = comp[i]
+        members[c].append(i)
+        weight[c] += graph.weight(i)
+
+    # Arcs du graphe condensé (CSR), doublons compris : sans effet sur le résultat
+    succ = [[] for _ in range(count)]
+    for u in range(n):
+        cu = comp[u]
+        for k in range(offsets[u], offsets[u + 1]):
+            cv = comp[targets[k]]
+            if cv != cu:
+                succ[cu].append(cv)
+
+    # Passe avant : les composantes sont déjà dans l'ordre topologique
+    es = [0.0] * count
+    pred = [-1] * count
+    for c in range(count):
+        ef = es[c] + weight[c]
+        for d in succ[c]:
+            if ef > es[d] + _EPS or (pred[d] == -1 and ef >= es[d]):
+                es[d] = ef
+                pred[d] = c
+    ef = [es[c] + weight[c] for c in range(count)]
+    lead_time = max(ef) if count else 0.0
+
+    # Passe arrière
+    lf = [lead_time] * count
+    for c in range(count - 1, -1, -1):
+        for d in succ[c]:
+            ls_d = lf[d] - weight[d]
+            if ls_d < lf[c]:
+                lf[c] = ls_d
+    ls = [lf[c] - weight[c] for c in range(count)]
+
+    # Chemin critique : on remonte depuis la composante qui termine le plus tard
+    path = []
+    if count:
+        c = max(range(count), key=lambda x: (ef[x], -x))
+        while c != -1:
+            path.append(c)
+            c = pred[c]
+        path.reverse()
+
+    cycles = [
+        sorted(m) for c, m in enumerate(members)
+        if len(m) > 1 or (len(m) == 1 and m[0] in graph.self_loops)
+    ]
+
+    return {
+        "comp": comp,
+        "members": members,
+        "weight": weight,
+        "es": es, "ef": ef, "ls": ls, "lf": lf,
+        "lead_time": lead_time,
+        "critical_components": path,
+        "cycles": cycles,
+    }
+
+
+def _r(x):
+    return round(x, 2)
+
+
+def graph_report(graph, result, bottlenecks=5, detail=True):
+    """
+    Mise en forme JSON : seules les activités sont listées (les données ont un
+    poids nul). detail=False omet la liste par activité, la partie la plus
+    coûteuse sur les grandes cartographies.
+    """
+    comp = result["comp"]
+    members = result["members"]
+    is_activity = [kind == ACTIVITY for kind in graph.kinds]
+    order = sorted((i for i in range(len(graph)) if is_activity[i]), key=lambda i: (comp[i], i))
+
+    critical = [i for c in result["critical_components"] for i in members[c] if is_activity[i]]
+    ranked = sorted(critical, key=lambda i: -graph.weight(i))
+
+    report = {
+        "lead_time_minutes": _r(result["lead_time"]),
+        "activity_count": len(order),
+        "node_count": len(graph),
+        "edge_count": graph.edge_count,
+        "topological_order": [graph.ids[i] for i in order],
+        "critical_path": [{"id": graph.ids[i], "name": graph.names[i]} for i in critical],
+        "bottlenecks": [
+            {"id": graph.ids[i], "name": graph.names[i], "minutes": _r(graph.weight(i))}
+            for i in ranked[:bottlenecks]
+        ],
+        "cycles": [
+            [{"kind": graph.kinds[i], "id": graph.ids[i], "name": graph.names[i]} for i in nodes]
+            for nodes in result["cycles"]
+        ],
+    }
+    if not detail:
+        return report
+
+    es, ef, ls, lf = result["es"], result["ef"], result["ls"], result["lf"]
+    cycle_of = {}
+    for k, nodes in enumerate(result["cycles"]):
+        for i in nodes:
+            cycle_of[i] = k
+
+    activities = []
+    for i in order:
+        c = comp[i]
+        slack = ls[c] - es[c]
+        activities.append({
+            "id": graph.ids[i],
+            "name": graph.names[i],
+            "duration_minutes": _r(graph.durations[i]),
+            "delay_minutes": _r(graph.delays[i]),
+            "earliest_start": _r(es[c]),
+            "earliest_finish": _r(ef[c]),
+            "latest_start": _r(ls[c]),
+            "latest_finish": _r(lf[c]),
+            "slack": _r(slack),
+            "critical": slack <= _EPS,
+            "cycle": cycle_of.get(i),
+        })
+    report["activities"] = activities
+    return report
+
+
+# ============================================================
+# API
+# ============================================================
+@process_graph_bp.route("/api/analysis", methods=["GET"])
+def api_analysis():
+    """
+    GET /process-graph/api/analysis?entity_id=<id>[&summary=1]
+    Sans entity_id : entité active. entity_id limité aux entités de
+    l'utilisateur. summary=1 omet la liste détaillée des activités.
+    """
+    requested = request.args.get("entity_id", type=int)
+    entity_id = Entity.owned_id(requested) if requested else Entity.get_active_id()
+    if requested and not entity_id:
+        return jsonify({"error": "Entité introuvable"}), 404
+    if not entity_id:
+        return jsonify({"error": "entity_id requis"}), 400
+
+    t0 = time.perf_counter()
+    graph = load_entity_graph(entity_id)
+    t1 = time.perf_counter()
+    report = graph_report(graph, analyze(graph), detail=not request.args.get("summary", type=int))
+    t2 = time.perf_counter()
+
+    report["entity_id"] = entity_id
+    report["timings_ms"] = {"load": _r((t1 - t0) * 1000), "analyze": _r((t2 - t1) * 1000)}
+    return jsonify(report)
@@ -0,0 +1,341 @@
+# Code/routes/profiling.py
+"""
+Profilage des requêtes : nombre de requêtes SQL, temps base, temps total et
+requêtes dupliquées (empreintes N+1) par endpoint.
+
+- Mesure : signaux Flask request_started / request_finished et événements
+  SQLAlchemy before/after_cursor_execute (tous les moteurs).
+- Stockage : anneau borné en mémoire (PROFILING_BUFFER requêtes, par
+  processus) ; les rapports par endpoint sont agrégés à la lecture.
+- Capture : une requête « armée » (endpoint donné) est profilée une fois avec
+  pyinstrument s'il est installé, sinon cProfile.
+- Échantillons : un exemplaire (requête + paramètres) par empreinte SELECT,
+  rejoué avec EXPLAIN par l'index advisor (Code/index_advisor.py) ; les
+  paramètres restent en mémoire du processus, masqués dans /api/samples.
+
+Activation : PROFILING=1 (désactivé par défaut, coût nul hors mesure).
+Consultation (administrateurs) :
+    GET  /admin/profiling/api/report[?endpoint=...]
+    GET  /admin/profiling/api/requests?limit=50
+    POST /admin/profiling/api/arm        {"endpoint": "tasks.batch_update_tasks"}
+    GET  /admin/profiling/api/captures
+    GET  /admin/profiling/api/samples
+    GET  /admin/profiling/api/index-advice[?min_rows=1000]
+    GET  /admin/profiling/api/pools          (pools de connexions, routage réplique, pool d'E/S)
+    POST /admin/profiling/api/reset
+"""
+import os
+import re
+import threading
+import time
+from collections import Counter, deque
+
+from flask import Blueprint, current_app, g, has_request_context, jsonify, request, request_finished, request_started
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from Code.models.models import User
+
+profiling_bp = Blueprint("profiling", __name__, url_prefix="/admin/profiling")
+
+PROFILING_BUFFER = 2000
+CAPTURE_KEEP = 5
+DUPLICATE_MIN = 2           # une même empreinte exécutée ≥ 2 fois = suspicion N+1
+SAMPLE_LIMIT = 500          # empreintes SELECT distinctes conservées pour l'index advisor
+_FINGERPRINT_MAX = 300
+
+_lock = threading.Lock()
+_records = deque(maxlen=PROFILING_BUFFER)
+_captures = deque(maxlen=CAPTURE_KEEP)
+_armed = {}                 # {endpoint: True} : capture unique à la prochaine requête
+_samples = {}               # {empreinte: {"statement", "parameters", "endpoint", "count"}}
+
+_WS = re.compile(r"\s+")
+_IN_LIST = re.compile(r"\(\s*(?:\?|%\([^)]*\)s|:\w+)(?:\s*,\s*(?:\?|%\([^)]*\)s|:\w+))*\s*\)")
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+
+
+def fingerprint(statement):
+    """Forme normalisée d'une requête : littéraux et listes IN repliés."""
+    s = _WS.sub(" ", statement).strip()
+    s = _LITERAL.sub("?", s)
+    s = _IN_LIST.sub("(?)", s)
+    return s[:_FINGERPRINT_MAX]
+
+
+# ============================================================
+# Mesure
+# ============================================================
+def _current():
+    return g.get("_profiling") if has_request_context() else None
+
+
+def _on_request_started(sender, **extra):
+    if not sender.config.get("PROFILING") or request.blueprint == "profiling":
+        return
+    state = {"t0": time.perf_counter(), "queries": 0, "db": 0.0, "statements": Counter(), "profiler": None}
+    endpoint = request.endpoint or ""
+    with _lock:
+        armed = _armed.pop(endpoint, False)
+    if armed:
+        state["profiler"] = _start_profiler()
+    g._profiling = state
+
+
+def _on_request_finished(sender, response, **extra):
+    state = g.pop("_profiling", None)
+    if state is None:
+        return
+    total = (time.perf_counter() - state["t0"]) * 1000
+    duplicates = [
+        {"fingerprint": fp, "count": n}
+        for fp, n in state["statements"].most_common() if n >= DUPLICATE_MIN
+    ]
+    memo = g.get("_request_memo")
+    record = {
+        "ts": time.time(),
+        "endpoint": request.endpoint or "<aucun>",
+        "method": request.method,
+        "path": request.path,
+        "status": response.status_code,
+        "total_ms": round(total, 2),
+        "db_ms": round(state["db"], 2),
+        "queries": state["queries"],
+        "duplicates": duplicates,
+        "context_lookups": memo["stats"]["lookups"] if memo else None,
+    }
+    if state["profiler"] is not None:
+        record["capture"] = _stop_profiler(state["profiler"], record)
+    _records.append(record)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    state = _current()
+    if state is not None:
+        conn.info.setdefault("_profiling_t0", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    state = _current()
+    if state is None:
+        return
+    stack = conn.info.get("_profiling_t0")
+    if not stack:
+        return
+    state["db"] += (time.perf_counter() - stack.pop()) * 1000
+    state["queries"] += 1
+    fp = fingerprint(statement)
+    state["statements"][fp] += 1
+    if not executemany:
+        _sample(fp, statement, parameters)
+
+
+def _sample(fp, statement, parameters):
+    with _lock:
+        sample = _samples.get(fp)
+        if sample is not None:
+            sample["count"] += 1
+        elif len(_samples) < SAMPLE_LIMIT and statement.lstrip().upper().startswith(("SELECT", "WITH")):
+            _samples[fp] = {
+                "statement": statement,
+                "parameters": parameters,
+                "endpoint": request.endpoint,
+                "count": 1,
+            }
+
+
+def samples():
+    """Échantillons SELECT (les plus fréquents d'abord), copiés sous verrou."""
+    with _lock:
+        return sorted((dict(s) for s in _samples.values()), key=lambda s: -s["count"])
+
+
+# ============================================================
+# Capture (pyinstrument si disponible, sinon cProfile)
+# ============================================================
+def _start_profiler():
+    try:
+        from pyinstrument import Profiler
+        profiler = Profiler()
+        profiler.start()
+        return ("pyinstrument", profiler)
+    except ImportError:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return ("cprofile", profiler)
+
+
+def _stop_profiler(handle, record):
+    kind, profiler = handle
+    if kind == "pyinstrument":
+        profiler.stop()
+        report = profiler.output_text(unicode=True, color=False)
+    else:
+        import io
+        import pstats
+        profiler.disable()
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(40)
+        report = out.getvalue()
+    capture_id = f"{int(record['ts'] * 1000)}-{len(_captures)}"
+    _captures.append({
+        "id": capture_id,
+        "ts": record["ts"],
+        "endpoint": record["endpoint"],
+        "path": record["path"],
+        "profiler": kind,
+        "report": report,
+    })
+    print(f"[PROFILING] Capture {kind} de {record['endpoint']} ({record['total_ms']} ms)")
+    return capture_id
+
+
+# ============================================================
+# Agrégation
+# ============================================================
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, max(0, int(round(q * (len(sorted_values) - 1)))))
+    return sorted_values[k]
+
+
+def endpoint_report(records=None, endpoint=None):
+    """Statistiques par endpoint sur le contenu de l'anneau, triées par temps cumulé."""
+    records = list(_records) if records is None else records
+    groups = {}
+    for r in records:
+        if endpoint and r["endpoint"] != endpoint:
+            continue
+        groups.setdefault(r["endpoint"], []).append(r)
+
+    report = []
+    for name, rows in groups.items():
+        totals = sorted(r["total_ms"] for r in rows)
+        queries = [r["queries"] for r in rows]
+        dup = Counter()
+        for r in rows:
+            for d in r["duplicates"]:
+                dup[d["fingerprint"]] = max(dup[d["fingerprint"]], d["count"])
+        report.append({
+            "endpoint": name,
+            "requests": len(rows),
+            "total_ms": {
+                "p50": round(_percentile(totals, 0.5), 2),
+                "p95": round(_percentile(totals, 0.95), 2),
+                "max": round(totals[-1], 2),
+                "sum": round(sum(totals), 2),
+            },
+            "db_ms_mean": round(sum(r["db_ms"] for r in rows) / len(rows), 2),
+            "queries_mean": round(sum(queries) / len(rows), 2),
+            "queries_max": max(queries),
+            "n_plus_one": [{"fingerprint": fp, "max_count": n} for fp, n in dup.most_common(5)],
+        })
+    report.sort(key=lambda e: -e["total_ms"]["sum"])
+    return report
+
+
+def reset():
+    with _lock:
+        _records.clear()
+        _captures.clear()
+        _armed.clear()
+        _samples.clear()
+
+
+# ============================================================
+# Installation
+# ============================================================
+def init_profiling(app):
+    """Branche les signaux Flask et les événements SQLAlchemy (une fois par processus)."""
+    app.config.setdefault("PROFILING", os.getenv("PROFILING", "0") == "1")
+    request_started.connect(_on_request_started, app)
+    request_finished.connect(_on_request_finished, app)
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+
+# ============================================================
+# API (administrateurs)
+# ============================================================
+@profiling_bp.before_request
+def _admin_only():
+    user = User.current()
+    if not user or user.status != "admin":
+        return jsonify({"error": "Accès réservé aux administrateurs"}), 403
+
+
+@profiling_bp.route("/api/report", methods=["GET"])
+def api_report():
+    endpoint = request.args.get("endpoint")
+    return jsonify({
+        "enabled": bool(current_app.config.get("PROFILING")),
+        "buffered": len(_records),
+        "capacity": _records.maxlen,
+        "endpoints": endpoint_report(endpoint=endpoint),
+    })
+
+
+@profiling_bp.route("/api/requests", methods=["GET"])
+def api_requests():
+    limit = max(1, min(request.args.get("limit", 50, type=int), _records.maxlen))
+    endpoint = request.args.get("endpoint")
+    rows = [r for r in reversed(_records) if not endpoint or r["endpoint"] == endpoint]
+    return jsonify({"requests": rows[:limit]})
+
+
+@profiling_bp.route("/api/arm", methods=["POST"])
+def api_arm():
+    data = request.get_json() or {}
+    endpoint = (data.get("endpoint") or "").strip()
+    if endpoint not in current_app.view_functions:
+        return jsonify({"error": "Endpoint inconnu"}), 400
+    with _lock:
+        _armed[endpoint] = True
+    return jsonify({"armed": endpoint})
+
+
+@profiling_bp.route("/api/captures", methods=["GET"])
+def api_captures():
+    return jsonify({"captures": list(reversed(_captures))})
+
+
+@profiling_bp.route("/api/samples", methods=["GET"])
+def api_samples():
+    from Code.index_advisor import jsonable_sample
+    return jsonify({"samples": [jsonable_sample(s) for s in samples()]})
+
+
+@profiling_bp.route("/api/index-advice", methods=["GET"])
+def api_index_advice():
+    from Code.index_advisor import MIN_ROWS, advise
+    min_rows = request.args.get("min_rows", MIN_ROWS, type=int)
+    return jsonify(advise(samples(), min_rows=min_rows))
+
+
+@profiling_bp.route("/api/pools", methods=["GET"])
+def api_pools():
+    from Code.db_routing import ROUTING_STATS, _replica_state, pool_metrics
+    from Code.extensions import db
+    from Code.io_executor import io_stats
+
+    routing = current_app.extensions.get("db_routing") or {}
+    return jsonify({
+        "pools": pool_metrics(db.engines),
+        "routing": {
+            "replica_configured": routing.get("replica") is not None,
+            "blueprints": sorted(routing.get("blueprints", ())),
+            "replica_healthy": _replica_state["healthy"],
+            "replica_lag_s": round(_replica_state["lag"], 3),
+            "requests": dict(ROUTING_STATS),
+        },
+        "io_executor": io_stats(),
+    })
+
+
+@profiling_bp.route("/api/reset", methods=["POST"])
+def api_reset():
+    reset()
+    return jsonify({"ok": True})
@@ -2,17 +2,19 @@
 # -*- coding: utf-8 -*-
 
 import base64
-import logging
 import os
 import re
+import threading
 import time
 import unicodedata
 import difflib
 from typing import List, Dict, Any, Optional
 
-import requests
 from flask import Blueprint, render_template, jsonify, request
 
+from Code.io_executor import map_io
+from Code.metrics import observe_upstream
+from Code.structured_logging import get_logger
 from Code.models.models import (
     User,
     Role, UserRole,
@@ -51,16 +53,10 @@ ROME_CLIENT_ID = _env("ROME_CLIENT_ID", "")
 ROME_CLIENT_SECRET = _env("ROME_CLIENT_SECRET", "")
 ROME_SCOPE = _env("ROME_SCOPE", "api_rome-fiches-metiersv1")  # âš ï¸ CRITIQUE : scope obligatoire
 ROME_TIMEOUT = float(_env("ROME_TIMEOUT", "10"))
+ROME_MAX_PARALLEL = int(_env("ROME_MAX_PARALLEL", "4"))  # appels simultanés (quota API)
 
-# Configuration du logger
-logger = logging.getLogger("projection_metier")
-if not logger.handlers:
-    handler = logging.StreamHandler()
-    handler.setFormatter(
-        logging.Formatter("[%(asctime)s] %(levelname)s - %(name)s: %(message)s")
-    )
-    logger.addHandler(handler)
-logger.setLevel(logging.INFO)
+# Journalisation structurée (Code/structured_logging.py) : niveau via LOG_LEVEL
+logger = get_logger("projection_metier")
 
 
 def _mask_secret(secret: str) -> str:
@@ -73,16 +69,9 @@ def _mask_secret(secret: str) -> str:
 
 
 # Log de la configuration au dÃ©marrage
-logger.info("=" * 60)
-logger.info("Configuration ROME 4.0")
-logger.info("=" * 60)
-logger.info("Client ID: %s", _mask_secret(ROME_CLIENT_ID))
-logger.info("Client Secret: %s", _mask_secret(ROME_CLIENT_SECRET))
-logger.info("Scope: %s", ROME_SCOPE)
-logger.info("Base URL: %s", ROME_BASE_URL)
-logger.info("Token URL: %s", ROME_TOKEN_URL)
-logger.info("Timeout: %s secondes", ROME_TIMEOUT)
-logger.info("=" * 60)
+logger.debug("Configuration ROME", client_id=_mask_secret(ROME_CLIENT_ID),
+             client_secret=_mask_secret(ROME_CLIENT_SECRET), scope=ROME_SCOPE,
+             base_url=ROME_BASE_URL, token_url=ROME_TOKEN_URL, timeout_s=ROME_TIMEOUT)
 
 
 # ============================================================
@@ -93,15 +82,28 @@ _token_cache: Dict[str, Any] = {
     "access_token": None,
     "expires_at": 0
 }
+_token_lock = threading.Lock()
 
 
 def get_access_token() -> Optional[str]:
+    """
+    Token OAuth2 en cache, renouvelé par un seul thread à la fois
+    (workers gthread/gevent, appels ROME parallèles).
+    """
+    if _token_cache["access_token"] and _token_cache["expires_at"] > time.time() + 30:
+        return _token_cache["access_token"]
+    with _token_lock:
+        return _request_access_token()
+
+
+def _request_access_token() -> Optional[str]:
     """
     Obtient un token d'accÃ¨s OAuth2 pour l'API ROME.
     
     Returns:
         str: Le token d'accÃ¨s ou None en cas d'Ã©chec
     """
+    import requests
     now = time.time()
     
     # VÃ©rifier le cache
@@ -151,7 +153,8 @@ def get_access_token() -> Optional[str]:
         logger.debug("Headers: %s", {k: v if k != "Authorization" else "Basic ***" for k, v in headers.items()})
         logger.debug("Data: %s", data)
         
-        response = requests.post(
+        response = observe_upstream(
+            "rome", "token", requests.post,
             ROME_TOKEN_URL,
             data=data,
             headers=headers,
@@ -218,7 +221,8 @@ def get_access_token() -> Optional[str]:
             "scope": ROME_SCOPE
         }
         
-        response = requests.post(
+        response = observe_upstream(
+            "rome", "token", requests.post,
             ROME_TOKEN_URL,
             data=data,
             headers=headers,
@@ -390,12 +394,9 @@ def _extract_user_competencies(user_id: int) -> List[str]:
     # RÃ©cupÃ©rer l'utilisateur
     user = User.query.get(user_id)
     if not user:
-        logger.warning("âš ï¸  Utilisateur %d introuvable", user_id)
+        logger.warning("Utilisateur introuvable", user_id=user_id)
         return []
     
-    logger.info("ðŸ“‹ Extraction des compÃ©tences pour %s %s (ID: %d)", 
-                user.first_name, user.last_name, user_id)
-    
     # 1. RÃ©cupÃ©rer les rÃ´les de l'utilisateur
     roles = (
         Role.query
@@ -405,7 +406,6 @@ def _extract_user_competencies(user_id: int) -> List[str]:
     )
     
     role_ids = [role.id for role in roles]
-    logger.info("   â†’ %d rÃ´les trouvÃ©s", len(roles))
     
     # Ajouter les noms des rÃ´les
     for role in roles:
@@ -414,7 +414,7 @@ def _extract_user_competencies(user_id: int) -> List[str]:
     
     # 2. RÃ©cupÃ©rer les activitÃ©s liÃ©es aux rÃ´les
     if not role_ids:
-        logger.info("   â†’ Aucun rÃ´le, pas d'activitÃ©s Ã  extraire")
+        logger.debug("Aucun rôle : pas d'activités à extraire", user_id=user_id)
         return labels
     
     activities = (
@@ -424,7 +424,6 @@ def _extract_user_competencies(user_id: int) -> List[str]:
         .all()
     )
     
-    logger.info("   â†’ %d activitÃ©s trouvÃ©es", len(activities))
     
     # 3. Extraire les compÃ©tences des activitÃ©s
     comp_count = 0
@@ -462,11 +461,11 @@ def _extract_user_competencies(user_id: int) -> List[str]:
                 labels.append(aptitude.description)
                 comp_count += 1
     
-    logger.info("   â†’ %d compÃ©tences extraites", comp_count)
     
     # Nettoyage final
     labels = [label.strip() for label in labels if label and label.strip()]
-    logger.info("   â†’ Total : %d labels uniques", len(set(labels)))
+    logger.debug("Compétences extraites", user_id=user_id, roles=len(roles),
+                 activities=len(activities), competencies=comp_count, labels=len(labels))
     
     return labels
 
@@ -485,6 +484,7 @@ def rome_search_jobs(query: str) -> List[Dict[str, Any]]:
     Returns:
         Liste de mÃ©tiers trouvÃ©s
     """
+    import requests
     if not query or not query.strip():
         return []
     
@@ -498,7 +498,8 @@ def rome_search_jobs(query: str) -> List[Dict[str, Any]]:
     try:
         logger.debug("ðŸ” Recherche ROME : '%s'", query)
         
-        response = requests.get(
+        response = observe_upstream(
+            "rome", "search", requests.get,
             url,
             params={"libelle": query},
             headers=headers,
@@ -541,6 +542,7 @@ def rome_get_job_details(code: str) -> Dict[str, Any]:
     Returns:
         DÃ©tails du mÃ©tier ou dict vide
     """
+    import requests
     if not code or not code.strip():
         return {}
     
@@ -554,7 +556,8 @@ def rome_get_job_details(code: str) -> Dict[str, Any]:
     try:
         logger.debug("ðŸ“„ DÃ©tails mÃ©tier : %s", code)
         
-        response = requests.get(
+        response = observe_upstream(
+            "rome", "job_details", requests.get,
             url,
             params={"code": code},
             headers=headers,
@@ -636,23 +639,20 @@ def analyze_user(uid: int):
     Returns:
         JSON avec mÃ©tiers maÃ®trisables et envisageables
     """
-    logger.info("=" * 60)
-    logger.info("ðŸš€ Analyse utilisateur : ID %d", uid)
-    logger.info("=" * 60)
+    logger.debug("Analyse utilisateur", user_id=uid)
     
     if uid <= 0:
-        logger.error("âŒ ID utilisateur invalide : %d", uid)
+        logger.warning("ID utilisateur invalide", user_id=uid)
         return jsonify({"error": "INVALID_USER_ID"}), 400
     
     # RÃ©cupÃ©rer l'utilisateur
     user = User.query.get_or_404(uid)
-    logger.info("ðŸ‘¤ Utilisateur : %s %s", user.first_name, user.last_name)
     
     # Extraire les compÃ©tences
     user_competencies = _extract_user_competencies(uid)
     
     if not user_competencies:
-        logger.warning("âš ï¸  Aucune compÃ©tence trouvÃ©e pour l'utilisateur %d", uid)
+        logger.info("Aucune compétence trouvée", user_id=uid)
         return jsonify({
             "full": [],
             "partial": [],
@@ -678,12 +678,10 @@ def analyze_user(uid: int):
             })
             all_user_tokens |= tokens
     
-    logger.info("ðŸ“Š %d compÃ©tences Ã  analyser", len(user_items))
-    
     # Rechercher les mÃ©tiers ROME
-    logger.info("ðŸ” Recherche de mÃ©tiers ROME...")
     
     rome_jobs_pool = {}
+    search_words = []
     
     for comp in user_competencies:
         normalized = _normalize(comp)
@@ -697,21 +695,30 @@ def analyze_user(uid: int):
         
         # Rechercher avec chaque mot
         for word in words[:3]:  # Limiter Ã  3 mots pour Ã©viter trop d'appels
-            results = rome_search_jobs(word)
-            for job in results:
-                code = _extract_job_code(job)
-                if code and code not in rome_jobs_pool:
-                    rome_jobs_pool[code] = job
+            if word not in search_words:
+                search_words.append(word)
+
+    # Appels ROME en parallèle (Code/io_executor.py), fusionnés dans l'ordre des mots
+    for results in map_io(rome_search_jobs, search_words, timeout=ROME_TIMEOUT * 2, default=[],
+                          max_parallel=ROME_MAX_PARALLEL):
+        for job in results:
+            code = _extract_job_code(job)
+            if code and code not in rome_jobs_pool:
+                rome_jobs_pool[code] = job
     
-    logger.info("ðŸ“¦ %d mÃ©tiers ROME trouvÃ©s", len(rome_jobs_pool))
+    logger.debug("Métiers ROME trouvés", user_id=uid, searches=len(search_words), jobs=len(rome_jobs_pool))
     
     # Analyser chaque mÃ©tier
     fully_matching = []
     partially_matching = []
     
+    codes = list(rome_jobs_pool)
+    details_by_code = dict(zip(codes, map_io(
+        rome_get_job_details, codes, timeout=ROME_TIMEOUT * 2, default={}, max_parallel=ROME_MAX_PARALLEL)))
+
     for code, job_summary in rome_jobs_pool.items():
         # RÃ©cupÃ©rer les dÃ©tails complets
-        job_details = rome_get_job_details(code)
+        job_details = details_by_code.get(code)
         if not job_details:
             continue
         
@@ -793,8 +800,8 @@ def analyze_user(uid: int):
     fully_matching.sort(key=lambda x: x["score"], reverse=True)
     partially_matching.sort(key=lambda x: x["score"], reverse=True)
     
-    logger.info("âœ… Analyse terminÃ©e : %d mÃ©tiers maÃ®trisables, %d envisageables",
-                len(fully_matching), len(partially_matching))
+    logger.info("Analyse terminée", user_id=uid, competencies=len(user_items),
+                rome_searches=len(search_words), full=len(fully_matching), partial=len(partially_matching))
     
     # Pagination
     full_offset = int(request.args.get("full_offset", 0))
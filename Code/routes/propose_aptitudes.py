@@ -1,7 +1,7 @@
 from flask import Blueprint, request, jsonify, current_app
 import json
 import re
-from .propose_common import openai_client_or_none
+from .propose_common import chat_completion, openai_client_or_none
 
 bp_propose_aptitudes = Blueprint("propose_aptitudes", __name__)
 
@@ -206,7 +206,8 @@ def propose_aptitudes():
             hsc_context=hsc_context,
         )
 
-        resp = client.chat.completions.create(
+        resp = chat_completion(
+            client,
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": "Tu es un expert en analyse du travail, prevention sante/securite et inclusion. Tu reponds UNIQUEMENT en JSON valide, sans markdown ni texte supplementaire."},
@@ -271,7 +272,8 @@ def propose_feasibility():
             assistive_products_text=assistive_products_text,
         )
 
-        resp = client.chat.completions.create(
+        resp = chat_completion(
+            client,
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": "Tu es un expert prevention et inclusion. Tu reponds UNIQUEMENT en JSON valide, sans markdown ni texte supplementaire."},
@@ -53,6 +53,28 @@ def openai_client_or_none():
         return None, str(e)
 
 
+LLM_TIMEOUT_S = float(os.environ.get("LLM_TIMEOUT_S", 60))
+
+
+def chat_completion(client, timeout=None, **kwargs):
+    """
+    client.chat.completions.create(**kwargs) exécuté hors du thread de
+    requête (Code/io_executor.py) : attente bornée à LLM_TIMEOUT_S
+    (IOTimeout au-delà), le client OpenAI reçoit le même délai. Durée et
+    issue comptées dans optiq_upstream_* (service="openai").
+    """
+    from functools import partial
+
+    from Code.io_executor import run_io
+    from Code.metrics import observe_upstream
+
+    timeout = LLM_TIMEOUT_S if timeout is None else timeout
+    kwargs.setdefault("timeout", timeout)
+    # `timeout` de run_io et celui du client OpenAI : ce dernier est lié d'avance
+    create = partial(client.chat.completions.create, **kwargs)
+    return observe_upstream("openai", "chat.completions", run_io, create, timeout=timeout + 1)
+
+
 def dummy_from_context(ctx: str, kind: str = "savoir"):
     """
     Fallback déterministe : on fabrique 3 items à partir du contexte.
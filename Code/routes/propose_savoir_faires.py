@@ -1,6 +1,6 @@
 # Code/routes/propose_savoir_faires.py
 from flask import Blueprint, request, jsonify, current_app
-from .propose_common import build_activity_context, openai_client_or_none, dummy_from_context
+from .propose_common import build_activity_context, chat_completion, openai_client_or_none, dummy_from_context
 
 bp_propose_sf = Blueprint("propose_savoir_faires", __name__)
 
@@ -33,7 +33,8 @@ def propose_savoir_faires():
 === CONTEXTE ===
 {ctx}
 """
-        resp = client.chat.completions.create(
+        resp = chat_completion(
+            client,
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": "Tu es un assistant RH/formation, précis et concis."},
@@ -3,6 +3,7 @@ import json
 import re
 from flask import Blueprint, request, jsonify, current_app
 from .propose_common import (
+    chat_completion,
     openai_client_or_none,
     dummy_from_context,
 )
@@ -187,7 +188,8 @@ def propose_softskills():
             x50_766_hsc=X50_766_HSC,
         )
 
-        resp = client.chat.completions.create(
+        resp = chat_completion(
+            client,
             model="gpt-4o-mini",
             messages=[
                 {
@@ -5,6 +5,7 @@ from itsdangerous import URLSafeTimedSerializer, SignatureExpired, BadSignature
 from flask import current_app
 from Code.models.models import User
 from Code.extensions import mail, db
+from Code.io_executor import run_background
 
 auth_password_bp = Blueprint('auth_password', __name__)
 
@@ -31,7 +32,8 @@ def forgot_password():
     # Forcer l'encodage en UTF-8
     msg.charset = 'utf-8'
 
-    mail.send(msg)
+    # Envoi SMTP en arrière-plan : la réponse n'attend pas le serveur de mail
+    run_background(mail.send, msg)
 
     flash('Un email de réinitialisation a été envoyé si l’adresse est correcte.', 'success')
     return redirect(url_for('auth.login'))
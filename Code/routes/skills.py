@@ -2,10 +2,10 @@
 
 from flask import Blueprint, request, jsonify
 import os
-import openai
 import re
 from Code.extensions import db
 from Code.models.models import Competency
+from Code.routes.propose_common import chat_completion
 
 skills_bp = Blueprint('skills', __name__, url_prefix='/skills')
 
@@ -79,6 +79,7 @@ Outils : {tools_str}
 """
 
     # --- OpenAI API KEY ---
+    import openai
     openai.api_key = os.getenv("OPENAI_API_KEY")
     if not openai.api_key:
         return jsonify({"error": "Clé OpenAI manquante (OPENAI_API_KEY)."}), 500
@@ -88,7 +89,8 @@ Outils : {tools_str}
         from openai import OpenAI
         client = OpenAI(api_key=openai.api_key)
 
-        response = client.chat.completions.create(
+        response = chat_completion(
+            client,
             model="gpt-4o-mini",    # modèle compatible nouvelle API
             messages=[
                 {"role": "system", "content": "Vous êtes un assistant spécialisé en compétences NF X50-124."},
@@ -5,25 +5,12 @@ from Code.extensions import db
 
 task_links_bp = Blueprint('task_links', __name__, url_prefix='/task-links')
 
-_table_ensured = False
-
-
-def ensure_table():
-    """Crée la table task_link_assignments via SQLAlchemy (compatible SQLite + PostgreSQL)."""
-    global _table_ensured
-    if _table_ensured:
-        return
-    try:
-        from Code.models.models import TaskLinkAssignment
-        TaskLinkAssignment.__table__.create(db.engine, checkfirst=True)
-        _table_ensured = True
-    except Exception:
-        pass
+# La table task_link_assignments est créée par la migration c3d4e5f6a7b8
+# (python -m Code.bootstrap) : aucune DDL sur le chemin des requêtes.
 
 
 @task_links_bp.route('/assign', methods=['POST'])
 def assign():
-    ensure_table()
     data = request.get_json(force=True) or {}
     link_id = data.get('link_id')
     task_id = data.get('task_id')
@@ -50,7 +37,6 @@ def assign():
 
 @task_links_bp.route('/<int:link_id>/<direction>', methods=['DELETE'])
 def unassign(link_id, direction):
-    ensure_table()
     try:
         db.session.execute(
             text("DELETE FROM task_link_assignments WHERE link_id = :lid AND direction = :dir"),
@@ -65,7 +51,6 @@ def unassign(link_id, direction):
 
 @task_links_bp.route('/activity/<int:activity_id>', methods=['GET'])
 def get_assignments(activity_id):
-    ensure_table()
     try:
         rows = db.session.execute(text("""
             SELECT tla.link_id, tla.task_id, tla.direction
@@ -1,9 +1,14 @@
 # Code/routes/tasks.py
 
-from flask import Blueprint, request, jsonify, render_template
-from sqlalchemy import text
+import json
+from datetime import datetime
+
+from flask import Blueprint, request, jsonify, render_template, session
+from sqlalchemy import case, func, text, tuple_
 from Code.extensions import db
-from Code.models.models import Task, Activities, Role, task_roles, Link, Data
+from Code.models.models import (
+    Task, Activities, Role, Tool, RecentEvent, task_roles, task_tools, Link, Data
+)
 
 tasks_bp = Blueprint('tasks', __name__, url_prefix='/tasks')
 
@@ -42,9 +47,287 @@ def add_task():
 #
 # -------------------------------------------------------
 # Ici, on n’a plus la route de reorder => c’est dans activities.py
+# (elle s'appuie sur reorder_activity_tasks ci-dessous)
 # -------------------------------------------------------
 
 
+#
+# -------------------------------------------------------
+# OPÉRATIONS ENSEMBLISTES (ordre, rôles, outils)
+# -------------------------------------------------------
+#
+def _insert_on_conflict(table, rows, index_elements, update_columns=()):
+    """
+    INSERT multi-lignes ; en cas de doublon sur index_elements, met à jour
+    update_columns (ou ignore la ligne). SQLite et PostgreSQL.
+    """
+    if not rows:
+        return
+    if db.engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    stmt = insert(table).values(rows)
+    if update_columns:
+        stmt = stmt.on_conflict_do_update(
+            index_elements=index_elements,
+            set_={c: stmt.excluded[c] for c in update_columns},
+        )
+    else:
+        stmt = stmt.on_conflict_do_nothing(index_elements=index_elements)
+    db.session.execute(stmt)
+
+
+def reorder_activity_tasks(activity_id, order, conn=None):
+    """
+    Applique l'ordre [task_id, ...] en un seul UPDATE ... CASE.
+    Les ids étrangers à l'activité sont ignorés. Retourne le nombre de lignes.
+    conn : connexion à utiliser (file d'écriture), sinon db.session.
+    """
+    ranks = {}
+    for idx, t_id in enumerate(order):
+        try:
+            ranks.setdefault(int(t_id), idx)
+        except (TypeError, ValueError):
+            continue
+    if not ranks:
+        return 0
+    stmt = (
+        db.update(Task)
+        .where(Task.activity_id == activity_id, Task.id.in_(list(ranks)))
+        .values(order=case(ranks, value=Task.id))
+    )
+    if conn is not None:
+        return conn.execute(stmt).rowcount
+    return db.session.execute(stmt.execution_options(synchronize_session=False)).rowcount
+
+
+def _resolve_by_name(model, entity_id, names, lower=False):
+    """
+    {nom: id} pour les noms donnés dans l'entité, en créant les manquants
+    (via l'ORM, pour conserver le journal d'audit). Une requête de lecture.
+    """
+    names = list(dict.fromkeys(n.strip() for n in names if n and n.strip()))
+    if not names:
+        return {}
+    key = (lambda n: n.lower()) if lower else (lambda n: n)
+    column = func.lower(model.name) if lower else model.name
+    found = {
+        key(name): rid for rid, name in db.session.query(model.id, model.name).filter(
+            model.entity_id == entity_id, column.in_([key(n) for n in names])
+        )
+    }
+    created = [model(name=n, entity_id=entity_id) for n in names if key(n) not in found]
+    if created:
+        db.session.add_all(created)
+        db.session.flush()
+        found.update({key(obj.name): obj.id for obj in created})
+    return {n: found[key(n)] for n in names}
+
+
+def upsert_task_roles(entity_id, rows):
+    """
+    rows : [(task_id, role_id | None, role_name | None, status)]
+    Les rôles nommés sont résolus/créés dans l'entité ; un couple (tâche, rôle)
+    déjà associé voit son statut mis à jour.
+    """
+    by_name = _resolve_by_name(Role, entity_id, [name for _, rid, name, _ in rows if rid is None])
+    wanted_ids = {rid for _, rid, _, _ in rows if rid is not None}
+    valid_ids = {
+        rid for (rid,) in db.session.query(Role.id).filter(
+            Role.id.in_(wanted_ids), Role.entity_id == entity_id
+        )
+    } if wanted_ids else set()
+
+    values = {}
+    for task_id, rid, name, status in rows:
+        if rid is None:
+            rid = by_name.get((name or '').strip())
+        elif rid not in valid_ids:
+            continue
+        if rid is not None:
+            values[(task_id, rid)] = {"task_id": task_id, "role_id": rid, "status": status}
+    _insert_on_conflict(task_roles, list(values.values()), ["task_id", "role_id"], ["status"])
+    return len(values)
+
+
+def apply_task_tool_sets(entity_id, tool_sets, task_names=None):
+    """
+    tool_sets : {task_id: ({tool_id, ...}, [nouveau nom, ...])}
+    Remplace l'ensemble des outils de chaque tâche par l'ensemble demandé :
+    un DELETE et un INSERT pour l'ensemble du lot. Retourne (ajouts, retraits).
+    """
+    if not tool_sets:
+        return [], []
+    new_names = [n for _, names in tool_sets.values() for n in names]
+    by_name = _resolve_by_name(Tool, entity_id, new_names, lower=True)
+    wanted_ids = {tid for ids, _ in tool_sets.values() for tid in ids}
+    valid = dict(db.session.query(Tool.id, Tool.name).filter(
+        Tool.id.in_(wanted_ids), Tool.entity_id == entity_id
+    )) if wanted_ids else {}
+    if by_name:
+        valid.update(db.session.query(Tool.id, Tool.name).filter(Tool.id.in_(list(by_name.values()))))
+
+    current = set(db.session.query(task_tools.c.task_id, task_tools.c.tool_id).filter(
+        task_tools.c.task_id.in_(list(tool_sets))
+    ))
+    desired = set()
+    for task_id, (ids, names) in tool_sets.items():
+        desired.update((task_id, tid) for tid in ids if tid in valid)
+        desired.update((task_id, by_name[n.strip()]) for n in names if n and n.strip())
+
+    added = sorted(desired - current)
+    removed = sorted(current - desired)
+    if removed:
+        db.session.execute(task_tools.delete().where(
+            tuple_(task_tools.c.task_id, task_tools.c.tool_id).in_(removed)
+        ))
+    if added:
+        db.session.execute(task_tools.insert(), [{"task_id": t, "tool_id": tid} for t, tid in added])
+        task_names = task_names or {}
+        now = datetime.utcnow()
+        db.session.execute(db.insert(RecentEvent), [{
+            "event_type": 'tool_linked',
+            "icon": 'fa-solid fa-link',
+            "label": f'Outil associé : {valid.get(tid, "")}',
+            "detail": json.dumps({"tool": valid.get(tid, ""), "task": task_names.get(t, "")},
+                                 ensure_ascii=False),
+            "entity_id": entity_id,
+            "user_id": session.get('user_id'),
+            "created_at": now,
+        } for t, tid in added])
+    return added, removed
+
+
+def tasks_state(activity_id):
+    """Tâches de l'activité avec rôles et outils : trois requêtes."""
+    tasks = db.session.query(Task.id, Task.name, Task.order).filter(
+        Task.activity_id == activity_id
+    ).order_by(func.coalesce(Task.order, 0), Task.id).all()
+    roles, tools = {}, {}
+    for tid, rid, name, status in db.session.query(
+        task_roles.c.task_id, Role.id, Role.name, task_roles.c.status
+    ).join(Role, Role.id == task_roles.c.role_id).join(
+        Task, Task.id == task_roles.c.task_id
+    ).filter(Task.activity_id == activity_id).order_by(Role.name):
+        roles.setdefault(tid, []).append({"id": rid, "name": name, "status": status})
+    for tid, tool_id, name in db.session.query(
+        task_tools.c.task_id, Tool.id, Tool.name
+    ).join(Tool, Tool.id == task_tools.c.tool_id).join(
+        Task, Task.id == task_tools.c.task_id
+    ).filter(Task.activity_id == activity_id).order_by(Tool.name):
+        tools.setdefault(tid, []).append({"id": tool_id, "name": name})
+    return [{
+        "id": tid, "name": name, "order": order,
+        "roles": roles.get(tid, []), "tools": tools.get(tid, []),
+    } for tid, name, order in tasks]
+
+
+def _int_list(values):
+    out = []
+    for v in values or []:
+        try:
+            out.append(int(v))
+        except (TypeError, ValueError):
+            continue
+    return out
+
+
+@tasks_bp.route('/batch', methods=['POST'])
+def batch_update_tasks():
+    """
+    Applique en une transaction l'ordre, les rôles et les outils des tâches
+    d'une activité, puis retourne le nouvel état.
+    Ex: POST /tasks/batch
+        {
+          "activity_id": 5,
+          "order": [12, 13, 15],
+          "tasks": [
+            {"id": 12,
+             "roles": [{"id": 1, "status": "Réalisateur"}, {"name": "Expert", "status": "Support"}],
+             "tools": [3, 4],               # ensemble complet (diff appliqué)
+             "new_tools": ["Excel"]}
+          ]
+        }
+    "roles" ajoute ou met à jour le statut ; "tools"/"new_tools" remplacent
+    l'ensemble des outils de la tâche (omettre les deux pour ne pas y toucher).
+    """
+    data = request.get_json() or {}
+    try:
+        activity_id = int(data.get('activity_id'))
+    except (TypeError, ValueError):
+        return jsonify({"error": "activity_id is required"}), 400
+    activity = db.session.get(Activities, activity_id)
+    if not activity:
+        return jsonify({"error": "Activité non trouvée."}), 404
+
+    items = data.get('tasks') or []
+    if not isinstance(items, list):
+        return jsonify({"error": "tasks must be a list"}), 400
+    task_names = dict(db.session.query(Task.id, Task.name).filter(Task.activity_id == activity_id))
+
+    role_rows, tool_sets, errors = [], {}, []
+    for item in items:
+        try:
+            task_id = int(item.get('id'))
+        except (AttributeError, TypeError, ValueError):
+            errors.append({"item": item, "error": "id invalide"})
+            continue
+        if task_id not in task_names:
+            errors.append({"id": task_id, "error": "tâche hors de l'activité"})
+            continue
+        roles = item.get('roles') or []
+        if not isinstance(roles, list):
+            errors.append({"id": task_id, "error": "roles doit être une liste"})
+            continue
+        for role in roles:
+            status = role.get('status') if isinstance(role, dict) else None
+            if not isinstance(status, str) or not status.strip():
+                errors.append({"id": task_id, "error": "status requis pour chaque rôle"})
+                continue
+            name = role.get('name')
+            if name is not None and not isinstance(name, str):
+                errors.append({"id": task_id, "error": "nom de rôle invalide"})
+                continue
+            rid = role.get('id')
+            try:
+                rid = int(rid) if rid is not None else None
+            except (TypeError, ValueError):
+                rid = None
+            if rid is None and not (name or '').strip():
+                continue
+            role_rows.append((task_id, rid, name, status.strip()))
+        if 'tools' in item or 'new_tools' in item:
+            new_tools = item.get('new_tools') or []
+            if not isinstance(new_tools, list) or not all(isinstance(n, str) for n in new_tools):
+                errors.append({"id": task_id, "error": "new_tools doit être une liste de noms"})
+                continue
+            tool_sets[task_id] = (set(_int_list(item.get('tools'))), new_tools)
+
+    if errors:
+        return jsonify({"error": "Lot invalide", "details": errors}), 400
+
+    try:
+        reordered = reorder_activity_tasks(activity_id, data.get('order') or [])
+        roles_applied = upsert_task_roles(activity.entity_id, role_rows)
+        added, removed = apply_task_tool_sets(activity.entity_id, tool_sets, task_names)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+    return jsonify({
+        "activity_id": activity_id,
+        "applied": {
+            "reordered": reordered,
+            "roles": roles_applied,
+            "tools_added": len(added),
+            "tools_removed": len(removed),
+        },
+        "tasks": tasks_state(activity_id),
+    }), 200
+
+
 #
 # -------------------------------------------------------
 # NOUVELLES ROUTES POUR ASSOCIER DES RÔLES À LA TÂCHE
@@ -75,26 +358,27 @@ def add_roles_to_task(task_id):
     added_roles = []
 
     try:
-        # (1) Associer des rôles existants
-        for rid in existing_role_ids:
-            role_obj = Role.query.get(rid)
-            if role_obj:
-                # Vérifier si association déjà existante
-                res = db.session.execute(
-                    text("SELECT 1 FROM task_roles WHERE task_id=:tid AND role_id=:rid"),
-                    {"tid": task_id, "rid": rid}
-                ).fetchone()
-                if not res:
-                    db.session.execute(
-                        text("""INSERT INTO task_roles (task_id, role_id, status)
-                                VALUES (:tid, :rid, :st)"""),
-                        {"tid": task_id, "rid": rid, "st": chosen_status}
-                    )
-                    added_roles.append({
-                        "id": role_obj.id,
-                        "name": role_obj.name,
-                        "status": chosen_status
-                    })
+        # (1) Associer des rôles existants (rôles et associations lus en une requête chacun)
+        roles_by_id = {
+            r.id: r for r in Role.query.filter(Role.id.in_(_int_list(existing_role_ids)))
+        } if existing_role_ids else {}
+        linked = {
+            rid for (rid,) in db.session.query(task_roles.c.role_id).filter(task_roles.c.task_id == task_id)
+        }
+        for rid in _int_list(existing_role_ids):
+            role_obj = roles_by_id.get(rid)
+            if role_obj and rid not in linked:
+                db.session.execute(
+                    text("""INSERT INTO task_roles (task_id, role_id, status)
+                            VALUES (:tid, :rid, :st)"""),
+                    {"tid": task_id, "rid": rid, "st": chosen_status}
+                )
+                linked.add(rid)
+                added_roles.append({
+                    "id": role_obj.id,
+                    "name": role_obj.name,
+                    "status": chosen_status
+                })
 
         # (2) Créer/associer de nouveaux rôles
         for role_name in new_roles:
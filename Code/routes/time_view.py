@@ -1,13 +1,18 @@
 # Code/routes/time_view.py
+import threading
+import time
+from collections import OrderedDict
 from flask import Blueprint, render_template, request, jsonify
 from datetime import datetime
-from sqlalchemy import text
+from sqlalchemy import text, case, event, func, inspect
+from sqlalchemy.orm import object_session, selectinload
+from Code.db_routing import RoutingSession
 from Code.extensions import db
 from Code.models.models import (
     Activities, Task, Role, TimeAnalysis,
     TimeProject, TimeProjectLine, TimeWeakness,
     TimeRoleAnalysis, TimeRoleLine,
-    activity_roles, Entity
+    activity_roles, CacheGeneration, Entity, User, UserRole, ANNUAL_FACTORS
 )
 
 time_bp = Blueprint('time_view', __name__, url_prefix='/temps')
@@ -56,27 +61,6 @@ def activity_duration_minutes(activity_id):
     a = Activities.query.get(activity_id)
     return float(getattr(a, 'duration_minutes', 0) or 0)
 
-def ensure_time_role_schema():
-    """Auto-patch : ajoute les colonnes manquantes dans les tables rôle si nécessaire (SQLite)."""
-    try:
-        # time_role_analysis
-        cols_ra = db.session.execute(text("PRAGMA table_info(time_role_analysis)")).fetchall()
-        if cols_ra:
-            names_ra = {c[1] for c in cols_ra}
-            if 'name' not in names_ra:
-                db.session.execute(text("ALTER TABLE time_role_analysis ADD COLUMN name TEXT DEFAULT 'Analyse rôle'"))
-            if 'created_at' not in names_ra:
-                db.session.execute(text("ALTER TABLE time_role_analysis ADD COLUMN created_at TEXT DEFAULT (datetime('now'))"))
-        # time_role_line
-        cols_rl = db.session.execute(text("PRAGMA table_info(time_role_line)")).fetchall()
-        if cols_rl:
-            names_rl = {c[1] for c in cols_rl}
-            if 'duration_minutes' not in names_rl:
-                db.session.execute(text("ALTER TABLE time_role_line ADD COLUMN duration_minutes REAL"))
-        db.session.commit()
-    except Exception:
-        db.session.rollback()
-
 # ---------- Page ----------
 @time_bp.route('/', methods=['GET'])
 def page():
@@ -337,7 +321,6 @@ def api_activities_list():
 # ========================= ROLE ANALYSIS =========================
 @time_bp.route('/api/role_analysis', methods=['POST'])
 def api_role_analysis_create():
-    ensure_time_role_schema()
     d = request.get_json(force=True) or {}
     role_id = int(d.get('role_id'))
     name = (d.get('name') or 'Analyse rôle').strip()
@@ -363,13 +346,25 @@ def _line_duration(l):
         return float(l.duration_minutes or 0)
     return activity_duration_minutes(l.activity_id)
 
-def _role_summary(R):
-    sum_day = sum(_line_duration(l) * max(1, l.frequency) for l in R.lines if l.recurrence.startswith('jour'))
-    sum_week = sum(_line_duration(l) * max(1, l.frequency) for l in R.lines if l.recurrence.startswith('hebdo'))
-    sum_month = sum(_line_duration(l) * max(1, l.frequency) for l in R.lines if l.recurrence.startswith('mens'))
-    sum_year = sum(_line_duration(l) * max(1, l.frequency) for l in R.lines if l.recurrence.startswith('ann'))
+RECURRENCE_BUCKETS = (("jour", "day"), ("hebdo", "week"), ("mens", "month"), ("ann", "year"))
 
-    p = get_calendar_params()
+def _recurrence_bucket(rec):
+    rec = (rec or '').lower()
+    for prefix, bucket in RECURRENCE_BUCKETS:
+        if rec.startswith(prefix):
+            return bucket
+    return None
+
+def _role_summary(R, p=None):
+    # Une seule passe sur les lignes, ventilées par récurrence
+    sums = {"day": 0.0, "week": 0.0, "month": 0.0, "year": 0.0}
+    for l in R.lines:
+        bucket = _recurrence_bucket(l.recurrence)
+        if bucket:
+            sums[bucket] += _line_duration(l) * max(1, l.frequency)
+    sum_day, sum_week, sum_month, sum_year = sums["day"], sums["week"], sums["month"], sums["year"]
+
+    p = p or get_calendar_params()
     dpw, wpy = p['days_per_week'], p['weeks_per_year']
     annual = sum_day * (dpw * wpy) + sum_week * wpy + sum_month * 12 + sum_year
     monthly = sum_day * (dpw * wpy / 12.0) + sum_week * (wpy / 12.0) + sum_month + sum_year / 12.0
@@ -386,7 +381,6 @@ def _role_summary(R):
 
 @time_bp.route('/api/role_analysis/<int:rid>', methods=['GET', 'PATCH', 'DELETE'])
 def api_role_analysis_read_patch_delete(rid):
-    ensure_time_role_schema()
     R = TimeRoleAnalysis.query.get_or_404(rid)
     if request.method == 'PATCH':
         data = request.get_json(force=True) or {}
@@ -421,15 +415,19 @@ def api_role_analysis_read_patch_delete(rid):
 
 @time_bp.route('/api/role_analyses', methods=['GET'])
 def api_role_analyses_list():
-    ensure_time_role_schema()
-    Rs = TimeRoleAnalysis.query.order_by(TimeRoleAnalysis.created_at.desc(), TimeRoleAnalysis.id.desc()).all()
+    Rs = (TimeRoleAnalysis.query
+          .options(selectinload(TimeRoleAnalysis.lines))
+          .order_by(TimeRoleAnalysis.created_at.desc(), TimeRoleAnalysis.id.desc())
+          .all())
+    role_names = dict(db.session.query(Role.id, Role.name).filter(Role.id.in_({R.role_id for R in Rs})))
+    p = get_calendar_params()
     out = []
     for R in Rs:
-        s = _role_summary(R)
+        s = _role_summary(R, p)
         out.append({
             "id": R.id,
             "role_id": R.role_id,
-            "role": Role.query.get(R.role_id).name if R.role_id else "",
+            "role": role_names.get(R.role_id, "") if R.role_id else "",
             "name": getattr(R, "name", "Analyse rôle"),
             "created_at": R.created_at.isoformat() if hasattr(R, "created_at") and R.created_at else None,
             **s
@@ -438,7 +436,6 @@ def api_role_analyses_list():
 
 @time_bp.route('/api/role_line/<int:line_id>', methods=['DELETE'])
 def api_role_line_delete(line_id):
-    ensure_time_role_schema()
     ln = TimeRoleLine.query.get_or_404(line_id)
     rid = ln.role_analysis_id
     db.session.delete(ln)
@@ -453,7 +450,380 @@ def api_role_line_delete(line_id):
     db.session.commit()
     return jsonify({"ok": True, "analysis_deleted": deleted, "analysis_id": rid})
 
+# ========================= CHARGE ANNUALISÉE (entité) =========================
+# Agrégat entité → rôles / utilisateurs, calculé en SQL et mis en cache par
+# processus. Clé de cache : (entité, génération, calendrier). La génération
+# est une ligne de cache_generations par entité (« workload:<id> »),
+# incrémentée dans la transaction qui modifie un modèle ci-dessous pour
+# cette entité : tous les workers la relisent (une requête par clé
+# primaire), aucun ne sert un agrégat périmé par l'écriture d'un autre, et
+# les écritures de deux entités ne se disputent pas la même ligne. Le TTL
+# borne l'obsolescence en cas d'écriture hors ORM (SQL brut).
+WORKLOAD_MODELS = (TimeAnalysis, TimeRoleAnalysis, TimeRoleLine, Activities, Role, UserRole, User)
+WORKLOAD_GENERATION = "workload:{}"
+WORKLOAD_CACHE_SIZE = 128
+WORKLOAD_CACHE_TTL = 300  # secondes
+
+_workload_lock = threading.Lock()
+_workload_cache = OrderedDict()
+_workload_state = {"hits": 0, "misses": 0}
+_ALL_ENTITIES = "*"
+
+def workload_generation(entity_id):
+    value = db.session.query(CacheGeneration.value).filter(
+        CacheGeneration.name == WORKLOAD_GENERATION.format(entity_id)).scalar()
+    return value or 0
+
+def _bump_workload_generations(connection, entity_ids):
+    """INSERT … ON CONFLICT par entité : incrément atomique, ligne créée au premier appel."""
+    table = CacheGeneration.__table__
+    if _ALL_ENTITIES in entity_ids:
+        # Écriture en masse sans entité connue : toutes les générations existantes
+        connection.execute(table.update()
+                           .where(table.c.name.like(WORKLOAD_GENERATION.format("%")))
+                           .values(value=table.c.value + 1))
+        entity_ids = entity_ids - {_ALL_ENTITIES}
+    if not entity_ids:
+        return
+    if connection.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    # Ordre fixe : deux transactions sur les mêmes entités ne s'interbloquent pas
+    for entity_id in sorted(entity_ids):
+        stmt = insert(table).values(name=WORKLOAD_GENERATION.format(entity_id), value=1)
+        connection.execute(stmt.on_conflict_do_update(
+            index_elements=[table.c.name], set_={"value": table.c.value + 1},
+        ))
+
+def _scalars(connection, stmt):
+    return {v for v in connection.execute(stmt).scalars() if v is not None}
+
+def _workload_entities(connection, target):
+    """Entités dont l'agrégat dépend de cet objet (anciennes valeurs comprises)."""
+    def ids(attr):
+        hist = inspect(target).attrs[attr].history
+        return {v for v in (*hist.unchanged, *hist.added, *hist.deleted) if v is not None}
+
+    if isinstance(target, (Activities, Role)):
+        return ids('entity_id')
+    if isinstance(target, (TimeAnalysis, TimeRoleLine)):
+        activity_ids = ids('activity_id')
+        return activity_ids and _scalars(connection, db.select(Activities.entity_id)
+                                         .where(Activities.id.in_(activity_ids)))
+    if isinstance(target, (TimeRoleAnalysis, UserRole)):
+        role_ids = ids('role_id')
+        return role_ids and _scalars(connection, db.select(Role.entity_id).where(Role.id.in_(role_ids)))
+    if isinstance(target, User):
+        # Seuls les noms sont repris (by_user) : entités de ses rôles et analyses
+        state = inspect(target)
+        if not (state.deleted or state.was_deleted or any(
+                state.attrs[a].history.has_changes() for a in ('first_name', 'last_name'))):
+            return set()
+        return _scalars(connection, db.select(Role.entity_id)
+                        .join(UserRole, UserRole.role_id == Role.id)
+                        .where(UserRole.user_id == target.id)) | _scalars(
+            connection, db.select(Activities.entity_id)
+            .join(TimeAnalysis, TimeAnalysis.activity_id == Activities.id)
+            .where(TimeAnalysis.user_id == target.id))
+    return set()
+
+def _mark_workload_dirty(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("workload_dirty", set()).update(_workload_entities(connection, target))
+
+for _model in WORKLOAD_MODELS:
+    for _evt in ("after_insert", "after_update", "after_delete"):
+        event.listen(_model, _evt, _mark_workload_dirty)
+
+@event.listens_for(RoutingSession, "after_flush_postexec")
+def _workload_after_flush(session, flush_context):
+    # Incrément dans la transaction du flush : annulé avec elle en cas de rollback
+    dirty = session.info.pop("workload_dirty", None)
+    if dirty:
+        _bump_workload_generations(session.connection(), dirty)
+
+@event.listens_for(RoutingSession, "do_orm_execute")
+def _workload_bulk_execute(orm_execute_state):
+    # UPDATE/DELETE en masse (query.update, query.delete) : pas de flush, les
+    # entités touchées sont relues avant l'exécution (même clause WHERE)
+    if orm_execute_state.is_select:
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None or not issubclass(mapper.class_, WORKLOAD_MODELS):
+        return
+    session = orm_execute_state.session
+    where = getattr(orm_execute_state.statement, "whereclause", None)
+    if (orm_execute_state.is_update or orm_execute_state.is_delete) and where is not None:
+        connection = session.connection()
+        dirty = set()
+        for target in session.execute(db.select(mapper.class_).where(where)).scalars():
+            dirty |= _workload_entities(connection, target)
+    else:
+        dirty = {_ALL_ENTITIES}
+    if dirty:
+        _bump_workload_generations(session.connection(), dirty)
+
+@event.listens_for(RoutingSession, "after_rollback")
+def _workload_after_rollback(session):
+    session.info.pop("workload_dirty", None)
+
+def _prefix_case(column, factors):
+    return case(
+        *[(func.lower(column).like(f"{prefix}%"), factor) for prefix, factor in factors],
+        else_=0,
+    )
+
+def _fte_minutes(p):
+    """Minutes travaillées par an pour un ETP."""
+    return p['hours_per_day'] * 60 * p['days_per_week'] * p['weeks_per_year']
+
+def compute_workload_rollup(entity_id, p):
+    """
+    Charge annualisée d'une entité, en quatre requêtes agrégées :
+      - time_analysis (facteurs ANNUAL_FACTORS, × fréquence × nb_people),
+        ventilée par (rôle, utilisateur) ;
+      - dernière analyse de chaque rôle (time_role_line, calendrier entreprise) ;
+      - effectif par rôle (user_roles) et noms.
+    """
+    dpw, wpy = p['days_per_week'], p['weeks_per_year']
+    fte_minutes = _fte_minutes(p) or 1
+
+    # 1) time_analysis
+    weight = TimeAnalysis.frequency * func.coalesce(TimeAnalysis.nb_people, 1) * _prefix_case(TimeAnalysis.recurrence, ANNUAL_FACTORS)
+    ta_rows = (
+        db.session.query(
+            TimeAnalysis.role_id, TimeAnalysis.user_id,
+            func.sum(TimeAnalysis.duration * weight),
+            func.sum((func.coalesce(TimeAnalysis.delay, 0) + func.coalesce(TimeAnalysis.delay_increase, 0)) * weight),
+        )
+        .join(Activities, Activities.id == TimeAnalysis.activity_id)
+        .filter(Activities.entity_id == entity_id)
+        .group_by(TimeAnalysis.role_id, TimeAnalysis.user_id)
+        .all()
+    )
+
+    # 2) dernière analyse par rôle
+    latest = (
+        db.session.query(func.max(TimeRoleAnalysis.id).label("rid"))
+        .join(Role, Role.id == TimeRoleAnalysis.role_id)
+        .filter(Role.entity_id == entity_id)
+        .group_by(TimeRoleAnalysis.role_id)
+        .subquery()
+    )
+    line_weight = (
+        case((TimeRoleLine.frequency < 1, 1), else_=TimeRoleLine.frequency)
+        * _prefix_case(TimeRoleLine.recurrence, (("jour", dpw * wpy), ("hebdo", wpy), ("mens", 12), ("ann", 1)))
+    )
+    line_duration = func.coalesce(func.nullif(TimeRoleLine.duration_minutes, 0), Activities.duration_minutes, 0)
+    role_rows = (
+        db.session.query(
+            TimeRoleAnalysis.role_id,
+            func.sum(line_duration * line_weight),
+            func.sum(func.coalesce(TimeRoleLine.delay_minutes, 0) * line_weight),
+        )
+        .join(latest, latest.c.rid == TimeRoleAnalysis.id)
+        .join(TimeRoleLine, TimeRoleLine.role_analysis_id == TimeRoleAnalysis.id)
+        .outerjoin(Activities, Activities.id == TimeRoleLine.activity_id)
+        .group_by(TimeRoleAnalysis.role_id)
+        .all()
+    )
+
+    # 3) rôles + effectif
+    roles = (
+        db.session.query(Role.id, Role.name, func.count(UserRole.user_id))
+        .outerjoin(UserRole, UserRole.role_id == Role.id)
+        .filter(Role.entity_id == entity_id)
+        .group_by(Role.id, Role.name)
+        .all()
+    )
+
+    by_role = {
+        rid: {"role_id": rid, "name": name, "headcount": int(headcount or 0),
+              "role_analysis_minutes": 0.0, "time_analysis_minutes": 0.0, "delay_minutes": 0.0}
+        for rid, name, headcount in roles
+    }
+    by_user = {}
+    unassigned = {"annual_minutes": 0.0, "delay_minutes": 0.0}
+
+    # Une passe sur chaque résultat agrégé
+    for role_id, user_id, minutes, delay in ta_rows:
+        minutes, delay = float(minutes or 0), float(delay or 0)
+        if role_id in by_role:
+            by_role[role_id]["time_analysis_minutes"] += minutes
+            by_role[role_id]["delay_minutes"] += delay
+        if user_id is not None:
+            u = by_user.setdefault(user_id, {"user_id": user_id, "annual_minutes": 0.0, "delay_minutes": 0.0})
+            u["annual_minutes"] += minutes
+            u["delay_minutes"] += delay
+        if role_id not in by_role and user_id is None:
+            unassigned["annual_minutes"] += minutes
+            unassigned["delay_minutes"] += delay
+
+    for role_id, minutes, delay in role_rows:
+        if role_id in by_role:
+            by_role[role_id]["role_analysis_minutes"] += float(minutes or 0)
+            by_role[role_id]["delay_minutes"] += float(delay or 0)
+
+    if by_user:
+        names = db.session.query(User.id, User.first_name, User.last_name).filter(User.id.in_(by_user))
+        for uid, first, last in names:
+            by_user[uid]["name"] = f"{first} {last}".strip()
+
+    roles_out = []
+    for r in by_role.values():
+        r["annual_minutes"] = r["role_analysis_minutes"] + r["time_analysis_minutes"]
+        r["fte"] = round(r["annual_minutes"] / fte_minutes, 3)
+        r["load_ratio"] = round(r["fte"] / r["headcount"], 3) if r["headcount"] else None
+        roles_out.append(r)
+    for u in by_user.values():
+        u["fte"] = round(u["annual_minutes"] / fte_minutes, 3)
+
+    # Chaque ligne agrégée compte une fois au total, même rattachée à un rôle ET un utilisateur
+    total_minutes = sum(float(m or 0) for _r, _u, m, _d in ta_rows) + sum(float(m or 0) for _r, m, _d in role_rows)
+    total_delay = sum(float(d or 0) for _r, _u, _m, d in ta_rows) + sum(float(d or 0) for _r, _m, d in role_rows)
+    total_headcount = sum(r["headcount"] for r in roles_out)
+
+    return {
+        "entity_id": entity_id,
+        "totals": {
+            "annual_minutes": round(total_minutes, 2),
+            "annual_hours": round(total_minutes / 60, 2),
+            "fte": round(total_minutes / fte_minutes, 3),
+            "headcount": total_headcount,
+            "delay_minutes": round(total_delay, 2),
+            "delay_fte": round(total_delay / fte_minutes, 3),
+        },
+        "by_role": sorted(roles_out, key=lambda r: -r["annual_minutes"]),
+        "by_user": sorted(by_user.values(), key=lambda u: -u["annual_minutes"]),
+        "unassigned": unassigned,
+        "calendar": p,
+    }
+
+def workload_rollup(entity_id, refresh=False):
+    """Rollup mis en cache ; retourne (données, hit, génération de la clé)."""
+    p = get_calendar_params()
+    generation = workload_generation(entity_id)
+    key = (entity_id, generation, tuple(sorted(p.items())))
+    now = time.monotonic()
+    with _workload_lock:
+        cached = _workload_cache.get(key)
+        if cached and not refresh and now - cached[0] < WORKLOAD_CACHE_TTL:
+            _workload_cache.move_to_end(key)
+            _workload_state["hits"] += 1
+            return cached[1], True, generation
+        _workload_state["misses"] += 1
+
+    data = compute_workload_rollup(entity_id, p)
+    with _workload_lock:
+        _workload_cache[key] = (now, data)
+        while len(_workload_cache) > WORKLOAD_CACHE_SIZE:
+            _workload_cache.popitem(last=False)
+    return data, False, generation
+
+@time_bp.route('/api/workload_rollup', methods=['GET'])
+def api_workload_rollup():
+    """GET /temps/api/workload_rollup?entity_id=<id>[&refresh=1] — entité active par défaut."""
+    requested = request.args.get('entity_id', type=int)
+    entity_id = Entity.owned_id(requested) if requested else Entity.get_active_id()
+    if requested and not entity_id:
+        return jsonify({"ok": False, "error": "Entité non trouvée"}), 404
+    if not entity_id:
+        return jsonify({"ok": False, "error": "entity_id requis"}), 400
+    data, hit, generation = workload_rollup(entity_id, refresh=bool(request.args.get('refresh', type=int)))
+    return jsonify({"ok": True, "cached": hit, "generation": generation, **data})
+
 # ========================= FAIBLESSE =========================
+WPM = 4.34524   # semaines par mois
+WPA = 52.1429   # semaines par an
+WEAKNESS_MAX_SCENARIOS = 2000
+WEAKNESS_MAX_SAMPLES = 20000
+WEAKNESS_PERCENTILES = (10, 50, 90)
+
+def recurrence_per_year(rec, params):
+    """H : nombre d'occurrences par an de la récurrence."""
+    Js, Sa = params['days_per_week'], params['weeks_per_year']
+    if rec.startswith('jour'):
+        return Js * Sa
+    if rec.startswith('hebdo'):
+        return Sa
+    if rec.startswith('mens'):
+        return Sa / WPM
+    return Sa / WPA
+
+def weakness_calc(B, C, L_qty, M_qty, N_denom, H, Sa):
+    """Colonnes O…AA du calculateur de faiblesse pour un scénario."""
+    O = 1.0 / N_denom
+    P = H * O
+    months = Sa / WPM
+    U = L_qty * P
+    V = (L_qty + M_qty) * P
+    return {
+        "O": O, "P": P,
+        "Q": L_qty * O, "R": (L_qty + M_qty) * O,
+        "S": B + L_qty * O, "T": C + (L_qty + M_qty) * O,
+        "U": U, "V": V,
+        "W": U / months if months else 0,
+        "X": V / months if months else 0,
+        "Y": C + M_qty, "Z": M_qty, "AA": P,
+    }
+
+def _weakness_row(activity_id, task_id, B, C, rec, freq, weakness_txt, L_qty, M_qty, N_denom, now):
+    return {
+        "activity_id": activity_id, "task_id": task_id,
+        "duration_std_minutes": B, "delay_std_minutes": C,
+        "recurrence": rec, "frequency": freq, "weakness": weakness_txt,
+        "work_added_qty": L_qty, "work_added_unit": 'minutes',
+        "wait_added_qty": M_qty, "wait_added_unit": 'minutes',
+        "prob_denom": N_denom, "created_at": now,
+    }
+
+def _bulk_insert_weakness(rows):
+    """Un seul INSERT multi-lignes (executemany) au lieu d'un add() par ligne."""
+    if rows:
+        db.session.execute(db.insert(TimeWeakness), rows)
+
+def _weakness_tasks(d, with_ids=False):
+    """
+    Tâches du payload en [(task_id, durée, délai)] (minutes) ; task_id exigé
+    seulement si with_ids. ValueError en nommant l'indice fautif.
+    """
+    tasks = d.get('tasks') or []
+    if not isinstance(tasks, list):
+        raise ValueError("tasks : liste attendue")
+    out = []
+    for i, t in enumerate(tasks):
+        if not isinstance(t, dict):
+            raise ValueError(f"tasks[{i}] : objet attendu")
+        dur = _minutes(t.get('duration_std', 0), t.get('duration_unit') or 'minutes', f"tasks[{i}].duration_std")
+        delay = 0
+        if t.get('delay_std') is not None:
+            delay = _minutes(t.get('delay_std'), t.get('delay_unit') or 'minutes', f"tasks[{i}].delay_std")
+        task_id = None
+        if with_ids:
+            try:
+                task_id = int(t.get('task_id'))
+            except (TypeError, ValueError):
+                raise ValueError(f"tasks[{i}].task_id invalide : {t.get('task_id')!r}")
+        out.append((task_id, dur, delay))
+    return out
+
+def _base_minutes(d, mode, tasks):
+    """(B, C) : durée et délai standard de l'activité ou de ses tâches."""
+    C = _minutes(d.get('delay_std', 0), d.get('delay_unit') or 'minutes', 'delay_std')
+    if mode == 'tasks':
+        B = sum(dur for _, dur, _ in tasks)
+    else:
+        B = _minutes(d.get('duration_std', 0), d.get('duration_unit') or 'minutes', 'duration_std')
+    return B, C
+
+def _task_rows(activity_id, tasks, rec, freq, weakness_txt, L_qty, M_qty, N_denom, now):
+    return [
+        _weakness_row(activity_id, task_id, dur, delay, rec, freq, weakness_txt, L_qty, M_qty, N_denom, now)
+        for task_id, dur, delay in tasks
+    ]
+
 @time_bp.route('/api/weakness', methods=['POST'])
 def api_weakness():
     d = request.get_json(force=True) or {}
@@ -468,79 +838,250 @@ def api_weakness():
     M_qty = to_minutes(d.get('M_wait_added', 0), d.get('M_unit') or 'minutes')
     N_denom = max(1, int(d.get('N_prob_denom') or 1))
 
-    C = to_minutes(d.get('delay_std', 0), d.get('delay_unit') or 'minutes')
-
-    tasks_payload = d.get('tasks') or []
-    if mode == 'tasks':
-        B = sum(to_minutes(t.get('duration_std', 0), t.get('duration_unit') or 'minutes') for t in tasks_payload)
-    else:
-        B = to_minutes(d.get('duration_std', 0), d.get('duration_unit') or 'minutes')
+    try:
+        tasks = _weakness_tasks(d, with_ids=save and mode == 'tasks')
+        B, C = _base_minutes(d, mode, tasks)
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
 
     params = get_calendar_params()
-    Js, Sa = params['days_per_week'], params['weeks_per_year']
-    WPM = 4.34524
-    WPA = 52.1429
-
-    if rec.startswith('jour'):
-        H = Js * Sa
-    elif rec.startswith('hebdo'):
-        H = Sa
-    elif rec.startswith('mens'):
-        H = Sa / WPM
-    else:
-        H = Sa / WPA
-
-    O = 1.0 / N_denom
-    P = H * O
-    Q = L_qty * O
-    Rv = (L_qty + M_qty) * O
-    S = B + Q
-    T = C + Rv
-    U = L_qty * P
-    V = (L_qty + M_qty) * P
-    W = U / (Sa / WPM) if (Sa / WPM) else 0
-    X = V / (Sa / WPM) if (Sa / WPM) else 0
-    Y = C + M_qty
-    Z = M_qty
-    AA = P
+    calc = weakness_calc(B, C, L_qty, M_qty, N_denom, recurrence_per_year(rec, params), params['weeks_per_year'])
 
     if save:
-        if mode == 'tasks' and tasks_payload:
-            for t in tasks_payload:
-                dur_task = to_minutes(t.get('duration_std', 0), t.get('duration_unit') or 'minutes')
-                del_task = to_minutes(t.get('delay_std', 0), t.get('delay_unit') or 'minutes') if t.get('delay_std') is not None else 0
-                db.session.add(TimeWeakness(
-                    activity_id=activity_id, task_id=int(t.get('task_id')),
-                    duration_std_minutes=dur_task, delay_std_minutes=del_task or 0,
-                    recurrence=rec, frequency=freq, weakness=weakness_txt,
-                    work_added_qty=L_qty, work_added_unit='minutes',
-                    wait_added_qty=M_qty, wait_added_unit='minutes',
-                    prob_denom=N_denom, created_at=datetime.utcnow()
-                ))
-            db.session.add(TimeWeakness(
-                activity_id=activity_id, task_id=None,
-                duration_std_minutes=B, delay_std_minutes=C,
-                recurrence=rec, frequency=freq, weakness=weakness_txt,
-                work_added_qty=L_qty, work_added_unit='minutes',
-                wait_added_qty=M_qty, wait_added_unit='minutes',
-                prob_denom=N_denom, created_at=datetime.utcnow()
-            ))
-        else:
-            db.session.add(TimeWeakness(
-                activity_id=activity_id, task_id=None,
-                duration_std_minutes=B, delay_std_minutes=C,
-                recurrence=rec, frequency=freq, weakness=weakness_txt,
-                work_added_qty=L_qty, work_added_unit='minutes',
-                wait_added_qty=M_qty, wait_added_unit='minutes',
-                prob_denom=N_denom, created_at=datetime.utcnow()
-            ))
+        now = datetime.utcnow()
+        rows = []
+        if mode == 'tasks' and tasks:
+            rows = _task_rows(activity_id, tasks, rec, freq, weakness_txt, L_qty, M_qty, N_denom, now)
+        rows.append(_weakness_row(activity_id, None, B, C, rec, freq, weakness_txt, L_qty, M_qty, N_denom, now))
+        _bulk_insert_weakness(rows)
         db.session.commit()
 
     return jsonify({
         "ok": True,
         "mode": mode,
         "activity_id": activity_id,
-        "calc": {"O": O, "P": P, "Q": Q, "R": Rv, "S": S, "T": T, "U": U, "V": V, "W": W, "X": X, "Y": Y, "Z": Z, "AA": AA},
+        "calc": calc,
         "B_minutes": B, "C_minutes": C,
-        "params": get_calendar_params()
+        "params": params
     })
+
+# ---------- Faiblesse : scénarios en lot ----------
+def _as_list(value, default):
+    if value is None:
+        return [default]
+    return value if isinstance(value, list) else [value]
+
+def _positive_int(value, name):
+    try:
+        return max(1, int(value or 1))
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} invalide : {value!r}")
+
+def _minutes(value, unit, name):
+    try:
+        return to_minutes(value, unit)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} invalide : {value!r}")
+
+def weakness_scenarios(d, limit=WEAKNESS_MAX_SCENARIOS):
+    """
+    Scénarios explicites (`scenarios`) ou produit cartésien de `grid` :
+      grid = {"recurrence": [...], "N_prob_denom": [...],
+              "L_work_added": [...], "M_wait_added": [...]}
+    Retourne une liste de tuples (rec, L_minutes, M_minutes, N_denom).
+    ValueError si le nombre de scénarios dépasse `limit` (vérifié sur les
+    longueurs, avant de construire le produit) ou si une valeur est invalide.
+    """
+    from itertools import product
+    from math import prod
+
+    L_unit = d.get('L_unit') or 'minutes'
+    M_unit = d.get('M_unit') or 'minutes'
+    if d.get('scenarios'):
+        if not isinstance(d['scenarios'], list) or not all(isinstance(s, dict) for s in d['scenarios']):
+            raise ValueError("scenarios : liste d'objets attendue")
+        raw = [(s.get('recurrence'), s.get('L_work_added'), s.get('M_wait_added'), s.get('N_prob_denom'))
+               for s in d['scenarios']]
+        count = len(raw)
+        prefix = 'scenarios[{}].'.format
+    else:
+        grid = d.get('grid') or {}
+        axes = (
+            _as_list(grid.get('recurrence'), d.get('recurrence') or 'journalier'),
+            _as_list(grid.get('L_work_added'), d.get('L_work_added', 0)),
+            _as_list(grid.get('M_wait_added'), d.get('M_wait_added', 0)),
+            _as_list(grid.get('N_prob_denom'), d.get('N_prob_denom', 1)),
+        )
+        raw = product(*axes)    # paresseux : rien n'est construit avant le contrôle
+        count = prod(len(axis) for axis in axes)
+        prefix = 'grid[{}].'.format
+    if count > limit:
+        raise ValueError(f"{count} scénarios (max {limit})")
+    return [
+        (str(rec or 'journalier').strip().lower(),
+         _minutes(L, L_unit, prefix(i) + 'L_work_added'), _minutes(M, M_unit, prefix(i) + 'M_wait_added'),
+         _positive_int(N, prefix(i) + 'N_prob_denom'))
+        for i, (rec, L, M, N) in enumerate(raw)
+    ]
+
+def evaluate_weakness_grid(scenarios, B, C, params):
+    """
+    Évalue tous les scénarios en une passe colonne par colonne : H n'est
+    calculé qu'une fois par récurrence distincte, puis chaque formule est
+    appliquée sur les colonnes L, M, N.
+    """
+    Sa = params['weeks_per_year']
+    months = Sa / WPM
+    H_by_rec = {rec: recurrence_per_year(rec, params) for rec in {s[0] for s in scenarios}}
+
+    H = [H_by_rec[s[0]] for s in scenarios]
+    L = [s[1] for s in scenarios]
+    M = [s[2] for s in scenarios]
+    O = [1.0 / s[3] for s in scenarios]
+    LM = [l + m for l, m in zip(L, M)]
+    P = [h * o for h, o in zip(H, O)]
+    Q = [l * o for l, o in zip(L, O)]
+    R = [lm * o for lm, o in zip(LM, O)]
+    U = [l * p for l, p in zip(L, P)]
+    V = [lm * p for lm, p in zip(LM, P)]
+    inv_months = 1 / months if months else 0
+    return {
+        "O": O, "P": P, "Q": Q, "R": R,
+        "S": [B + q for q in Q], "T": [C + r for r in R],
+        "U": U, "V": V,
+        "W": [u * inv_months for u in U], "X": [v * inv_months for v in V],
+        "Y": [C + m for m in M], "Z": M, "AA": P,
+    }
+
+def _sampler(spec, unit_default, rng):
+    """
+    Distribution d'un paramètre (L, M ou N) :
+      {"dist": "fixed", "value": x}
+      {"dist": "uniform", "min": a, "max": b}
+      {"dist": "triangular", "min": a, "mode": c, "max": b}
+      {"dist": "normal", "mean": m, "sd": s}      (tronquée à 0)
+    """
+    dist = (spec.get('dist') or 'fixed').lower()
+    unit = spec.get('unit') or unit_default
+    scale = to_minutes(1, unit)
+    if dist == 'uniform':
+        a, b = float(spec.get('min', 0)), float(spec.get('max', 0))
+        return lambda: rng.uniform(a, b) * scale
+    if dist == 'triangular':
+        a, b = float(spec.get('min', 0)), float(spec.get('max', 0))
+        c = float(spec.get('mode', (a + b) / 2))
+        return lambda: rng.triangular(a, b, c) * scale
+    if dist == 'normal':
+        m, sd = float(spec.get('mean', 0)), float(spec.get('sd', 0))
+        return lambda: max(0.0, rng.gauss(m, sd)) * scale
+    value = float(spec.get('value', 0)) * scale
+    return lambda: value
+
+def _percentiles(values, pcts):
+    values = sorted(values)
+    last = len(values) - 1
+    out = {}
+    for p in pcts:
+        k = last * p / 100
+        lo = int(k)
+        hi = min(lo + 1, last)
+        out[f"p{p:g}"] = values[lo] + (values[hi] - values[lo]) * (k - lo)
+    return out
+
+def weakness_monte_carlo(mc, rec, B, C, params):
+    """
+    Tire `samples` valeurs de L, M et N puis retourne les percentiles des
+    colonnes annuelles (P, U, V, W, X) et des durées S, T.
+    """
+    import random
+
+    rng = random.Random(mc.get('seed'))
+    samples = min(_positive_int(mc.get('samples') or 2000, 'samples'), WEAKNESS_MAX_SAMPLES)
+    pcts = mc.get('percentiles') or WEAKNESS_PERCENTILES
+    if not isinstance(pcts, (list, tuple)) or not all(
+            isinstance(p, (int, float)) and not isinstance(p, bool) and 0 <= p <= 100 for p in pcts):
+        raise ValueError("percentiles : nombres entre 0 et 100 attendus")
+    for key in ('L', 'M', 'N'):
+        if mc.get(key) is not None and not isinstance(mc[key], dict):
+            raise ValueError(f"{key} : objet attendu")
+    draw_L = _sampler(mc.get('L') or {}, 'minutes', rng)
+    draw_M = _sampler(mc.get('M') or {}, 'minutes', rng)
+    N_spec = dict(mc.get('N') or {'value': 1}, unit='minutes')
+    draw_N = _sampler(N_spec, 'minutes', rng)
+
+    scenarios = [(rec, draw_L(), draw_M(), max(1.0, draw_N())) for _ in range(samples)]
+    cols = evaluate_weakness_grid(scenarios, B, C, params)
+    return {
+        "samples": samples,
+        "recurrence": rec,
+        "percentiles": {k: _percentiles(cols[k], pcts) for k in ("P", "S", "T", "U", "V", "W", "X")},
+    }
+
+@time_bp.route('/api/weakness/batch', methods=['POST'])
+def api_weakness_batch():
+    """
+    Évalue une grille de scénarios pour une activité (mêmes champs que
+    /api/weakness + `grid` ou `scenarios`), optionnellement un Monte Carlo
+    (`monte_carlo`: {samples, seed, percentiles, L, M, N}) ; `save` insère
+    toutes les lignes en un seul INSERT.
+    """
+    d = request.get_json(force=True) or {}
+    mode = (d.get('mode') or 'activity').strip().lower()
+    try:
+        activity_id = int(d.get('activity_id'))
+    except (TypeError, ValueError):
+        return jsonify({"ok": False, "error": "activity_id requis"}), 400
+    try:
+        freq = int(d.get('frequency') or 1)
+    except (TypeError, ValueError):
+        return jsonify({"ok": False, "error": "frequency invalide"}), 400
+    weakness_txt = (d.get('weakness') or '').strip()
+
+    try:
+        scenarios = weakness_scenarios(d)
+        tasks = _weakness_tasks(d, with_ids=bool(d.get('save')) and mode == 'tasks')
+        B, C = _base_minutes(d, mode, tasks)
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+
+    params = get_calendar_params()
+    cols = evaluate_weakness_grid(scenarios, B, C, params)
+    keys = list(cols)
+    results = [
+        {"recurrence": rec, "L_minutes": L, "M_minutes": M, "N_prob_denom": N,
+         "calc": {k: cols[k][i] for k in keys}}
+        for i, (rec, L, M, N) in enumerate(scenarios)
+    ]
+
+    out = {
+        "ok": True,
+        "mode": mode,
+        "activity_id": activity_id,
+        "count": len(results),
+        "scenarios": results,
+        "B_minutes": B, "C_minutes": C,
+        "params": params,
+    }
+
+    if d.get('monte_carlo'):
+        mc = d['monte_carlo']
+        if not isinstance(mc, dict):
+            return jsonify({"ok": False, "error": "monte_carlo : objet attendu"}), 400
+        rec = str(mc.get('recurrence') or d.get('recurrence') or 'journalier').strip().lower()
+        try:
+            out["monte_carlo"] = weakness_monte_carlo(mc, rec, B, C, params)
+        except (TypeError, ValueError) as e:
+            return jsonify({"ok": False, "error": f"monte_carlo : {e}"}), 400
+
+    if d.get('save') and scenarios:
+        now = datetime.utcnow()
+        rows = []
+        for rec, L, M, N in scenarios:
+            if mode == 'tasks' and tasks:
+                rows.extend(_task_rows(activity_id, tasks, rec, freq, weakness_txt, L, M, N, now))
+            rows.append(_weakness_row(activity_id, None, B, C, rec, freq, weakness_txt, L, M, N, now))
+        _bulk_insert_weakness(rows)
+        db.session.commit()
+        out["saved"] = len(rows)
+
+    return jsonify(out)
@@ -21,8 +21,10 @@ def add_tools_to_task():
     try:
         # (1) Associer des outils existants via leurs IDs
         if 'existing_tool_ids' in data and isinstance(data['existing_tool_ids'], list):
-            for tool_id in data['existing_tool_ids']:
-                tool = Tool.query.get(tool_id)
+            wanted = [int(tid) for tid in data['existing_tool_ids'] if str(tid).isdigit()]
+            tools_by_id = {t.id: t for t in Tool.query.filter(Tool.id.in_(wanted))} if wanted else {}
+            for tool_id in wanted:
+                tool = tools_by_id.get(tool_id)
                 if tool and tool not in task.tools:
                     task.tools.append(tool)
                     added_tools.append({"id": tool.id, "name": tool.name})
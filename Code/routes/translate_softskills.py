@@ -4,6 +4,8 @@ import json
 import re
 from flask import Blueprint, request, jsonify, current_app
 
+from .propose_common import chat_completion
+
 translate_softskills_bp = Blueprint('translate_softskills_bp', __name__, url_prefix='/translate_softskills')
 
 X50_766_HSC = """
@@ -182,7 +184,8 @@ def translate_softskills():
         return jsonify({"error": err}), 500
 
     try:
-        response = client.chat.completions.create(
+        response = chat_completion(
+            client,
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": "Tu es un assistant spécialisé en habiletés socio-cognitives X50-766. Tu réponds UNIQUEMENT en JSON valide, sans markdown ni texte supplémentaire."},
@@ -13,6 +13,8 @@ import xml.etree.ElementTree as ET
 from typing import List, Dict, Optional, Tuple, Set
 import os
 
+from Code.metrics import VSDX_PARSE
+
 
 class VsdxConnectionParser:
     """Parse les connexions d'un fichier VSDX."""
@@ -205,8 +207,9 @@ class VsdxConnectionParser:
 
 
 def parse_vsdx_connections(vsdx_path: str) -> Tuple[List[Dict], List[str]]:
-    parser = VsdxConnectionParser(vsdx_path)
-    return parser.parse()
+    with VSDX_PARSE.time(parser="connections"):
+        parser = VsdxConnectionParser(vsdx_path)
+        return parser.parse()
 
 
 def normalize_activity_name(name: str) -> str:
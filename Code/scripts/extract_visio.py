@@ -1,11 +1,13 @@
 import os
 import sys
+import threading
 from vsdx import VisioFile
 
 # Pour pouvoir importer Code.extensions et Code.models.models
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
 
 from Code.extensions import db
+from Code.metrics import VSDX_PARSE
 from Code.models.models import Activities, Data, Link
 
 # Calques Visio gérés
@@ -21,7 +23,10 @@ LAYER_MAPPING = {
 IGNORE_LAYERS = ["légende", "Color"]
 
 # ------------------- Variables globales -------------------
-# Elles sont utilisées par process_visio_file et print_summary
+# Elles sont utilisées par process_visio_file et print_summary.
+# Partagées par le processus : import_visio() sérialise les imports
+# (workers gthread/gevent).
+_import_lock = threading.Lock()
 activity_mapping = {}
 data_mapping = {}
 return_mapping = {}  # retours
@@ -70,7 +75,7 @@ def process_visio_file(vsdx_path):
     rename_summaries.clear()
 
     # Parcours du visio
-    with VisioFile(vsdx_path) as visio:
+    with VSDX_PARSE.time(parser="extract_visio"), VisioFile(vsdx_path) as visio:
         for page in visio.pages:
             print(f"INFO : Analyse de la page : {page.name}")
             for shape in page.all_shapes:
@@ -439,28 +444,42 @@ def standardize_id(visio_id):
         return str(visio_id).strip().lower()
 
 
-def print_summary():
+def import_visio(vsdx_path):
+    """
+    Import complet sous verrou (process_visio_file + résumé) ; retourne le
+    texte du résumé. Utilisé par la route /update-cartography.
     """
-    Affiche (print) un résumé des liens créés (link_summaries)
-    et des renommages (rename_summaries).
-    Cette fonction est appelée par activities.py
-    dans la route /update-cartography (avec contextlib.redirect_stdout).
+    with _import_lock:
+        process_visio_file(vsdx_path)
+        return summary_text()
+
+
+def summary_text():
     """
-    print("\n--- RÉSUMÉ DES LIENS ---")
+    Résumé des liens créés (link_summaries) et des renommages
+    (rename_summaries), sans passer par sys.stdout (partagé entre threads).
+    """
+    lines = ["", "--- RÉSUMÉ DES LIENS ---"]
     if link_summaries:
         for (data_name, data_type, s_name, t_name) in link_summaries:
-            print(f"  - '{data_name}' ({data_type}) : {s_name} -> {t_name}")
+            lines.append(f"  - '{data_name}' ({data_type}) : {s_name} -> {t_name}")
     else:
-        print("  Aucun lien créé")
-    print("--- Fin du résumé ---\n")
+        lines.append("  Aucun lien créé")
+    lines += ["--- Fin du résumé ---", ""]
 
     if rename_summaries:
-        print("--- Renommages détectés ---")
+        lines.append("--- Renommages détectés ---")
         for (old, new) in rename_summaries:
-            print(f"  * '{old}' => '{new}'")
-        print("--- Fin des renommages ---\n")
+            lines.append(f"  * '{old}' => '{new}'")
+        lines += ["--- Fin des renommages ---", ""]
+
+    lines.append("CONFIRMATION : toutes les opérations ont été effectuées avec succès.")
+    return "\n".join(lines) + "\n"
 
-    print("CONFIRMATION : toutes les opérations ont été effectuées avec succès.")
+
+def print_summary():
+    """Affiche le résumé (exécution en script)."""
+    print(summary_text(), end="")
 
 
 if __name__ == "__main__":
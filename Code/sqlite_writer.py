@@ -0,0 +1,189 @@
+# Code/sqlite_writer.py
+"""
+Profil SQLite de production : pragmas à la connexion et file d'écriture
+unique par processus.
+
+Pragmas (variables d'environnement, appliqués par Code/extensions.py) :
+    SQLITE_SYNCHRONOUS     NORMAL   (sûr en WAL : seul le dernier commit peut
+                                     être perdu en cas de coupure système)
+    SQLITE_CACHE_KB        65536    (cache de pages par connexion)
+    SQLITE_MMAP_MB         256      (lecture des pages par mmap)
+    SQLITE_BUSY_TIMEOUT_MS 30000
+journal_mode=WAL et temp_store=MEMORY sont toujours appliqués.
+
+File d'écriture (SQLITE_WRITE_SERIALIZER=1, base fichier uniquement) :
+les écritures courtes soumises par run_write() sont exécutées par un seul
+thread, regroupées par lots de WRITE_BATCH_MAX dans une transaction
+BEGIN IMMEDIATE (un SAVEPOINT par écriture : un échec n'annule que la
+sienne). Le verrou d'écriture est pris une fois par lot au lieu d'une fois
+par requête, et BEGIN IMMEDIATE évite les « database is locked » immédiats
+des transactions différées qui passent de la lecture à l'écriture.
+Entre processus (workers gunicorn), WAL + busy_timeout prennent le relais.
+Désactivée par défaut : d'après benchmarks/sqlite_concurrency.py, elle
+resserre la queue de latence des écritures (p95) mais le passage de main
+entre threads (GIL) coûte en débit et en latence médiane. À activer quand
+les workers ont beaucoup de threads qui écrivent en même temps.
+
+Sans file (PostgreSQL, SQLite en mémoire), run_write() exécute l'écriture
+immédiatement dans sa propre transaction.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import StaticPool
+
+from Code.extensions import db
+
+WRITE_BATCH_MAX = 64
+WRITE_BATCH_WAIT_MS = 0        # 0 : lot = écritures déjà en file (group commit opportuniste)
+WRITE_TIMEOUT_S = 30
+
+SQLITE_PRAGMA_DEFAULTS = {
+    "SQLITE_SYNCHRONOUS": "NORMAL",
+    "SQLITE_CACHE_KB": 65536,
+    "SQLITE_MMAP_MB": 256,
+    "SQLITE_BUSY_TIMEOUT_MS": 30000,
+}
+
+
+def sqlite_pragmas():
+    """Liste des PRAGMA à exécuter sur chaque nouvelle connexion SQLite."""
+    conf = {k: os.getenv(k, v) for k, v in SQLITE_PRAGMA_DEFAULTS.items()}
+    synchronous = str(conf["SQLITE_SYNCHRONOUS"]).upper()
+    if synchronous not in ("OFF", "NORMAL", "FULL", "EXTRA"):
+        synchronous = "NORMAL"
+    return [
+        "PRAGMA journal_mode=WAL",
+        f"PRAGMA synchronous={synchronous}",
+        f"PRAGMA busy_timeout={int(conf['SQLITE_BUSY_TIMEOUT_MS'])}",
+        f"PRAGMA cache_size=-{int(conf['SQLITE_CACHE_KB'])}",
+        f"PRAGMA mmap_size={int(conf['SQLITE_MMAP_MB']) * 1024 * 1024}",
+        "PRAGMA temp_store=MEMORY",
+    ]
+
+
+class WriteSerializer:
+    """Thread d'écriture unique, démarré à la première soumission (après fork)."""
+
+    def __init__(self, url, batch_max=WRITE_BATCH_MAX, batch_wait_ms=WRITE_BATCH_WAIT_MS):
+        self.url = url
+        self.batch_max = batch_max
+        self.batch_wait = batch_wait_ms / 1000
+        self.stats = {"jobs": 0, "batches": 0, "errors": 0}
+        self._queue = queue.Queue()
+        self._engine = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _make_engine(self):
+        # Transactions gérées à la main : BEGIN IMMEDIATE au lieu du BEGIN
+        # différé implicite de pysqlite (recette SQLAlchemy « pysqlite »).
+        # Une seule connexion gardée ouverte : seul le thread d'écriture l'utilise.
+        engine = create_engine(self.url, poolclass=StaticPool, connect_args={"check_same_thread": False})
+
+        @event.listens_for(engine, "connect")
+        def _autocommit_driver(dbapi_connection, connection_record):
+            dbapi_connection.isolation_level = None
+
+        @event.listens_for(engine, "begin")
+        def _begin_immediate(conn):
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+        return engine
+
+    def _ensure_started(self):
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            # Après un fork, le thread et les connexions du parent n'existent plus
+            self._queue = queue.Queue()
+            self._engine = self._make_engine()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="sqlite-writer", daemon=True)
+            self._thread.start()
+
+    def submit(self, fn, *args, **kwargs):
+        """Met fn(conn, *args, **kwargs) en file ; retourne un Future."""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((fn, args, kwargs, future))
+        return future
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_max:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = [job for job in self._next_batch() if job[3].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            results = []
+            try:
+                with self._engine.begin() as conn:
+                    for fn, args, kwargs, future in batch:
+                        try:
+                            with conn.begin_nested():
+                                results.append((future, fn(conn, *args, **kwargs), None))
+                        except Exception as exc:
+                            results.append((future, None, exc))
+            except Exception as exc:
+                # Échec du COMMIT (ou de BEGIN IMMEDIATE) : tout le lot échoue
+                self.stats["errors"] += len(batch)
+                for _, _, _, future in batch:
+                    future.set_exception(exc)
+                continue
+            self.stats["batches"] += 1
+            for future, result, exc in results:
+                self.stats["jobs"] += 1
+                if exc is not None:
+                    self.stats["errors"] += 1
+                    future.set_exception(exc)
+                else:
+                    future.set_result(result)
+
+    def close(self):
+        if self._engine is not None:
+            self._engine.dispose()
+
+
+def init_write_serializer(app):
+    """Installe la file d'écriture si la base est un fichier SQLite."""
+    url = db.engine.url
+    enabled = os.getenv("SQLITE_WRITE_SERIALIZER", "0") == "1"
+    if url.get_backend_name() != "sqlite" or url.database in (None, "", ":memory:") or not enabled:
+        app.extensions["write_serializer"] = None
+        return None
+    serializer = WriteSerializer(url.render_as_string(hide_password=False))
+    app.extensions["write_serializer"] = serializer
+    print(f"[SQLITE] File d'écriture active (lots de {serializer.batch_max})")
+    return serializer
+
+
+def run_write(fn, *args, **kwargs):
+    """
+    Exécute fn(conn, *args, **kwargs) dans sa propre transaction, committée
+    au retour. Passe par la file d'écriture quand elle est active.
+    Les objets ORM déjà chargés dans db.session ne sont pas rafraîchis.
+    """
+    from flask import current_app
+
+    serializer = current_app.extensions.get("write_serializer")
+    if serializer is None:
+        with db.engine.begin() as conn:
+            return fn(conn, *args, **kwargs)
+    return serializer.submit(fn, *args, **kwargs).result(timeout=WRITE_TIMEOUT_S)
@@ -0,0 +1,267 @@
+# Code/structured_logging.py
+"""
+Journalisation structurée des chemins chauds : lignes JSON, filtrées par
+niveau, écrites par un thread dédié.
+
+    from Code.structured_logging import get_logger
+    log = get_logger("carto")
+    log.debug("Activités extraites du SVG", count=len(activities))
+    log.info("Synchronisation %s", "terminée", entity_id=eid, added=3)
+
+- Niveau : LOG_LEVEL (INFO par défaut). Un appel sous le niveau s'arrête au
+  test isEnabledFor : ni formatage du message (arguments « %s » évalués
+  paresseusement, pas de f-string), ni sérialisation, ni écriture.
+- Format : LOG_FORMAT=json (défaut) ou text ; champs nommés (kwargs) à plat
+  dans la ligne JSON, avec ts, level, logger, msg, pid, request_id.
+- Non bloquant : la requête ne fait que poser l'enregistrement dans une file
+  bornée (LOG_QUEUE_SIZE, 10 000) ; un thread par processus (démarré après
+  le fork des workers) sérialise et écrit sur stdout. File pleine :
+  l'enregistrement est abandonné et compté (dropped_records()).
+- Corrélation : un identifiant par requête, repris de l'en-tête X-Request-ID
+  (proxy, autre worker) ou généré, renvoyé dans la réponse et ajouté à
+  chaque ligne, y compris depuis le pool d'E/S (Code/io_executor.py).
+
+Les loggers sont sous « optiq. » (sans propagation vers la racine) ; les
+print("[TAG] ...") hors chemins chauds restent inchangés.
+"""
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import sys
+import threading
+import uuid
+from datetime import datetime, timezone
+
+ROOT_LOGGER = "optiq"
+REQUEST_ID_HEADER = "X-Request-ID"
+
+_request_id = contextvars.ContextVar("request_id", default=None)
+_VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._:-]{1,64}$")
+_LOG_KWARGS = frozenset(("exc_info", "stack_info", "stacklevel", "extra"))
+_CORE_KEYS = ("ts", "level", "logger", "msg", "pid", "request_id")
+_config_lock = threading.Lock()
+
+
+def current_request_id():
+    return _request_id.get()
+
+
+# ============================================================
+# Logger à champs nommés
+# ============================================================
+class StructLogger(logging.LoggerAdapter):
+    """log.info("message %s", arg, champ=valeur) : kwargs inconnus → champs."""
+
+    def process(self, msg, kwargs):
+        fields = {k: kwargs.pop(k) for k in list(kwargs) if k not in _LOG_KWARGS}
+        if fields:
+            kwargs["extra"] = {**kwargs.get("extra", {}), "fields": fields}
+        return msg, kwargs
+
+    def log(self, _level, _msg, *args, **kwargs):
+        # Paramètres renommés : un champ « level » ou « msg » ne les percute pas
+        if self.isEnabledFor(_level):
+            _msg, kwargs = self.process(_msg, kwargs)
+            self.logger.log(_level, _msg, *args, **kwargs)
+
+
+def get_logger(name):
+    return StructLogger(logging.getLogger(f"{ROOT_LOGGER}.{name}"), {})
+
+
+# ============================================================
+# Formatage (thread d'écriture)
+# ============================================================
+class JsonFormatter(logging.Formatter):
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "pid": record.process,
+            "request_id": getattr(record, "request_id", None),
+        }
+        for key, value in (getattr(record, "fields", None) or {}).items():
+            if key not in _CORE_KEYS:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+
+    def __init__(self):
+        super().__init__("[%(asctime)s] %(levelname)s %(name)s [%(request_id)s] %(message)s")
+
+    def format(self, record):
+        if not hasattr(record, "request_id"):
+            record.request_id = None
+        line = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            line += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        return line
+
+
+class _RequestIdFilter(logging.Filter):
+    """Exécuté dans le thread appelant : fige l'identifiant de requête."""
+
+    def filter(self, record):
+        record.request_id = _request_id.get()
+        return True
+
+
+# ============================================================
+# Handler à file (non bloquant)
+# ============================================================
+class _StdoutHandler(logging.StreamHandler):
+    """sys.stdout relu à chaque écriture (remplacé par gunicorn, pytest…)."""
+
+    def emit(self, record):
+        self.stream = sys.stdout
+        super().emit(record)
+
+    def flush(self):
+        self.stream = sys.stdout
+        super().flush()
+
+
+class _Listener(logging.handlers.QueueListener):
+
+    def enqueue_sentinel(self):
+        # Arrêt : attendre une place plutôt qu'échouer sur une file pleine
+        self.queue.put(self._sentinel)
+
+
+class QueueingHandler(logging.handlers.QueueHandler):
+    """
+    File bornée vidée par un QueueListener ; file et thread recréés dans
+    chaque processus (le thread du master ne survit pas au fork).
+    """
+
+    def __init__(self, target, maxsize=10000):
+        super().__init__(None)
+        self.target = target
+        self.maxsize = maxsize
+        self.dropped = 0
+        self._listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self.addFilter(_RequestIdFilter())
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self.queue = queue.Queue(self.maxsize)
+            self._listener = _Listener(self.queue, self.target)
+            self._listener.start()
+            self._pid = os.getpid()
+
+    def prepare(self, record):
+        # Message et traceback figés ici (leurs arguments peuvent changer) ;
+        # la sérialisation JSON est laissée au thread d'écriture
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = self.target.formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        self._ensure_started()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self):
+        """Attend l'écriture de tout ce qui est en file (tests, arrêt)."""
+        if self._pid == os.getpid():
+            self.queue.join()
+        self.target.flush()
+
+    def close(self):
+        if self._pid == os.getpid() and self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+            self._pid = None
+        super().close()
+
+
+def _handler():
+    for handler in logging.getLogger(ROOT_LOGGER).handlers:
+        if isinstance(handler, QueueingHandler):
+            return handler
+    return None
+
+
+def dropped_records():
+    handler = _handler()
+    return handler.dropped if handler else 0
+
+
+def flush():
+    handler = _handler()
+    if handler:
+        handler.flush()
+
+
+def configure_logging(level=None, fmt=None, stream=None, queue_size=None):
+    """Installe le handler à file sur « optiq » (remplace le précédent)."""
+    level = (level or os.getenv("LOG_LEVEL", "INFO")).upper()
+    fmt = (fmt or os.getenv("LOG_FORMAT", "json")).lower()
+    queue_size = queue_size or int(os.getenv("LOG_QUEUE_SIZE", 10000))
+
+    target = logging.StreamHandler(stream) if stream is not None else _StdoutHandler()
+    target.setFormatter(TextFormatter() if fmt == "text" else JsonFormatter())
+    with _config_lock:
+        logger = logging.getLogger(ROOT_LOGGER)
+        old = _handler()
+        if old is not None:
+            logger.removeHandler(old)
+            old.close()
+        logger.addHandler(QueueingHandler(target, queue_size))
+        logger.setLevel(level)
+        logger.propagate = False
+    return logger
+
+
+# ============================================================
+# Identifiant de corrélation par requête
+# ============================================================
+def init_request_logging(app):
+    """X-Request-ID entrant (ou généré) → contexte des logs et en-tête de réponse."""
+    from flask import g, request
+
+    @app.before_request
+    def _bind_request_id():
+        incoming = request.headers.get(REQUEST_ID_HEADER, "")
+        rid = incoming if _VALID_REQUEST_ID.match(incoming) else uuid.uuid4().hex
+        g._request_id_token = _request_id.set(rid)
+
+    @app.after_request
+    def _send_request_id(response):
+        rid = _request_id.get()
+        if rid:
+            response.headers[REQUEST_ID_HEADER] = rid
+        return response
+
+    @app.teardown_request
+    def _unbind_request_id(exception=None):
+        token = g.pop("_request_id_token", None)
+        if token is not None:
+            _request_id.reset(token)
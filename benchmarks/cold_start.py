@@ -0,0 +1,95 @@
+# benchmarks/cold_start.py
+"""
+Benchmark du démarrage à froid d'un worker.
+
+Chaque mesure est faite dans un processus Python neuf :
+  - import_app_ms : `import Code.app` (imports + create_app() du module)
+  - create_app_ms : un second create_app() une fois les modules chargés,
+                    c'est-à-dire le coût par worker avec preload_app
+  - bootstrap_ms  : `bootstrap_database()` (commande ponctuelle, hors workers)
+
+Usage :
+    python benchmarks/cold_start.py                 # base SQLite temporaire
+    python benchmarks/cold_start.py -n 10 --out cold_start.json
+    DATABASE_URL=postgresql://... python benchmarks/cold_start.py
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_CHILD = r"""
+import json, sys, time
+sys.path.insert(0, {root!r})
+t0 = time.perf_counter()
+import Code.app
+t1 = time.perf_counter()
+Code.app.create_app()
+t2 = time.perf_counter()
+print(json.dumps({{"import_app_ms": (t1 - t0) * 1000, "create_app_ms": (t2 - t1) * 1000}}))
+"""
+
+_BOOTSTRAP = r"""
+import json, os, sys, time
+sys.path.insert(0, {root!r})
+os.environ["SCHEMA_CHECK"] = "off"
+from Code.app import app
+from Code.bootstrap import bootstrap_database
+t0 = time.perf_counter()
+bootstrap_database(app, seed=False)
+print(json.dumps({{"bootstrap_ms": (time.perf_counter() - t0) * 1000}}))
+"""
+
+
+def _run(code, env):
+    out = subprocess.run(
+        [sys.executable, "-c", code.format(root=ROOT)],
+        capture_output=True, text=True, env=env, cwd=ROOT, check=True,
+    ).stdout
+    # La dernière ligne est la mesure ; le reste est la sortie de l'app
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def _summary(values):
+    return {
+        "min": round(min(values), 1),
+        "median": round(statistics.median(values), 1),
+        "max": round(max(values), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--runs", type=int, default=5)
+    parser.add_argument("--out", help="Fichier JSON de résultats")
+    args = parser.parse_args()
+
+    env = dict(os.environ, SCHEMA_CHECK="strict")
+    tmpdir = None
+    if not env.get("DATABASE_URL"):
+        tmpdir = tempfile.mkdtemp(prefix="optiq_bench_")
+        env["DATABASE_URL"] = "sqlite:///" + os.path.join(tmpdir, "bench.db")
+
+    bootstrap = _run(_BOOTSTRAP, env)
+    runs = [_run(_CHILD, env) for _ in range(args.runs)]
+
+    result = {
+        "database": env["DATABASE_URL"].split("://", 1)[0],
+        "runs": args.runs,
+        "bootstrap_ms": round(bootstrap["bootstrap_ms"], 1),
+        "import_app_ms": _summary([r["import_app_ms"] for r in runs]),
+        "create_app_ms": _summary([r["create_app_ms"] for r in runs]),
+    }
+    print(json.dumps(result, indent=2))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
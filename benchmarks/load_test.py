@@ -0,0 +1,460 @@
+# benchmarks/load_test.py
+"""
+Test de charge local : gunicorn réel, trafic mixte concurrent, comparaison
+des classes de workers (sync, gthread, gevent).
+
+Déroulement :
+  1. base SQLite temporaire (bootstrap_database) ou DATABASE_URL
+     (--use-database-url, ex. PostgreSQL local), avec --tenants locataires
+     synthétiques (benchmarks/synthetic_tenant.py, mot de passe « bench ») ;
+  2. faux backend OpenAI local (OPENAI_BASE_URL) qui répond après
+     --llm-delay secondes, comme un appel LLM réel ;
+  3. pour chaque classe de workers : gunicorn -c gunicorn.conf.py
+     -k <classe> -w --workers [--threads], puis --vusers utilisateurs
+     virtuels (boucle fermée, client HTTP asyncio keep-alive) pendant
+     --seconds secondes ;
+  4. par classe : débit, taux d'erreurs, et par type de requête
+     p50/p95/p99, erreurs et conflits de révision (409 des sauvegardes).
+
+Trafic (poids relatifs, MIX) : connexion, carte, chargement et
+sauvegarde incrémentale de la cartographie, vue temps, synthèse des
+compétences, proposition de savoirs (LLM).
+
+Classes absentes de l'environnement (gevent non installé) : ignorées
+avec un message.
+
+Usage :
+    python benchmarks/load_test.py
+    python benchmarks/load_test.py --classes sync,gthread --workers 2 --threads 8 --vusers 32 --seconds 30
+    python benchmarks/load_test.py --llm-delay 2 --out load.json
+    DATABASE_URL=postgresql://... python benchmarks/load_test.py --use-database-url
+"""
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlencode
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from benchmarks.synthetic_tenant import add_size_arguments, generate_tenant, size_overrides  # noqa: E402
+
+MIX = {
+    "login": 5,
+    "map": 25,
+    "carto_load": 15,
+    "carto_save": 15,
+    "time_activities": 15,
+    "competences_summary": 10,
+    "llm_propose": 15,
+}
+WORKER_MODULES = {"sync": None, "gthread": None, "gevent": "gevent"}
+REQUEST_TIMEOUT_S = 60
+STARTUP_TIMEOUT_S = 60
+
+
+# ============================================================
+# Faux backend OpenAI
+# ============================================================
+def start_fake_llm(delay):
+    """Serveur /v1/chat/completions local ; retourne (serveur, url de base)."""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            time.sleep(delay)
+            body = json.dumps({
+                "id": "chatcmpl-bench", "object": "chat.completion", "created": int(time.time()),
+                "model": "gpt-4o-mini",
+                "choices": [{"index": 0, "finish_reason": "stop", "message": {
+                    "role": "assistant",
+                    "content": "- Règles de sécurité\n- Procédure interne\n- Référentiel qualité",
+                }}],
+                "usage": {"prompt_tokens": 100, "completion_tokens": 20, "total_tokens": 120},
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+# ============================================================
+# Client HTTP asyncio (keep-alive, cookies)
+# ============================================================
+class HttpClient:
+    """Client HTTP/1.1 minimal : une connexion keep-alive, cookies de session."""
+
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.cookies = {}
+        self._reader = self._writer = None
+
+    async def _connect(self):
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except Exception:
+                pass
+            self._reader = self._writer = None
+
+    async def request(self, method, path, json_body=None, form=None):
+        """Retourne (statut, en-têtes, corps)."""
+        for attempt in (0, 1):
+            if self._writer is None:
+                await self._connect()
+            try:
+                return await self._exchange(method, path, json_body, form)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                # Connexion keep-alive fermée par le serveur entre deux requêtes
+                await self.close()
+                if attempt:
+                    raise
+
+    async def _exchange(self, method, path, json_body, form):
+        body = b""
+        headers = {"Host": f"{self.host}:{self.port}", "Connection": "keep-alive"}
+        if json_body is not None:
+            body = json.dumps(json_body).encode()
+            headers["Content-Type"] = "application/json"
+        elif form is not None:
+            body = urlencode(form).encode()
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        if body or method == "POST":
+            headers["Content-Length"] = str(len(body))
+        if self.cookies:
+            headers["Cookie"] = "; ".join(f"{k}={v}" for k, v in self.cookies.items())
+        head = f"{method} {path} HTTP/1.1\r\n" + "".join(f"{k}: {v}\r\n" for k, v in headers.items())
+        self._writer.write(head.encode("latin-1") + b"\r\n" + body)
+        await self._writer.drain()
+
+        status_line = await self._reader.readline()
+        if not status_line:
+            raise ConnectionResetError("connexion fermée")
+        status = int(status_line.split()[1])
+        resp_headers = {}
+        while True:
+            line = (await self._reader.readline()).decode("latin-1").rstrip("\r\n")
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            name, value = name.strip().lower(), value.strip()
+            if name == "set-cookie":
+                cookie, _, _ = value.partition(";")
+                key, _, val = cookie.partition("=")
+                self.cookies[key.strip()] = val.strip()
+            resp_headers[name] = value
+
+        if resp_headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await self._reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    await self._reader.readline()
+                    break
+                chunks.append(await self._reader.readexactly(size))
+                await self._reader.readline()
+            payload = b"".join(chunks)
+        elif "content-length" in resp_headers:
+            payload = await self._reader.readexactly(int(resp_headers["content-length"]))
+        else:
+            payload = await self._reader.read()
+            await self.close()
+        if resp_headers.get("connection", "").lower() == "close":
+            await self.close()
+        return status, resp_headers, payload
+
+
+# ============================================================
+# Utilisateur virtuel
+# ============================================================
+class VirtualUser:
+    def __init__(self, host, port, tenant, rng):
+        self.http = HttpClient(host, port)
+        self.tenant = tenant
+        self.rng = rng
+        self.rev = None
+        self.shapes = []
+
+    async def login(self):
+        status, _, _ = await self.http.request(
+            "POST", "/login", form={"email": self.tenant["owner_email"], "password": "bench"})
+        return status, status == 302
+
+    async def carto_load(self):
+        status, headers, body = await self.http.request("GET", "/cartography/api/load/bench")
+        if status == 200:
+            self.rev = int(headers.get("x-carto-rev", 0))
+            self.shapes = json.loads(body).get("shapes") or []
+        return status, status == 200
+
+    async def carto_save(self):
+        if self.rev is None or not self.shapes:
+            await self.carto_load()
+        shape = dict(self.rng.choice(self.shapes))
+        shape["label"] = f"{shape['label'].split(' ·')[0]} · {self.rng.randrange(10**6)}"
+        status, _, body = await self.http.request("POST", "/cartography/api/patch", json_body={
+            "base_rev": self.rev, "ops": [{"op": "replace", "path": f"/shapes/{shape['id']}", "value": shape}],
+        })
+        if status == 200:
+            self.rev = json.loads(body)["rev"]
+        elif status == 409:
+            self.rev = json.loads(body).get("rev")
+            return status, "conflict"
+        return status, status == 200
+
+    async def get(self, path):
+        status, _, _ = await self.http.request("GET", path)
+        return status, status == 200
+
+    async def llm_propose(self):
+        status, _, body = await self.http.request("POST", "/propose_savoirs/propose", json_body={
+            "title": "Activité 1", "description": "Benchmark", "savoir_faires": ["Appliquer la procédure"],
+        })
+        ok = status == 200 and "error" not in json.loads(body or b"{}")
+        return status, ok
+
+    async def run(self, name):
+        if name == "login":
+            return await self.login()
+        if name == "map":
+            return await self.get("/activities/map")
+        if name == "carto_load":
+            return await self.carto_load()
+        if name == "carto_save":
+            return await self.carto_save()
+        if name == "time_activities":
+            return await self.get("/temps/api/activities")
+        if name == "competences_summary":
+            return await self.get("/competences/users/global_summary")
+        if name == "llm_propose":
+            return await self.llm_propose()
+        raise ValueError(name)
+
+
+def _picker(rng):
+    """Tirage pondéré (poids MIX) du prochain type de requête."""
+    names = list(MIX)
+    weights = [MIX[n] for n in names]
+    return lambda: rng.choices(names, weights)[0]
+
+
+async def _drive(port, tenants, users, seconds, seed):
+    names = list(MIX)
+    samples = {n: [] for n in names}
+    counts = {n: {"ok": 0, "errors": 0, "conflicts": 0, "statuses": {}} for n in names}
+    deadline = time.monotonic() + seconds
+
+    async def one_user(i):
+        rng = random.Random(seed * 10000 + i)
+        vu = VirtualUser("127.0.0.1", port, tenants[i % len(tenants)], rng)
+        pick = _picker(rng)
+        try:
+            await vu.login()
+            await vu.carto_load()
+            while time.monotonic() < deadline:
+                name = pick()
+                t0 = time.perf_counter()
+                try:
+                    status, ok = await asyncio.wait_for(vu.run(name), REQUEST_TIMEOUT_S)
+                except Exception as exc:
+                    status, ok = exc.__class__.__name__, False
+                    await vu.http.close()
+                elapsed = (time.perf_counter() - t0) * 1000
+                c = counts[name]
+                c["statuses"][str(status)] = c["statuses"].get(str(status), 0) + 1
+                if ok == "conflict":
+                    c["conflicts"] += 1
+                elif ok:
+                    c["ok"] += 1
+                    samples[name].append(elapsed)
+                else:
+                    c["errors"] += 1
+        finally:
+            await vu.http.close()
+
+    t0 = time.monotonic()
+    await asyncio.gather(*(one_user(i) for i in range(users)))
+    return samples, counts, time.monotonic() - t0
+
+
+def _pct(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(round(q * (len(values) - 1))))], 1)
+
+
+# ============================================================
+# Gunicorn
+# ============================================================
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(port, proc):
+    deadline = time.monotonic() + STARTUP_TIMEOUT_S
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"gunicorn s'est arrêté (code {proc.returncode})")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1) as s:
+                s.sendall(b"GET /login HTTP/1.0\r\nHost: localhost\r\n\r\n")
+                if s.recv(12).startswith(b"HTTP/1."):
+                    return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("gunicorn ne répond pas")
+
+
+def bench_worker_class(worker_class, env, tenants, args):
+    port = _free_port()
+    cmd = [sys.executable, "-m", "gunicorn", "-c", os.path.join(ROOT, "gunicorn.conf.py"),
+           "-k", worker_class, "-w", str(args.workers), "-b", f"127.0.0.1:{port}",
+           "--log-level", "warning"]
+    if worker_class == "gthread":
+        cmd += ["--threads", str(args.threads)]
+    elif worker_class == "gevent":
+        cmd += ["--worker-connections", str(max(args.vusers * 2, 100))]
+    cmd.append("Code.app:app")
+
+    log = tempfile.TemporaryFile()
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+    try:
+        _wait_ready(port, proc)
+        samples, counts, elapsed = asyncio.run(_drive(port, tenants, args.vusers, args.seconds, args.seed))
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+    total_ok = sum(c["ok"] for c in counts.values())
+    total = sum(c["ok"] + c["errors"] + c["conflicts"] for c in counts.values())
+    errors = sum(c["errors"] for c in counts.values())
+    result = {
+        "worker_class": worker_class,
+        "workers": args.workers,
+        "threads": args.threads if worker_class == "gthread" else 1,
+        "users": args.vusers,
+        "seconds": round(elapsed, 1),
+        "requests": total,
+        "throughput_rps": round(total_ok / elapsed, 1),
+        "error_rate": round(errors / total, 4) if total else None,
+        "endpoints": {
+            name: {
+                "ok": c["ok"], "errors": c["errors"], "conflicts": c["conflicts"], "statuses": c["statuses"],
+                "p50_ms": _pct(samples[name], 0.50), "p95_ms": _pct(samples[name], 0.95),
+                "p99_ms": _pct(samples[name], 0.99),
+            }
+            for name, c in counts.items()
+        },
+    }
+    if errors:
+        log.seek(0)
+        result["server_log_tail"] = log.read().decode(errors="replace").splitlines()[-20:]
+    log.close()
+    return result
+
+
+def _print(result):
+    print(f"[LOAD] {result['worker_class']:<8} {result['workers']} workers × {result['threads']} threads, "
+          f"{result['users']} utilisateurs : {result['throughput_rps']} req/s, "
+          f"erreurs {result['error_rate']:.2%}")
+    for name, e in result["endpoints"].items():
+        print(f"    {name:<20} ok {e['ok']:6}  err {e['errors']:4}  409 {e['conflicts']:4}  "
+              f"p50 {e['p50_ms']} ms  p95 {e['p95_ms']} ms  p99 {e['p99_ms']} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_size_arguments(parser)
+    parser.add_argument("--tenants", type=int, default=4, help="Locataires (un propriétaire chacun)")
+    parser.add_argument("--classes", default="sync,gthread,gevent")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--vusers", type=int, default=16, help="Utilisateurs virtuels simultanés")
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--llm-delay", type=float, default=1.0, help="Latence du faux LLM (s)")
+    parser.add_argument("--use-database-url", action="store_true",
+                        help="Utiliser DATABASE_URL au lieu d'une base SQLite temporaire")
+    parser.add_argument("--out", help="Fichier JSON de résultats")
+    args = parser.parse_args()
+
+    tmp = None
+    if not args.use_database_url:
+        tmp = tempfile.TemporaryDirectory()
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp.name, 'load.db')}"
+    os.environ["SCHEMA_CHECK"] = "off"
+
+    from Code.app import app
+    from Code.bootstrap import bootstrap_database
+    from Code.extensions import db
+
+    llm, llm_url = start_fake_llm(args.llm_delay)
+    try:
+        if tmp is not None:
+            bootstrap_database(app, seed=False)
+        with app.app_context():
+            tenants = [
+                generate_tenant(db.engine, args.size, seed=args.seed + n, **size_overrides(args))
+                for n in range(args.tenants)
+            ]
+            db.engine.dispose()
+
+        env = dict(os.environ, SCHEMA_CHECK="off", OPENAI_API_KEY="bench",
+                   OPENAI_BASE_URL=llm_url, SECRET_KEY="load-test")
+        results = []
+        for worker_class in [c.strip() for c in args.classes.split(",") if c.strip()]:
+            module = WORKER_MODULES.get(worker_class, worker_class)
+            if module and importlib.util.find_spec(module) is None:
+                print(f"[LOAD] {worker_class} ignoré : module {module} non installé")
+                results.append({"worker_class": worker_class, "skipped": f"{module} non installé"})
+                continue
+            result = bench_worker_class(worker_class, env, tenants, args)
+            _print(result)
+            results.append(result)
+
+        if args.out:
+            with open(args.out, "w", encoding="utf-8") as f:
+                json.dump({
+                    "meta": {"size": args.size, "tenants": args.tenants, "llm_delay_s": args.llm_delay,
+                             "mix": MIX, "database": "sqlite" if tmp else "DATABASE_URL"},
+                    "results": results,
+                }, f, indent=2, ensure_ascii=False)
+    finally:
+        llm.shutdown()
+        if tmp is not None:
+            tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
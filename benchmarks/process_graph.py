@@ -0,0 +1,103 @@
+# benchmarks/process_graph.py
+"""
+Benchmark de l'analyse du graphe de processus (Code/routes/process_graph.py).
+
+Génère des cartographies synthétiques en couches (activités + données
+relais, avec quelques boucles) et mesure séparément la construction des
+tableaux d'adjacence et l'analyse (Tarjan + passes avant/arrière).
+
+Usage :
+    python benchmarks/process_graph.py
+    python benchmarks/process_graph.py --sizes 1000 10000 50000 -n 5 --out graph.json
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def synthetic_map(n_activities, fan_out=2, data_ratio=0.3, cycle_ratio=0.01, seed=0):
+    """Retourne (activities, data, links) au format de build_graph()."""
+    rng = random.Random(seed)
+    width = max(1, int(n_activities ** 0.5))
+    activities = [(i, f"Activité {i}", rng.randint(5, 240), rng.choice((0, 0, 15, 60)))
+                  for i in range(n_activities)]
+    data, links = [], []
+    next_data = 0
+    for i in range(n_activities - width):
+        layer_end = (i // width + 2) * width
+        for _ in range(fan_out):
+            j = rng.randrange(i + 1, min(layer_end, n_activities))
+            if rng.random() < data_ratio:
+                data.append((next_data, f"Donnée {next_data}"))
+                links.append((i, None, None, next_data))
+                links.append((None, next_data, j, None))
+                next_data += 1
+            else:
+                links.append((i, None, j, None))
+        if rng.random() < cycle_ratio:
+            links.append((rng.randrange(i + 1, min(layer_end, n_activities)), None, i, None))
+    return activities, data, links
+
+
+def _summary(values):
+    return {
+        "min": round(min(values), 2),
+        "median": round(statistics.median(values), 2),
+        "max": round(max(values), 2),
+    }
+
+
+def bench(size, runs):
+    from Code.routes.process_graph import analyze, build_graph, graph_report
+
+    activities, data, links = synthetic_map(size)
+    build, compute, report = [], [], []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        graph = build_graph(activities, data, links)
+        t1 = time.perf_counter()
+        result = analyze(graph)
+        t2 = time.perf_counter()
+        out = graph_report(graph, result)
+        t3 = time.perf_counter()
+        build.append((t1 - t0) * 1000)
+        compute.append((t2 - t1) * 1000)
+        report.append((t3 - t2) * 1000)
+    return {
+        "activities": size,
+        "nodes": len(graph),
+        "edges": graph.edge_count,
+        "cycles": len(out["cycles"]),
+        "lead_time_minutes": out["lead_time_minutes"],
+        "build_ms": _summary(build),
+        "analyze_ms": _summary(compute),
+        "report_ms": _summary(report),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("-n", "--runs", type=int, default=5)
+    parser.add_argument("--out", help="Fichier JSON de résultats")
+    args = parser.parse_args()
+
+    results = [bench(size, args.runs) for size in args.sizes]
+    for r in results:
+        print(f"{r['activities']:>7} activités  {r['nodes']:>7} nœuds  {r['edges']:>7} arcs  "
+              f"build {r['build_ms']['median']:7.1f} ms  analyze {r['analyze_ms']['median']:7.1f} ms  "
+              f"report {r['report_ms']['median']:7.1f} ms")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+# benchmarks/scenarios.py
+"""
+Suite de benchmarks reproductible sur un locataire synthétique.
+
+Génère une entité (benchmarks/synthetic_tenant.py) puis exécute des
+scénarios chronométrés contre les vrais blueprints, via le client de test
+Flask (sans réseau) et une session connectée sur le propriétaire :
+
+    map, activities_view, roles_view, export_entity, carto_load,
+    competences_summary, user_global_summary, time_activities,
+    time_analyses, time_workload, process_graph, import_validate,
+    import_inject (en dernier : ajoute des tâches)
+
+Par scénario : statut HTTP, latences p50/p95/moyenne sur --runs mesures
+(après --warmup), requêtes SQL par appel (écouteur before_cursor_execute),
+pic mémoire Python d'un appel supplémentaire sous tracemalloc et taille de
+la réponse. Le JSON produit (--out) porte le commit git et la taille du
+locataire ; --compare affiche l'écart avec un résultat précédent.
+
+Base : SQLite temporaire créée par bootstrap_database (défaut), ou la base
+de DATABASE_URL avec --use-database-url (une entité y est ajoutée).
+
+Usage :
+    python benchmarks/scenarios.py --size small
+    python benchmarks/scenarios.py --size large --runs 20 --out bench_large.json
+    python benchmarks/scenarios.py --size medium --only map,export_entity --compare bench_main.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from benchmarks.synthetic_tenant import add_size_arguments, generate_tenant, size_overrides  # noqa: E402
+
+IMPORT_ROWS = 50
+
+
+def _import_content(tenant):
+    n = tenant["counts"]["activities"]
+    return json.dumps([
+        {"nom": f"Tâche importée {i}", "activite": f"Activité {i % n + 1}",
+         "description": "Import de benchmark", "outils": f"Outil {i % 5 + 1}"}
+        for i in range(IMPORT_ROWS)
+    ], ensure_ascii=False)
+
+
+def _scenarios(tenant):
+    """(nom, méthode, url, corps JSON ou fabrique de corps)."""
+    user_id = tenant["owner_id"] + 1
+    entity_id = tenant["entity_id"]
+    content = _import_content(tenant)
+    inject_payload = {}
+
+    def inject_body(client):
+        if not inject_payload:
+            resp = client.post("/api/import-tasks/validate", json={"format": "json", "content": content})
+            inject_payload["results"] = resp.get_json()["results"]
+        return inject_payload
+
+    return [
+        ("map", "GET", "/activities/map", None),
+        ("activities_view", "GET", "/activities/view", None),
+        ("roles_view", "GET", "/roles_view/", None),
+        ("export_entity", "GET", f"/export/entity?entity_id={entity_id}", None),
+        ("carto_load", "GET", "/cartography/api/load/bench", None),
+        ("competences_summary", "GET", "/competences/users/global_summary", None),
+        ("user_global_summary", "GET", f"/competences/global_summary/{user_id}", None),
+        ("time_activities", "GET", "/temps/api/activities", None),
+        ("time_analyses", "GET", "/temps/api/time_analyses", None),
+        ("time_workload", "GET", "/temps/api/workload_rollup", None),
+        ("process_graph", "GET", "/process-graph/api/analysis", None),
+        ("import_validate", "POST", "/api/import-tasks/validate", {"format": "json", "content": content}),
+        ("import_inject", "POST", "/api/import-tasks/inject", inject_body),
+    ]
+
+
+def _percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))]
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, cwd=ROOT, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def run_scenarios(app, tenant, runs=10, warmup=1, only=None):
+    from sqlalchemy import event
+
+    from Code.extensions import db
+
+    queries = {"n": 0}
+
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        queries["n"] += 1
+
+    with app.app_context():
+        engines = list(db.engines.values())
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", _count)
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["user_id"] = tenant["owner_id"]
+        sess["user_email"] = tenant["owner_email"]
+        sess["active_entity_id"] = tenant["entity_id"]
+
+    def call(method, url, body):
+        payload = body(client) if callable(body) else body
+        if method == "GET":
+            return client.get(url)
+        return client.open(url, method=method, json=payload)
+
+    results = {}
+    try:
+        for name, method, url, body in _scenarios(tenant):
+            if only and name not in only:
+                continue
+            try:
+                if callable(body):
+                    body(client)   # préparation hors mesure
+                for _ in range(warmup):
+                    call(method, url, body)
+            except Exception as exc:
+                # Scénario cassé (exception propagée par l'app) : noté, la suite continue
+                results[name] = {"method": method, "url": url, "status": None,
+                                 "error": f"{exc.__class__.__name__}: {str(exc).splitlines()[0][:200]}"}
+                print(f"[BENCH] {name:<20} ERREUR {results[name]['error']}")
+                continue
+
+            timings, per_call = [], []
+            for _ in range(runs):
+                queries["n"] = 0
+                t0 = time.perf_counter()
+                resp = call(method, url, body)
+                timings.append((time.perf_counter() - t0) * 1000)
+                per_call.append(queries["n"])
+
+            tracemalloc.start()
+            resp = call(method, url, body)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            timings.sort()
+            results[name] = {
+                "method": method,
+                "url": url,
+                "status": resp.status_code,
+                "p50_ms": round(statistics.median(timings), 2),
+                "p95_ms": round(_percentile(timings, 0.95), 2),
+                "mean_ms": round(statistics.fmean(timings), 2),
+                "queries": max(per_call),
+                "peak_kb": round(peak / 1024, 1),
+                "response_kb": round(len(resp.get_data()) / 1024, 1),
+            }
+            r = results[name]
+            flag = "" if r["status"] < 400 else f"  ⚠ HTTP {r['status']}"
+            print(f"[BENCH] {name:<20} p50 {r['p50_ms']:9.2f} ms  p95 {r['p95_ms']:9.2f} ms  "
+                  f"{r['queries']:5} req.  pic {r['peak_kb']:9.1f} Ko{flag}")
+    finally:
+        for engine in engines:
+            event.remove(engine, "before_cursor_execute", _count)
+    return results
+
+
+def compare(current, baseline):
+    """Écart relatif (p50, requêtes) par scénario présent dans les deux résultats."""
+    old = baseline.get("scenarios", {})
+    print(f"[BENCH] Comparaison avec {baseline.get('meta', {}).get('commit') or '?'}")
+    if baseline.get("meta", {}).get("params") != current["meta"]["params"]:
+        print("[BENCH] ⚠ Locataires de tailles différentes : écarts non comparables")
+    for name, r in current["scenarios"].items():
+        if name not in old or "error" in r or "error" in old[name]:
+            continue
+        b = old[name]
+        ratio = r["p50_ms"] / b["p50_ms"] if b["p50_ms"] else float("inf")
+        print(f"  {name:<20} p50 {b['p50_ms']:9.2f} → {r['p50_ms']:9.2f} ms ({ratio:5.2f}×)  "
+              f"requêtes {b['queries']} → {r['queries']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_size_arguments(parser)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--only", help="Scénarios à exécuter, séparés par des virgules")
+    parser.add_argument("--use-database-url", action="store_true",
+                        help="Utiliser DATABASE_URL au lieu d'une base SQLite temporaire")
+    parser.add_argument("--out", help="Fichier JSON de résultats")
+    parser.add_argument("--compare", help="Résultat JSON précédent à comparer")
+    args = parser.parse_args()
+
+    tmp = None
+    if not args.use_database_url:
+        tmp = tempfile.TemporaryDirectory()
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp.name, 'bench.db')}"
+    os.environ["SCHEMA_CHECK"] = "off"
+
+    from Code.app import app
+    from Code.bootstrap import bootstrap_database
+    from Code.extensions import db
+
+    try:
+        if tmp is not None:
+            bootstrap_database(app, seed=False)
+        with app.app_context():
+            tenant = generate_tenant(db.engine, args.size, seed=args.seed, **size_overrides(args))
+            dialect = db.engine.dialect.name
+
+        only = set(args.only.split(",")) if args.only else None
+        scenarios = run_scenarios(app, tenant, runs=args.runs, warmup=args.warmup, only=only)
+
+        try:
+            import resource
+            max_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        except ImportError:   # Windows
+            max_rss_kb = None
+
+        result = {
+            "meta": {
+                "commit": _git_commit(),
+                "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "dialect": dialect,
+                "size": args.size,
+                "params": tenant["params"],
+                "counts": tenant["counts"],
+                "generate_s": tenant["seconds"],
+                "runs": args.runs,
+                "max_rss_kb": max_rss_kb,
+            },
+            "scenarios": scenarios,
+        }
+        if args.out:
+            with open(args.out, "w", encoding="utf-8") as f:
+                json.dump(result, f, indent=2, ensure_ascii=False)
+        if args.compare:
+            with open(args.compare, encoding="utf-8") as f:
+                compare(result, json.load(f))
+    finally:
+        if tmp is not None:
+            with app.app_context():
+                db.engine.dispose()
+            tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
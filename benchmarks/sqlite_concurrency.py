@@ -0,0 +1,196 @@
+# benchmarks/sqlite_concurrency.py
+"""
+Benchmark de concurrence SQLite : débit lecture/écriture et erreurs
+« database is locked » avec plusieurs processus (workers gunicorn) et
+plusieurs threads par processus.
+
+Trois profils, chacun dans des processus neufs :
+  - before  : ancien réglage (WAL + busy_timeout=5000 à la connexion),
+              chaque thread écrit dans sa propre transaction (lecture puis
+              écriture, comme une requête ORM) ;
+  - pragmas : profil de Code/sqlite_writer.py (pragmas complets), mêmes
+              écritures directes ;
+  - after   : pragmas complets et file d'écriture unique par processus
+              (lots BEGIN IMMEDIATE, SQLITE_WRITE_SERIALIZER=1).
+
+Usage :
+    python benchmarks/sqlite_concurrency.py
+    python benchmarks/sqlite_concurrency.py --workers 2 --threads 8 --seconds 5 --write-ratio 0.3 --out sqlite.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SEED_ROWS = 20000
+
+
+def _prepare(path):
+    import sqlite3
+
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("CREATE TABLE events (id INTEGER PRIMARY KEY, entity_id INTEGER, label TEXT, created_at REAL)")
+    conn.execute("CREATE INDEX ix_events_entity ON events (entity_id, id)")
+    conn.executemany(
+        "INSERT INTO events (entity_id, label, created_at) VALUES (?, ?, ?)",
+        [(i % 50, f"événement {i}", time.time()) for i in range(SEED_ROWS)],
+    )
+    conn.commit()
+    conn.close()
+
+
+def _read(conn, rng):
+    return conn.exec_driver_sql(
+        "SELECT id, label FROM events WHERE entity_id = ? ORDER BY id DESC LIMIT 20", (rng.randrange(50),)
+    ).fetchall()
+
+
+def _write(conn, entity_id):
+    # Lecture puis écriture dans la même transaction, comme une requête ORM
+    last = conn.exec_driver_sql("SELECT MAX(id) FROM events WHERE entity_id = ?", (entity_id,)).scalar()
+    conn.exec_driver_sql(
+        "INSERT INTO events (entity_id, label, created_at) VALUES (?, ?, ?)",
+        (entity_id, f"suite de {last}", time.time()),
+    )
+
+
+def _make_engine(mode, url):
+    from sqlalchemy import create_engine, event
+
+    if mode in ("pragmas", "after"):
+        import Code.extensions  # noqa: F401  (écouteur de pragmas du profil)
+        return create_engine(url, connect_args={"check_same_thread": False})
+
+    engine = create_engine(url, connect_args={"timeout": 30, "check_same_thread": False})
+
+    @event.listens_for(engine, "connect")
+    def _old_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL;")
+        cursor.execute("PRAGMA busy_timeout = 5000;")
+        cursor.close()
+
+    return engine
+
+
+def _worker(mode, path, threads, seconds, write_ratio, seed, out):
+    url = f"sqlite:///{path}"
+    engine = _make_engine(mode, url)
+    serializer = None
+    if mode == "after":
+        from Code.sqlite_writer import WriteSerializer
+        serializer = WriteSerializer(url)
+
+    counts = {"reads": 0, "writes": 0, "errors": 0}
+    write_ms = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def loop(tid):
+        rng = random.Random(seed * 1000 + tid)
+        local = {"reads": 0, "writes": 0, "errors": 0}
+        local_ms = []
+        while time.monotonic() < deadline:
+            if rng.random() < write_ratio:
+                t0 = time.perf_counter()
+                try:
+                    if serializer is not None:
+                        serializer.submit(_write, rng.randrange(50)).result(timeout=60)
+                    else:
+                        with engine.begin() as conn:
+                            _write(conn, rng.randrange(50))
+                    local["writes"] += 1
+                    local_ms.append((time.perf_counter() - t0) * 1000)
+                except Exception:
+                    local["errors"] += 1
+            else:
+                with engine.connect() as conn:
+                    _read(conn, rng)
+                local["reads"] += 1
+        with lock:
+            for k, v in local.items():
+                counts[k] += v
+            write_ms.extend(local_ms)
+
+    pool = [threading.Thread(target=loop, args=(i,)) for i in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    if serializer is not None:
+        counts["batches"] = serializer.stats["batches"]
+        serializer.close()
+    engine.dispose()
+    counts["write_ms"] = write_ms
+    out.put(counts)
+
+
+def bench(mode, workers, threads, seconds, write_ratio):
+    ctx = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        _prepare(path)
+        out = ctx.Queue()
+        procs = [
+            ctx.Process(target=_worker, args=(mode, path, threads, seconds, write_ratio, w, out))
+            for w in range(workers)
+        ]
+        for p in procs:
+            p.start()
+        results = [out.get() for _ in procs]
+        for p in procs:
+            p.join()
+
+    write_ms = sorted(ms for r in results for ms in r["write_ms"])
+    total = {k: sum(r.get(k, 0) for r in results) for k in ("reads", "writes", "errors", "batches")}
+    return {
+        "mode": mode,
+        "workers": workers,
+        "threads": threads,
+        "seconds": seconds,
+        "write_ratio": write_ratio,
+        "reads_per_s": round(total["reads"] / seconds, 1),
+        "writes_per_s": round(total["writes"] / seconds, 1),
+        "lock_errors": total["errors"],
+        "write_batches": total["batches"] if mode == "after" else None,
+        "write_ms": {
+            "p50": round(statistics.median(write_ms), 2) if write_ms else None,
+            "p95": round(write_ms[int(0.95 * (len(write_ms) - 1))], 2) if write_ms else None,
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--write-ratio", type=float, default=0.3)
+    parser.add_argument("--out", help="Fichier JSON de résultats")
+    args = parser.parse_args()
+
+    results = [
+        bench(mode, args.workers, args.threads, args.seconds, args.write_ratio)
+        for mode in ("before", "pragmas", "after")
+    ]
+    for r in results:
+        print(f"{r['mode']:>7}  {r['workers']}×{r['threads']} threads  "
+              f"lectures {r['reads_per_s']:8.1f}/s  écritures {r['writes_per_s']:7.1f}/s  "
+              f"verrous {r['lock_errors']:>5}  écriture p50 {r['write_ms']['p50']} ms  p95 {r['write_ms']['p95']} ms")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
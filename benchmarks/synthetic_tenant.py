@@ -0,0 +1,283 @@
+# benchmarks/synthetic_tenant.py
+"""
+Générateur de locataires synthétiques pour les benchmarks.
+
+Une entité complète et déterministe (graine fixe) : propriétaire admin,
+utilisateurs (avec managers), rôles, activités, données, liens
+activité → activité et activité → donnée → activité, tâches (outils et
+rôles), outils, compétences/savoirs, évaluations, analyses de temps et
+cartographie (optiqcarto_data) cohérente avec les activités.
+
+Insertion en masse par SQLAlchemy Core (executemany), identifiants
+attribués à l'avance : quelques secondes pour la taille « large ».
+
+Tailles prédéfinies (SIZES) ou paramètres individuels :
+    activities, links (liens activité → activité), tasks_per_activity,
+    tools, roles, users, evals_per_user, data_per_activity
+
+Usage :
+    python benchmarks/synthetic_tenant.py --size medium            # base de DATABASE_URL
+    python benchmarks/synthetic_tenant.py --size large --entities 3
+    python benchmarks/synthetic_tenant.py --activities 2000 --links 6000 --users 500
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+SIZES = {
+    "small": dict(activities=50, links=120, tasks_per_activity=4, tools=20, roles=8,
+                  users=30, evals_per_user=20, data_per_activity=1),
+    "medium": dict(activities=300, links=900, tasks_per_activity=6, tools=80, roles=25,
+                   users=150, evals_per_user=60, data_per_activity=1),
+    "large": dict(activities=1500, links=4500, tasks_per_activity=8, tools=300, roles=60,
+                  users=600, evals_per_user=120, data_per_activity=2),
+}
+DATA_TYPES = ("nourrissante", "descendante", "remontante", "déclenchante")
+RECURRENCES = ("journalier", "hebdomadaire", "mensuel", "annuel")
+NOTES = ("green", "orange", "red")
+BAND_HEIGHT = 180
+BANDS_START_Y = -200   # editor.js getBandForY()
+
+
+def _next_ids(conn, table, count):
+    from sqlalchemy import func, select
+
+    start = (conn.execute(select(func.max(table.c.id))).scalar() or 0) + 1
+    return list(range(start, start + count))
+
+
+def _link(entity_id, type_, src_act=None, src_data=None, tgt_act=None, tgt_data=None):
+    # executemany : toutes les lignes d'un lot doivent avoir les mêmes clés
+    return dict(entity_id=entity_id, type=type_, source_activity_id=src_act, source_data_id=src_data,
+                target_activity_id=tgt_act, target_data_id=tgt_data)
+
+
+def _insert(conn, table, rows, chunk=5000):
+    for i in range(0, len(rows), chunk):
+        conn.execute(table.insert(), rows[i:i + chunk])
+
+
+def generate_tenant(engine, size="small", seed=0, label=None, **overrides):
+    """
+    Crée une entité synthétique ; retourne {"entity_id", "owner_id",
+    "owner_email", "counts", "seconds"}. Les paramètres nommés
+    remplacent ceux de la taille choisie.
+    """
+    from werkzeug.security import generate_password_hash
+
+    from Code.models.models import (
+        Activities, Competency, CompetencyEvaluation, Data, Entity, Link, Role,
+        Savoir, Task, TimeAnalysis, Tool, User, UserRole, activity_roles,
+        task_roles, task_tools,
+    )
+
+    params = dict(SIZES[size])
+    params.update({k: v for k, v in overrides.items() if v is not None})
+    rng = random.Random(seed)
+    t0 = time.perf_counter()
+    now = datetime.utcnow()
+    password = generate_password_hash("bench")
+    tables = {m: m.__table__ for m in (
+        Activities, Competency, CompetencyEvaluation, Data, Entity, Link, Role,
+        Savoir, Task, TimeAnalysis, Tool, User)}
+
+    with engine.begin() as conn:
+        entity_id = _next_ids(conn, tables[Entity], 1)[0]
+        label = label or f"Bench {size} #{entity_id}"
+        tag = f"bench{entity_id}-{seed}"
+
+        # ── Utilisateurs (le premier est le propriétaire admin) ──────────
+        user_ids = _next_ids(conn, tables[User], params["users"] + 1)
+        owner_id = user_ids[0]
+        managers = user_ids[1:1 + max(1, params["users"] // 10)]
+        users = [dict(id=owner_id, entity_id=None, first_name="Bench", last_name="Owner",
+                      email=f"owner-{tag}@bench.local", password=password, status="admin")]
+        for n, uid in enumerate(user_ids[1:], start=1):
+            users.append(dict(
+                id=uid, entity_id=None, first_name=f"Prénom{n}", last_name=f"Nom{n}",
+                email=f"user{n}-{tag}@bench.local", password=password, status="user",
+                manager_id=None if uid in managers else rng.choice(managers),
+            ))
+        for u in users:
+            u.setdefault("manager_id", None)
+        # Entité avant les FK users.entity_id (contraintes PostgreSQL)
+        _insert(conn, tables[Entity], [dict(
+            id=entity_id, name=label, description="Locataire synthétique (benchmarks)",
+            owner_id=None, is_active=True, optiqcarto_rev=1, created_at=now, updated_at=now,
+        )])
+        for u in users:
+            u["entity_id"] = entity_id
+        _insert(conn, tables[User], users)
+        conn.execute(tables[Entity].update().where(tables[Entity].c.id == entity_id).values(owner_id=owner_id))
+
+        # ── Rôles ────────────────────────────────────────────────────────
+        role_ids = _next_ids(conn, tables[Role], params["roles"])
+        _insert(conn, tables[Role], [
+            dict(id=rid, entity_id=entity_id, name=f"Rôle {n + 1}") for n, rid in enumerate(role_ids)
+        ])
+        _insert(conn, UserRole.__table__, [
+            dict(user_id=uid, role_id=rng.choice(role_ids), manager_id=None) for uid in user_ids[1:]
+        ])
+
+        # ── Activités et cartographie ────────────────────────────────────
+        act_ids = _next_ids(conn, tables[Activities], params["activities"])
+        activities, shapes, act_roles = [], [], []
+        per_band = {}
+        for n, aid in enumerate(act_ids):
+            band = rng.randrange(len(role_ids))
+            col = per_band.get(band, 0)
+            per_band[band] = col + 1
+            activities.append(dict(
+                id=aid, entity_id=entity_id, shape_id=str(n + 1), name=f"Activité {n + 1}",
+                description=f"Description de l'activité {n + 1}", is_result=False,
+                duration_minutes=rng.randint(5, 240), delay_minutes=rng.randint(0, 120),
+            ))
+            shapes.append({
+                "id": str(n + 1), "type": "process", "label": f"Activité {n + 1}",
+                "x": 40 + col * 200, "y": BANDS_START_Y + band * BAND_HEIGHT + 50, "w": 160, "h": 80,
+            })
+            act_roles.append(dict(activity_id=aid, role_id=role_ids[band], status="Garant"))
+        _insert(conn, tables[Activities], activities)
+        _insert(conn, activity_roles, act_roles)
+
+        # ── Liens activité → activité ────────────────────────────────────
+        pairs = set()
+        max_pairs = len(act_ids) * (len(act_ids) - 1)
+        while len(pairs) < min(params["links"], max_pairs):
+            a, b = rng.sample(range(len(act_ids)), 2)
+            pairs.add((a, b))
+        pairs = sorted(pairs)
+        connections = [{"id": f"c{n + 1}", "fromId": str(a + 1), "toId": str(b + 1)}
+                       for n, (a, b) in enumerate(pairs)]
+        links = [_link(entity_id, "flux", src_act=act_ids[a], tgt_act=act_ids[b]) for a, b in pairs]
+
+        # ── Données : produites par une activité, consommées par une autre ──
+        n_data = params["activities"] * params["data_per_activity"]
+        data_ids = _next_ids(conn, tables[Data], n_data)
+        data_types = [rng.choice(DATA_TYPES) for _ in data_ids]
+        _insert(conn, tables[Data], [
+            dict(id=did, entity_id=entity_id, shape_id=f"d{n + 1}", name=f"Donnée {n + 1}", type=dtype)
+            for n, (did, dtype) in enumerate(zip(data_ids, data_types))
+        ])
+        # Le type d'un lien de donnée est celui de la donnée (comme l'import de tâches)
+        for did, dtype in zip(data_ids, data_types):
+            src, tgt = rng.sample(act_ids, 2)
+            links.append(_link(entity_id, dtype, src_act=src, tgt_data=did))
+            links.append(_link(entity_id, dtype, src_data=did, tgt_act=tgt))
+        _insert(conn, tables[Link], links)
+
+        diagram = {
+            "shapes": shapes,
+            "bands": [{"id": f"b{n + 1}", "label": f"Rôle {n + 1}", "height": BAND_HEIGHT}
+                      for n in range(len(role_ids))],
+            "connections": connections,
+            "groups": [],
+        }
+        conn.execute(tables[Entity].update().where(tables[Entity].c.id == entity_id)
+                     .values(optiqcarto_data=json.dumps(diagram, ensure_ascii=False)))
+
+        # ── Outils, tâches, tâche ↔ outils / rôles ───────────────────────
+        tool_ids = _next_ids(conn, tables[Tool], params["tools"])
+        _insert(conn, tables[Tool], [
+            dict(id=tid, entity_id=entity_id, name=f"Outil {n + 1}") for n, tid in enumerate(tool_ids)
+        ])
+        task_ids = _next_ids(conn, tables[Task], len(act_ids) * params["tasks_per_activity"])
+        tasks, t_tools, t_roles = [], [], []
+        it = iter(task_ids)
+        for aid in act_ids:
+            for order in range(1, params["tasks_per_activity"] + 1):
+                tid = next(it)
+                tasks.append(dict(id=tid, activity_id=aid, name=f"Tâche {tid}", order=order,
+                                  duration_minutes=rng.randint(1, 60), delay_minutes=rng.randint(0, 30)))
+                for tool in rng.sample(tool_ids, min(len(tool_ids), rng.randint(0, 2))):
+                    t_tools.append(dict(task_id=tid, tool_id=tool))
+                t_roles.append(dict(task_id=tid, role_id=rng.choice(role_ids), status="executant"))
+        _insert(conn, tables[Task], tasks)
+        _insert(conn, task_tools, t_tools)
+        _insert(conn, task_roles, t_roles)
+
+        # ── Compétences, savoirs, analyses de temps ──────────────────────
+        _insert(conn, tables[Competency], [
+            dict(activity_id=aid, description=f"Maîtriser l'activité {n + 1}") for n, aid in enumerate(act_ids)
+        ])
+        savoir_ids = _next_ids(conn, tables[Savoir], len(act_ids))
+        _insert(conn, tables[Savoir], [
+            dict(id=sid, activity_id=aid, description=f"Savoir {n + 1}")
+            for n, (sid, aid) in enumerate(zip(savoir_ids, act_ids))
+        ])
+        _insert(conn, tables[TimeAnalysis], [
+            dict(activity_id=aid, type="activity", duration=rng.randint(5, 120),
+                 recurrence=rng.choice(RECURRENCES), frequency=rng.randint(1, 5),
+                 delay=rng.randint(0, 60), nb_people=rng.randint(1, 4))
+            for aid in act_ids
+        ])
+
+        # ── Évaluations (activité globale et savoirs) ────────────────────
+        evals = []
+        for uid in user_ids[1:]:
+            for n, idx in enumerate(rng.sample(range(len(act_ids)), min(len(act_ids), params["evals_per_user"]))):
+                created = (now - timedelta(days=rng.randint(0, 365))).isoformat()
+                if n % 2:
+                    evals.append(dict(user_id=uid, activity_id=act_ids[idx], item_id=savoir_ids[idx],
+                                      item_type="savoirs", eval_number="1", note=rng.choice(NOTES),
+                                      created_at=created))
+                else:
+                    evals.append(dict(user_id=uid, activity_id=act_ids[idx], item_id=None,
+                                      item_type="activities", eval_number="1", note=rng.choice(NOTES),
+                                      created_at=created))
+        _insert(conn, tables[CompetencyEvaluation], evals)
+
+    counts = {
+        "users": len(users), "roles": len(role_ids), "activities": len(act_ids),
+        "links": len(links), "data": len(data_ids), "tasks": len(tasks), "tools": len(tool_ids),
+        "task_tools": len(t_tools), "evaluations": len(evals),
+    }
+    seconds = round(time.perf_counter() - t0, 2)
+    print(f"[BENCH] Entité {entity_id} « {label} » générée en {seconds} s : {counts}")
+    return {"entity_id": entity_id, "owner_id": owner_id, "owner_email": users[0]["email"],
+            "params": params, "counts": counts, "seconds": seconds}
+
+
+def add_size_arguments(parser):
+    """Options de taille communes aux scripts de benchmarks/."""
+    parser.add_argument("--size", choices=sorted(SIZES), default="small")
+    parser.add_argument("--seed", type=int, default=0)
+    for name in SIZES["small"]:
+        parser.add_argument(f"--{name.replace('_', '-')}", type=int, dest=name, help="Remplace la taille prédéfinie")
+
+
+def size_overrides(args):
+    return {name: getattr(args, name) for name in SIZES["small"] if getattr(args, name) is not None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_size_arguments(parser)
+    parser.add_argument("--entities", type=int, default=1)
+    parser.add_argument("--out", help="Fichier JSON décrivant les entités créées")
+    args = parser.parse_args()
+
+    os.environ.setdefault("SCHEMA_CHECK", "warn")
+    from Code.app import app
+    from Code.extensions import db
+
+    with app.app_context():
+        created = [
+            generate_tenant(db.engine, args.size, seed=args.seed + n, **size_overrides(args))
+            for n in range(args.entities)
+        ]
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(created, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,7 @@
 workers = 2
 bind = "0.0.0.0:8080"
 timeout = 120
-preload_app = False
+# L'app est construite une fois dans le master puis partagée par fork :
+# create_app() ne fait plus de DDL (voir Code/bootstrap.py) et ferme
+# son pool avant le fork.
+preload_app = True
@@ -0,0 +1,53 @@
+"""Versioned cartography history: carto_blobs + carto_revisions
+
+Stockage adressé par contenu (sha256, zlib) et révisions par entité
+(instantané complet ou delta d'opérations). Idempotente.
+
+Revision ID: a7b8c9d0e1f2
+Revises: f6a7b8c9d0e1
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'a7b8c9d0e1f2'
+down_revision = 'f6a7b8c9d0e1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    tables = set(sa.inspect(op.get_bind()).get_table_names())
+    if 'carto_blobs' not in tables:
+        op.create_table(
+            'carto_blobs',
+            sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column('sha256', sa.String(length=64), nullable=False, unique=True),
+            sa.Column('encoding', sa.String(length=10), nullable=False),
+            sa.Column('size', sa.Integer(), nullable=False),
+            sa.Column('data', sa.LargeBinary(), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+        )
+    if 'carto_revisions' not in tables:
+        op.create_table(
+            'carto_revisions',
+            sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column('entity_id', sa.Integer(), sa.ForeignKey('entities.id'), nullable=True),
+            sa.Column('rev', sa.Integer(), nullable=True),
+            sa.Column('kind', sa.String(length=10), nullable=False),
+            sa.Column('blob_id', sa.Integer(), sa.ForeignKey('carto_blobs.id'), nullable=False),
+            sa.Column('content_sha', sa.String(length=64), nullable=True),
+            sa.Column('filename', sa.String(length=255), nullable=True),
+            sa.Column('user_id', sa.Integer(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.UniqueConstraint('entity_id', 'rev', name='uq_carto_revision'),
+        )
+        op.create_index('ix_carto_revisions_blob_id', 'carto_revisions', ['blob_id'])
+
+
+def downgrade():
+    op.drop_index('ix_carto_revisions_blob_id', table_name='carto_revisions')
+    op.drop_table('carto_revisions')
+    op.drop_table('carto_blobs')
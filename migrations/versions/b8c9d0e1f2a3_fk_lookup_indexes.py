@@ -0,0 +1,79 @@
+"""Foreign-key and lookup indexes
+
+Index sur les clés étrangères filtrées par les pages et les imports
+(activity_id des tables satellites, extrémités des liens, manager_id) et
+(entity_id, lower(name)) sur data, l'expression des recherches par nom
+des imports. Déjà couverts par un index existant :
+recent_events.created_at (ix_recent_events_created_id),
+competency_evaluation.user_id et tools(entity_id, name) (contraintes
+d'unicité). Idempotente : create_all les crée déjà sur une base neuve.
+
+Revision ID: b8c9d0e1f2a3
+Revises: a7b8c9d0e1f2
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'b8c9d0e1f2a3'
+down_revision = 'a7b8c9d0e1f2'
+branch_labels = None
+depends_on = None
+
+INDEXES = {
+    'tasks': {'ix_tasks_activity_id': ['activity_id']},
+    'links': {
+        'ix_links_source_activity_id': ['source_activity_id'],
+        'ix_links_target_activity_id': ['target_activity_id'],
+        'ix_links_source_data_id': ['source_data_id'],
+        'ix_links_target_data_id': ['target_data_id'],
+    },
+    'competencies': {'ix_competencies_activity_id': ['activity_id']},
+    'softskills': {'ix_softskills_activity_id': ['activity_id']},
+    'savoirs': {'ix_savoirs_activity_id': ['activity_id']},
+    'savoir_faires': {'ix_savoir_faires_activity_id': ['activity_id']},
+    'aptitudes': {'ix_aptitudes_activity_id': ['activity_id']},
+    'constraints': {'ix_constraints_activity_id': ['activity_id']},
+    'competency_evaluation': {'ix_competency_evaluation_activity_id': ['activity_id']},
+    'users': {'ix_users_manager_id': ['manager_id']},
+    'time_analysis': {'ix_time_analysis_activity_id': ['activity_id']},
+    'time_project_line': {'ix_time_project_line_activity_id': ['activity_id']},
+    'time_role_line': {'ix_time_role_line_activity_id': ['activity_id']},
+    'time_weakness': {'ix_time_weakness_activity_id': ['activity_id']},
+    'data': {'ix_data_entity_name': ['entity_id', sa.text('lower(name)')]},
+}
+
+
+def _index_names(bind, table):
+    """Index existants ; SQLite ne reflète pas les index sur expression."""
+    if bind.dialect.name == 'sqlite':
+        rows = bind.execute(sa.text(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :t"), {'t': table})
+        return {name for (name,) in rows}
+    return {ix['name'] for ix in sa.inspect(bind).get_indexes(table)}
+
+
+def upgrade():
+    bind = op.get_bind()
+    tables = set(sa.inspect(bind).get_table_names())
+    for table, indexes in INDEXES.items():
+        if table not in tables:
+            continue
+        existing = _index_names(bind, table)
+        for name, columns in indexes.items():
+            if name not in existing:
+                op.create_index(name, table, columns)
+
+
+def downgrade():
+    bind = op.get_bind()
+    tables = set(sa.inspect(bind).get_table_names())
+    for table, indexes in INDEXES.items():
+        if table not in tables:
+            continue
+        existing = _index_names(bind, table)
+        for name in indexes:
+            if name in existing:
+                op.drop_index(name, table_name=table)
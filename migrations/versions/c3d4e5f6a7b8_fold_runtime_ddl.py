@@ -0,0 +1,129 @@
+"""Fold runtime DDL into a versioned migration
+
+Tables et colonnes auparavant créées à la volée sur le chemin des requêtes :
+task_link_assignments, performance_personnalisee_historique, training_plan,
+prerequis_comment, time_role_analysis.name/created_at,
+time_role_line.duration_minutes, user_roles.manager_id (clé étrangère vers
+users.id, ajoutée aussi à une colonne déjà créée à la volée, hors SQLite).
+
+Idempotente : les bases créées par create_all les ont déjà. downgrade() est
+sans effet (voir plus bas).
+
+Revision ID: c3d4e5f6a7b8
+Revises: b2c3d4e5f6a7
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'c3d4e5f6a7b8'
+down_revision = 'b2c3d4e5f6a7'
+branch_labels = None
+depends_on = None
+
+
+def _tables():
+    return set(sa.inspect(op.get_bind()).get_table_names())
+
+
+def _columns(table):
+    return {c['name'] for c in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def upgrade():
+    tables = _tables()
+
+    if 'task_link_assignments' not in tables:
+        op.create_table('task_link_assignments',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('link_id', sa.Integer(), nullable=False),
+        sa.Column('task_id', sa.Integer(), nullable=False),
+        sa.Column('direction', sa.String(length=20), nullable=False),
+        sa.ForeignKeyConstraint(['link_id'], ['links.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['task_id'], ['tasks.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('link_id', 'direction', name='uq_task_link_dir')
+        )
+
+    if 'performance_personnalisee_historique' not in tables:
+        op.create_table('performance_personnalisee_historique',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('performance_id', sa.Integer(), nullable=True),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('activity_id', sa.Integer(), nullable=True),
+        sa.Column('content', sa.Text(), nullable=True),
+        sa.Column('contenu', sa.Text(), nullable=True),
+        sa.Column('validation_status', sa.Text(), nullable=True),
+        sa.Column('validation_date', sa.Text(), nullable=True),
+        sa.Column('event', sa.Text(), nullable=True),
+        sa.Column('changed_at', sa.Text(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+
+    if 'training_plan' not in tables:
+        op.create_table('training_plan',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('role_id', sa.Integer(), nullable=False),
+        sa.Column('activity_id', sa.Integer(), nullable=False),
+        sa.Column('plan_type', sa.String(length=100), nullable=True),
+        sa.Column('plan_json', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.func.current_timestamp(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+
+    if 'prerequis_comment' not in tables:
+        op.create_table('prerequis_comment',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('activity_id', sa.Integer(), nullable=False),
+        sa.Column('item_type', sa.String(length=100), nullable=True),
+        sa.Column('item_id', sa.Integer(), nullable=True),
+        sa.Column('comment', sa.Text(), nullable=True),
+        sa.Column('updated_at', sa.Text(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+
+    # op.add_column = ALTER TABLE ADD COLUMN : instantané sur PostgreSQL (pas de rebuild table)
+    if 'time_role_analysis' in tables:
+        cols = _columns('time_role_analysis')
+        if 'name' not in cols:
+            op.add_column('time_role_analysis', sa.Column('name', sa.String(length=120), server_default='Analyse rôle', nullable=True))
+        if 'created_at' not in cols:
+            op.add_column('time_role_analysis', sa.Column('created_at', sa.DateTime(), nullable=True))
+
+    if 'time_role_line' in tables and 'duration_minutes' not in _columns('time_role_line'):
+        op.add_column('time_role_line', sa.Column('duration_minutes', sa.Float(), nullable=True))
+
+    if 'user_roles' in tables:
+        _user_roles_manager_fk()
+
+
+def _user_roles_manager_fk():
+    """user_roles.manager_id → users.id, comme UserRole.manager_id dans le modèle."""
+    bind = op.get_bind()
+    if 'manager_id' not in _columns('user_roles'):
+        if bind.dialect.name == 'sqlite':
+            # SQLite n'ajoute pas de contrainte après coup : référence déclarée dans ADD COLUMN
+            op.execute('ALTER TABLE user_roles ADD COLUMN manager_id INTEGER REFERENCES users (id)')
+            return
+        op.add_column('user_roles', sa.Column('manager_id', sa.Integer(), nullable=True))
+    elif bind.dialect.name == 'sqlite':
+        return  # colonne créée par l'ancien DDL à la volée : pas d'ALTER de contrainte en SQLite
+    fks = sa.inspect(bind).get_foreign_keys('user_roles')
+    if any(fk['constrained_columns'] == ['manager_id'] for fk in fks):
+        return
+    # Colonne créée à la volée sans contrainte : références orphelines remises à NULL
+    op.execute('UPDATE user_roles SET manager_id = NULL '
+               'WHERE manager_id IS NOT NULL AND manager_id NOT IN (SELECT id FROM users)')
+    op.create_foreign_key('fk_user_roles_manager_id', 'user_roles', 'users', ['manager_id'], ['id'])
+
+
+def downgrade():
+    # Sans effet : ces tables et colonnes existaient souvent avant cette
+    # révision (créées à la volée par l'application) et upgrade() ne les
+    # crée que si elles manquent. Les supprimer ici détruirait des données
+    # antérieures ; elles restent donc en place à la redescente.
+    pass
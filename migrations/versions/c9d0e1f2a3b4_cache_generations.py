@@ -0,0 +1,35 @@
+"""Shared cache generation counters
+
+cache_generations : un compteur par cache applicatif et par entité
+(« workload:<id> » pour la charge annualisée), incrémenté dans la
+transaction qui modifie les données sources. Tous les workers lisent la même génération : un cache local n'est
+plus servi après une écriture faite par un autre worker. Idempotente.
+
+Revision ID: c9d0e1f2a3b4
+Revises: b8c9d0e1f2a3
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'c9d0e1f2a3b4'
+down_revision = 'b8c9d0e1f2a3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'cache_generations' in inspector.get_table_names():
+        return
+    op.create_table(
+        'cache_generations',
+        sa.Column('name', sa.String(length=50), primary_key=True),
+        sa.Column('value', sa.Integer(), nullable=False, server_default='0'),
+    )
+
+
+def downgrade():
+    op.drop_table('cache_generations')
@@ -0,0 +1,47 @@
+"""Expression index for data name lookups
+
+ix_data_entity_name passe de (entity_id, name) à (entity_id, lower(name)) :
+les imports cherchent les données par lower(name), que l'index sur la
+colonne brute ne sert pas sous PostgreSQL. Seules les bases qui ont déjà
+l'ancien index sont modifiées. Idempotente.
+
+Revision ID: d0e1f2a3b4c5
+Revises: c9d0e1f2a3b4
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'd0e1f2a3b4c5'
+down_revision = 'c9d0e1f2a3b4'
+branch_labels = None
+depends_on = None
+
+INDEX = 'ix_data_entity_name'
+
+
+def _plain_index_exists(bind):
+    # Index sur expression : non reflété par SQLite, reflété avec
+    # « expressions » par PostgreSQL ; seul l'index sur colonnes est visé
+    for ix in sa.inspect(bind).get_indexes('data'):
+        if ix['name'] == INDEX:
+            return ix['column_names'] == ['entity_id', 'name'] and not any(ix.get('expressions') or [])
+    return False
+
+
+def upgrade():
+    bind = op.get_bind()
+    if 'data' not in sa.inspect(bind).get_table_names() or not _plain_index_exists(bind):
+        return
+    op.drop_index(INDEX, table_name='data')
+    op.create_index(INDEX, 'data', ['entity_id', sa.text('lower(name)')])
+
+
+def downgrade():
+    bind = op.get_bind()
+    if 'data' not in sa.inspect(bind).get_table_names() or _plain_index_exists(bind):
+        return
+    op.execute(f"DROP INDEX IF EXISTS {INDEX}")
+    op.create_index(INDEX, 'data', ['entity_id', 'name'])
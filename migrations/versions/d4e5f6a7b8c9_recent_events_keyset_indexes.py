@@ -0,0 +1,38 @@
+"""Composite indexes for the keyset-paginated recent_events feed
+
+(created_at, id) pour le fil global, (entity_id, created_at, id) pour le
+fil par entité. Idempotente : create_all les crée déjà sur une base neuve.
+
+Revision ID: d4e5f6a7b8c9
+Revises: c3d4e5f6a7b8
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'd4e5f6a7b8c9'
+down_revision = 'c3d4e5f6a7b8'
+branch_labels = None
+depends_on = None
+
+INDEXES = {
+    'ix_recent_events_created_id': ['created_at', 'id'],
+    'ix_recent_events_entity_created_id': ['entity_id', 'created_at', 'id'],
+}
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'recent_events' not in inspector.get_table_names():
+        return
+    existing = {ix['name'] for ix in inspector.get_indexes('recent_events')}
+    for name, columns in INDEXES.items():
+        if name not in existing:
+            op.create_index(name, 'recent_events', columns)
+
+
+def downgrade():
+    for name in INDEXES:
+        op.drop_index(name, table_name='recent_events')
@@ -0,0 +1,48 @@
+"""Delta columns and read indexes for performance_personnalisee_historique
+
+content_delta / delta_base_id : instantanés compactés par Code/retention.py.
+Index (performance_id, id) et (user_id, activity_id) pour les lectures
+d'historique. Idempotente.
+
+Revision ID: e5f6a7b8c9d0
+Revises: d4e5f6a7b8c9
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'e5f6a7b8c9d0'
+down_revision = 'd4e5f6a7b8c9'
+branch_labels = None
+depends_on = None
+
+TABLE = 'performance_personnalisee_historique'
+INDEXES = {
+    'ix_perf_hist_performance_id': ['performance_id', 'id'],
+    'ix_perf_hist_user_activity': ['user_id', 'activity_id'],
+}
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if TABLE not in inspector.get_table_names():
+        return
+    columns = {c['name'] for c in inspector.get_columns(TABLE)}
+    if 'content_delta' not in columns:
+        op.add_column(TABLE, sa.Column('content_delta', sa.Text(), nullable=True))
+    if 'delta_base_id' not in columns:
+        op.add_column(TABLE, sa.Column('delta_base_id', sa.Integer(), nullable=True))
+    existing = {ix['name'] for ix in inspector.get_indexes(TABLE)}
+    for name, cols in INDEXES.items():
+        if name not in existing:
+            op.create_index(name, TABLE, cols)
+
+
+def downgrade():
+    for name in INDEXES:
+        op.drop_index(name, table_name=TABLE)
+    with op.batch_alter_table(TABLE) as batch_op:
+        batch_op.drop_column('delta_base_id')
+        batch_op.drop_column('content_delta')
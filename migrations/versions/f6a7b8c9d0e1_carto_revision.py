@@ -0,0 +1,34 @@
+"""Revision counter for Entity.optiqcarto_data
+
+optiqcarto_rev : numéro de révision de la cartographie, incrémenté à chaque
+sauvegarde ; sert au contrôle de concurrence optimiste des patchs de
+l'éditeur. Idempotente.
+
+Revision ID: f6a7b8c9d0e1
+Revises: e5f6a7b8c9d0
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'f6a7b8c9d0e1'
+down_revision = 'e5f6a7b8c9d0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'entities' not in inspector.get_table_names():
+        return
+    columns = {c['name'] for c in inspector.get_columns('entities')}
+    if 'optiqcarto_rev' not in columns:
+        op.add_column('entities', sa.Column('optiqcarto_rev', sa.Integer(), nullable=False,
+                                            server_default='0'))
+
+
+def downgrade():
+    with op.batch_alter_table('entities') as batch_op:
+        batch_op.drop_column('optiqcarto_rev')
@@ -1,5 +1,11 @@
 #!/bin/sh
-exec gunicorn \
+set -e
+
+# Schéma/bootstrap : une seule fois par conteneur, avant les workers
+python -m Code.bootstrap
+
+# Les workers ne font que vérifier la version du schéma
+SCHEMA_CHECK=strict exec gunicorn \
   -w 1 \
   -b 0.0.0.0:8080 \
   --timeout 120 \
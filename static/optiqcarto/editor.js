@@ -2729,15 +2729,136 @@ function _showSaveWarningModal(diff) {
   });
 }
 
+// ── Sauvegarde incrémentale ───────────────────────
+// Dernier diagramme connu du serveur (JSON) et sa révision (X-Carto-Rev) :
+// les sauvegardes suivantes n'envoient que les opérations qui en diffèrent.
+let _savedSnapshot = null;
+let _savedRev = null;
+const _PATCH_COLLECTIONS = ['shapes', 'bands', 'connections', 'groups'];
+
+function _rememberSaved(json, rev) {
+  _savedSnapshot = json;
+  _savedRev = Number.isInteger(rev) ? rev : null;
+}
+
+function _readRev(res) {
+  const rev = parseInt(res.headers.get('X-Carto-Rev'), 10);
+  return Number.isNaN(rev) ? null : rev;
+}
+
+function _diffOps(base, cur) {
+  const ops = [];
+  for (const key of new Set([...Object.keys(base), ...Object.keys(cur)])) {
+    if (_PATCH_COLLECTIONS.includes(key)) continue;
+    if (!(key in cur)) ops.push({ op: 'remove', path: '/' + key });
+    else if (JSON.stringify(base[key]) !== JSON.stringify(cur[key])) ops.push({ op: 'replace', path: '/' + key, value: cur[key] });
+  }
+  for (const coll of _PATCH_COLLECTIONS) {
+    const before = base[coll] || [], after = cur[coll] || [];
+    const beforeMap = new Map(before.map(x => [String(x.id), x]));
+    const afterMap  = new Map(after.map(x => [String(x.id), x]));
+    // Éléments réordonnés (position des bandes, plan des formes) → liste entière
+    const kept = ids => ids.filter(id => beforeMap.has(id) && afterMap.has(id)).join(',');
+    if (kept([...beforeMap.keys()]) !== kept([...afterMap.keys()])) {
+      ops.push({ op: 'replace', path: `/${coll}`, value: after });
+      continue;
+    }
+    for (const id of beforeMap.keys()) {
+      if (!afterMap.has(id)) ops.push({ op: 'remove', path: `/${coll}/${id}` });
+    }
+    after.forEach((item, index) => {
+      const id = String(item.id);
+      const prev = beforeMap.get(id);
+      if (!prev) ops.push({ op: 'add', path: `/${coll}/${id}`, value: item, index });
+      else if (JSON.stringify(prev) !== JSON.stringify(item)) ops.push({ op: 'replace', path: `/${coll}/${id}`, value: item });
+    });
+  }
+  return ops;
+}
+
+function _removalsFromOps(base, cur) {
+  const ACTIVITY_TYPES = ['process', 'start-end', 'special'];
+  const curShapes = new Set((cur.shapes || []).filter(s => ACTIVITY_TYPES.includes(s.type)).map(s => String(s.id)));
+  const curBands  = new Set((cur.bands || []).map(b => (b.label || '').trim()));
+  return {
+    removed_activities: (base.shapes || [])
+      .filter(s => ACTIVITY_TYPES.includes(s.type) && !curShapes.has(String(s.id)))
+      .map(s => s.label || ''),
+    removed_roles: (base.bands || [])
+      .map(b => (b.label || '').trim())
+      .filter(l => l && !curBands.has(l)),
+  };
+}
+
+async function _savePatch(apiBase, current) {
+  // Retourne true si la sauvegarde est traitée, false pour basculer en sauvegarde complète
+  const base = JSON.parse(_savedSnapshot);
+  const ops  = _diffOps(base, current);
+  if (!ops.length) { showToast('Cartographie sauvegardée ✓'); return true; }
+
+  const removals = _removalsFromOps(base, current);
+  if (removals.removed_activities.length || removals.removed_roles.length) {
+    const confirmed = await _showSaveWarningModal(removals);
+    if (!confirmed) return true;
+  }
+
+  const res = await fetch(`${apiBase}/api/patch`, {
+    method:  'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body:    JSON.stringify({ base_rev: _savedRev, ops }),
+  });
+  if (res.status === 409) {
+    if (confirm('La cartographie a été modifiée ailleurs depuis son chargement. Écraser avec votre version ?')) return false;
+    // Refus : repartir de la version du serveur (et de sa révision)
+    await _loadServerCarto(apiBase);
+    showToast('Version du serveur rechargée');
+    return true;
+  }
+  const data = await res.json();
+  if (data.ok) {
+    _rememberSaved(JSON.stringify(current), data.rev);
+    showToast('Cartographie sauvegardée ✓');
+  } else showToast('Erreur : ' + (data.error || 'inconnue'));
+  return true;
+}
+
+// Charge la cartographie enregistrée en base et mémorise sa révision
+async function _loadServerCarto(apiBase) {
+  try {
+    const res  = await fetch(`${apiBase}/api/load/${encodeURIComponent(window.OPTIQCARTO_DEFAULT_NAME)}`);
+    const data = await res.json();
+    if (!data || data.error) return;
+    _rememberSaved(JSON.stringify(data), _readRev(res));
+    state = data;
+    if (!state.bandWidth) state.bandWidth = 1600;
+    if (!state.groups) state.groups = [];
+    if (state.connections && state.shapes) {
+      state.connections = state.connections.filter(c => {
+        const from = state.shapes.find(s => s.id === c.fromId);
+        const to   = state.shapes.find(s => s.id === c.toId);
+        if (!from || !to) return true;
+        return (to.x + to.w / 2) >= (from.x + from.w / 2) - 10;
+      });
+    }
+    history = [JSON.stringify(state)]; histIndex = 0;
+    render(); updateProps(); fitView();
+  } catch (_) { /* hors ligne : état local conservé */ }
+}
+
 async function saveJSON() {
   const apiBase = window.OPTIQCARTO_API_BASE || '/cartography';
+  const current = JSON.parse(JSON.stringify(state));
+
+  if (_savedSnapshot !== null && _savedRev !== null) {
+    if (await _savePatch(apiBase, current)) return;
+  }
 
   // Check what would be removed (only when there's an existing carto in DB)
   try {
     const diffRes = await fetch(`${apiBase}/api/save-diff`, {
       method:  'POST',
       headers: { 'Content-Type': 'application/json' },
-      body:    JSON.stringify({ diagram: state }),
+      body:    JSON.stringify({ diagram: current }),
     });
     if (diffRes.ok) {
       const diff = await diffRes.json();
@@ -2752,10 +2873,11 @@ async function saveJSON() {
   const res  = await fetch(`${apiBase}/api/save`, {
     method:  'POST',
     headers: { 'Content-Type': 'application/json' },
-    body:    JSON.stringify({ diagram: state }),
+    body:    JSON.stringify({ diagram: current }),
   });
   const data = await res.json();
   if (data.ok) {
+    _rememberSaved(JSON.stringify(current), data.rev);
     if (data.sync_warning) showToast('Sauvegardé — erreur sync : ' + data.sync_warning, 'warn');
     else showToast('Cartographie sauvegardée ✓');
   } else showToast('Erreur : ' + (data.error || 'inconnue'));
@@ -2781,8 +2903,10 @@ async function openLoadDialog() {
     item.innerHTML = `<i class="fa-solid fa-diagram-project"></i><span>${name}</span><button class="load-delete" title="Supprimer"><i class="fa-solid fa-trash"></i></button>`;
 
     item.querySelector('span').addEventListener('click', async () => {
-      const data = await fetch(`${apiBase}/api/load/${encodeURIComponent(name)}`).then(r => r.json());
+      const res  = await fetch(`${apiBase}/api/load/${encodeURIComponent(name)}`);
+      const data = await res.json();
       if (data.error) { showToast('Erreur : ' + data.error); return; }
+      _rememberSaved(JSON.stringify(data), _readRev(res));
       state = data;
       // Filtrer les connexions qui reviendraient en arrière (depuis anciens fichiers)
       if (state.connections && state.shapes) {
@@ -4357,27 +4481,7 @@ function init() {
 
   // Auto-load cartography from DB if one exists
   if (window.OPTIQCARTO_HAS_CARTO && window.OPTIQCARTO_DEFAULT_NAME) {
-    const apiBase = window.OPTIQCARTO_API_BASE || '/cartography';
-    fetch(`${apiBase}/api/load/${encodeURIComponent(window.OPTIQCARTO_DEFAULT_NAME)}`)
-      .then(r => r.json())
-      .then(data => {
-        if (data && !data.error) {
-          state = data;
-          if (!state.bandWidth) state.bandWidth = 1600;
-          if (!state.groups) state.groups = [];
-          if (state.connections && state.shapes) {
-            state.connections = state.connections.filter(c => {
-              const from = state.shapes.find(s => s.id === c.fromId);
-              const to   = state.shapes.find(s => s.id === c.toId);
-              if (!from || !to) return true;
-              return (to.x + to.w / 2) >= (from.x + from.w / 2) - 10;
-            });
-          }
-          history = [JSON.stringify(state)]; histIndex = 0;
-          render(); updateProps(); fitView();
-        }
-      })
-      .catch(() => {});
+    _loadServerCarto(window.OPTIQCARTO_API_BASE || '/cartography');
   }
 
   // Welcome modal
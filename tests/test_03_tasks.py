@@ -117,3 +117,101 @@ class TestTasksReorder:
             content_type="application/json",
         )
         assert r.status_code in (200, 404, 405)
+
+
+class TestTasksBatch:
+    """Ordre, rôles et outils appliqués en lot (POST /tasks/batch)."""
+
+    @pytest.fixture(scope="class")
+    def batch_activity(self, app, ids):
+        from Code.extensions import db
+        from Code.models.models import Activities, Role, Task, Tool
+
+        with app.app_context():
+            activity = Activities(entity_id=ids["entity_id"], name="Activité Lot")
+            db.session.add(activity)
+            db.session.flush()
+            tasks = [Task(name=f"Lot {i}", activity_id=activity.id, order=i) for i in range(3)]
+            role = Role(name="Rôle Lot", entity_id=ids["entity_id"])
+            tools = [Tool(name=f"Outil Lot {i}", entity_id=ids["entity_id"]) for i in range(2)]
+            db.session.add_all(tasks + [role] + tools)
+            db.session.commit()
+            return {
+                "activity_id": activity.id,
+                "tasks": [t.id for t in tasks],
+                "role_id": role.id,
+                "tools": [t.id for t in tools],
+            }
+
+    def _post(self, client, payload):
+        return client.post("/tasks/batch", data=json.dumps(payload), content_type="application/json")
+
+    def test_reorder_roles_and_tools_in_one_call(self, auth_client, batch_activity):
+        t0, t1, t2 = batch_activity["tasks"]
+        tool_a, tool_b = batch_activity["tools"]
+        r = self._post(auth_client, {
+            "activity_id": batch_activity["activity_id"],
+            "order": [t2, t0, t1],
+            "tasks": [
+                {"id": t0,
+                 "roles": [{"id": batch_activity["role_id"], "status": "Réalisateur"},
+                           {"name": "Rôle Lot Nouveau", "status": "Support"}],
+                 "tools": [tool_a], "new_tools": ["outil lot 1", "Outil Lot Neuf"]},
+            ],
+        })
+        assert r.status_code == 200
+        data = r.get_json()
+        assert [t["id"] for t in data["tasks"]] == [t2, t0, t1]
+        first = next(t for t in data["tasks"] if t["id"] == t0)
+        assert sorted(x["name"] for x in first["roles"]) == ["Rôle Lot", "Rôle Lot Nouveau"]
+        # « outil lot 1 » est résolu sans tenir compte de la casse
+        assert sorted(x["name"] for x in first["tools"]) == ["Outil Lot 0", "Outil Lot 1", "Outil Lot Neuf"]
+        assert data["applied"]["tools_added"] == 3
+
+        # Conflit sur (tâche, rôle) : statut mis à jour ; outils : diff appliqué
+        r = self._post(auth_client, {
+            "activity_id": batch_activity["activity_id"],
+            "tasks": [{"id": t0, "roles": [{"id": batch_activity["role_id"], "status": "Valideur"}],
+                       "tools": [tool_b]}],
+        })
+        first = next(t for t in r.get_json()["tasks"] if t["id"] == t0)
+        statuses = {x["name"]: x["status"] for x in first["roles"]}
+        assert statuses["Rôle Lot"] == "Valideur"
+        assert [x["id"] for x in first["tools"]] == [tool_b]
+        assert r.get_json()["applied"]["tools_removed"] == 2
+
+    def test_rejects_foreign_task(self, auth_client, batch_activity, ids):
+        r = self._post(auth_client, {
+            "activity_id": batch_activity["activity_id"],
+            "tasks": [{"id": ids["task_id"], "tools": []}],
+        })
+        assert r.status_code == 400
+
+    @pytest.mark.parametrize("item", [
+        {"new_tools": [5]},
+        {"new_tools": "Excel"},
+        {"roles": [{"name": 7, "status": "Support"}]},
+        {"roles": [{"name": "Expert", "status": 3}]},
+        {"roles": "Expert"},
+    ])
+    def test_rejects_non_string_names(self, auth_client, batch_activity, item):
+        t0 = batch_activity["tasks"][0]
+        r = self._post(auth_client, {"activity_id": batch_activity["activity_id"],
+                                     "tasks": [dict(item, id=t0)]})
+        assert r.status_code == 400
+        assert r.get_json()["details"][0]["id"] == t0
+
+    def test_requires_activity(self, auth_client):
+        assert self._post(auth_client, {"tasks": []}).status_code == 400
+        assert self._post(auth_client, {"activity_id": 999999}).status_code == 404
+
+    def test_reorder_route_uses_single_update(self, auth_client, batch_activity):
+        t0, t1, t2 = batch_activity["tasks"]
+        r = auth_client.post(
+            f"/activities/{batch_activity['activity_id']}/tasks/reorder",
+            data=json.dumps({"order": [str(t1), str(t2), str(t0)]}),
+            content_type="application/json",
+        )
+        assert r.status_code == 200
+        from Code.routes.tasks import tasks_state
+        assert [t["id"] for t in tasks_state(batch_activity["activity_id"])] == [t1, t2, t0]
@@ -90,3 +90,281 @@ class TestTimePage:
         if r.status_code == 200:
             data = json.loads(r.data)
             assert isinstance(data, (list, dict))
+
+
+class TestWeakness:
+
+    BASE = {"duration_std": 30, "delay_std": 10, "L_unit": "minutes", "M_unit": "minutes"}
+
+    def _post(self, client, url, payload):
+        return client.post(url, data=json.dumps(payload), content_type="application/json")
+
+    def test_single_scenario(self, auth_client, ids):
+        r = self._post(auth_client, "/temps/api/weakness", dict(
+            self.BASE, activity_id=ids["activity_id"], recurrence="hebdomadaire",
+            L_work_added=12, M_wait_added=6, N_prob_denom=4,
+        ))
+        assert r.status_code == 200
+        calc = r.get_json()["calc"]
+        assert calc["O"] == 0.25
+        assert calc["S"] == 30 + 12 * 0.25
+
+    def test_batch_matches_single(self, auth_client, ids):
+        single = self._post(auth_client, "/temps/api/weakness", dict(
+            self.BASE, activity_id=ids["activity_id"], recurrence="mensuel",
+            L_work_added=20, M_wait_added=5, N_prob_denom=3,
+        )).get_json()["calc"]
+
+        r = self._post(auth_client, "/temps/api/weakness/batch", dict(
+            self.BASE, activity_id=ids["activity_id"],
+            grid={"recurrence": ["journalier", "mensuel"], "L_work_added": [10, 20],
+                  "M_wait_added": [5], "N_prob_denom": [1, 3]},
+        ))
+        assert r.status_code == 200
+        data = r.get_json()
+        assert data["count"] == 8
+        match = [s for s in data["scenarios"]
+                 if s["recurrence"] == "mensuel" and s["L_minutes"] == 20 and s["N_prob_denom"] == 3]
+        assert len(match) == 1
+        for key, value in single.items():
+            assert match[0]["calc"][key] == pytest.approx(value)
+
+    def test_batch_monte_carlo(self, auth_client, ids):
+        r = self._post(auth_client, "/temps/api/weakness/batch", dict(
+            self.BASE, activity_id=ids["activity_id"],
+            monte_carlo={"samples": 500, "seed": 7, "recurrence": "hebdomadaire",
+                         "L": {"dist": "triangular", "min": 5, "mode": 10, "max": 30},
+                         "M": {"dist": "uniform", "min": 0, "max": 1, "unit": "heures"},
+                         "N": {"dist": "uniform", "min": 1, "max": 5}},
+        ))
+        assert r.status_code == 200
+        mc = r.get_json()["monte_carlo"]
+        assert mc["samples"] == 500
+        u = mc["percentiles"]["U"]
+        assert u["p10"] <= u["p50"] <= u["p90"]
+
+    def test_batch_save_bulk(self, auth_client, ids, app):
+        from Code.models.models import TimeWeakness
+
+        with app.app_context():
+            before = TimeWeakness.query.count()
+        r = self._post(auth_client, "/temps/api/weakness/batch", dict(
+            self.BASE, activity_id=ids["activity_id"], save=True, weakness="lot",
+            grid={"N_prob_denom": [1, 2, 4]},
+        ))
+        assert r.status_code == 200
+        assert r.get_json()["saved"] == 3
+        with app.app_context():
+            assert TimeWeakness.query.count() == before + 3
+
+    def test_batch_too_many_scenarios(self, auth_client, ids):
+        r = self._post(auth_client, "/temps/api/weakness/batch", dict(
+            self.BASE, activity_id=ids["activity_id"],
+            grid={"L_work_added": list(range(100)), "N_prob_denom": list(range(1, 30))},
+        ))
+        assert r.status_code == 400
+
+    def test_batch_size_checked_before_product(self, auth_client, ids, monkeypatch):
+        from Code.routes import time_view
+
+        monkeypatch.setattr(time_view, "to_minutes", lambda *a: pytest.fail("scénario construit"))
+        r = self._post(auth_client, "/temps/api/weakness/batch", dict(
+            self.BASE, activity_id=ids["activity_id"],
+            grid={"L_work_added": list(range(1000)), "M_wait_added": list(range(1000)),
+                  "N_prob_denom": list(range(1, 1000))},
+        ))
+        assert r.status_code == 400
+        assert "999000000 scénarios" in r.get_json()["error"]
+
+    @pytest.mark.parametrize("payload", [
+        {"grid": {"N_prob_denom": ["abc"]}},
+        {"grid": {"L_work_added": ["dix"]}},
+        {"scenarios": [1, 2]},
+        {"frequency": "souvent"},
+        {"monte_carlo": {"percentiles": [50, 150]}},
+        {"monte_carlo": {"percentiles": ["p50"]}},
+        {"monte_carlo": {"samples": "beaucoup"}},
+        {"monte_carlo": {"L": {"dist": "uniform", "min": "a"}}},
+        {"monte_carlo": [1]},
+    ])
+    def test_batch_invalid_input_is_400(self, auth_client, ids, payload):
+        r = self._post(auth_client, "/temps/api/weakness/batch",
+                       dict(self.BASE, activity_id=ids["activity_id"], **payload))
+        assert r.status_code == 400
+        assert r.get_json()["ok"] is False
+
+    @pytest.mark.parametrize("payload, where", [
+        ({"scenarios": [{"L_work_added": 1}, {"L_work_added": "dix"}]}, "scenarios[1].L_work_added"),
+        ({"monte_carlo": {"L": 3}}, "L : objet attendu"),
+        ({"monte_carlo": {"M": [1, 2]}}, "M : objet attendu"),
+        ({"duration_std": "long"}, "duration_std"),
+        ({"mode": "tasks", "tasks": [{"duration_std": 5}, {"duration_std": "x"}]}, "tasks[1].duration_std"),
+        ({"mode": "tasks", "save": True, "tasks": [{"task_id": 1}, {"duration_std": 5}]}, "tasks[1].task_id"),
+        ({"mode": "tasks", "save": True, "tasks": [{"task_id": "abc"}]}, "tasks[0].task_id"),
+        ({"mode": "tasks", "tasks": ["x"]}, "tasks[0]"),
+    ])
+    def test_batch_invalid_item_names_index(self, auth_client, ids, payload, where):
+        r = self._post(auth_client, "/temps/api/weakness/batch",
+                       dict(self.BASE, activity_id=ids["activity_id"], **payload))
+        assert r.status_code == 400
+        assert where in r.get_json()["error"]
+
+    def test_batch_tasks_without_ids_when_not_saving(self, auth_client, ids):
+        r = self._post(auth_client, "/temps/api/weakness/batch", dict(
+            self.BASE, activity_id=ids["activity_id"], mode="tasks",
+            tasks=[{"duration_std": 1, "duration_unit": "heures"}, {"duration_std": 15}],
+        ))
+        assert r.status_code == 200
+        assert r.get_json()["B_minutes"] == 75
+
+
+@pytest.fixture(scope="module")
+def workload(app):
+    """Utilisateur propriétaire de deux entités (une activité et un rôle chacune)."""
+    from werkzeug.security import generate_password_hash
+
+    from Code.extensions import db
+    from Code.models.models import Activities, Entity, Role, User
+
+    with app.app_context():
+        user = User(first_name="Charge", last_name="Annuelle", email="workload@devoptiq.com",
+                    password=generate_password_hash("ChargePass123!"), status="admin")
+        db.session.add(user)
+        db.session.flush()
+        entities, activities = [], []
+        for name in ("Charge A", "Charge B"):
+            entity = Entity(name=name, owner_id=user.id)
+            db.session.add(entity)
+            db.session.flush()
+            activity = Activities(entity_id=entity.id, name=f"Activité {name}")
+            db.session.add_all([activity, Role(entity_id=entity.id, name=f"Rôle {name}")])
+            db.session.flush()
+            entities.append(entity.id)
+            activities.append(activity.id)
+        db.session.commit()
+        user_id = user.id
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["user_id"] = user_id
+        sess["active_entity_id"] = entities[0]
+    return {"client": client, "user_id": user_id, "entities": entities, "activities": activities}
+
+
+class TestWorkloadRollup:
+
+    def test_requires_entity(self, client):
+        r = client.get("/temps/api/workload_rollup")
+        assert r.status_code == 400
+
+    def test_foreign_entity_is_404(self, auth_client, workload):
+        r = auth_client.get(f"/temps/api/workload_rollup?entity_id={workload['entities'][0]}")
+        assert r.status_code == 404
+
+    def test_rollup_and_cache(self, workload, app):
+        from Code.extensions import db
+        from Code.models.models import Role, UserRole, TimeRoleAnalysis, TimeRoleLine, TimeAnalysis
+
+        client, user_id = workload["client"], workload["user_id"]
+        entity_id, activity_id = workload["entities"][0], workload["activities"][0]
+        with app.app_context():
+            role = Role(entity_id=entity_id, name="Rôle charge")
+            db.session.add(role)
+            db.session.flush()
+            db.session.add(UserRole(user_id=user_id, role_id=role.id))
+            ra = TimeRoleAnalysis(role_id=role.id, name="Charge")
+            db.session.add(ra)
+            db.session.flush()
+            db.session.add(TimeRoleLine(role_analysis_id=ra.id, activity_id=activity_id,
+                                        recurrence="journalier", frequency=2, duration_minutes=30))
+            db.session.add(TimeAnalysis(type="activity", activity_id=activity_id, role_id=role.id,
+                                        user_id=user_id, duration=10, recurrence="hebdomadaire",
+                                        frequency=1, delay=5))
+            db.session.commit()
+            role_id = role.id
+
+        url = f"/temps/api/workload_rollup?entity_id={entity_id}"
+        data = client.get(url).get_json()
+        cal = data["calendar"]
+        role = next(r for r in data["by_role"] if r["role_id"] == role_id)
+        assert role["headcount"] == 1
+        assert role["role_analysis_minutes"] == 30 * 2 * cal["days_per_week"] * cal["weeks_per_year"]
+        assert role["time_analysis_minutes"] == 10 * 42
+        assert role["delay_minutes"] == 5 * 42
+        assert role["fte"] > 0
+        user = next(u for u in data["by_user"] if u["user_id"] == user_id)
+        assert user["annual_minutes"] == 10 * 42
+
+        again = client.get(url).get_json()
+        assert again["cached"] is True
+        assert again["generation"] == data["generation"]
+        # Sans paramètre : entité active, même entrée de cache
+        assert client.get("/temps/api/workload_rollup").get_json()["cached"] is True
+
+        r = client.post("/temps/api/time_analysis", data=json.dumps({
+            "activity_id": activity_id, "duration": 60, "recurrence": "annuel", "frequency": 1,
+        }), content_type="application/json")
+        assert r.status_code == 200
+        fresh = client.get(url).get_json()
+        assert fresh["cached"] is False
+        assert fresh["generation"] > data["generation"]
+        assert fresh["totals"]["annual_minutes"] >= data["totals"]["annual_minutes"] + 60
+
+    def test_generation_per_entity(self, workload, app):
+        from Code.extensions import db
+        from Code.models.models import CacheGeneration, Role, TimeAnalysis
+        from Code.routes.time_view import WORKLOAD_GENERATION, workload_generation
+
+        client = workload["client"]
+        (first, second), (act_first, act_second) = workload["entities"], workload["activities"]
+        url = f"/temps/api/workload_rollup?entity_id={first}"
+        client.get(url)
+        assert client.get(url).get_json()["cached"] is True
+
+        with app.app_context():
+            before, other = workload_generation(first), workload_generation(second)
+            # Écriture d'un autre worker : seule la ligne de l'entité change
+            db.session.execute(db.update(CacheGeneration)
+                               .where(CacheGeneration.name == WORKLOAD_GENERATION.format(first))
+                               .values(value=CacheGeneration.value + 1))
+            db.session.commit()
+            assert workload_generation(first) == before + 1
+        assert client.get(url).get_json()["cached"] is False
+
+        with app.app_context():
+            # Commit sans modèle de la charge : génération inchangée
+            db.session.execute(db.text("SELECT 1"))
+            db.session.commit()
+            assert workload_generation(first) == before + 1
+            # Écriture dans l'autre entité : cache de la première intact
+            db.session.add(TimeAnalysis(type="activity", activity_id=act_second, duration=1,
+                                        recurrence="annuel", frequency=1))
+            db.session.commit()
+            assert workload_generation(first) == before + 1
+            assert workload_generation(second) == other + 1
+        assert client.get(url).get_json()["cached"] is True
+
+        with app.app_context():
+            db.session.add(TimeAnalysis(type="activity", activity_id=act_first, duration=1,
+                                        recurrence="annuel", frequency=1))
+            db.session.commit()
+            assert workload_generation(first) == before + 2
+            # Mise à jour en masse : entités relues avant l'exécution
+            Role.query.filter_by(entity_id=second).update({"name": "Rôle renommé"})
+            db.session.commit()
+            assert workload_generation(first) == before + 2
+            assert workload_generation(second) == other + 2
+
+    def test_rollback_discards_bump(self, workload, app):
+        from Code.extensions import db
+        from Code.models.models import TimeAnalysis
+        from Code.routes.time_view import workload_generation
+
+        entity_id, activity_id = workload["entities"][0], workload["activities"][0]
+        with app.app_context():
+            before = workload_generation(entity_id)
+            db.session.add(TimeAnalysis(type="activity", activity_id=activity_id, duration=1,
+                                        recurrence="annuel", frequency=1))
+            db.session.flush()
+            db.session.rollback()
+            assert workload_generation(entity_id) == before
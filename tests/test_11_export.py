@@ -0,0 +1,60 @@
+# tests/test_11_export.py
+"""
+Page : Export des données
+Tests couvrant l'export Excel (write_only + fichier temporaire), l'export HTML
+diffusé par template et les générateurs de données partagés.
+"""
+import io
+import pytest
+
+pytestmark = pytest.mark.export
+
+
+class TestExportEntity:
+
+    def test_export_requires_entity(self, auth_client):
+        r = auth_client.get("/export/entity")
+        assert r.status_code == 400
+
+    def test_export_unknown_entity(self, auth_client):
+        r = auth_client.get("/export/entity?entity_id=999999")
+        assert r.status_code == 404
+
+    def test_export_excel(self, auth_client, ids, app):
+        with app.app_context():
+            from Code.models.models import Savoir
+            from Code.extensions import db
+            db.session.add(Savoir(description="Savoir export", activity_id=ids["activity_id"]))
+            db.session.commit()
+
+        r = auth_client.get(f"/export/entity?entity_id={ids['entity_id']}&format=excel")
+        assert r.status_code == 200
+        assert "spreadsheetml" in r.mimetype
+
+        from openpyxl import load_workbook
+        wb = load_workbook(io.BytesIO(r.data))
+        assert wb.sheetnames == [
+            "Résumé", "Activités", "Savoirs", "Savoir-faires", "HSC - Aptitudes", "Compétences",
+        ]
+        ws = wb["Savoirs"]
+        assert ws.freeze_panes == "A2"
+        assert ws["A1"].font.b is True
+        rows = list(ws.iter_rows(min_row=2, values_only=True))
+        assert ("Activité Test", "Savoir export") in rows
+
+    def test_export_html_streamed(self, auth_client, ids):
+        r = auth_client.get(f"/export/entity?entity_id={ids['entity_id']}&format=html")
+        assert r.status_code == 200
+        assert r.is_streamed
+        html = r.get_data(as_text=True)
+        assert "Activité Test" in html
+        assert "Savoir export" in html
+        assert html.rstrip().endswith("</html>")
+
+    def test_export_loaders(self, app, ids):
+        from Code.routes.export import _collect_entity_data, iter_activity_names, iter_items
+        with app.test_request_context():
+            data = _collect_entity_data(ids["entity_id"])
+            assert data["counts"]["savoirs"] >= 1
+            assert "Activité Test" in list(iter_activity_names(data))
+            assert ("Activité Test", "Savoir export") in list(iter_items(data, "savoirs"))
@@ -0,0 +1,36 @@
+# tests/test_12_bootstrap.py
+"""
+Démarrage : bootstrap du schéma séparé de create_app().
+"""
+import pytest
+
+pytestmark = pytest.mark.bootstrap
+
+
+class TestBootstrap:
+
+    def test_schema_version_is_alembic_head(self):
+        from alembic.config import Config
+        from alembic.script import ScriptDirectory
+        from Code.bootstrap import MIGRATIONS_DIR, SCHEMA_VERSION
+
+        config = Config()
+        config.set_main_option("script_location", MIGRATIONS_DIR)
+        assert ScriptDirectory.from_config(config).get_current_head() == SCHEMA_VERSION
+
+    def test_bootstrap_then_strict_check(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'boot.db'}")
+        monkeypatch.setenv("SCHEMA_CHECK", "off")
+        from Code.app import create_app
+        from Code.bootstrap import bootstrap_database, check_schema, SchemaVersionError
+
+        app = create_app()
+        app.config["SCHEMA_CHECK"] = "strict"
+        with app.app_context():
+            with pytest.raises(SchemaVersionError):
+                check_schema(app)
+
+        bootstrap_database(app, seed=False)
+        bootstrap_database(app, seed=False)   # idempotent
+        with app.app_context():
+            assert check_schema(app) is True
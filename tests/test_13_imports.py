@@ -0,0 +1,33 @@
+# tests/test_13_imports.py
+"""
+Démarrage : budget de temps d'import et imports différés des bibliothèques lourdes.
+Le budget (meilleur de 3 imports) peut être ajusté sur une machine lente
+via IMPORT_BUDGET_MS.
+"""
+import os
+import pytest
+
+pytestmark = pytest.mark.imports
+
+IMPORT_BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", "1000"))
+
+
+@pytest.fixture(scope="module")
+def profile():
+    from Code.import_profiler import profile_imports
+    return profile_imports("Code.app", runs=3)
+
+
+class TestImportTime:
+
+    def test_heavy_libraries_are_lazy(self, profile):
+        assert profile["heavy_loaded"] == []
+
+    def test_total_import_budget(self, profile):
+        assert profile["total_ms"] <= IMPORT_BUDGET_MS, (
+            f"Import de Code.app : {profile['total_ms']} ms > budget {IMPORT_BUDGET_MS} ms"
+        )
+
+    def test_blueprints_are_profiled(self, profile):
+        assert "export" in profile["blueprints"]
+        assert "Code.routes.export" in profile["blueprints"]["export"]["modules"]
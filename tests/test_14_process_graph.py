@@ -0,0 +1,138 @@
+# tests/test_14_process_graph.py
+"""
+Graphe de processus : ordre topologique, chemin critique, marges et boucles.
+"""
+import pytest
+from werkzeug.security import generate_password_hash
+
+pytestmark = pytest.mark.process_graph
+
+
+def _graph(activities, links, data=()):
+    from Code.routes.process_graph import build_graph
+    return build_graph(activities, data, links)
+
+
+class TestProcessGraphEngine:
+
+    def test_diamond_critical_path_and_slack(self):
+        from Code.routes.process_graph import analyze, graph_report
+
+        # 1 → 2 → 4 et 1 → 3 → 4 ; la branche par 3 est la plus longue
+        g = _graph(
+            [(1, "A", 10, 0), (2, "B", 5, 0), (3, "C", 20, 5), (4, "D", 10, 0)],
+            [(1, None, 2, None), (1, None, 3, None), (2, None, 4, None), (3, None, 4, None)],
+        )
+        report = graph_report(g, analyze(g))
+
+        assert report["lead_time_minutes"] == 45
+        assert [s["id"] for s in report["critical_path"]] == [1, 3, 4]
+        by_id = {a["id"]: a for a in report["activities"]}
+        assert by_id[2]["slack"] == 20
+        assert by_id[2]["critical"] is False
+        assert by_id[3]["earliest_start"] == 10 and by_id[3]["critical"] is True
+        order = report["topological_order"]
+        assert order.index(1) < order.index(2) < order.index(4)
+        assert report["bottlenecks"][0]["id"] == 3
+        assert report["cycles"] == []
+
+    def test_data_nodes_relay_between_activities(self):
+        from Code.routes.process_graph import analyze, graph_report
+
+        g = _graph(
+            [(1, "A", 10, 0), (2, "B", 15, 0)],
+            [(1, None, None, 7), (None, 7, 2, None)],
+            data=[(7, "Bon de commande")],
+        )
+        report = graph_report(g, analyze(g))
+        assert report["lead_time_minutes"] == 25
+        assert [a["id"] for a in report["activities"]] == [1, 2]
+
+    def test_cycle_is_condensed(self):
+        from Code.routes.process_graph import analyze, graph_report
+
+        # 1 → 2 ⇄ 3 → 4
+        g = _graph(
+            [(1, "A", 1, 0), (2, "B", 2, 0), (3, "C", 3, 0), (4, "D", 4, 0)],
+            [(1, None, 2, None), (2, None, 3, None), (3, None, 2, None), (3, None, 4, None)],
+        )
+        report = graph_report(g, analyze(g))
+        assert len(report["cycles"]) == 1
+        assert sorted(n["id"] for n in report["cycles"][0]) == [2, 3]
+        assert report["lead_time_minutes"] == 10
+        by_id = {a["id"]: a for a in report["activities"]}
+        assert by_id[2]["cycle"] == by_id[3]["cycle"] == 0
+
+    def test_self_loop_reported(self):
+        from Code.routes.process_graph import analyze
+
+        g = _graph([(1, "A", 1, 0)], [(1, None, 1, None)])
+        assert analyze(g)["cycles"] == [[0]]
+
+    def test_large_chain_is_iterative(self):
+        from Code.routes.process_graph import analyze
+
+        n = 20000
+        g = _graph(
+            [(i, f"A{i}", 1, 0) for i in range(n)],
+            [(i, None, i + 1, None) for i in range(n - 1)],
+        )
+        assert analyze(g)["lead_time"] == n
+
+
+@pytest.fixture(scope="module")
+def graph_owner(app):
+    """Utilisateur propriétaire d'une entité à deux activités reliées."""
+    from Code.extensions import db
+    from Code.models.models import Activities, Entity, Link, User
+
+    with app.app_context():
+        user = User(first_name="Graphe", last_name="Processus", email="process-graph@devoptiq.com",
+                    password=generate_password_hash("GraphPass123!"), status="admin")
+        db.session.add(user)
+        db.session.flush()
+        entity = Entity(name="Entité Graphe", owner_id=user.id)
+        db.session.add(entity)
+        db.session.flush()
+        first = Activities(entity_id=entity.id, name="Amont", duration_minutes=10)
+        second = Activities(entity_id=entity.id, name="Aval", duration_minutes=5)
+        db.session.add_all([first, second])
+        db.session.flush()
+        db.session.add(Link(entity_id=entity.id, source_activity_id=first.id,
+                            target_activity_id=second.id, type="flux"))
+        db.session.commit()
+        user_id, entity_id, activity_id = user.id, entity.id, first.id
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["user_id"] = user_id
+        sess["active_entity_id"] = entity_id
+    return {"client": client, "entity_id": entity_id, "activity_id": activity_id}
+
+
+class TestProcessGraphApi:
+
+    def test_requires_entity(self, client):
+        r = client.get("/process-graph/api/analysis")
+        assert r.status_code == 400
+
+    def test_unknown_entity(self, auth_client):
+        r = auth_client.get("/process-graph/api/analysis?entity_id=999999")
+        assert r.status_code == 404
+
+    def test_foreign_entity(self, graph_owner, ids):
+        r = graph_owner["client"].get(f"/process-graph/api/analysis?entity_id={ids['entity_id']}")
+        assert r.status_code == 404
+
+    def test_analysis(self, graph_owner):
+        client, entity_id = graph_owner["client"], graph_owner["entity_id"]
+        r = client.get(f"/process-graph/api/analysis?entity_id={entity_id}")
+        assert r.status_code == 200
+        data = r.get_json()
+        assert graph_owner["activity_id"] in data["topological_order"]
+        assert "load" in data["timings_ms"]
+
+        r = client.get("/process-graph/api/analysis?summary=1")
+        assert r.status_code == 200
+        assert r.get_json()["entity_id"] == entity_id
+        assert "activities" not in r.get_json()
@@ -0,0 +1,144 @@
+# tests/test_15_recent_feed.py
+"""
+Fil d'activité récente : filtre par entité, pagination par clé
+(created_at, id), nom d'utilisateur joint et ETag / 304 ; écriture
+tamponnée des événements au commit et mode masse (audit_bulk).
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+pytestmark = pytest.mark.recent_feed
+
+
+@pytest.fixture(scope="module")
+def feed_client(app):
+    """Utilisateur propriétaire de sa propre entité, avec 25 événements + 1 hors entité."""
+    from Code.extensions import db
+    from Code.models.models import Entity, RecentEvent, User
+
+    with app.app_context():
+        user = User(first_name="Fil", last_name="Actu", email="feed@devoptiq.com",
+                    password=generate_password_hash("FeedPass123!"), status="admin")
+        db.session.add(user)
+        db.session.flush()
+        entity = Entity(name="Entité Fil", owner_id=user.id)
+        db.session.add(entity)
+        db.session.flush()
+
+        base = datetime(2026, 1, 1, 12, 0, 0)
+        for i in range(25):
+            # Deux événements par horodatage : départage par id
+            db.session.add(RecentEvent(event_type="activity_created", label=f"Événement {i}",
+                                       entity_id=entity.id, user_id=user.id,
+                                       created_at=base + timedelta(minutes=i // 2)))
+        db.session.add(RecentEvent(event_type="activity_created", label="Autre entité",
+                                   entity_id=entity.id + 1000, created_at=base + timedelta(days=1)))
+        db.session.commit()
+        user_id, entity_id = user.id, entity.id
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["user_id"] = user_id
+        sess["active_entity_id"] = entity_id
+    return client
+
+
+class TestRecentFeed:
+
+    def test_requires_active_entity(self, client):
+        r = client.get("/api/recent-activity/feed")
+        assert r.status_code == 400
+
+    def test_keyset_pages_cover_all_events(self, feed_client):
+        labels, cursor, pages = [], None, 0
+        while True:
+            url = "/api/recent-activity/feed?limit=10" + (f"&cursor={cursor}" if cursor else "")
+            data = feed_client.get(url).get_json()
+            labels += [it["label"] for it in data["items"]]
+            pages += 1
+            cursor = data["next_cursor"]
+            if not cursor:
+                break
+        assert pages == 3
+        assert labels == [f"Événement {i}" for i in range(24, -1, -1)]
+        assert "Autre entité" not in labels
+
+    def test_user_name_joined(self, feed_client):
+        data = feed_client.get("/api/recent-activity/feed?limit=1").get_json()
+        assert data["items"][0]["user"] == "Fil Actu"
+
+    def test_etag_not_modified(self, feed_client):
+        r = feed_client.get("/api/recent-activity/feed")
+        etag = r.headers["ETag"]
+        r2 = feed_client.get("/api/recent-activity/feed", headers={"If-None-Match": etag})
+        assert r2.status_code == 304
+
+    def test_invalid_cursor(self, feed_client):
+        r = feed_client.get("/api/recent-activity/feed?cursor=@@@")
+        assert r.status_code == 400
+
+    def test_global_feed_still_served(self, auth_client):
+        r = auth_client.get("/api/recent-activity")
+        assert r.get_json()["ok"] is True
+
+
+class TestAuditBuffer:
+
+    def _count(self, **filters):
+        from Code.models.models import RecentEvent
+        return RecentEvent.query.filter_by(**filters).count()
+
+    def test_events_written_at_commit(self, app, ids):
+        from Code.extensions import db
+        from Code.models.models import Task
+
+        with app.app_context():
+            before = self._count(event_type="task_created", entity_id=ids["entity_id"])
+            for i in range(3):
+                db.session.add(Task(name=f"Tâche tampon {i}", activity_id=ids["activity_id"], order=100 + i))
+            db.session.flush()
+            # Rien d'écrit au flush : le tampon attend le commit
+            assert self._count(event_type="task_created", entity_id=ids["entity_id"]) == before
+            db.session.commit()
+            assert self._count(event_type="task_created", entity_id=ids["entity_id"]) == before + 3
+
+    def test_rollback_discards_buffer(self, app, ids):
+        from Code.extensions import db
+        from Code.models.models import RecentEvent, Task
+
+        with app.app_context():
+            before = RecentEvent.query.count()
+            db.session.add(Task(name="Tâche annulée", activity_id=ids["activity_id"], order=200))
+            db.session.flush()
+            db.session.rollback()
+            db.session.commit()
+            assert RecentEvent.query.count() == before
+
+    def test_bulk_coalesced(self, app, ids):
+        from Code.extensions import db
+        from Code.models.models import RecentEvent, Task, audit_bulk
+
+        with app.app_context():
+            before = RecentEvent.query.count()
+            with audit_bulk("Import", entity_id=ids["entity_id"]):
+                for i in range(50):
+                    db.session.add(Task(name=f"Tâche masse {i}", activity_id=ids["activity_id"], order=300 + i))
+            db.session.commit()
+            assert RecentEvent.query.count() == before + 1
+            ev = RecentEvent.query.order_by(RecentEvent.id.desc()).first()
+            assert ev.event_type == "bulk_import"
+            assert ev.label == "Import : 50 tâches créées"
+            assert ev.entity_id == ids["entity_id"]
+
+    def test_bulk_suspended(self, app, ids):
+        from Code.extensions import db
+        from Code.models.models import RecentEvent, Task, audit_bulk
+
+        with app.app_context():
+            before = RecentEvent.query.count()
+            with audit_bulk(coalesce=False):
+                db.session.add(Task(name="Tâche silencieuse", activity_id=ids["activity_id"], order=400))
+            db.session.commit()
+            assert RecentEvent.query.count() == before
@@ -0,0 +1,129 @@
+# tests/test_16_retention.py
+"""
+Rétention : purge de recent_events (âge / quota par entité), purge et
+compaction en deltas de l'historique des performances personnalisées.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+pytestmark = pytest.mark.retention
+
+
+def _policy(app, **overrides):
+    from Code.retention import load_policy
+    policy = load_policy(app)
+    policy.update({
+        "RETENTION_EVENTS_MAX_AGE_DAYS": 0,
+        "RETENTION_EVENTS_MAX_PER_ENTITY": 0,
+        "RETENTION_HISTORY_MAX_AGE_DAYS": 0,
+        "RETENTION_HISTORY_MAX_PER_PERF": 0,
+        "RETENTION_BATCH_SIZE": 4,
+    })
+    policy.update(overrides)
+    return policy
+
+
+class TestDeltaCodec:
+
+    @pytest.mark.parametrize("base,target", [
+        ("", "nouveau texte"),
+        ("texte complet", ""),
+        ("Le processus de validation", "Le processus de validation des factures"),
+        ("abc def ghi", "abc XYZ ghi jkl"),
+        ("é à ü — ligne\nsuite", "é à ü — ligne modifiée\nsuite"),
+    ])
+    def test_roundtrip(self, base, target):
+        from Code.retention import apply_delta, make_delta
+        assert apply_delta(base, make_delta(base, target)) == target
+
+
+class TestRecentEventsRetention:
+
+    def test_prune_by_age(self, app):
+        from Code.extensions import db
+        from Code.models.models import RecentEvent
+        from Code.retention import prune_recent_events
+
+        with app.app_context():
+            old = datetime.utcnow() - timedelta(days=400)
+            for i in range(6):
+                db.session.add(RecentEvent(event_type="activity_created", label=f"Ancien {i}",
+                                           entity_id=515151, created_at=old))
+            db.session.commit()
+
+            policy = _policy(app, RETENTION_EVENTS_MAX_AGE_DAYS=365)
+            estimate = prune_recent_events(policy, dry_run=True)
+            assert estimate["deleted_rows"] >= 6
+            assert RecentEvent.query.filter_by(entity_id=515151).count() == 6
+
+            metrics = prune_recent_events(policy)
+            assert metrics["deleted_rows"] >= 6
+            assert metrics["bytes_reclaimed"] > 0
+            assert metrics["strategy"] == "batch_delete"
+            assert RecentEvent.query.filter_by(entity_id=515151).count() == 0
+
+    def test_prune_per_entity_quota(self, app):
+        from Code.extensions import db
+        from Code.models.models import RecentEvent
+        from Code.retention import prune_recent_events
+
+        with app.app_context():
+            base = datetime.utcnow() - timedelta(hours=1)
+            for i in range(15):
+                db.session.add(RecentEvent(event_type="task_created", label=f"Quota {i}",
+                                           entity_id=626262, created_at=base + timedelta(seconds=i)))
+            db.session.commit()
+
+            metrics = prune_recent_events(_policy(app, RETENTION_EVENTS_MAX_PER_ENTITY=10))
+            assert metrics["deleted_rows"] >= 5
+            labels = [e.label for e in RecentEvent.query.filter_by(entity_id=626262)
+                      .order_by(RecentEvent.created_at).all()]
+            assert labels == [f"Quota {i}" for i in range(5, 15)]
+
+
+class TestHistoryCompaction:
+
+    def _perf_with_history(self, auth_client, ids, versions):
+        r = auth_client.post("/performance_perso/create", json={
+            "user_id": ids["user_id"], "activity_id": ids["activity_id"], "content": versions[0],
+        })
+        perf_id = r.get_json()["item"]["id"]
+        for content in versions[1:]:
+            auth_client.put(f"/performance_perso/update/{perf_id}", json={"content": content})
+        return perf_id
+
+    def test_compaction_is_transparent_to_reads(self, auth_client, ids, app):
+        from Code.retention import compact_history
+
+        paragraph = "Préparer le dossier client, vérifier les pièces et valider la commande. " * 5
+        versions = [paragraph + f"Version {i}." for i in range(6)]
+        perf_id = self._perf_with_history(auth_client, ids, versions)
+        before = auth_client.get(f"/performance_perso/history/{perf_id}").get_json()["history"]
+
+        with app.app_context():
+            metrics = compact_history(_policy(app))
+        assert metrics["compacted_rows"] >= 4
+        assert metrics["bytes_after"] < metrics["bytes_before"]
+
+        after = auth_client.get(f"/performance_perso/history/{perf_id}").get_json()["history"]
+        assert [h["content"] for h in after] == [h["content"] for h in before]
+
+        by_pair = auth_client.get(
+            f"/performance_perso/history?user_id={ids['user_id']}&activity_id={ids['activity_id']}"
+        ).get_json()["history"]
+        assert {h["content"] for h in by_pair if h["performance_id"] == perf_id} == {h["content"] for h in before}
+
+    def test_prune_keeps_newest_snapshots(self, auth_client, ids, app):
+        from Code.retention import compact_history, prune_history
+
+        versions = [f"Contenu de la performance, révision {i}. " * 4 for i in range(8)]
+        perf_id = self._perf_with_history(auth_client, ids, versions)
+        with app.app_context():
+            compact_history(_policy(app))
+            metrics = prune_history(_policy(app, RETENTION_HISTORY_MAX_PER_PERF=3))
+        assert metrics["deleted_rows"] >= 5
+
+        history = auth_client.get(f"/performance_perso/history/{perf_id}").get_json()["history"]
+        assert len(history) == 3
+        assert all(h["content"] for h in history)
@@ -0,0 +1,152 @@
+# tests/test_17_changelog.py
+"""
+Changelog : cache par commit, persisté et servi depuis la mémoire, sans
+appel git en sous-processus sur le chemin de requête.
+"""
+import json
+import os
+import threading
+
+import pytest
+
+pytestmark = pytest.mark.changelog
+
+
+@pytest.fixture
+def generated(monkeypatch, tmp_path):
+    """Changelog généré (pas de fichier curated), génération instrumentée."""
+    from Code.routes import changelog
+
+    calls = []
+
+    def fake_commits(n=30):
+        calls.append(n)
+        return ["Ajout du graphe de processus"]
+
+    monkeypatch.setenv("CHANGELOG_CACHE_PATH", str(tmp_path / "changelog_cache.json"))
+    monkeypatch.setenv("GIT_COMMIT", "abc123def4567890")
+    monkeypatch.setattr(changelog, "_curated_file", lambda: str(tmp_path / "absent.json"))
+    monkeypatch.setattr(changelog, "_get_recent_commits", fake_commits)
+    monkeypatch.setattr(changelog, "_generate_with_openai",
+                        lambda commits: {"items": [{"icon": "fa-solid fa-star", "title": "T", "desc": "D"}]})
+    monkeypatch.setattr(changelog.subprocess, "run",
+                        lambda *a, **k: pytest.fail("subprocess sur le chemin de requête"))
+    changelog._changelog_memory.clear()
+    yield changelog, calls, tmp_path
+    changelog._changelog_memory.clear()
+
+
+class TestChangelogCache:
+
+    def test_commit_hash_without_subprocess(self, monkeypatch):
+        from Code.routes import changelog
+
+        monkeypatch.delenv("GIT_COMMIT", raising=False)
+        monkeypatch.setattr(changelog.subprocess, "run", lambda *a, **k: pytest.fail("subprocess"))
+        commit = changelog._get_latest_commit_hash()
+        assert commit == "unknown" or len(commit) == 40
+
+    def test_generated_once_then_served_from_memory(self, client, generated):
+        changelog, calls, tmp_path = generated
+
+        r = client.get("/api/changelog")
+        assert r.status_code == 200
+        data = r.get_json()
+        assert data["ok"] and data["items"][0]["title"] == "T"
+        assert data["version"] == "abc123def4567890"
+        assert r.headers["ETag"] == '"changelog-abc123def456"'
+
+        client.get("/api/changelog")
+        assert calls == [30]
+
+        stored = json.loads((tmp_path / "changelog_cache.json").read_text(encoding="utf-8"))
+        assert stored["commit"] == "abc123def4567890"
+
+    def test_persisted_cache_reused_by_other_worker(self, client, generated):
+        changelog, calls, _ = generated
+
+        client.get("/api/changelog")
+        changelog._changelog_memory.clear()     # nouveau worker : mémoire vide
+        r = client.get("/api/changelog")
+        assert r.get_json()["items"][0]["title"] == "T"
+        assert calls == [30]
+
+    def test_etag_and_versioned_url(self, client, generated):
+        r = client.get("/api/changelog")
+        etag = r.headers["ETag"]
+        assert "no-cache" in r.headers["Cache-Control"]
+
+        r = client.get("/api/changelog", headers={"If-None-Match": etag})
+        assert r.status_code == 304
+
+        r = client.get("/api/changelog?v=abc123def4567890")
+        assert "immutable" in r.headers["Cache-Control"]
+
+    def test_unknown_commit_not_cached(self, client, generated, monkeypatch):
+        changelog, calls, tmp_path = generated
+
+        monkeypatch.setattr(changelog, "_get_latest_commit_hash", lambda: changelog.UNKNOWN_COMMIT)
+        for url in ("/api/changelog", "/api/changelog?v=unknown"):
+            r = client.get(url, headers={"If-None-Match": '"changelog-unknown"'})
+            assert r.status_code == 200
+            assert r.get_json()["items"] == changelog._fallback_changelog()["items"]
+            assert "ETag" not in r.headers
+            assert r.headers["Cache-Control"] == "no-store"
+        assert calls == []
+        assert not (tmp_path / "changelog_cache.json").exists()
+
+    def test_lock_held_serves_fallback(self, client, generated):
+        changelog, calls, tmp_path = generated
+
+        lock = tmp_path / "changelog_cache.json.lock"
+        lock.write_text("")
+        r = client.get("/api/changelog")
+        assert r.status_code == 200
+        assert r.get_json()["items"] == changelog._fallback_changelog()["items"]
+        assert calls == []
+
+        # Verrou abandonné : repris après expiration
+        old = os.path.getmtime(lock) - changelog.CHANGELOG_LOCK_STALE_SECONDS - 1
+        os.utime(lock, (old, old))
+        client.get("/api/changelog")
+        assert calls == [30]
+        assert not lock.exists()
+
+    def test_generation_outside_process_lock(self, client, generated, monkeypatch):
+        changelog, calls, _ = generated
+
+        started, release, results = threading.Event(), threading.Event(), []
+
+        def slow_openai(commits):
+            started.set()
+            release.wait(5)
+            return {"items": [{"icon": "fa-solid fa-star", "title": "T", "desc": "D"}]}
+
+        monkeypatch.setattr(changelog, "_generate_with_openai", slow_openai)
+        worker = threading.Thread(target=lambda: results.append(changelog.build_changelog_cache()))
+        worker.start()
+        try:
+            assert started.wait(5)
+            # Appel OpenAI en cours : le verrou est libre, les autres requêtes
+            # reçoivent tout de suite le changelog de repli
+            assert not changelog._changelog_lock.locked()
+            r = client.get("/api/changelog")
+            assert r.get_json()["items"] == changelog._fallback_changelog()["items"]
+        finally:
+            release.set()
+            worker.join(5)
+        assert results[0]["key"] == "abc123def4567890"
+        assert client.get("/api/changelog").get_json()["items"][0]["title"] == "T"
+        assert calls == [30]
+
+    def test_curated_first(self, client, generated, monkeypatch):
+        changelog, calls, tmp_path = generated
+
+        curated = tmp_path / "changelog_user.json"
+        curated.write_text(json.dumps([{"icon": "fa-solid fa-a", "title": "Curated", "desc": ""}]),
+                           encoding="utf-8")
+        monkeypatch.setattr(changelog, "_curated_file", lambda: str(curated))
+        r = client.get("/api/changelog")
+        assert r.get_json()["items"][0]["title"] == "Curated"
+        assert client.get("/api/changelog", headers={"If-None-Match": r.headers["ETag"]}).status_code == 304
+        assert calls == []
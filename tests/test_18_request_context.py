@@ -0,0 +1,192 @@
+# tests/test_18_request_context.py
+"""
+Contexte de requête : utilisateur et entité active résolus une fois par
+requête (flask.g), propriété de l'entité mise en cache en session.
+"""
+import time
+
+import pytest
+from sqlalchemy import event
+from werkzeug.security import generate_password_hash
+
+pytestmark = pytest.mark.request_context
+
+
+@pytest.fixture(scope="module")
+def owner(app):
+    from Code.extensions import db
+    from Code.models.models import Entity, User
+
+    with app.app_context():
+        user = User(first_name="Ctx", last_name="Owner", email="ctx@devoptiq.com",
+                    password=generate_password_hash("CtxPass123!"), status="admin")
+        db.session.add(user)
+        db.session.flush()
+        first = Entity(name="Ctx A", owner_id=user.id)
+        second = Entity(name="Ctx B", owner_id=user.id)
+        db.session.add_all([first, second])
+        db.session.commit()
+        return {"user_id": user.id, "first": first.id, "second": second.id}
+
+
+@pytest.fixture
+def queries(app):
+    """Compte les requêtes SQL émises pendant le test."""
+    from Code.extensions import db
+
+    statements = []
+
+    def _count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", _count)
+    yield statements
+    event.remove(engine, "before_cursor_execute", _count)
+
+
+def _request(app, session_data, method="GET"):
+    ctx = app.test_request_context("/", method=method)
+    ctx.push()
+    from flask import session
+    session.update(session_data)
+    return ctx
+
+
+class TestRequestContext:
+
+    def test_resolved_once_per_request(self, app, owner, queries):
+        from Code.models.models import Activities, Entity, Role, User, request_memo
+
+        ctx = _request(app, {"user_id": owner["user_id"], "active_entity_id": owner["second"]})
+        try:
+            assert Entity.get_active_id() == owner["second"]
+            n = len(queries)
+            assert Entity.get_active_id() == owner["second"]
+            Activities.for_active_entity()
+            Role.for_active_entity()
+            assert len(queries) == n
+            assert Entity.get_active().id == owner["second"]
+            assert Entity.get_active() is Entity.get_active()
+            assert User.current() is User.current()
+            stats = request_memo()["stats"]
+            assert stats["lookups"] == 2          # propriété + utilisateur
+            assert stats["memo_hits"] >= 5
+        finally:
+            ctx.pop()
+
+    def test_session_cache_skips_lookup(self, app, owner, queries):
+        from flask import session
+        from Code.models.models import Entity, request_memo
+
+        ctx = _request(app, {"user_id": owner["user_id"], "active_entity_id": owner["second"]})
+        try:
+            Entity.get_active_id()
+            cached = dict(session)
+        finally:
+            ctx.pop()
+
+        del queries[:]
+        ctx = _request(app, cached)
+        try:
+            assert Entity.get_active_id() == owner["second"]
+            assert queries == []
+            assert request_memo()["stats"]["session_hits"] == 1
+        finally:
+            ctx.pop()
+
+    def test_expired_cache_is_rechecked(self, app, owner):
+        from Code.models import models
+
+        stale = [owner["second"], owner["user_id"], int(time.time()) - models.ACTIVE_ENTITY_TTL - 1]
+        ctx = _request(app, {"user_id": owner["user_id"], "active_entity_id": owner["second"],
+                             models._OWNER_CACHE_KEY: stale})
+        try:
+            assert models.Entity.get_active_id() == owner["second"]
+            assert models.request_memo()["stats"]["lookups"] == 1
+        finally:
+            ctx.pop()
+
+    def test_lost_ownership_rechecked_on_write(self, app, owner, queries):
+        from flask import session
+        from Code.extensions import db
+        from Code.models.models import Entity, User
+
+        with app.app_context():
+            other = User(first_name="Ctx", last_name="Repreneur", email="ctx-taker@devoptiq.com",
+                         password=generate_password_hash("CtxPass123!"), status="admin")
+            moved = Entity(name="Ctx cédée", owner_id=owner["user_id"])
+            db.session.add_all([other, moved])
+            db.session.commit()
+            other_id, moved_id = other.id, moved.id
+
+        ctx = _request(app, {"user_id": owner["user_id"], "active_entity_id": moved_id})
+        try:
+            assert Entity.get_active_id() == moved_id
+            cached = dict(session)
+        finally:
+            ctx.pop()
+
+        with app.app_context():
+            db.session.get(Entity, moved_id).owner_id = other_id
+            db.session.commit()
+
+        # Écriture : propriété revérifiée en une requête, malgré le cache de session
+        del queries[:]
+        ctx = _request(app, cached, method="POST")
+        try:
+            assert Entity.get_active_id() == owner["first"]
+            assert Entity.get_active().id == owner["first"]
+        finally:
+            ctx.pop()
+        assert queries
+
+    def test_foreign_entity_falls_back(self, app, owner, ids):
+        from flask import session
+        from Code.models.models import Entity
+
+        # Entité de démonstration sans propriétaire : refusée en mode strict
+        ctx = _request(app, {"user_id": owner["user_id"], "active_entity_id": ids["entity_id"]})
+        try:
+            assert Entity.get_active_id() == owner["first"]
+            assert session["active_entity_id"] == owner["first"]
+        finally:
+            ctx.pop()
+
+    def test_cartography_falls_back_to_newest(self, app, owner):
+        from flask import session
+        from Code.models.models import Entity
+        from Code.routes.cartography_editor import _get_active_entity
+
+        # Repli historique de l'éditeur (plus récente), les autres pages gardent la plus ancienne
+        ctx = _request(app, {"user_id": owner["user_id"]})
+        try:
+            assert _get_active_entity().id == owner["second"]
+            assert session["active_entity_id"] == owner["second"]
+        finally:
+            ctx.pop()
+        ctx = _request(app, {"user_id": owner["user_id"]})
+        try:
+            assert Entity.get_active_id() == owner["first"]
+            # Entité active désormais en session : elle prime sur le repli
+            assert Entity.get_active(newest_first=True).id == owner["first"]
+        finally:
+            ctx.pop()
+
+    def test_deleted_entity_forgotten(self, app, owner):
+        from Code.extensions import db
+        from Code.models.models import Entity
+
+        ctx = _request(app, {"user_id": owner["user_id"]})
+        try:
+            doomed = Entity(name="Ctx C", owner_id=owner["user_id"])
+            db.session.add(doomed)
+            db.session.commit()
+            assert Entity.set_active(doomed.id).id == doomed.id
+            assert Entity.get_active_id() == doomed.id
+            db.session.delete(doomed)
+            db.session.commit()
+            assert Entity.get_active_id() == owner["first"]
+        finally:
+            ctx.pop()
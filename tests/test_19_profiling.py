@@ -0,0 +1,113 @@
+# tests/test_19_profiling.py
+"""
+Profilage : nombre de requêtes, temps base/total, empreintes N+1 par
+endpoint, anneau borné, capture unique d'une requête armée.
+"""
+import json
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+pytestmark = pytest.mark.profiling
+
+
+@pytest.fixture
+def profiling(app):
+    from Code.routes import profiling as prof
+
+    prof.reset()
+    app.config["PROFILING"] = True
+    yield prof
+    app.config["PROFILING"] = False
+    prof.reset()
+
+
+@pytest.fixture(scope="module")
+def admin_client(app, ids):
+    """Client dédié (le client partagé peut avoir changé d'utilisateur)."""
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["user_id"] = ids["user_id"]
+    return client
+
+
+@pytest.fixture(scope="module")
+def plain_client(app):
+    """Utilisateur non administrateur."""
+    from Code.extensions import db
+    from Code.models.models import User
+
+    with app.app_context():
+        user = User(first_name="Prof", last_name="Lecteur", email="prof@devoptiq.com",
+                    password=generate_password_hash("ProfPass123!"), status="user")
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["user_id"] = user_id
+    return client
+
+
+class TestFingerprint:
+
+    def test_literals_and_in_lists_fold(self):
+        from Code.routes.profiling import fingerprint
+
+        a = fingerprint("SELECT * FROM tasks WHERE id IN (?, ?, ?) AND name = 'x'")
+        b = fingerprint("SELECT *  FROM tasks\n WHERE id IN (?) AND name = 'autre'")
+        assert a == b == "SELECT * FROM tasks WHERE id IN (?) AND name = ?"
+
+
+class TestProfiling:
+
+    def test_records_queries_per_endpoint(self, admin_client, ids, profiling):
+        admin_client.get(f"/tasks/{ids['task_id']}/roles")
+        admin_client.get(f"/tasks/{ids['task_id']}/roles")
+
+        r = admin_client.get("/admin/profiling/api/report?endpoint=tasks.get_roles_for_task")
+        assert r.status_code == 200
+        data = r.get_json()
+        assert data["enabled"] is True
+        (entry,) = data["endpoints"]
+        assert entry["requests"] == 2
+        assert entry["queries_mean"] >= 2
+        assert entry["total_ms"]["p95"] >= entry["total_ms"]["p50"] >= 0
+
+        # Les endpoints du profilage lui-même ne sont pas enregistrés
+        rows = admin_client.get("/admin/profiling/api/requests").get_json()["requests"]
+        assert {row["endpoint"] for row in rows} == {"tasks.get_roles_for_task"}
+        assert rows[0]["db_ms"] <= rows[0]["total_ms"]
+
+    def test_duplicates_reported(self, profiling):
+        records = [{"endpoint": "x.y", "total_ms": 10.0, "db_ms": 5.0, "queries": 12,
+                    "duplicates": [{"fingerprint": "SELECT ? FROM t WHERE id = ?", "count": 10}]}]
+        (entry,) = profiling.endpoint_report(records)
+        assert entry["n_plus_one"][0]["max_count"] == 10
+
+    def test_ring_buffer_is_bounded(self, client, profiling):
+        for _ in range(profiling._records.maxlen + 5):
+            profiling._records.append({"endpoint": "x"})
+        assert len(profiling._records) == profiling._records.maxlen
+
+    def test_disabled_records_nothing(self, admin_client, app, profiling):
+        app.config["PROFILING"] = False
+        admin_client.get("/healthz")
+        assert len(profiling._records) == 0
+
+    def test_armed_request_is_captured_once(self, admin_client, profiling):
+        r = admin_client.post("/admin/profiling/api/arm", data=json.dumps({"endpoint": "healthz"}),
+                             content_type="application/json")
+        assert r.status_code == 200
+        admin_client.get("/healthz")
+        admin_client.get("/healthz")
+        captures = admin_client.get("/admin/profiling/api/captures").get_json()["captures"]
+        assert len(captures) == 1
+        assert captures[0]["endpoint"] == "healthz" and captures[0]["report"]
+
+        r = admin_client.post("/admin/profiling/api/arm", data=json.dumps({"endpoint": "nope"}),
+                             content_type="application/json")
+        assert r.status_code == 400
+
+    def test_admin_only(self, plain_client, profiling):
+        assert plain_client.get("/admin/profiling/api/report").status_code == 403
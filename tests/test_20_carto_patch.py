@@ -0,0 +1,204 @@
+# tests/test_20_carto_patch.py
+"""
+Éditeur de cartographie : sauvegarde par patch (ops par id, révision,
+concurrence optimiste) équivalente à une sauvegarde complète.
+"""
+import copy
+import json
+
+import pytest
+from sqlalchemy import event
+from werkzeug.security import generate_password_hash
+
+pytestmark = pytest.mark.carto_patch
+
+
+def _shape(sid, label, band=0, kind="process"):
+    return {"id": sid, "type": kind, "label": label, "x": 100 * sid, "y": -200 + 180 * band + 40, "w": 120, "h": 60}
+
+
+def _diagram(n=4):
+    return {
+        "shapes": [_shape(i, f"Act {i}", band=i % 2) for i in range(1, n + 1)] + [_shape(900, "Note", kind="text")],
+        "bands": [{"id": 500, "label": "Chef", "height": 180}, {"id": 501, "label": "Opérateur", "height": 180}],
+        "connections": [{"id": 700 + i, "fromId": i, "toId": i + 1, "label": ""} for i in range(1, n)],
+        "groups": [],
+        "nextId": 1000,
+    }
+
+
+def _make_client(app, email):
+    from Code.extensions import db
+    from Code.models.models import Entity, User
+
+    with app.app_context():
+        user = User(first_name="Carto", last_name="Patch", email=email,
+                    password=generate_password_hash("CartoPass123!"), status="admin")
+        db.session.add(user)
+        db.session.flush()
+        entity = Entity(name=f"Carto {email}", owner_id=user.id)
+        db.session.add(entity)
+        db.session.commit()
+        user_id, entity_id = user.id, entity.id
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["user_id"] = user_id
+        sess["user_email"] = email
+        sess["active_entity_id"] = entity_id
+    return client, entity_id
+
+
+def _db_state(app, entity_id):
+    from Code.extensions import db
+    from Code.models.models import Activities, Link, Role, activity_roles
+
+    with app.app_context():
+        acts = {a.id: a for a in Activities.query.filter_by(entity_id=entity_id)}
+        roles = {r.id: r.name for r in Role.query.filter_by(entity_id=entity_id)}
+        assigned = {
+            (acts[aid].shape_id, roles.get(rid))
+            for aid, rid in db.session.query(activity_roles.c.activity_id, activity_roles.c.role_id)
+            .filter(activity_roles.c.activity_id.in_(list(acts)))
+        }
+        links = sorted(
+            (acts[l.source_activity_id].shape_id, acts[l.target_activity_id].shape_id, l.description)
+            for l in Link.query.filter_by(entity_id=entity_id)
+            if l.source_activity_id in acts and l.target_activity_id in acts
+        )
+        return {
+            "activities": sorted((a.shape_id, a.name, bool(a.is_result)) for a in acts.values()),
+            "roles": sorted(roles.values()),
+            "assigned": sorted(assigned, key=str),
+            "links": links,
+        }
+
+
+def _save(client, diagram):
+    r = client.post("/cartography/api/save", data=json.dumps({"diagram": diagram}),
+                    content_type="application/json")
+    assert r.status_code == 200
+    return r.get_json()["rev"]
+
+
+def _patch(client, base_rev, ops):
+    return client.post("/cartography/api/patch", data=json.dumps({"base_rev": base_rev, "ops": ops}),
+                       content_type="application/json")
+
+
+OPS = [
+    {"op": "replace", "path": "/shapes/2/label", "value": "Act deux"},
+    {"op": "add", "path": "/shapes/5", "value": _shape(5, "Act 5", band=1, kind="special")},
+    {"op": "add", "path": "/connections/710", "value": {"id": 710, "fromId": 4, "toId": 5, "label": "flux"}},
+    {"op": "remove", "path": "/shapes/1"},
+    {"op": "remove", "path": "/connections/701"},
+    {"op": "replace", "path": "/shapes/3", "value": _shape(3, "Act 3", band=1)},
+    {"op": "replace", "path": "/bands/500/label", "value": "Responsable"},
+    {"op": "replace", "path": "/nextId", "value": 1010},
+]
+
+
+class TestCartoPatch:
+
+    def test_patch_matches_full_save(self, app):
+        patched, pid = _make_client(app, "carto-a@devoptiq.com")
+        full, fid = _make_client(app, "carto-b@devoptiq.com")
+
+        rev = _save(patched, _diagram())
+        r = _patch(patched, rev, OPS)
+        assert r.status_code == 200, r.get_json()
+        assert r.get_json()["rev"] == rev + 1
+
+        expected = _diagram()
+        from Code.routes.cartography_editor import apply_carto_ops
+        apply_carto_ops(expected, copy.deepcopy(OPS))
+        _save(full, _diagram())
+        _save(full, expected)
+
+        assert _db_state(app, pid) == _db_state(app, fid)
+        loaded = patched.get("/cartography/api/load/x")
+        assert loaded.get_json() == expected
+        assert loaded.headers["X-Carto-Rev"] == str(rev + 1)
+
+    def test_band_move_reassigns_roles(self, app):
+        patched, pid = _make_client(app, "carto-c@devoptiq.com")
+        full, fid = _make_client(app, "carto-d@devoptiq.com")
+        ops = [{"op": "move", "path": "/bands/501", "index": 0}]
+
+        rev = _save(patched, _diagram())
+        assert _patch(patched, rev, ops).status_code == 200
+        expected = _diagram()
+        expected["bands"].reverse()
+        _save(full, expected)
+        assert _db_state(app, pid)["assigned"] == _db_state(app, fid)["assigned"]
+
+    def test_stale_revision_conflicts(self, app):
+        client, _ = _make_client(app, "carto-e@devoptiq.com")
+        rev = _save(client, _diagram())
+        assert _patch(client, rev, [{"op": "replace", "path": "/shapes/2/label", "value": "A"}]).status_code == 200
+        r = _patch(client, rev, [{"op": "replace", "path": "/shapes/2/label", "value": "B"}])
+        assert r.status_code == 409
+        assert r.get_json()["rev"] == rev + 1
+
+    def test_invalid_ops(self, app):
+        client, _ = _make_client(app, "carto-f@devoptiq.com")
+        rev = _save(client, _diagram())
+        assert _patch(client, rev, [{"op": "replace", "path": "/shapes/999", "value": {}}]).status_code == 400
+        assert _patch(client, rev, [{"op": "add", "path": "/shapes/8", "value": {"id": 9}}]).status_code == 400
+        assert _patch(client, rev, [{"op": "replace", "path": "/shapes/2/id", "value": 3}]).status_code == 400
+        assert client.post("/cartography/api/patch", json={"ops": []}).status_code == 400
+
+    def test_non_object_items_are_400(self, app):
+        from Code.extensions import db
+        from Code.models.models import Entity
+
+        client, entity_id = _make_client(app, "carto-g@devoptiq.com")
+        rev = _save(client, _diagram())
+        assert _patch(client, rev, [{"op": "replace", "path": "/shapes", "value": [1]}]).status_code == 400
+        with app.app_context():
+            db.session.execute(db.update(Entity).where(Entity.id == entity_id)
+                               .values(optiqcarto_data=json.dumps({"shapes": ["corrompu"]})))
+            db.session.commit()
+        r = _patch(client, rev, [{"op": "replace", "path": "/shapes/2/label", "value": "A"}])
+        assert r.status_code == 400
+
+    def test_full_save_bumps_revision_in_sql(self, app):
+        from Code.extensions import db
+        from Code.models.models import Entity
+        from Code.routes.cartography_editor import _save_full
+
+        client, entity_id = _make_client(app, "carto-h@devoptiq.com")
+        rev = _save(client, _diagram())
+        with app.test_request_context():
+            entity = db.session.get(Entity, entity_id)
+            assert entity.optiqcarto_rev == rev
+            # Sauvegarde concurrente : l'objet en mémoire porte une révision périmée
+            db.session.execute(db.update(Entity).where(Entity.id == entity_id)
+                               .values(optiqcarto_rev=Entity.optiqcarto_rev + 1)
+                               .execution_options(synchronize_session=False))
+            assert _save_full(entity, _diagram(3))["rev"] == rev + 2
+            assert entity.optiqcarto_rev == rev + 2
+
+    def test_single_shape_edit_is_constant_size(self, app):
+        from Code.extensions import db
+
+        counts = []
+        for n in (10, 200):
+            client, _ = _make_client(app, f"carto-size-{n}@devoptiq.com")
+            rev = _save(client, _diagram(n))
+            statements = []
+
+            def _count(conn, cursor, statement, *args):
+                if statement.lstrip().upper().startswith(("INSERT", "UPDATE", "DELETE")):
+                    statements.append(statement)
+
+            with app.app_context():
+                engine = db.engine
+            event.listen(engine, "before_cursor_execute", _count)
+            try:
+                # Libellé distinct par taille : le delta historisé n'est pas dédoublonné
+                r = _patch(client, rev, [{"op": "replace", "path": "/shapes/2/label", "value": f"Renommée {n}"}])
+            finally:
+                event.remove(engine, "before_cursor_execute", _count)
+            assert r.status_code == 200
+            counts.append(len(statements))
+        assert counts[0] == counts[1]
@@ -0,0 +1,204 @@
+# tests/test_21_carto_history.py
+"""
+Historique de la cartographie : instantanés + deltas, lecture à une
+révision donnée, restauration, compaction et import des anciens fichiers.
+"""
+import copy
+import os
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+pytestmark = pytest.mark.carto_history
+
+
+def _shape(sid, label, band=0):
+    return {"id": sid, "type": "process", "label": label, "x": 100 * sid, "y": -160 + 180 * band, "w": 120, "h": 60}
+
+
+def _diagram(n=3):
+    return {
+        "shapes": [_shape(i, f"Act {i}", band=i % 2) for i in range(1, n + 1)],
+        "bands": [{"id": 500, "label": "Chef", "height": 180}, {"id": 501, "label": "Opérateur", "height": 180}],
+        "connections": [{"id": 700 + i, "fromId": i, "toId": i + 1, "label": ""} for i in range(1, n)],
+        "groups": [],
+        "nextId": 1000,
+    }
+
+
+def _make_client(app, email):
+    from Code.extensions import db
+    from Code.models.models import Entity, User
+
+    with app.app_context():
+        user = User(first_name="Carto", last_name="Histo", email=email,
+                    password=generate_password_hash("CartoPass123!"), status="user")
+        db.session.add(user)
+        db.session.flush()
+        entity = Entity(name=f"Histo {email}", owner_id=user.id)
+        db.session.add(entity)
+        db.session.commit()
+        user_id, entity_id = user.id, entity.id
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["user_id"] = user_id
+        sess["user_email"] = email
+        sess["active_entity_id"] = entity_id
+    return client, entity_id
+
+
+class TestCartoOps:
+
+    def test_diff_round_trip(self):
+        from Code.carto_history import apply_carto_ops, diff_carto_ops
+
+        old = _diagram(4)
+        new = copy.deepcopy(old)
+        new["shapes"][1]["label"] = "Renommée"
+        del new["shapes"][2]
+        new["shapes"].insert(0, _shape(42, "Nouvelle"))
+        new["connections"] = list(reversed(new["connections"]))
+        new["nextId"] = 1001
+        ops = diff_carto_ops(old, new)
+        assert {"op": "replace", "path": "/connections", "value": new["connections"]} in ops
+
+        rebuilt = copy.deepcopy(old)
+        apply_carto_ops(rebuilt, ops)
+        assert rebuilt == new
+        assert diff_carto_ops(new, new) == []
+
+
+class TestCartoHistoryStore:
+
+    def test_keyframes_and_time_travel(self, app):
+        from Code.carto_history import diagram_at, record_revision, revision_list
+        from Code.extensions import db
+        from Code.models.models import Entity
+
+        with app.app_context():
+            entity = Entity(name="Histo store")
+            db.session.add(entity)
+            db.session.commit()
+            versions = [_diagram(3)]
+            for rev in range(1, 8):
+                new = copy.deepcopy(versions[-1])
+                new["shapes"].append(_shape(10 + rev, f"Ajout {rev}"))
+                record_revision(entity.id, rev, versions[-1], new, keyframe=3)
+                versions.append(new)
+            db.session.commit()
+
+            kinds = {r["rev"]: r["kind"] for r in revision_list(entity.id)}
+            assert kinds[0] == "full" and kinds[3] == "full" and kinds[6] == "full"
+            assert kinds[1] == kinds[2] == kinds[4] == "delta"
+            for rev, expected in enumerate(versions):
+                assert diagram_at(entity.id, rev) == expected
+            assert diagram_at(entity.id, 99) is None
+
+    def test_identical_content_is_deduplicated(self, app):
+        from Code.carto_history import store_blob
+        from Code.extensions import db
+        from Code.models.models import CartoBlob
+
+        with app.app_context():
+            raw = ("x" * 5000).encode()
+            first, second = store_blob(raw), store_blob(raw)
+            db.session.commit()
+            assert first == second
+            blob = db.session.get(CartoBlob, first)
+            assert blob.encoding == "zlib" and len(blob.data) < blob.size
+
+    def test_compaction_rewrites_chain(self, app):
+        from Code.carto_history import compact_carto_history, diagram_at, record_revision, revision_list
+        from Code.extensions import db
+        from Code.models.models import Entity
+
+        with app.app_context():
+            entity = Entity(name="Histo compaction")
+            db.session.add(entity)
+            db.session.commit()
+            versions = [_diagram(3)]
+            for rev in range(1, 6):
+                new = copy.deepcopy(versions[-1])
+                new["shapes"][0]["label"] = f"v{rev}"
+                # Que des instantanés complets (keyframe=1) : la compaction doit les réduire
+                record_revision(entity.id, rev, versions[-1], new, keyframe=1)
+                versions.append(new)
+            db.session.commit()
+
+            metrics = compact_carto_history(entity.id, keyframe=10)
+            assert metrics["revisions_rewritten"] == 5
+            assert metrics["blobs_deleted"] >= 5
+            kinds = [r["kind"] for r in sorted(revision_list(entity.id), key=lambda r: r["rev"])]
+            assert kinds == ["full"] + ["delta"] * 5
+            for rev, expected in enumerate(versions):
+                assert diagram_at(entity.id, rev) == expected
+
+            assert compact_carto_history(entity.id, keyframe=10)["revisions_rewritten"] == 0
+            assert compact_carto_history(keyframe=10, dry_run=True)["entities"] >= 1
+
+    def test_import_legacy_files(self, app, tmp_path):
+        from Code.carto_history import import_legacy_files
+
+        (tmp_path / "20250101_120000_carte.svg").write_bytes(b"<svg>a</svg>")
+        (tmp_path / "20250102_120000_carte.svg").write_bytes(b"<svg>a</svg>")
+        (tmp_path / "active_carto.txt").write_text("carte.svg")
+        with app.app_context():
+            out = import_legacy_files(str(tmp_path))
+            assert out["files"] == 2 and out["imported"] == 2 and out["deduplicated"] == 1
+
+            again = import_legacy_files(str(tmp_path), remove=True)
+            assert again["imported"] == 0 and again["removed"] == 2
+        assert sorted(os.listdir(tmp_path)) == ["active_carto.txt"]
+
+
+class TestCartoHistoryApi:
+
+    def test_save_patch_history_and_restore(self, app):
+        client, _ = _make_client(app, "carto.history@test.local")
+        v1 = _diagram(3)
+        r = client.post("/cartography/api/save", json={"diagram": v1})
+        assert r.status_code == 200
+        rev1 = r.get_json()["rev"]
+
+        v2 = copy.deepcopy(v1)
+        v2["shapes"][0]["label"] = "Patchée"
+        r = client.post("/cartography/api/patch", json={
+            "base_rev": rev1,
+            "ops": [{"op": "replace", "path": "/shapes/1/label", "value": "Patchée"}],
+        })
+        assert r.status_code == 200
+        rev2 = r.get_json()["rev"]
+
+        history = client.get("/cartography/api/history").get_json()
+        assert history["rev"] == rev2
+        assert [h["rev"] for h in history["revisions"]][:2] == [rev2, rev1]
+        assert history["revisions"][0]["kind"] == "delta"
+
+        r = client.get(f"/cartography/api/history/{rev1}")
+        assert r.status_code == 200 and r.get_json() == v1
+        assert client.get(f"/cartography/api/history/{rev2}").get_json() == v2
+        assert client.get("/cartography/api/history/999").status_code == 404
+
+        r = client.post(f"/cartography/api/history/{rev1}/restore")
+        assert r.status_code == 200
+        body = r.get_json()
+        assert body["restored_from"] == rev1 and body["rev"] == rev2 + 1
+        assert client.get("/cartography/api/load/x").get_json() == v1
+
+    def test_revision_collision_is_409(self, app):
+        from Code.carto_history import record_revision
+        from Code.extensions import db
+
+        client, entity_id = _make_client(app, "carto.collision@test.local")
+        rev = client.post("/cartography/api/save", json={"diagram": _diagram(3)}).get_json()["rev"]
+        with app.app_context():
+            # Numéro suivant déjà pris (sauvegarde concurrente) : uq_carto_revision
+            record_revision(entity_id, rev + 1, _diagram(3), _diagram(2))
+            db.session.commit()
+        r = client.post("/cartography/api/save", json={"diagram": _diagram(4)})
+        assert r.status_code == 409
+        assert r.get_json()["rev"] == rev
+        assert client.post(f"/cartography/api/history/{rev}/restore").status_code == 409
+        r = client.post("/cartography/api/patch", json={
+            "base_rev": rev, "ops": [{"op": "replace", "path": "/shapes/1/label", "value": "A"}]})
+        assert r.status_code == 409
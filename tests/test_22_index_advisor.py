@@ -0,0 +1,194 @@
+# tests/test_22_index_advisor.py
+"""
+Index des clés étrangères et index advisor : EXPLAIN des requêtes capturées,
+signalement des parcours séquentiels sur les grandes tables.
+"""
+import json
+
+import pytest
+from sqlalchemy import inspect, text
+from werkzeug.security import generate_password_hash
+
+pytestmark = pytest.mark.index_advisor
+
+EXPECTED = {
+    "tasks": ["activity_id"],
+    "links": ["source_activity_id", "target_activity_id", "source_data_id", "target_data_id"],
+    "competencies": ["activity_id"],
+    "softskills": ["activity_id"],
+    "savoirs": ["activity_id"],
+    "savoir_faires": ["activity_id"],
+    "aptitudes": ["activity_id"],
+    "constraints": ["activity_id"],
+    "competency_evaluation": ["user_id"],
+    "users": ["manager_id"],
+    "time_analysis": ["activity_id"],
+    "recent_events": ["created_at"],
+    "data": ["entity_id"],
+    "tools": ["entity_id"],
+}
+
+
+@pytest.fixture(scope="module")
+def wide_table(app):
+    """Table de 1500 lignes sans index sur `code`."""
+    from Code.extensions import db
+
+    with app.app_context():
+        db.session.execute(text("CREATE TABLE advisor_probe (id INTEGER PRIMARY KEY, code INTEGER, label TEXT)"))
+        db.session.execute(
+            text("INSERT INTO advisor_probe (code, label) VALUES (:c, :l)"),
+            [{"c": i % 50, "l": f"x{i}"} for i in range(1500)],
+        )
+        db.session.commit()
+    yield "advisor_probe"
+    with app.app_context():
+        db.session.execute(text("DROP TABLE advisor_probe"))
+        db.session.commit()
+
+
+class TestForeignKeyIndexes:
+
+    def test_hot_columns_lead_an_index(self, app):
+        from Code.extensions import db
+        from Code.index_advisor import _indexed_leading_columns
+
+        with app.app_context():
+            inspector = inspect(db.engine)
+            for table, columns in EXPECTED.items():
+                leading = _indexed_leading_columns(inspector, table)
+                for column in columns:
+                    assert column in leading, f"{table}.{column} sans index"
+
+    def test_migration_matches_models(self, app):
+        """Les index de la migration sont ceux que create_all produit."""
+        import importlib.util
+        import os
+
+        from Code.extensions import db
+
+        path = os.path.join(os.path.dirname(__file__), "..", "migrations", "versions",
+                            "b8c9d0e1f2a3_fk_lookup_indexes.py")
+        spec = importlib.util.spec_from_file_location("fk_lookup_indexes", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        with app.app_context():
+            inspector = inspect(db.engine)
+            for table, indexes in module.INDEXES.items():
+                existing = {ix["name"]: ix["column_names"] for ix in inspector.get_indexes(table)}
+                for name, columns in indexes.items():
+                    if all(isinstance(c, str) for c in columns):
+                        assert existing.get(name) == columns, name
+                        continue
+                    # Index sur expression (non reflété par SQLite) : DDL relu
+                    sql = db.session.execute(text("SELECT sql FROM sqlite_master WHERE name = :n"),
+                                             {"n": name}).scalar()
+                    assert sql and "lower(name)" in sql.lower(), name
+
+    def test_name_lookup_uses_expression_index(self, app):
+        from Code.extensions import db
+        from Code.models.models import Data
+
+        with app.app_context():
+            query = db.select(Data.id).where(Data.entity_id == 1, db.func.lower(Data.name) == "donnée")
+            sql = str(query.compile(db.engine, compile_kwargs={"literal_binds": True}))
+            plan = " ".join(str(row[-1]) for row in db.session.execute(text(f"EXPLAIN QUERY PLAN {sql}")))
+        assert "ix_data_entity_name" in plan
+
+
+class TestIndexAdvisor:
+
+    def test_flags_scan_on_large_table(self, app, wide_table):
+        from Code.index_advisor import advise
+
+        with app.app_context():
+            report = advise([{
+                "statement": f"SELECT {wide_table}.id FROM {wide_table} WHERE {wide_table}.code = ?",
+                "parameters": [7], "endpoint": "probe", "count": 3,
+            }])
+        assert report["dialect"] == "sqlite" and report["analyzed"] == 1
+        [finding] = report["findings"]
+        assert finding["table"] == wide_table and finding["rows"] == 1500
+        assert finding["suggested_indexes"] == [f"CREATE INDEX ix_{wide_table}_code ON {wide_table} (code)"]
+
+    def test_small_tables_and_index_searches_are_ignored(self, app, wide_table):
+        from Code.index_advisor import advise
+
+        with app.app_context():
+            report = advise([
+                {"statement": f"SELECT * FROM {wide_table} WHERE {wide_table}.id = ?", "parameters": [1]},
+                {"statement": "SELECT tasks.id FROM tasks WHERE tasks.activity_id = ?", "parameters": [1]},
+                {"statement": "SELECT * FROM tasks", "parameters": []},
+                {"statement": "SELECT * FROM table_inexistante", "parameters": []},
+                {"statement": "DELETE FROM tasks", "parameters": []},
+            ], min_rows=1000)
+        assert report["analyzed"] == 3 and report["errors"] == 1
+        assert report["findings"] == []
+
+    def test_cli_reads_exported_samples(self, app, wide_table, tmp_path):
+        path = tmp_path / "samples.json"
+        path.write_text(json.dumps({"samples": [{
+            "statement": f"SELECT label FROM {wide_table} WHERE {wide_table}.code IN (?, ?)",
+            "parameters": [1, 2],
+        }]}))
+        result = app.test_cli_runner().invoke(args=["index-advisor", str(path), "--json"])
+        assert result.exit_code == 0, result.output
+        report = json.loads(result.output[result.output.index("{"):])
+        assert report["findings"][0]["table"] == wide_table
+
+    def test_redacted_parameters_still_replay(self, app, wide_table):
+        from Code.index_advisor import advise, jsonable_sample
+
+        sample = jsonable_sample({"statement": f"SELECT id FROM {wide_table} WHERE {wide_table}.code = ?",
+                                  "parameters": ["secret@devoptiq.com"], "endpoint": "probe", "count": 1})
+        assert sample["parameters"] == [None]
+        assert jsonable_sample({"statement": "SELECT 1", "parameters": {"email": "x"}})["parameters"] == {"email": None}
+        with app.app_context():
+            report = advise([sample])
+        assert report["errors"] == 0 and report["findings"][0]["table"] == wide_table
+
+
+@pytest.fixture(scope="module")
+def advisor_owner(app):
+    """Utilisateur propriétaire d'une entité (analyse du graphe autorisée)."""
+    from Code.extensions import db
+    from Code.models.models import Activities, Entity, User
+
+    with app.app_context():
+        user = User(first_name="Index", last_name="Advisor", email="index-advisor@devoptiq.com",
+                    password=generate_password_hash("AdvisorPass123!"), status="admin")
+        db.session.add(user)
+        db.session.flush()
+        entity = Entity(name="Entité Advisor", owner_id=user.id)
+        db.session.add(entity)
+        db.session.flush()
+        db.session.add(Activities(entity_id=entity.id, name="Activité Advisor"))
+        db.session.commit()
+        return {"user_id": user.id, "entity_id": entity.id}
+
+
+class TestProfilingSamples:
+
+    def test_samples_are_captured_and_advised(self, app, advisor_owner):
+        from Code.routes import profiling as prof
+
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess["user_id"] = advisor_owner["user_id"]
+        prof.reset()
+        app.config["PROFILING"] = True
+        try:
+            url = f"/process-graph/api/analysis?entity_id={advisor_owner['entity_id']}"
+            assert client.get(url).status_code == 200
+            samples = client.get("/admin/profiling/api/samples").get_json()["samples"]
+            assert samples and all(s["statement"].lstrip().upper().startswith("SELECT") for s in samples)
+            assert any(s["endpoint"] == "process_graph.api_analysis" for s in samples)
+            # Valeurs liées jamais exportées, seule la forme est conservée
+            assert any(s["parameters"] for s in samples)
+            assert all(v is None for s in samples for v in s["parameters"])
+
+            advice = client.get("/admin/profiling/api/index-advice?min_rows=0").get_json()
+            assert advice["analyzed"] == len(samples) and advice["errors"] == 0
+        finally:
+            app.config["PROFILING"] = False
+            prof.reset()
@@ -0,0 +1,112 @@
+# tests/test_23_sqlite_profile.py
+"""
+Profil SQLite : pragmas appliqués à la connexion et file d'écriture unique
+(lots BEGIN IMMEDIATE, un SAVEPOINT par écriture).
+"""
+import threading
+
+import pytest
+from sqlalchemy import create_engine, text
+
+pytestmark = pytest.mark.sqlite_profile
+
+
+@pytest.fixture
+def db_file(app, tmp_path):
+    """Base fichier dédiée (app chargée : écouteur de pragmas installé)."""
+    url = f"sqlite:///{tmp_path / 'profile.db'}"
+    engine = create_engine(url)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE counters (id INTEGER PRIMARY KEY, value INTEGER NOT NULL)"))
+    yield url, engine
+    engine.dispose()
+
+
+def _insert(conn, value):
+    return conn.execute(text("INSERT INTO counters (value) VALUES (:v)"), {"v": value}).lastrowid
+
+
+class TestPragmas:
+
+    def test_applied_on_connect(self, db_file, monkeypatch):
+        monkeypatch.setenv("SQLITE_CACHE_KB", "2048")
+        url, _ = db_file
+        engine = create_engine(url)
+        with engine.connect() as conn:
+            pragma = lambda name: conn.exec_driver_sql(f"PRAGMA {name}").scalar()
+            assert pragma("journal_mode") == "wal"
+            assert pragma("synchronous") == 1          # NORMAL
+            assert pragma("cache_size") == -2048
+            assert pragma("temp_store") == 2           # MEMORY
+            assert pragma("busy_timeout") == 30000
+        engine.dispose()
+
+    def test_invalid_synchronous_falls_back(self, monkeypatch):
+        from Code.sqlite_writer import sqlite_pragmas
+
+        monkeypatch.setenv("SQLITE_SYNCHRONOUS", "whatever; DROP TABLE x")
+        assert "PRAGMA synchronous=NORMAL" in sqlite_pragmas()
+
+
+class TestWriteSerializer:
+
+    def test_concurrent_writes_are_batched(self, db_file):
+        from Code.sqlite_writer import WriteSerializer
+
+        url, engine = db_file
+        serializer = WriteSerializer(url, batch_wait_ms=20)
+        barrier = threading.Barrier(16)
+        futures = []
+
+        def writer(i):
+            barrier.wait()
+            futures.append(serializer.submit(_insert, i))
+
+        threads = [threading.Thread(target=writer, args=(i,)) for i in range(16)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        ids = [f.result(timeout=10) for f in futures]
+
+        assert len(set(ids)) == 16
+        assert serializer.stats["jobs"] == 16
+        assert serializer.stats["batches"] < 16
+        with engine.connect() as conn:
+            assert conn.execute(text("SELECT COUNT(*) FROM counters")).scalar() == 16
+        serializer.close()
+
+    def test_failing_write_only_rolls_back_itself(self, db_file):
+        from Code.sqlite_writer import WriteSerializer
+
+        url, engine = db_file
+        serializer = WriteSerializer(url, batch_wait_ms=50)
+
+        def _boom(conn):
+            _insert(conn, -1)
+            raise ValueError("refusé")
+
+        ok_before = serializer.submit(_insert, 1)
+        failing = serializer.submit(_boom)
+        ok_after = serializer.submit(_insert, 2)
+
+        assert ok_before.result(timeout=10) and ok_after.result(timeout=10)
+        with pytest.raises(ValueError):
+            failing.result(timeout=10)
+        with engine.connect() as conn:
+            values = [v for (v,) in conn.execute(text("SELECT value FROM counters ORDER BY id"))]
+        assert values == [1, 2]
+        assert serializer.stats["errors"] == 1
+        serializer.close()
+
+    def test_run_write_without_serializer_is_inline(self, app):
+        from Code.extensions import db
+        from Code.sqlite_writer import run_write
+
+        saved = app.extensions.get("write_serializer")
+        app.extensions["write_serializer"] = None
+        try:
+            with app.app_context():
+                assert run_write(lambda conn, x: conn.execute(text("SELECT :x"), {"x": x}).scalar(), 7) == 7
+        finally:
+            app.extensions["write_serializer"] = saved
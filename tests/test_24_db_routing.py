@@ -0,0 +1,156 @@
+# tests/test_24_db_routing.py
+"""
+Routage lecture/écriture : lectures des blueprints de consultation sur la
+réplique, primaire après une écriture, en cas de retard ou de panne ;
+métriques des pools de connexions.
+"""
+import pytest
+from sqlalchemy import create_engine, event
+from werkzeug.security import generate_password_hash
+
+pytestmark = pytest.mark.db_routing
+
+
+@pytest.fixture
+def replica(app):
+    """Réplique simulée : second moteur sur la même base, requêtes comptées."""
+    from Code import db_routing
+    from Code.extensions import db
+
+    with app.app_context():
+        engine = create_engine(db.engine.url.render_as_string(hide_password=False))
+    statements = []
+
+    def _record(conn, cursor, statement, *args):
+        if statement != "SELECT 1":       # sonde de retard
+            statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", _record)
+    routing = app.extensions["db_routing"]
+    saved = dict(routing)
+    routing.update(replica=engine, sticky=60.0, max_lag=5.0)
+    db_routing.reset_routing()
+    yield engine, statements
+    routing.clear()
+    routing.update(saved)
+    db_routing.reset_routing()
+    engine.dispose()
+
+
+@pytest.fixture(scope="module")
+def user_client(app):
+    from Code.extensions import db
+    from Code.models.models import Entity, User
+
+    with app.app_context():
+        user = User(first_name="Route", last_name="Lecture", email="routing@devoptiq.com",
+                    password=generate_password_hash("RoutePass123!"), status="admin")
+        db.session.add(user)
+        db.session.flush()
+        entity = Entity(name="Routage", owner_id=user.id)
+        db.session.add(entity)
+        db.session.commit()
+        ids = {"user_id": user.id, "entity_id": entity.id}
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["user_id"] = ids["user_id"]
+        sess["user_email"] = "routing@devoptiq.com"
+        sess["active_entity_id"] = ids["entity_id"]
+    return client, ids
+
+
+def _analysis(client, entity_id):
+    r = client.get(f"/process-graph/api/analysis?entity_id={entity_id}")
+    assert r.status_code == 200
+    return r
+
+
+class TestReadRouting:
+
+    def test_without_replica_everything_is_primary(self, app, user_client):
+        from Code.db_routing import ROUTING_STATS, reset_routing
+
+        reset_routing()
+        client, ids = user_client
+        _analysis(client, ids["entity_id"])
+        assert ROUTING_STATS["replica"] == 0
+
+    def test_read_blueprint_goes_to_replica(self, replica, user_client):
+        from Code.db_routing import ROUTING_STATS
+
+        engine, statements = replica
+        client, ids = user_client
+        _analysis(client, ids["entity_id"])
+        assert ROUTING_STATS["replica"] == 1
+        assert any("FROM activities" in s for s in statements)
+
+    def test_other_blueprints_and_writes_stay_on_primary(self, replica, user_client):
+        from Code.db_routing import ROUTING_STATS
+
+        engine, statements = replica
+        client, _ = user_client
+        assert client.get("/cartography/api/list").status_code == 200
+        assert statements == [] and ROUTING_STATS["replica"] == 0
+
+    def test_sticky_after_write(self, app, replica, user_client):
+        from Code.db_routing import ROUTING_STATS, WRITE_AT_KEY
+
+        engine, statements = replica
+        client, ids = user_client
+        r = client.post("/cartography/api/save", json={"diagram": {"shapes": [], "bands": [], "connections": []}})
+        assert r.status_code == 200
+        with client.session_transaction() as sess:
+            assert sess.get(WRITE_AT_KEY)
+
+        _analysis(client, ids["entity_id"])
+        assert ROUTING_STATS["sticky"] == 1 and statements == []
+
+        app.extensions["db_routing"]["sticky"] = 0.0
+        _analysis(client, ids["entity_id"])
+        assert ROUTING_STATS["replica"] == 1 and statements
+
+    def test_lagging_replica_is_skipped(self, app, replica, user_client, monkeypatch):
+        from Code import db_routing
+
+        engine, statements = replica
+        client, ids = user_client
+        monkeypatch.setattr(db_routing, "_measure_lag", lambda engine: 42.0)
+        _analysis(client, ids["entity_id"])
+        assert db_routing.ROUTING_STATS["lagging"] == 1 and statements == []
+
+    def test_unreachable_replica_falls_back(self, app, replica, user_client):
+        from Code import db_routing
+
+        client, ids = user_client
+        app.extensions["db_routing"]["replica"] = create_engine("sqlite:////nonexistent/dir/replica.db")
+        _analysis(client, ids["entity_id"])
+        _analysis(client, ids["entity_id"])
+        assert db_routing.ROUTING_STATS["unhealthy"] == 2
+        assert db_routing._replica_state["healthy"] is False
+
+    def test_dml_in_read_request_goes_to_primary(self, app, replica):
+        from Code.extensions import db
+        from Code.models.models import Task
+
+        engine, _ = replica
+        with app.test_request_context("/process-graph/api/analysis"):
+            app.preprocess_request()
+            session = db.session()
+            assert session.get_bind(clause=db.update(Task).values(order=1)) is db.engine
+            assert session.get_bind(clause=db.select(Task.id)) is db.engine   # écriture déjà faite
+            session.info.pop("wrote", None)
+
+
+class TestPoolMetrics:
+
+    def test_pools_endpoint(self, app, user_client):
+        client, ids = user_client
+        _analysis(client, ids["entity_id"])
+        r = client.get("/admin/profiling/api/pools")
+        assert r.status_code == 200
+        data = r.get_json()
+        primary = data["pools"]["primary"]
+        assert primary["pool"] == "TimedQueuePool"
+        assert primary["checkouts"] > 0
+        assert {"checked_out", "overflow", "wait_ms_mean", "wait_ms_max"} <= set(primary)
+        assert data["routing"]["replica_configured"] is False
@@ -0,0 +1,154 @@
+# tests/test_25_bench_suite.py
+"""
+Suite de benchmarks : générateur de locataire synthétique (cohérence des
+données générées), exécution des scénarios sur un petit locataire et
+outils du test de charge (percentiles, trafic pondéré, faux backend LLM).
+"""
+import asyncio
+import json
+import random
+import urllib.request
+from collections import Counter
+
+import pytest
+
+pytestmark = pytest.mark.bench_suite
+
+TINY = dict(activities=6, links=8, tasks_per_activity=2, tools=3, roles=2,
+            users=4, evals_per_user=3, data_per_activity=1)
+
+
+@pytest.fixture(scope="module")
+def tenant(app):
+    from benchmarks.synthetic_tenant import generate_tenant
+    from Code.extensions import db
+
+    with app.app_context():
+        return generate_tenant(db.engine, "small", seed=7, **TINY)
+
+
+class TestSyntheticTenant:
+
+    def test_counts(self, tenant):
+        c = tenant["counts"]
+        assert c["activities"] == 6
+        assert c["tasks"] == 12
+        assert c["users"] == 5          # propriétaire + utilisateurs
+        assert c["links"] == 8 + 2 * 6  # activité → activité + entrée/sortie des données
+        assert c["evaluations"] == 4 * 3
+
+    def test_rows_belong_to_entity(self, app, tenant):
+        from Code.extensions import db
+        from Code.models.models import Activities, Entity, Link, Task, User
+
+        with app.app_context():
+            entity = db.session.get(Entity, tenant["entity_id"])
+            assert entity.owner_id == tenant["owner_id"]
+            assert db.session.get(User, tenant["owner_id"]).status == "admin"
+            acts = Activities.query.filter_by(entity_id=entity.id).all()
+            assert len(acts) == 6
+            assert Task.query.filter(Task.activity_id.in_([a.id for a in acts])).count() == 12
+            assert Link.query.filter_by(entity_id=entity.id, type="flux").count() == 8
+
+    def test_diagram_matches_activities(self, app, tenant):
+        from Code.extensions import db
+        from Code.models.models import Activities, Entity
+
+        with app.app_context():
+            diagram = json.loads(db.session.get(Entity, tenant["entity_id"]).optiqcarto_data)
+            shape_ids = {s["id"] for s in diagram["shapes"]}
+            db_ids = {a.shape_id for a in Activities.query.filter_by(entity_id=tenant["entity_id"])}
+            assert shape_ids == db_ids
+            assert len(diagram["connections"]) == 8
+            assert len(diagram["bands"]) == 2
+
+
+class TestScenarios:
+
+    def test_run_selected_scenarios(self, app, tenant):
+        from benchmarks.scenarios import run_scenarios
+
+        results = run_scenarios(app, tenant, runs=2, warmup=0,
+                                only={"carto_load", "time_activities", "import_validate"})
+        assert set(results) == {"carto_load", "time_activities", "import_validate"}
+        for r in results.values():
+            assert r["status"] == 200
+            assert r["p95_ms"] >= r["p50_ms"] > 0
+            assert r["queries"] >= 1
+            assert r["peak_kb"] > 0
+
+
+class TestLoadTestHarness:
+
+    def test_pct(self):
+        from benchmarks.load_test import _pct
+
+        assert _pct([], 0.5) is None
+        assert _pct([42.04], 0.99) == 42.0
+        values = [float(v) for v in range(100, 0, -1)]     # 100 … 1, non trié
+        assert _pct(values, 0.0) == 1.0
+        assert _pct(values, 0.5) == 51.0
+        assert _pct(values, 0.95) == 95.0
+        assert _pct(values, 1.0) == 100.0
+        assert values[0] == 100.0                           # entrée non modifiée
+
+    def test_mix_weighting(self):
+        from benchmarks.load_test import MIX, _picker
+
+        pick = _picker(random.Random(3))
+        draws = 20000
+        seen = Counter(pick() for _ in range(draws))
+        assert set(seen) == set(MIX)
+        total = sum(MIX.values())
+        for name, weight in MIX.items():
+            assert abs(seen[name] / draws - weight / total) < 0.02, name
+
+    def test_every_mix_entry_is_dispatched(self):
+        from benchmarks.load_test import MIX, VirtualUser
+
+        calls = []
+
+        class FakeHttp:
+            async def request(self, method, path, json_body=None, form=None):
+                calls.append((method, path))
+                if path == "/login":
+                    return 302, {}, b""
+                if path.startswith("/cartography/api/load/"):
+                    shapes = [{"id": "s1", "label": "Activité 1"}]
+                    return 200, {"x-carto-rev": "4"}, json.dumps({"shapes": shapes}).encode()
+                if path == "/cartography/api/patch":
+                    return 200, {}, json.dumps({"rev": json_body["base_rev"] + 1}).encode()
+                return 200, {}, b"{}"
+
+        vu = VirtualUser("127.0.0.1", 0, {"owner_email": "bench@devoptiq.com"}, random.Random(1))
+        vu.http = FakeHttp()
+        for name in MIX:
+            status, ok = asyncio.run(vu.run(name))
+            assert ok is True and status in (200, 302), name
+        assert vu.rev == 5
+        with pytest.raises(ValueError):
+            asyncio.run(vu.run("inconnu"))
+
+    def test_fake_llm_response_shape(self):
+        from benchmarks.load_test import start_fake_llm
+
+        server, base_url = start_fake_llm(0)
+        try:
+            req = urllib.request.Request(
+                f"{base_url}/chat/completions", method="POST",
+                data=json.dumps({"model": "gpt-4o-mini", "messages": []}).encode(),
+                headers={"Content-Type": "application/json"})
+            with urllib.request.urlopen(req, timeout=5) as resp:
+                assert resp.status == 200
+                assert resp.headers["Content-Type"] == "application/json"
+                body = json.loads(resp.read())
+        finally:
+            server.shutdown()
+            server.server_close()
+        assert body["object"] == "chat.completion"
+        (choice,) = body["choices"]
+        assert choice["finish_reason"] == "stop"
+        assert choice["message"]["role"] == "assistant"
+        lines = choice["message"]["content"].splitlines()
+        assert len(lines) == 3 and all(line.startswith("- ") for line in lines)
+        assert body["usage"]["total_tokens"] == body["usage"]["prompt_tokens"] + body["usage"]["completion_tokens"]
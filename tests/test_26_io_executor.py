@@ -0,0 +1,260 @@
+# tests/test_26_io_executor.py
+"""
+Pool d'E/S : délais, appels parallèles ordonnés, tâches de fond, contexte
+d'application recréé dans les threads ; requêtes concurrentes (workers
+gthread) sans partage de session SQLAlchemy.
+"""
+import threading
+import time
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+pytestmark = pytest.mark.io_executor
+
+
+@pytest.fixture(scope="module")
+def io_user(app):
+    from Code.extensions import db
+    from Code.models.models import Entity, User
+
+    with app.app_context():
+        user = User(first_name="Pool", last_name="IO", email="io-executor@devoptiq.com",
+                    password=generate_password_hash("IoPass123!"), status="admin")
+        db.session.add(user)
+        db.session.flush()
+        entity = Entity(name="Pool E/S", owner_id=user.id)
+        db.session.add(entity)
+        db.session.commit()
+        return {"user_id": user.id, "entity_id": entity.id, "email": user.email}
+
+
+class TestRunIO:
+
+    def test_returns_result(self, app):
+        from Code.io_executor import run_io
+
+        assert run_io(lambda a, b=0: a + b, 2, b=3, timeout=5) == 5
+
+    def test_timeout(self, app):
+        from Code.io_executor import IOTimeout, io_stats, run_io
+
+        before = io_stats()["timeouts"]
+        release, finished = threading.Event(), threading.Event()
+
+        def blocked():
+            release.wait(5)
+            finished.set()
+
+        try:
+            with pytest.raises(IOTimeout):
+                run_io(blocked, timeout=0.05)
+            # Rendu avant la fin de la tâche, toujours bloquée
+            assert not finished.is_set()
+        finally:
+            release.set()
+        assert io_stats()["timeouts"] == before + 1
+        assert finished.wait(5)
+
+    def test_exception_propagates(self, app):
+        from Code.io_executor import run_io
+
+        def boom():
+            raise ValueError("API indisponible")
+
+        with pytest.raises(ValueError, match="API indisponible"):
+            run_io(boom, timeout=5)
+
+    def test_app_context_in_thread(self, app):
+        from flask import current_app
+
+        from Code.extensions import db
+        from Code.io_executor import run_io
+
+        def probe():
+            return current_app.name, threading.current_thread().name, id(db.session())
+
+        with app.app_context():
+            name, thread, session_id = run_io(probe, timeout=5)
+            assert name == app.name
+            assert thread.startswith("io")
+            assert session_id != id(db.session())
+
+
+class TestChatCompletion:
+
+    def _client(self, create):
+        class Completions:
+            pass
+
+        class Chat:
+            completions = Completions()
+
+        class Client:
+            chat = Chat()
+
+        Completions.create = staticmethod(create)
+        return Client()
+
+    def test_kwargs_and_timeout_reach_client(self, app):
+        from Code.routes.propose_common import LLM_TIMEOUT_S, chat_completion
+
+        seen = {}
+
+        def create(**kwargs):
+            seen.update(kwargs, thread=threading.current_thread().name)
+            return {"choices": []}
+
+        client = self._client(create)
+        with app.app_context():
+            assert chat_completion(client, model="gpt-test", messages=[]) == {"choices": []}
+        assert seen["model"] == "gpt-test"
+        assert seen["timeout"] == LLM_TIMEOUT_S
+        assert seen["thread"].startswith("io")
+
+        with app.app_context():
+            chat_completion(client, timeout=3, model="gpt-test", messages=[])
+        assert seen["timeout"] == 3
+
+    def test_timeout_raises(self, app):
+        from Code.io_executor import IOTimeout
+        from Code.routes.propose_common import chat_completion
+
+        release = threading.Event()
+        client = self._client(lambda **kwargs: release.wait(5))
+        try:
+            with app.app_context(), pytest.raises(IOTimeout):
+                chat_completion(client, timeout=0.01, model="gpt-test", messages=[])
+        finally:
+            release.set()
+
+
+class TestMapIO:
+
+    def test_order_and_default(self, app):
+        from Code.io_executor import map_io
+
+        def slow_square(n):
+            if n == 3:
+                raise RuntimeError("échec")
+            time.sleep(0.05 * (5 - n))
+            return n * n
+
+        assert map_io(slow_square, range(5), timeout=5, default=-1) == [0, 1, 4, -1, 16]
+
+    def test_parallel_within_deadline(self, app):
+        from Code.io_executor import map_io
+
+        # Les 6 appels ne franchissent la barrière que s'ils tournent ensemble
+        barrier = threading.Barrier(6)
+
+        def meet(n):
+            barrier.wait(5)
+            return n
+
+        assert map_io(meet, range(6), timeout=10) == list(range(6))
+
+    def test_global_timeout_fills_default(self, app):
+        from Code.io_executor import map_io
+
+        results = map_io(lambda s: time.sleep(s) or s, [0, 0.6], timeout=0.2, default="absent")
+        assert results == [0, "absent"]
+
+    def test_max_parallel(self, app):
+        from Code.io_executor import map_io
+
+        state = {"current": 0, "peak": 0}
+        lock = threading.Lock()
+
+        def tracked(n):
+            with lock:
+                state["current"] += 1
+                state["peak"] = max(state["peak"], state["current"])
+            time.sleep(0.03)
+            with lock:
+                state["current"] -= 1
+            return n
+
+        assert map_io(tracked, range(8), timeout=5, max_parallel=2) == list(range(8))
+        assert state["peak"] <= 2
+
+    def test_empty(self, app):
+        from Code.io_executor import map_io
+
+        assert map_io(lambda n: n, []) == []
+
+
+class TestBackground:
+
+    def test_error_is_logged(self, app, capsys):
+        from Code.io_executor import run_background
+
+        def failing():
+            raise ConnectionError("SMTP injoignable")
+
+        future = run_background(failing)
+        assert isinstance(future.exception(timeout=5), ConnectionError)
+        assert "SMTP injoignable" in capsys.readouterr().out
+
+    def test_forgot_password_does_not_wait_for_smtp(self, app, io_user, monkeypatch):
+        from Code.extensions import mail
+
+        release, sent = threading.Event(), threading.Event()
+
+        def slow_send(msg):
+            release.wait(5)
+            sent.set()
+
+        monkeypatch.setattr(mail, "send", slow_send)
+        try:
+            resp = app.test_client().post("/forgot_password", data={"email": io_user["email"]})
+            assert resp.status_code == 302
+            # Réponse rendue alors que l'envoi SMTP est encore bloqué
+            assert not sent.is_set()
+        finally:
+            release.set()
+        assert sent.wait(5)
+
+
+class TestConcurrentRequests:
+
+    def test_threads_have_distinct_sessions(self, app):
+        from Code.extensions import db
+
+        sessions, barrier = [], threading.Barrier(4)
+
+        def worker():
+            with app.app_context():
+                session = db.session()
+                barrier.wait(5)     # les 4 sessions existent en même temps
+                sessions.append(id(session))
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(10)
+        assert len(set(sessions)) == 4
+
+    def test_parallel_reads(self, app, io_user):
+        errors, statuses = [], []
+
+        def worker():
+            client = app.test_client()
+            with client.session_transaction() as sess:
+                sess["user_id"] = io_user["user_id"]
+                sess["user_email"] = io_user["email"]
+                sess["active_entity_id"] = io_user["entity_id"]
+            try:
+                for _ in range(5):
+                    statuses.append(client.get("/temps/api/activities").status_code)
+            except Exception as exc:
+                errors.append(exc)
+
+        threads = [threading.Thread(target=worker) for _ in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(30)
+        assert not errors
+        assert statuses == [200] * 30
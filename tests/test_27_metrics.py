@@ -0,0 +1,172 @@
+# tests/test_27_metrics.py
+"""
+Métriques Prometheus : format d'exposition, latence par endpoint, requêtes
+SQL, pools, appels externes (issues), analyse VSDX, débit des imports et
+protection de /metrics par jeton.
+"""
+import os
+import re
+
+import pytest
+
+pytestmark = pytest.mark.metrics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def scratch_metrics():
+    """Instruments de test retirés de l'exposition à la fin."""
+    from Code import metrics
+
+    before = list(metrics._metrics)
+    yield metrics
+    metrics._metrics[:] = before
+
+
+def _sample(text, name, **labels):
+    """Valeur d'une série (étiquettes données incluses dans celles de la série)."""
+    for line in text.splitlines():
+        if line.startswith("#"):
+            continue
+        match = re.match(r"^(\w+)(\{.*\})? (\S+)$", line)
+        if not match or match.group(1) != name:
+            continue
+        found = dict(re.findall(r'(\w+)="((?:[^"\\]|\\.)*)"', match.group(2) or ""))
+        if all(found.get(k) == str(v) for k, v in labels.items()):
+            return float(match.group(3))
+    return None
+
+
+class TestExposition:
+
+    def test_counter_and_histogram_format(self, scratch_metrics):
+        m = scratch_metrics
+        counter = m.Counter("optiq_test_events_total", "Événements", ("kind",))
+        hist = m.Histogram("optiq_test_seconds", "Durées", ("op",), buckets=(0.1, 1.0))
+        counter.inc(kind='a"b')
+        counter.inc(2, kind='a"b')
+        for v in (0.05, 0.1, 0.5, 3.0):
+            hist.observe(v, op="x")
+
+        text = m.render()
+        assert "# TYPE optiq_test_events_total counter" in text
+        assert 'optiq_test_events_total{kind="a\\"b"} 3' in text
+        assert "# TYPE optiq_test_seconds histogram" in text
+        assert 'optiq_test_seconds_bucket{op="x",le="0.1"} 2' in text
+        assert 'optiq_test_seconds_bucket{op="x",le="1"} 3' in text
+        assert 'optiq_test_seconds_bucket{op="x",le="+Inf"} 4' in text
+        assert 'optiq_test_seconds_count{op="x"} 4' in text
+        assert _sample(text, "optiq_test_seconds_sum", op="x") == pytest.approx(3.65)
+
+    def test_histogram_time(self, scratch_metrics):
+        hist = scratch_metrics.Histogram("optiq_test_timer_seconds", "Chrono")
+        with hist.time():
+            pass
+        assert hist.value()["count"] == 1
+
+
+class TestEndpoint:
+
+    def test_request_and_sql_series(self, app):
+        client = app.test_client()
+        client.get("/healthz")
+        client.get("/login")
+        resp = client.get("/metrics")
+        assert resp.status_code == 200
+        assert resp.content_type.startswith("text/plain; version=0.0.4")
+        text = resp.get_data(as_text=True)
+
+        assert _sample(text, "optiq_http_request_duration_seconds_count", endpoint="healthz",
+                       method="GET", status=200) >= 1
+        assert _sample(text, "optiq_db_query_duration_seconds_count") > 0
+        assert _sample(text, "optiq_db_pool_checkouts_total", engine="primary") is not None
+        assert _sample(text, "optiq_process_info") == 1
+        assert _sample(text, "optiq_io_executor_tasks_total", state="submitted") is not None
+        # /metrics ne se mesure pas lui-même
+        assert _sample(text, "optiq_http_request_duration_seconds_count", endpoint="metrics.metrics") is None
+
+    def test_token(self, app):
+        client = app.test_client()
+        remote = {"REMOTE_ADDR": "203.0.113.7"}
+        app.config["METRICS_TOKEN"] = "s3cret"
+        try:
+            assert client.get("/metrics").status_code == 401
+            resp = client.get("/metrics", headers={"Authorization": "Bearer s3cret"}, environ_overrides=remote)
+            assert resp.status_code == 200
+        finally:
+            app.config["METRICS_TOKEN"] = None
+
+    def test_without_token_only_loopback(self, app):
+        client = app.test_client()
+        assert client.get("/metrics", environ_overrides={"REMOTE_ADDR": "::1"}).status_code == 200
+        assert client.get("/metrics", environ_overrides={"REMOTE_ADDR": "203.0.113.7"}).status_code == 403
+        # En-tête de proxy ignoré : il serait falsifiable par le client
+        resp = client.get("/metrics", headers={"X-Forwarded-For": "127.0.0.1"},
+                          environ_overrides={"REMOTE_ADDR": "203.0.113.7"})
+        assert resp.status_code == 403
+
+
+class TestUpstream:
+
+    def _count(self, **labels):
+        from Code.metrics import UPSTREAM_REQUESTS
+        return UPSTREAM_REQUESTS.value(**labels) or 0
+
+    def test_outcomes(self, app):
+        from Code.io_executor import IOTimeout
+        from Code.metrics import UPSTREAM_LATENCY, observe_upstream
+
+        class Resp:
+            def __init__(self, status_code):
+                self.status_code = status_code
+
+        def raise_(exc):
+            raise exc
+
+        labels = dict(service="test", operation="op")
+        assert observe_upstream("test", "op", Resp, 200).status_code == 200
+        observe_upstream("test", "op", Resp, 503)
+        with pytest.raises(IOTimeout):
+            observe_upstream("test", "op", raise_, IOTimeout("lent"))
+        with pytest.raises(ValueError):
+            observe_upstream("test", "op", raise_, ValueError("cassé"))
+
+        for outcome in ("ok", "http_5xx", "timeout", "error"):
+            assert self._count(outcome=outcome, **labels) == 1
+        assert UPSTREAM_LATENCY.value(**labels)["count"] == 4
+
+    def test_chat_completion_counted(self, app):
+        from Code.routes.propose_common import chat_completion
+
+        class Completions:
+            def create(self, **kwargs):
+                return {"model": kwargs["model"]}
+
+        class Client:
+            class chat:
+                completions = Completions()
+
+        before = self._count(service="openai", operation="chat.completions", outcome="ok")
+        with app.app_context():
+            assert chat_completion(Client, model="gpt-test", messages=[]) == {"model": "gpt-test"}
+        assert self._count(service="openai", operation="chat.completions", outcome="ok") == before + 1
+
+
+class TestParseAndImport:
+
+    def test_vsdx_parse_time(self):
+        from Code.metrics import VSDX_PARSE
+        from Code.routes.vsdx_conection_parser import parse_vsdx_connections
+
+        before = (VSDX_PARSE.value(parser="connections") or {"count": 0})["count"]
+        parse_vsdx_connections(os.path.join(ROOT, "Code", "example.vsdx"))
+        assert VSDX_PARSE.value(parser="connections")["count"] == before + 1
+
+    def test_import_rows(self, app):
+        from Code.metrics import IMPORT_LAST_RATE, IMPORT_ROWS, record_import
+
+        before = IMPORT_ROWS.value(kind="test") or 0
+        record_import("test", 120, 0.5)
+        assert IMPORT_ROWS.value(kind="test") == before + 120
+        assert IMPORT_LAST_RATE.value(kind="test") == 240
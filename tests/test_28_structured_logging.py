@@ -0,0 +1,183 @@
+# tests/test_28_structured_logging.py
+"""
+Journalisation structurée : lignes JSON à champs nommés, filtrage par
+niveau sans formatage, file non bloquante (abandon si pleine) et
+identifiant de corrélation par requête, propagé au pool d'E/S.
+"""
+import io
+import json
+import threading
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+pytestmark = pytest.mark.structured_logging
+
+
+@pytest.fixture
+def log_stream():
+    from Code import structured_logging
+
+    stream = io.StringIO()
+    structured_logging.configure_logging(level="INFO", fmt="json", stream=stream)
+    yield stream
+    structured_logging.configure_logging()
+
+
+def _lines(stream):
+    from Code.structured_logging import flush
+
+    flush()
+    return [json.loads(line) for line in stream.getvalue().splitlines() if line]
+
+
+class _Probe:
+    formatted = 0
+
+    def __str__(self):
+        _Probe.formatted += 1
+        return "probe"
+
+
+class TestFormat:
+
+    def test_json_line_with_fields(self, log_stream):
+        from Code.structured_logging import get_logger
+
+        get_logger("test").info("Synchronisation %s", "terminée", entity_id=7, added=3, level="ignoré")
+        (entry,) = _lines(log_stream)
+        assert entry["msg"] == "Synchronisation terminée"
+        assert entry["logger"] == "optiq.test"
+        assert entry["level"] == "info"          # champ réservé non écrasé
+        assert entry["entity_id"] == 7 and entry["added"] == 3
+        assert entry["request_id"] is None
+        assert isinstance(entry["pid"], int)
+
+    def test_exception(self, log_stream):
+        from Code.structured_logging import get_logger
+
+        try:
+            raise ValueError("fichier illisible")
+        except ValueError:
+            get_logger("test").exception("Erreur d'upload", entity_id=1)
+        (entry,) = _lines(log_stream)
+        assert entry["level"] == "error"
+        assert "ValueError: fichier illisible" in entry["exc"]
+
+    def test_text_format(self):
+        from Code import structured_logging
+
+        stream = io.StringIO()
+        structured_logging.configure_logging(level="INFO", fmt="text", stream=stream)
+        try:
+            structured_logging.get_logger("test").warning("Fichier inexistant", path="/tmp/x")
+            structured_logging.flush()
+        finally:
+            structured_logging.configure_logging()
+        line = stream.getvalue().strip()
+        assert "WARNING optiq.test [None] Fichier inexistant path=/tmp/x" in line
+
+
+class TestLevelGating:
+
+    def test_debug_disabled_costs_no_formatting(self, log_stream):
+        from Code.structured_logging import get_logger
+
+        before = _Probe.formatted
+        get_logger("test").debug("Détail %s", _Probe(), probe=1)
+        assert _lines(log_stream) == []
+        assert _Probe.formatted == before
+
+    def test_debug_enabled(self, log_stream):
+        import logging
+
+        from Code.structured_logging import ROOT_LOGGER, get_logger
+
+        logging.getLogger(ROOT_LOGGER).setLevel("DEBUG")
+        get_logger("test").debug("Détail %s", _Probe())
+        assert _lines(log_stream)[0]["msg"] == "Détail probe"
+
+
+class TestQueue:
+
+    def test_slow_writer_does_not_block_and_drops_when_full(self):
+        from Code import structured_logging
+
+        release = threading.Event()
+
+        class BlockedStream(io.StringIO):
+            def write(self, s):
+                release.wait(5)
+                return super().write(s)
+
+        structured_logging.configure_logging(level="INFO", stream=BlockedStream(), queue_size=5)
+        try:
+            log = structured_logging.get_logger("test")
+            for i in range(200):
+                log.info("Ligne", i=i)
+            # Thread d'écriture bloqué : la boucle a rendu la main en abandonnant
+            assert structured_logging.dropped_records() > 0
+        finally:
+            release.set()
+            structured_logging.configure_logging()
+
+
+@pytest.fixture(scope="module")
+def lonely_user(app):
+    from Code.extensions import db
+    from Code.models.models import User
+
+    with app.app_context():
+        user = User(first_name="Sans", last_name="Rôle", email="structured-log@devoptiq.com",
+                    password=generate_password_hash("LogPass123!"), status="user")
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+
+class TestCorrelation:
+
+    def test_incoming_request_id_propagated(self, app, lonely_user, log_stream):
+        resp = app.test_client().get(f"/projection_metier/analyze_user/{lonely_user}",
+                                     headers={"X-Request-ID": "lb-1234"})
+        assert resp.status_code == 200
+        assert resp.headers["X-Request-ID"] == "lb-1234"
+        entries = [e for e in _lines(log_stream) if e.get("user_id") == lonely_user]
+        assert entries and all(e["request_id"] == "lb-1234" for e in entries)
+
+    def test_generated_when_missing_or_invalid(self, app):
+        client = app.test_client()
+        first = client.get("/healthz").headers["X-Request-ID"]
+        second = client.get("/healthz", headers={"X-Request-ID": "bad id; <script>"}).headers["X-Request-ID"]
+        assert len(first) == 32 and len(second) == 32 and first != second
+
+    def test_request_id_in_io_threads(self, app, log_stream):
+        from Code.io_executor import run_io
+        from Code.structured_logging import _request_id, current_request_id, get_logger
+
+        token = _request_id.set("req-io")
+        try:
+            seen = run_io(lambda: (get_logger("test").info("Depuis le pool"), current_request_id())[1], timeout=5)
+        finally:
+            _request_id.reset(token)
+        assert seen == "req-io"
+        assert _lines(log_stream)[0]["request_id"] == "req-io"
+        assert current_request_id() is None
+
+    def test_concurrent_requests_keep_their_ids(self, app):
+        ids, errors = [], []
+
+        def worker(n):
+            try:
+                resp = app.test_client().get("/healthz", headers={"X-Request-ID": f"w{n}"})
+                ids.append((n, resp.headers["X-Request-ID"]))
+            except Exception as exc:
+                errors.append(exc)
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(10)
+        assert not errors
+        assert all(rid == f"w{n}" for n, rid in ids) and len(ids) == 8